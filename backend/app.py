@@ -393,7 +393,8 @@ def health_check():
 # Movido a backend/routes/programacion_routes.py + backend/services/programacion_service.py:
 # catalogo de maquinas, mes_programar, mes_cancelar, mes_get_programaciones,
 # mes_dashboard, mes_get_pendientes_calidad, mes_get_productos_programacion,
-# mes_get_status_maquina, mes_iniciar y el cache _mes_cache/clear_mes_cache.
+# mes_get_status_maquina, mes_iniciar y clear_mes_cache (tablero en memoria:
+# backend/services/mes_estado.py, push por /api/mes/stream).
 # ====================================================================
 
 # ====================================================================
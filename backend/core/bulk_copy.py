@@ -0,0 +1,98 @@
+"""
+Ingesta masiva vía COPY ... FROM STDIN (PostgreSQL / psycopg2).
+
+Las sincronizaciones de World Office (ventas staging, inventario_wo,
+cartera_wo, db_clientes) cargaban miles de filas con executemany de
+parámetros enlazados o con INSERTs multi-VALUES de un parámetro por celda:
+un round-trip (o un plan) por lote y mucho tiempo con la tabla destino
+bloqueada. COPY transmite todas las filas en un único stream y Postgres las
+parsea en el servidor, un orden de magnitud más rápido.
+
+Patrón de uso:
+  - Tablas que se cargan tal cual (staging): copiar_filas().
+  - Tablas con merge (UPSERT): copiar_a_temporal() vuelca a una tabla
+    temporal con la forma de la tabla real y el caller hace un único
+    INSERT ... SELECT ... ON CONFLICT set-based desde ahí.
+
+Ambas corren sobre la conexión de db.session, o sea DENTRO de la transacción
+del caller: el commit/rollback sigue siendo responsabilidad de quien llama
+(mismo contrato que StockService.actualizar_stock).
+"""
+import io
+import logging
+
+from sqlalchemy import text
+
+from backend.core.sql_database import db
+
+logger = logging.getLogger(__name__)
+
+# Marcador de NULL del CSV. Los valores reales siempre viajan entre comillas,
+# y en FORMAT csv un valor entre comillas nunca se interpreta como NULL: un
+# texto literal '\N' llega intacto.
+_NULL_CSV = r'\N'
+
+# Columna que copiar_a_temporal() agrega a la temporal con el orden de
+# llegada de cada fila, para que el merge resuelva duplicados dentro del
+# mismo payload quedándose con la ÚLTIMA ocurrencia (lo que hacía el
+# executemany fila a fila) en vez de fallar con "ON CONFLICT DO UPDATE
+# command cannot affect row a second time".
+COLUMNA_ORDEN_COPY = '_fila'
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return _NULL_CSV
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+def _buffer_csv(columnas, filas):
+    """Serializa `filas` (dicts o secuencias en el orden de `columnas`) a CSV en memoria."""
+    buffer = io.StringIO()
+    total = 0
+    for fila in filas:
+        valores = [fila.get(c) for c in columnas] if isinstance(fila, dict) else fila
+        buffer.write(','.join(_valor_csv(v) for v in valores))
+        buffer.write('\n')
+        total += 1
+    buffer.seek(0)
+    return buffer, total
+
+
+def copiar_filas(tabla, columnas, filas):
+    """
+    COPY de `filas` a `tabla` (solo `columnas`; el resto toma su DEFAULT).
+    No hace commit. Devuelve la cantidad de filas enviadas.
+    """
+    buffer, total = _buffer_csv(columnas, filas)
+    if not total:
+        return 0
+
+    sql = (
+        f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN "
+        f"WITH (FORMAT csv, NULL '{_NULL_CSV}')"
+    )
+    # La conexión DBAPI (psycopg2) de la sesión: misma transacción que el
+    # resto del trabajo del caller.
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+    logger.debug(f"[COPY] {total} filas copiadas a {tabla}")
+    return total
+
+
+def copiar_a_temporal(tabla_tmp, plantilla, columnas, filas):
+    """
+    Crea `tabla_tmp` (temporal, ON COMMIT DROP) con las `columnas` de la
+    tabla `plantilla` más COLUMNA_ORDEN_COPY, y le hace COPY de `filas`.
+    El caller hace el merge set-based desde `tabla_tmp` y luego commit.
+    Devuelve la cantidad de filas copiadas.
+    """
+    db.session.execute(text(
+        f"CREATE TEMP TABLE {tabla_tmp} ON COMMIT DROP AS "
+        f"SELECT {', '.join(columnas)} FROM {plantilla} WITH NO DATA"
+    ))
+    db.session.execute(text(f"ALTER TABLE {tabla_tmp} ADD COLUMN {COLUMNA_ORDEN_COPY} BIGSERIAL"))
+    return copiar_filas(tabla_tmp, columnas, filas)
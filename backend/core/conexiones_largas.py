@@ -0,0 +1,37 @@
+"""Cupo único de conexiones HTTP de larga duración (SSE y long-poll).
+
+Cada stream del asistente (/asistente/jobs/<id>/stream), del tablero MES
+(/api/mes/stream) y cada long-poll de pedidos
+(/api/pedidos/pendientes/cambios?espera=N) retiene un hilo de gunicorn
+mientras dura. Con un cupo por blueprint la suma podía ocupar todos los
+hilos y dejar la app sin nadie que atienda requests normales; por eso los
+tres comparten este único semáforo, acotado a hilos - 2 para que siempre
+queden al menos dos hilos libres.
+
+Quien no consigue cupo no espera: el endpoint responde al instante (429 con
+usar_polling, o el long-poll sin retención) y el cliente sigue por polling.
+"""
+import os
+import threading
+
+# Hilos por worker: el mismo valor que lee gunicorn.conf.py.
+HILOS_SERVIDOR = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# MAX_CONEXIONES_LARGAS solo puede bajar el tope, nunca pasar de hilos - 2
+# (con 2 hilos o menos no se admite ninguna: todo va por polling).
+MAX_CONEXIONES_LARGAS = max(0, min(
+    int(os.environ.get("MAX_CONEXIONES_LARGAS", HILOS_SERVIDOR - 2)),
+    HILOS_SERVIDOR - 2,
+))
+
+_cupo = threading.BoundedSemaphore(MAX_CONEXIONES_LARGAS)
+
+
+def tomar() -> bool:
+    """Intenta reservar un cupo sin bloquear. True si se obtuvo."""
+    return _cupo.acquire(blocking=False)
+
+
+def liberar() -> None:
+    """Devuelve un cupo reservado con tomar()."""
+    _cupo.release()
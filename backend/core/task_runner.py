@@ -4,7 +4,7 @@ Excel) que no deben bloquear el hilo HTTP.
 In-memory, sin Celery/Redis: gunicorn corre con workers=1 (ver
 gunicorn.conf.py) -- un solo proceso Python, asi que un dict en memoria no
 sufre la inconsistencia entre workers que tendria con mas de un proceso.
-Mismo supuesto que ya usan PRODUCTOS_V2_CACHE/NamespaceTTLCache. Si el
+Mismo supuesto que ya usan CatalogoService/NamespaceTTLCache. Si el
 proyecto alguna vez pasa a mas de un worker, este modulo deja de ser valido
 y hay que migrar a Redis/DB -- no antes.
 
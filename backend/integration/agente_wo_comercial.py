@@ -6,7 +6,7 @@ import logging
 import pyodbc
 import requests
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # Cargar variables de entorno locales si existe un archivo .env (y para que tome el token correcto)
@@ -43,6 +43,15 @@ API_KEY = os.getenv("WO_SYNC_API_KEY")
 if not API_KEY:
     raise RuntimeError("WO_SYNC_API_KEY no está configurada")
 
+# Modo delta: en vez de reenviar todo el histórico desde 2024, se pide al
+# servidor la fecha de la última sync exitosa (watermark) y se extraen solo
+# los documentos con fecha >= watermark - DIAS_VENTANA_DELTA. La ventana
+# cubre documentos editados/anulados con fecha reciente y el desfase entre
+# la extracción y el sellado del watermark. `--completa` fuerza el envío
+# del histórico completo (reconciliación total).
+WATERMARK_URL = os.getenv("API_RENDER_URL_WATERMARK_COMERCIAL", "https://proyecto-friparts.onrender.com/api/wo/watermark_comercial")
+DIAS_VENTANA_DELTA = int(os.getenv("WO_DELTA_VENTANA_DIAS", "7"))
+
 # Fase 2 (conciliacion OP): permite `from backend.models.sql_models import
 # OpWoStaging` aunque este script se invoque como archivo suelto (python
 # backend/integration/agente_wo_comercial.py) desde cualquier cwd -- sin esto
@@ -64,10 +73,36 @@ conn_str = (
 
 CHUNK_SIZE = 2000
 
-def enviar_datos_por_lotes(datos, url_api, headers):
+def obtener_desde_delta(headers):
+    """
+    Fecha desde la que se extrae en modo delta (watermark del servidor menos
+    DIAS_VENTANA_DELTA), o None si corresponde extracción completa: se pidió
+    --completa, el servidor no tiene watermark, o no se pudo consultar (ante
+    la duda se envía todo; el servidor igual aplica solo las diferencias).
+    """
+    if "--completa" in sys.argv:
+        logger.info("[INFO] --completa: se enviará el histórico completo.")
+        return None
+    try:
+        resp = requests.get(WATERMARK_URL, headers=headers, timeout=10)
+        resp.raise_for_status()
+        watermark = resp.json().get("watermark")
+    except Exception as e:
+        logger.warning(f"[WARN] No se pudo consultar el watermark comercial ({e}). Se hará extracción completa.")
+        return None
+    if not watermark:
+        logger.info("[INFO] El servidor no tiene watermark comercial. Se hará extracción completa.")
+        return None
+    desde = datetime.fromisoformat(watermark).date() - timedelta(days=DIAS_VENTANA_DELTA)
+    logger.info(f"[INFO] Modo delta: watermark={watermark} -> documentos con fecha >= {desde}")
+    return desde
+
+
+def enviar_datos_por_lotes(datos, url_api, headers, extra=None):
     """
     Divide el payload masivo en lotes pequeños para evitar 
-    timeouts en Render y locks en PostgreSQL.
+    timeouts en Render y locks en PostgreSQL. `extra` se agrega a cada
+    lote (ej. modo='delta' y desde).
     """
     total_registros = len(datos)
     for i in range(0, total_registros, CHUNK_SIZE):
@@ -76,7 +111,8 @@ def enviar_datos_por_lotes(datos, url_api, headers):
             "is_chunk": True,
             "index": i // CHUNK_SIZE,
             "total_chunks": (total_registros + CHUNK_SIZE - 1) // CHUNK_SIZE,
-            "data": lote
+            "data": lote,
+            **(extra or {})
         }
         
         try:
@@ -391,6 +427,23 @@ def ejecutar_extraccion():
         )
         select_nit = f"E.[{col_nit}]" if col_nit else "NULL"
 
+        headers = {
+            "Content-Type": "application/json",
+            "X-API-Key": API_KEY,
+            "X-Sync-Token": API_KEY
+        }
+
+        # Ventana de extracción: delta desde el watermark o histórico completo.
+        desde = obtener_desde_delta(headers)
+        if desde:
+            filtro_fecha = "E.Fecha >= ?"
+            params_sql = [desde]
+            extra_payload = {"modo": "delta", "desde": desde.isoformat()}
+        else:
+            filtro_fecha = "YEAR(E.Fecha) >= 2024"
+            params_sql = []
+            extra_payload = {"modo": "completa"}
+
         # 2. Consulta SQL Definitiva simplificada
         sql = f"""
         SELECT
@@ -409,13 +462,13 @@ def ejecutar_extraccion():
         FROM [FRIPARTS2021].[dbo].[Vista_Tabla_Encabezados] E
         INNER JOIN [FRIPARTS2021].[dbo].[Vista_Tabla_Movimientos_Inventario] D
             ON E.Autonumerico = D.Pertenece_A
-        WHERE YEAR(E.Fecha) >= 2024
+        WHERE {filtro_fecha}
           AND E.Tipo_de_Documento IN ('FV', 'PED', 'COT', 'NC', 'NCV', 'NCCL', 'DMC')
           AND E.Anulado = 0;
         """
 
         logger.info(">> Ejecutando consulta SQL...")
-        cursor.execute(sql)
+        cursor.execute(sql, params_sql)
         
         columnas = [column[0] for column in cursor.description]
         datos = []
@@ -487,13 +540,7 @@ def ejecutar_extraccion():
 
         # Envío POST
         logger.info(">> Enviando datos a Render por lotes...")
-        headers = {
-            "Content-Type": "application/json",
-            "X-API-Key": API_KEY,
-            "X-Sync-Token": API_KEY
-        }
-
-        enviar_datos_por_lotes(datos, API_URL, headers)
+        enviar_datos_por_lotes(datos, API_URL, headers, extra_payload)
         logger.info("[OK] Sincronización comercial finalizada exitosamente.")
 
     except Exception as e:
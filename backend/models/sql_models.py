@@ -245,6 +245,76 @@ class RawVentas(db.Model):
     identificacion_cliente = db.Column(db.String(50), nullable=True)
 
 
+class ResumenVentasClienteProducto(db.Model):
+    """
+    Resumen de db_ventas por (cliente resuelto, producto) para Backorder y
+    Top/Peores Productos del panel de Jefatura. Reemplaza a la vista
+    materializada mv_dashboard_ventas_analitica: se mantiene por grupo
+    afectado en cada delta de WO (backend/services/resumen_ventas_service.py),
+    no con un REFRESH completo. nombres/producto pueden venir NULL de WO, por
+    eso la llave natural es un índice único y no la PK.
+    """
+    __tablename__ = 'resumen_ventas_cliente_producto'
+    __table_args__ = (
+        db.Index('idx_resumen_ventas_cliente_producto', 'nombres', 'producto', unique=True),
+        {'extend_existing': True},
+    )
+
+    id              = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    nombres         = db.Column(db.String(200), nullable=True)
+    producto        = db.Column(db.String(100), index=True, nullable=True)
+    pedidos_qty     = db.Column(db.Numeric(18, 2), default=0)
+    ventas_qty      = db.Column(db.Numeric(18, 2), default=0)
+    ventas_dinero   = db.Column(db.Numeric(18, 2), default=0)
+    avg_price       = db.Column(db.Numeric(18, 2), default=0)
+
+
+class ResumenVentasMensual(db.Model):
+    """
+    Resumen de db_ventas por (año, mes) para el comparativo Ventas vs Pedidos.
+    Reemplaza a la vista materializada mv_rendimiento_mensual (mismo
+    mantenimiento incremental que ResumenVentasClienteProducto).
+    """
+    __tablename__ = 'resumen_ventas_mensual'
+    __table_args__ = {'extend_existing': True}
+
+    ano              = db.Column(db.Integer, primary_key=True)
+    mes              = db.Column(db.Integer, primary_key=True)
+    ventas_dinero    = db.Column(db.Numeric(18, 2), default=0)
+    pedidos_dinero   = db.Column(db.Numeric(18, 2), default=0)
+    ventas_unidades  = db.Column(db.Numeric(18, 2), default=0)
+    pedidos_unidades = db.Column(db.Numeric(18, 2), default=0)
+
+
+class ResumenVentasComercial(db.Model):
+    """
+    Cubo de db_ventas por (año, mes, día, vendedor, zona, cliente,
+    clasificación) del que responde la analítica comercial histórica
+    (ComercialHistoricoService). Dimensiones ya normalizadas ('' en vez de
+    NULL) y medidas con las Notas Crédito ya restadas; mismo mantenimiento
+    incremental que ResumenVentasClienteProducto, por día afectado.
+    """
+    __tablename__ = 'resumen_ventas_comercial'
+    __table_args__ = (
+        db.Index('idx_resumen_ventas_comercial_celda',
+                 'anio', 'mes', 'dia', 'vendedor', 'zona', 'cliente', 'clasificacion', unique=True),
+        db.Index('idx_resumen_ventas_comercial_vendedor', 'vendedor', 'anio'),
+        {'extend_existing': True},
+    )
+
+    id             = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    anio           = db.Column(db.Integer, nullable=False)
+    mes            = db.Column(db.Integer, nullable=False)
+    dia            = db.Column(db.Integer, nullable=False)
+    vendedor       = db.Column(db.String(150), nullable=False, default='')
+    zona           = db.Column(db.String(100), nullable=False, default='')
+    cliente        = db.Column(db.String(200), nullable=False, default='')
+    clasificacion  = db.Column(db.String(80), nullable=False, default='')
+    total_ventas   = db.Column(db.Numeric(18, 2), default=0)
+    total_unidades = db.Column(db.Numeric(18, 2), default=0)
+    transacciones  = db.Column(db.Integer, default=0)
+
+
 class DbClientes(db.Model):
     __tablename__ = 'db_clientes'
     __table_args__ = {'extend_existing': True}
@@ -268,7 +338,13 @@ class DbClientes(db.Model):
 
 class RegistroAsistencia(db.Model):
     __tablename__ = 'db_asistencia'
-    __table_args__ = {'extend_existing': True}
+    # uq_asistencia_fecha_colaborador: soporta el INSERT ... ON CONFLICT de
+    # nomina_service.guardar_asistencia_masiva. En Postgres la crea
+    # backend/sql/migrate_asistencia_unique_fecha_colaborador.py.
+    __table_args__ = (
+        db.Index('uq_asistencia_fecha_colaborador', 'fecha', 'colaborador', unique=True),
+        {'extend_existing': True},
+    )
 
     id                  = db.Column(db.Integer, primary_key=True, autoincrement=True)
     fecha               = db.Column(db.Date,        index=True, nullable=True)
@@ -4,13 +4,12 @@ Centraliza el acceso a la tabla db_clientes en PostgreSQL.
 """
 import logging
 from sqlalchemy import text
-from sqlalchemy.dialects.postgresql import insert as pg_insert
 from backend.core.sql_database import db, rollback_seguro
-from backend.models.sql_models import DbClientes
+from backend.core.bulk_copy import copiar_a_temporal, COLUMNA_ORDEN_COPY
 
 logger = logging.getLogger(__name__)
 
-BATCH_SIZE_UPSERT_CLIENTES = 500
+COLUMNAS_CLIENTES_WO = ('id_direccion_wo', 'identificacion', 'nombre', 'direccion', 'telefonos', 'ciudad')
 
 
 class ClienteRepository:
@@ -62,8 +61,10 @@ class ClienteRepository:
         por NIT.
 
         lote_clientes: lista de dicts con id_direccion_wo/identificacion/
-        nombre/direccion/telefonos/ciudad. Se procesa en sub-lotes de
-        BATCH_SIZE_UPSERT_CLIENTES dentro de una unica transaccion atomica.
+        nombre/direccion/telefonos/ciudad. Se cargan por COPY a una temporal
+        (backend/core/bulk_copy.py) y se fusionan con un único INSERT ...
+        SELECT ... ON CONFLICT dentro de una transaccion atomica; si un
+        id_direccion_wo llega repetido gana su última ocurrencia.
         """
         if not lote_clientes:
             return 0
@@ -76,23 +77,20 @@ class ClienteRepository:
             return 0
 
         try:
-            procesados = 0
-            for i in range(0, len(registros), BATCH_SIZE_UPSERT_CLIENTES):
-                batch = registros[i:i + BATCH_SIZE_UPSERT_CLIENTES]
-
-                stmt = pg_insert(DbClientes).values(batch)
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=['id_direccion_wo'],
-                    set_={
-                        'identificacion': stmt.excluded.identificacion,
-                        'nombre':         stmt.excluded.nombre,
-                        'direccion':      stmt.excluded.direccion,
-                        'telefonos':      stmt.excluded.telefonos,
-                        'ciudad':         stmt.excluded.ciudad,
-                    }
-                )
-                db.session.execute(stmt)
-                procesados += len(batch)
+            procesados = copiar_a_temporal('tmp_clientes_wo', 'db_clientes', COLUMNAS_CLIENTES_WO, registros)
+            db.session.execute(text(f"""
+                INSERT INTO db_clientes (id_direccion_wo, identificacion, nombre, direccion, telefonos, ciudad)
+                SELECT DISTINCT ON (id_direccion_wo)
+                    id_direccion_wo, identificacion, nombre, direccion, telefonos, ciudad
+                FROM tmp_clientes_wo
+                ORDER BY id_direccion_wo, {COLUMNA_ORDEN_COPY} DESC
+                ON CONFLICT (id_direccion_wo) DO UPDATE SET
+                    identificacion = EXCLUDED.identificacion,
+                    nombre         = EXCLUDED.nombre,
+                    direccion      = EXCLUDED.direccion,
+                    telefonos      = EXCLUDED.telefonos,
+                    ciudad         = EXCLUDED.ciudad
+            """))
 
             db.session.commit()
             logger.info(f"[ClienteRepository.upsert_clientes_wo] UPSERT completado: {procesados} direcciones de cliente procesadas.")
@@ -32,7 +32,7 @@ _SQL_CTE_ULTIMOS_DESPACHOS = """
 
 def _sql_ref_desde_producto(col):
     """
-    db_ventas.productos y mv_dashboard_ventas_analitica.producto son texto libre de
+    db_ventas.productos y resumen_ventas_cliente_producto.producto son texto libre de
     World Office ('FR-9843 BUJE ...'): se toma el primer token sin prefijo 'FR-',
     mismo criterio que VentasRepository.get_backorder_detalle_por_cliente, para que
     ambos lados del JOIN contra db_despachos_pedido.id_codigo queden comparables.
@@ -529,9 +529,9 @@ class DashboardRepository:
         Calcula el rendimiento mensual (comparativo Año Actual vs Año Anterior) 100% SQL-Native.
         Si se proveen fechas, calcula automáticamente el periodo espejo del año anterior.
 
-        Sin fechas (caso por defecto): lee de mv_rendimiento_mensual, que ya viene
-        agregada por (año, mes) — ver backend/sql/create_mv_rendimiento_mensual.sql.
-        Con fechas: la vista no tiene granularidad diaria (un filtro parcial de mes
+        Sin fechas (caso por defecto): lee de resumen_ventas_mensual, que ya viene
+        agregada por (año, mes) — ver backend/services/resumen_ventas_service.py.
+        Con fechas: el resumen no tiene granularidad diaria (un filtro parcial de mes
         perdería precisión), así que se mantiene el camino en vivo original sobre
         db_ventas con el rango espejo año-anterior.
         """
@@ -592,7 +592,7 @@ class DashboardRepository:
                 sql = """
                     SELECT mes, ano, ventas_dinero as ventas, pedidos_dinero as pedidos,
                            ventas_unidades as v_unds, pedidos_unidades as p_unds
-                    FROM mv_rendimiento_mensual
+                    FROM resumen_ventas_mensual
                     WHERE ano IN (2025, 2026)
                     ORDER BY ano, mes
                 """
@@ -696,10 +696,10 @@ class DashboardRepository:
             return f"COALESCE({col}, 0)"
 
         # 1-2. Top y Peores Productos.
-        # Sin filtro de fecha (caso por defecto): se lee de mv_dashboard_ventas_analitica,
+        # Sin filtro de fecha (caso por defecto): se lee de resumen_ventas_cliente_producto,
         # que ya viene agregada por (cliente, producto) — ver
-        # backend/sql/create_mv_dashboard_ventas_analitica.sql. Con filtro de fecha: la
-        # vista no tiene granularidad diaria, así que se cae al camino en vivo sobre
+        # backend/services/resumen_ventas_service.py. Con filtro de fecha: el
+        # resumen no tiene granularidad diaria, así que se cae al camino en vivo sobre
         # db_ventas (single-scan vía CTE materializada) para no romper el filtro.
         top_d = []
         peor_d = []
@@ -714,7 +714,7 @@ class DashboardRepository:
                         SELECT producto,
                                SUM(ventas_dinero) as total_dinero,
                                SUM(ventas_qty) as total_unidades
-                        FROM mv_dashboard_ventas_analitica
+                        FROM resumen_ventas_cliente_producto
                         WHERE 1=1 {excl_top}
                         GROUP BY producto
                         ORDER BY total_dinero DESC
@@ -725,7 +725,7 @@ class DashboardRepository:
                         SELECT producto,
                                SUM(ventas_dinero) as total_dinero,
                                SUM(ventas_qty) as total_unidades
-                        FROM mv_dashboard_ventas_analitica
+                        FROM resumen_ventas_cliente_producto
                         WHERE 1=1 {excl_peor}
                         GROUP BY producto
                         ORDER BY total_dinero ASC
@@ -777,7 +777,7 @@ class DashboardRepository:
             logger.error(f"[DashboardRepository.get_admin_dashboard_metrics_sql - top/peor productos] {e}")
 
         # 3. Incumplimiento (Backorder).
-        # Sin filtro de fecha: lectura directa de la vista materializada (ya trae el
+        # Sin filtro de fecha: lectura directa del resumen por cliente/producto (ya trae el
         # JOIN de alias y el NOT ILIKE '%FRIPARTS%' resueltos). Con filtro de fecha:
         # camino en vivo original (JOIN equality-only + fallback defensivo).
         back_rows = []
@@ -790,7 +790,7 @@ class DashboardRepository:
                            (v.pedidos_qty - v.ventas_qty) as diff_qty,
                            (v.pedidos_qty - v.ventas_qty) * v.avg_price as diff_money,
                            ud.ultima_fecha_despacho
-                    FROM mv_dashboard_ventas_analitica v
+                    FROM resumen_ventas_cliente_producto v
                     LEFT JOIN ultimos_despachos ud
                         ON ud.ref_despacho = {_sql_ref_desde_producto('v.producto')}
                     WHERE (v.pedidos_qty - v.ventas_qty) > 0
@@ -800,7 +800,7 @@ class DashboardRepository:
                 back_rows = db.session.execute(text(sql_inc_mv)).fetchall()
             except Exception as e:
                 rollback_seguro()
-                logger.error(f"[DashboardRepository.get_admin_dashboard_metrics_sql - backorder MV]: {e}")
+                logger.error(f"[DashboardRepository.get_admin_dashboard_metrics_sql - backorder resumen]: {e}")
         else:
             # Regla de negocio ya vigente en DashboardService.normalizar_cliente_alias, portada
             # a SQL: cubre el caso 'DISTRIBUJES Y CAUCHOS FC SAS' cuando aún no existe la fila
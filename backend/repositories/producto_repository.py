@@ -122,25 +122,25 @@ class ProductoRepository:
 
     def buscar_por_termino(self, termino: str, limite: int = 50) -> List[Dict]:
         """
-        Busca productos por término en SQL.
-        Soporta búsqueda parcial: '9304' encontrará 'FR-9304'.
+        Busca productos por término con el índice de búsqueda en memoria
+        (BusquedaProductosService), en orden de relevancia.
+        Soporta búsqueda parcial y sin prefijo: '9304' encontrará 'FR-9304'.
         """
         try:
-            t = f"%{termino.strip()}%"
+            # Import perezoso: el servicio depende del snapshot de catálogo.
+            from backend.services.busqueda_productos_service import BusquedaProductosService
+
+            encontrados = BusquedaProductosService.buscar(termino, tenant=self.tenant, limite=limite)
             if self.tenant == "frimetals":
-                res = db.session.query(MetalsProducto).filter(
-                    (MetalsProducto.codigo.ilike(t)) |
-                    (MetalsProducto.descripcion.ilike(t))
-                ).limit(limite).all()
+                claves = [r['codigo'] for r, _ in encontrados]
+                filas = db.session.query(MetalsProducto).filter(MetalsProducto.codigo.in_(claves)).all()
+                por_clave = {p.codigo: p for p in filas}
             else:
-                res = db.session.query(Producto).filter(
-                    (Producto.codigo_sistema.ilike(t)) |
-                    (Producto.id_codigo.ilike(t)) |
-                    (Producto.descripcion.ilike(t)) |
-                    (Producto.oem.ilike(t))
-                ).limit(limite).all()
-            
-            return [self._to_dict(p) for p in res]
+                claves = [r.id for r, _ in encontrados]
+                filas = db.session.query(Producto).filter(Producto.id.in_(claves)).all()
+                por_clave = {p.id: p for p in filas}
+
+            return [self._to_dict(por_clave[c]) for c in claves if c in por_clave]
         except Exception as e:
             logger.error(f"Error en buscar_por_termino ({self.tenant}): {e}")
             return []
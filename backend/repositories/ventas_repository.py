@@ -6,19 +6,49 @@ import logging
 import calendar
 from sqlalchemy import text
 from backend.core.sql_database import db, rollback_seguro
+from backend.core.bulk_copy import copiar_a_temporal, COLUMNA_ORDEN_COPY
 from backend.utils.numeric_helpers import _num
 
 logger = logging.getLogger(__name__)
 
+COLUMNAS_CARTERA_WO = (
+    'documento', 'identificacion', 'nombre', 'vendedor', 'moneda', 'empresa',
+    'fecha_emision', 'fecha_vencimiento', 'saldo_documento',
+)
+
+# Página de /api/pedidos/listar (pedidos, no filas); antes 100 en FriParts
+# y 200 filas en FriMetals. Con búsqueda se conserva el tope de antes (500
+# filas en FriParts, ahora 500 pedidos) para quien no pagine.
+LISTADO_PEDIDOS_LIMITE = 100
+LISTADO_PEDIDOS_LIMITE_MAX = 200
+LISTADO_PEDIDOS_BUSQUEDA_LIMITE = 500
+
 
 class VentasRepository:
     """Repositorio para operaciones de Pedidos/Ventas vía SQL crudo."""
 
     @staticmethod
-    def get_pedidos_pendientes():
+    def get_pedidos_pendientes(delegados=None, ids_pedido=None):
         """
         Obtiene pedidos pendientes para Almacén con mapeo robusto.
+
+        `delegados` (lista de nombres en MAYÚSCULAS) acota el listado a los
+        pedidos cuyo delegado_a coincide con alguno (RBAC de operarias de
+        almacén, ver pedidos_routes.obtener_pedidos_pendientes); None = sin
+        filtro. El filtro corre en SQL sobre el índice parcial
+        idx_db_pedidos_pendientes_delegado (UPPER(TRIM(delegado_a)) de los
+        pedidos abiertos, ver backend/sql/migrate_indices_funcionales_codigo.py)
+        en vez de traer todos los pendientes y descartarlos en Python.
+
+        `ids_pedido` acota además a esos id_pedido (change-feed de
+        /api/pedidos/pendientes/cambios: solo se releen los pedidos que
+        cambiaron desde la revisión del cliente, ver
+        backend/services/pedidos_feed.py); None = todos.
         """
+        if delegados is not None and not delegados:
+            return []
+        if ids_pedido is not None and not ids_pedido:
+            return []
         try:
             # LEFT JOIN informativo con cartera_wo: no bloquea ni condiciona el listado,
             # solo anexa el saldo vencido del cliente (por NIT) para que Sofía/Andrés
@@ -42,9 +72,22 @@ class VentasRepository:
                 )
                 WHERE p.estado NOT IN ('COMPLETADO', 'DESPACHADO', 'ENTREGADO', 'FACTURADO', 'CANCELADO')
                   AND p.estado IS NOT NULL
+                  {filtro_delegado}
+                  {filtro_ids}
                 ORDER BY p.fecha ASC, p.id_pedido ASC
             """
-            rows = db.session.execute(text(sql)).mappings().all()
+            params = {}
+            filtro_delegado = ''
+            if delegados is not None:
+                filtro_delegado = "AND UPPER(TRIM(p.delegado_a)) = ANY(:delegados)"
+                params['delegados'] = list(delegados)
+            filtro_ids = ''
+            if ids_pedido is not None:
+                filtro_ids = "AND p.id_pedido = ANY(:ids_pedido)"
+                params['ids_pedido'] = list(ids_pedido)
+            rows = db.session.execute(
+                text(sql.format(filtro_delegado=filtro_delegado, filtro_ids=filtro_ids)), params
+            ).mappings().all()
 
             agrupados = {}
             for r in rows:
@@ -105,6 +148,153 @@ class VentasRepository:
             logger.error(f"[VentasRepository.get_pedidos_pendientes] ERROR: {e}")
             return []
 
+    @staticmethod
+    def listar_pedidos(division='friparts', busqueda='', despues_de=None, limite=None):
+        """
+        Historial de pedidos (/api/pedidos/listar) para FriParts (db_pedidos)
+        o FriMetals (metals_pedidos), en una sola consulta por página.
+
+        Antes la rama FriMetals hacía un Pedido.query...first() por cada
+        id_pedido para recuperar la fecha de creación original (hasta 200
+        consultas extra por listado) y la de FriParts hacía tres viajes
+        (ids, filas, despachos). Ahora un único SQL:
+          - `pagina`: los id_pedido de la página, con paginación keyset
+            sobre id_pedido DESC (`despues_de` = último id de la página
+            anterior; nunca OFFSET, el costo no crece al avanzar).
+          - `ultimo_despacho`: MAX(fecha) de db_despachos_pedido solo de
+            esos pedidos.
+          - `originales` (solo FriMetals): la fecha de la primera fila del
+            pedido en db_pedidos vía ROW_NUMBER(), en vez de un lookup por
+            pedido.
+        y las filas de ítems se agrupan en Python en la forma compacta que
+        comparten ambas divisiones.
+
+        `busqueda` (ya en MAYÚSCULAS) filtra pedidos por id_pedido o cliente;
+        el pedido encontrado trae todos sus ítems. Sin `limite`, una búsqueda
+        trae hasta LISTADO_PEDIDOS_BUSQUEDA_LIMITE pedidos.
+
+        :return: (pedidos, siguiente) -- `siguiente` es el `despues_de` de la
+            próxima página, o None si esta fue la última.
+        """
+        es_metals = division == 'frimetals'
+        tope = LISTADO_PEDIDOS_BUSQUEDA_LIMITE if busqueda else LISTADO_PEDIDOS_LIMITE_MAX
+        limite = max(1, min(int(limite or (tope if busqueda else LISTADO_PEDIDOS_LIMITE)), tope))
+        params = {'limite': limite}
+
+        filtro_busqueda = ''
+        if busqueda:
+            filtro_busqueda = "AND (UPPER(p.id_pedido) LIKE :patron OR UPPER(p.cliente) LIKE :patron)"
+            params['patron'] = f"%{busqueda}%"
+        filtro_cursor = ''
+        if despues_de:
+            filtro_cursor = "AND p.id_pedido < :despues_de"
+            params['despues_de'] = despues_de
+
+        if es_metals:
+            # metals_pedidos no tiene id propio: el orden de ítems es por código.
+            tabla, orden_fila = 'metals_pedidos', 'p.id_codigo'
+            cte_originales = """,
+                originales AS (
+                    SELECT id_pedido, fecha FROM (
+                        SELECT o.id_pedido, o.fecha,
+                               ROW_NUMBER() OVER (PARTITION BY o.id_pedido ORDER BY o.id) AS n
+                        FROM db_pedidos o
+                        JOIN pagina pg ON pg.id_pedido = o.id_pedido
+                    ) x
+                    WHERE x.n = 1
+                )"""
+            col_original = "org.fecha AS fecha_original"
+            join_original = "LEFT JOIN originales org ON org.id_pedido = p.id_pedido"
+        else:
+            tabla, orden_fila = 'db_pedidos', 'p.id'
+            cte_originales, col_original, join_original = '', 'NULL AS fecha_original', ''
+
+        sql = f"""
+            WITH pagina AS (
+                SELECT p.id_pedido
+                FROM {tabla} p
+                WHERE p.id_pedido IS NOT NULL AND p.id_pedido <> ''
+                  {filtro_busqueda}
+                  {filtro_cursor}
+                GROUP BY p.id_pedido
+                ORDER BY p.id_pedido DESC
+                LIMIT :limite
+            ),
+            ultimo_despacho AS (
+                SELECT d.id_pedido, MAX(d.fecha) AS fecha
+                FROM db_despachos_pedido d
+                JOIN pagina pg ON pg.id_pedido = d.id_pedido
+                GROUP BY d.id_pedido
+            ){cte_originales}
+            SELECT
+                p.id_pedido, p.fecha, p.hora, p.cliente, p.vendedor, p.estado, p.progreso,
+                p.id_codigo, p.descripcion, p.cantidad, p.precio_unitario, p.total,
+                ud.fecha AS fecha_ultimo_despacho, {col_original}
+            FROM {tabla} p
+            JOIN pagina pg ON pg.id_pedido = p.id_pedido
+            LEFT JOIN ultimo_despacho ud ON ud.id_pedido = p.id_pedido
+            {join_original}
+            ORDER BY p.id_pedido DESC, {orden_fila}
+        """
+        try:
+            rows = db.session.execute(text(sql), params).mappings().all()
+        except Exception as e:
+            rollback_seguro()
+            logger.error(f"[VentasRepository.listar_pedidos] ERROR: {e}")
+            raise
+
+        def _fecha_hora(valor):
+            # DateTime/Date de Postgres o texto (SQLite, metals_pedidos.fecha)
+            if hasattr(valor, 'strftime'):
+                return valor.strftime('%Y-%m-%d %H:%M:%S' if hasattr(valor, 'hour') else '%Y-%m-%d')
+            return str(valor or '')[:19]
+
+        pedidos = {}
+        for r in rows:
+            id_p = r['id_pedido']
+            ped = pedidos.get(id_p)
+            if ped is None:
+                # Cabecera = primera fila del pedido (mismo criterio que el
+                # listado agrupado de pendientes).
+                fecha = _fecha_hora(r['fecha'])[:10]
+                fecha_hora = f"{fecha} {str(r['hora'] or '').strip()}".strip() if fecha else ""
+                if es_metals:
+                    # fecha de metals_pedidos es la de su última actualización
+                    # masiva: la creación real sale de db_pedidos.
+                    fecha_creacion = _fecha_hora(r['fecha_original'])[:10] or fecha
+                else:
+                    fecha_creacion = fecha_hora or fecha
+                # Sin despacho registrado se conserva el fallback de cada
+                # división (creación en FriParts, actualización en FriMetals).
+                fecha_despacho = _fecha_hora(r['fecha_ultimo_despacho']) or fecha_hora
+                ped = pedidos[id_p] = {
+                    "id_pedido": id_p,
+                    "fecha_creacion": fecha_creacion,
+                    "fecha": fecha,
+                    "fecha_despacho": fecha_despacho,
+                    "cliente": r['cliente'],
+                    "vendedor": r['vendedor'],
+                    "estado": r['estado'] or ("REGISTRADO" if es_metals else None),
+                    "progreso": r['progreso'] or 0,
+                    "items_count": 0,
+                    "total": 0.0,
+                    "productos": [],
+                }
+            total = _num(r['total'])
+            ped["items_count"] += 1
+            ped["total"] += total
+            ped["productos"].append({
+                "id_codigo": r['id_codigo'],
+                "descripcion": r['descripcion'],
+                "cantidad": _num(r['cantidad']),
+                "precio_unitario": _num(r['precio_unitario']),
+                "total": total,
+            })
+
+        lista = list(pedidos.values())
+        siguiente = lista[-1]['id_pedido'] if len(lista) == limite else None
+        return lista, siguiente
+
     @staticmethod
     def get_desglose_mensual_ventas(mes, anio, tipo_vista='money'):
         """
@@ -380,14 +570,24 @@ class VentasRepository:
         """
         Realiza un UPSERT masivo y eficiente en la tabla cartera_wo.
         Procesa los datos usando Decimal para la precisión monetaria.
+
+        Las filas viajan por COPY a una temporal (backend/core/bulk_copy.py) y
+        se fusionan con un único INSERT ... SELECT ... ON CONFLICT: una sola
+        sentencia por sincronización en vez de un executemany fila a fila.
+        Si un documento llega repetido gana su última ocurrencia, igual que
+        con el executemany.
         """
         if not datos_cartera:
             return 0
 
         try:
-            sql = text("""
+            copiados = copiar_a_temporal('tmp_cartera_wo', 'cartera_wo', COLUMNAS_CARTERA_WO, datos_cartera)
+            db.session.execute(text(f"""
                 INSERT INTO cartera_wo (documento, identificacion, nombre, vendedor, moneda, empresa, fecha_emision, fecha_vencimiento, saldo_documento, ultima_actualizacion)
-                VALUES (:documento, :identificacion, :nombre, :vendedor, :moneda, :empresa, :fecha_emision, :fecha_vencimiento, :saldo_documento, CURRENT_TIMESTAMP)
+                SELECT DISTINCT ON (documento)
+                    documento, identificacion, nombre, vendedor, moneda, empresa, fecha_emision, fecha_vencimiento, saldo_documento, CURRENT_TIMESTAMP
+                FROM tmp_cartera_wo
+                ORDER BY documento, {COLUMNA_ORDEN_COPY} DESC
                 ON CONFLICT (documento) DO UPDATE SET
                     identificacion = EXCLUDED.identificacion,
                     nombre = EXCLUDED.nombre,
@@ -398,10 +598,9 @@ class VentasRepository:
                     fecha_vencimiento = EXCLUDED.fecha_vencimiento,
                     saldo_documento = EXCLUDED.saldo_documento,
                     ultima_actualizacion = CURRENT_TIMESTAMP
-            """)
-            db.session.execute(sql, datos_cartera)
+            """))
             db.session.commit()
-            return len(datos_cartera)
+            return copiados
         except Exception as e:
             rollback_seguro()
             logger.error(f"[VentasRepository.upsert_cartera_wo] Error en el UPSERT: {e}")
@@ -11,6 +11,20 @@ logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin_bp', __name__)
 
+# Tablas (y resúmenes derivados de db_ventas) que lee el panel de Jefatura.
+# Una escritura de producción (inyección/pulido) ya no desaloja estas
+# entradas: solo una sincronización comercial o un despacho.
+_TABLAS_ADMIN_DASHBOARD = (
+    'db_ventas', 'db_despachos_pedido', 'db_cliente_equivalencias',
+    'resumen_ventas_cliente_producto', 'resumen_ventas_mensual',
+)
+
+
+def _version_resumen_ventas():
+    """Versión de los resúmenes de db_ventas: parte de la llave de caché del panel."""
+    from backend.services.resumen_ventas_service import ResumenVentasService
+    return ResumenVentasService.version_actual()
+
 # Import time helper
 import time as _time
 
@@ -38,7 +52,7 @@ def clean_number(val):
 
 @admin_bp.route('/api/admin/dashboard', methods=['GET'])
 @require_role(ROL_ADMINS + ROL_COMERCIALES)
-@cached_route(namespace='admin', ttl=600)
+@cached_route(namespace='admin', ttl=600, tags=_TABLAS_ADMIN_DASHBOARD, version=_version_resumen_ventas)
 def get_admin_dashboard_data():
     from flask import request
     from backend.repositories.dashboard_repository import DashboardRepository
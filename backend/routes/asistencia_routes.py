@@ -5,9 +5,7 @@ from flask import Blueprint, jsonify, request
 
 from backend.core.sql_database import db
 from backend.models.sql_models import RegistroAsistencia
-from backend.models.nomina_models import RegistroAsistencia as RegistroAsistenciaDTO
 from backend.services.nomina_service import (
-    ReglasAsistencia,
     get_ultima_fecha_corte,
     filtrar_registros_post_corte,
     consolidar_horas,
@@ -15,6 +13,7 @@ from backend.services.nomina_service import (
     ejecutar_corte_db,
     get_consolidado_pendiente,
     get_detalle_diario_pendiente,
+    guardar_asistencia_masiva,
 )
 from backend.utils.auth_middleware import (
     require_role,
@@ -186,82 +185,18 @@ def guardar_asistencia():
         if not data or 'registros' not in data:
             return jsonify({'status': 'error', 'success': False, 'message': 'Datos inválidos o vacíos'}), 400
 
-        registros_recibidos = data['registros']
-        usuario_registra = user
-        conteo = 0
-
-        for reg in registros_recibidos:
-            nombre = reg.get('colaborador') or reg.get('nombre')
-            if not nombre: continue
-
-            # Determinar fecha (ISO -> Date) de forma estricta
-            f_str = reg.get('fecha') or datetime.now().strftime('%Y-%m-%d')
-            try:
-                fecha_dt = datetime.strptime(f_str, '%Y-%m-%d').date()
-            except (ValueError, TypeError):
-                fecha_dt = datetime.now().date()
-
-            ing_real = reg.get('ingreso_real') or reg.get('hora_entrada', '')
-            sal_real = reg.get('salida_real') or reg.get('hora_salida', '')
-
-            # Recálculo de Reglas de Negocio en Servidor (Descarte de horas provenientes del cliente)
-            dto = RegistroAsistenciaDTO(
-                fecha=fecha_dt,
-                ingreso_real=ing_real,
-                salida_real=sal_real,
-                colaborador=nombre
-            )
-            calculo = ReglasAsistencia.calcular_jornada_y_extras(dto)
-            h_ord = calculo['horas_ordinarias']
-            h_ext = calculo['horas_extras']
-
-            # Buscar si ya existe registro para ese colaborador-día para evitar duplicados
-            existente = RegistroAsistencia.query.filter_by(
-                fecha=fecha_dt, 
-                colaborador=nombre
-            ).first()
-
-            if existente:
-                # Protección de Periodos Liquidados (Inmutabilidad Contable)
-                if existente.estado_pago == 'PROCESADO' or getattr(existente, 'corte_id', None) is not None:
-                    logger.warning(
-                        f"[INMUTABILIDAD] Omiso intento de sobreescritura en registro sellado "
-                        f"ID {existente.id} del colaborador '{nombre}'."
-                    )
-                    continue
-
-                # Actualización de registro en periodo abierto
-                existente.ingreso_real = ing_real
-                existente.salida_real = sal_real
-                existente.horas_ordinarias = h_ord
-                existente.horas_extras = h_ext
-                existente.estado = reg.get('estado', 'REGISTRADO')
-                existente.comentarios = reg.get('comentarios', '')
-                existente.registrado_por = usuario_registra
-            else:
-                # Inserción de nuevo registro
-                nuevo = RegistroAsistencia(
-                    fecha=fecha_dt,
-                    colaborador=nombre,
-                    ingreso_real=ing_real,
-                    salida_real=sal_real,
-                    horas_ordinarias=h_ord,
-                    horas_extras=h_ext,
-                    estado=reg.get('estado', 'REGISTRADO'),
-                    estado_pago='PENDIENTE',
-                    comentarios=reg.get('comentarios', ''),
-                    registrado_por=usuario_registra
-                )
-                db.session.add(nuevo)
-            
-            conteo += 1
-
+        resumen = guardar_asistencia_masiva(data['registros'], user)
         db.session.commit()
-        logger.info(f"💾 SQL: {conteo} registros de asistencia procesados exitosamente por usuario '{usuario_registra}'.")
-        
+        conteo = resumen['creados'] + resumen['actualizados']
+        logger.info(
+            f"💾 SQL: {conteo} registros de asistencia procesados exitosamente por usuario '{user}' "
+            f"({resumen['bloqueados']} bloqueados por nómina procesada)."
+        )
+
         return jsonify({
             'status': 'success', 'success': True,
-            'message': f'Se procesaron {conteo} registros en SQL correctamente.'
+            'message': f'Se procesaron {conteo} registros en SQL correctamente.',
+            **resumen
         }), 200
 
     except Exception as e:
@@ -281,24 +216,28 @@ def guardar_ausencia():
             return jsonify({'status': 'error', 'success': False, 'message': 'Datos inválidos'}), 400
 
         reg = data['registro']
-        from backend.models.sql_models import RegistroAsistencia
-        from backend.core.sql_database import db
 
-        # 1. SQL
-        nueva_ausencia = RegistroAsistencia(
-            fecha=reg.get('fecha'),
-            colaborador=reg.get('colaborador'),
-            ingreso_real='AUSENTE',
-            salida_real='',
-            horas_ordinarias=0,
-            horas_extras=0,
-            estado='AUSENTE',
-            estado_pago='PENDIENTE',
-            motivo=reg.get('motivo', ''),
-            comentarios=reg.get('comentarios', ''),
-            registrado_por=user_name
-        )
-        db.session.add(nueva_ausencia)
+        # 1. SQL -- mismo UPSERT que el registro masivo: con la restricción
+        # única (fecha, colaborador) la ausencia reemplaza lo registrado ese
+        # día en vez de duplicarlo, salvo que la nómina ya esté procesada.
+        resumen = guardar_asistencia_masiva([{
+            'fecha': reg.get('fecha'),
+            'colaborador': reg.get('colaborador'),
+            'ingreso_real': 'AUSENTE',
+            'salida_real': '',
+            'estado': 'AUSENTE',
+            'motivo': reg.get('motivo', ''),
+            'comentarios': reg.get('comentarios', ''),
+        }], user_name)
+        [resultado] = resumen['resultados']
+        if resultado['resultado'] == 'omitido':
+            return jsonify({'status': 'error', 'success': False, 'message': 'Datos inválidos'}), 400
+        if resultado['resultado'] == 'bloqueado':
+            db.session.rollback()
+            return jsonify({
+                'status': 'error', 'success': False,
+                'message': 'No se puede modificar un registro perteneciente a una nómina procesada.'
+            }), 409
         db.session.commit()
 
         return jsonify({'status': 'success', 'success': True, 'message': 'Ausencia registrada correctamente en SQL'}), 200
@@ -1,23 +1,43 @@
 """
 Rutas del Asistente de Dashboard (NL -> consulta de datos reales).
+
+La pregunta corre como job en segundo plano (backend/services/asistente_jobs.py):
+  POST /asistente/preguntar              -> 202 {job_id}
+  GET  /asistente/jobs/<id>/stream       -> SSE: estado, tool, texto, fin
+  GET  /asistente/jobs/<id>?desde=N      -> eventos nuevos (polling)
 """
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, Response, current_app, jsonify, request, session
+import json
 import logging
+import time
 
+from backend.core import conexiones_largas
 from backend.core.sql_database import rollback_seguro
 from backend.core.tenant import get_tenant_from_request
-from backend.services.asistente_service import AsistenteService
+from backend.services.asistente_jobs import crear_job, obtener_job, ColaAsistenteLlena
 from backend.utils.auth_middleware import require_role, obtener_identidad_segura, ROL_ADMINS, ROL_COMERCIALES, ROL_JEFES
 
 logger = logging.getLogger(__name__)
 
 asistente_bp = Blueprint('asistente_bp', __name__)
 
+ROLES_ASISTENTE = ROL_ADMINS + ROL_COMERCIALES + ROL_JEFES
+
+# Un stream SSE abierto ocupa un hilo de gunicorn mientras dura y toma del
+# cupo compartido de conexiones largas; sin cupo, el cliente recibe 429 y cae
+# a polling (/jobs/<id>?desde=N), que responde al instante sin retener el hilo.
+STREAM_MAX_SEGUNDOS = 120
+STREAM_PING_SEGUNDOS = 15
+
+
+def _evento_sse(seq, tipo, datos):
+    return f"id: {seq}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+
 
 @asistente_bp.route('/asistente/preguntar', methods=['POST'])
-@require_role(ROL_ADMINS + ROL_COMERCIALES + ROL_JEFES)
+@require_role(ROLES_ASISTENTE)
 def preguntar():
-    """Recibe una pregunta en lenguaje natural y delega toda la logica a AsistenteService."""
+    """Encola la pregunta y devuelve el id del job; el progreso se lee por stream/polling."""
     try:
         body = request.get_json(silent=True) or {}
         pregunta = str(body.get('pregunta', '')).strip()
@@ -30,10 +50,81 @@ def preguntar():
         user_id = session.get('user_id') or session.get('usuario_id') or 0
         tenant = get_tenant_from_request()
 
-        resultado = AsistenteService.responder(pregunta, contexto_dashboard, user, user_id, role, tenant)
-        return jsonify(resultado), 200 if resultado.get('success') else 400
+        job = crear_job(
+            current_app._get_current_object(), pregunta, contexto_dashboard, user, user_id, role, tenant
+        )
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'stream_url': f'/api/dashboard/asistente/jobs/{job.id}/stream',
+            'eventos_url': f'/api/dashboard/asistente/jobs/{job.id}',
+        }), 202
 
+    except ColaAsistenteLlena:
+        return jsonify({
+            'success': False,
+            'error': 'El asistente esta atendiendo muchas preguntas. Intenta de nuevo en un momento.',
+        }), 429
     except Exception as e:
         rollback_seguro()
         logger.error(f"Error en /api/dashboard/asistente/preguntar: {e}")
         return jsonify({'success': False, 'error': 'No fue posible procesar la pregunta.'}), 500
+
+
+@asistente_bp.route('/asistente/jobs/<job_id>', methods=['GET'])
+@require_role(ROLES_ASISTENTE)
+def eventos_job(job_id):
+    """Polling: eventos con seq > ?desde (no espera: responde con lo que haya)."""
+    user, _ = obtener_identidad_segura(request)
+    job = obtener_job(job_id, user)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Pregunta no encontrada o expirada.'}), 404
+
+    desde = request.args.get('desde', 0, type=int)
+    eventos, terminado = job.eventos_desde(desde)
+    return jsonify({
+        'success': True,
+        'eventos': [{'seq': seq, 'tipo': tipo, 'datos': datos} for seq, tipo, datos in eventos],
+        'siguiente': eventos[-1][0] if eventos else desde,
+        'terminado': terminado,
+    }), 200
+
+
+@asistente_bp.route('/asistente/jobs/<job_id>/stream', methods=['GET'])
+@require_role(ROLES_ASISTENTE)
+def stream_job(job_id):
+    """
+    Server-Sent Events del job. Retoma desde Last-Event-ID (reconexión del
+    navegador) o ?desde. 429 si está ocupado el cupo de conexiones largas:
+    el cliente debe seguir por polling.
+    """
+    user, _ = obtener_identidad_segura(request)
+    job = obtener_job(job_id, user)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Pregunta no encontrada o expirada.'}), 404
+
+    if not conexiones_largas.tomar():
+        return jsonify({'success': False, 'error': 'Sin cupo de streaming.', 'usar_polling': True}), 429
+
+    desde = request.headers.get('Last-Event-ID', type=int) or request.args.get('desde', 0, type=int)
+
+    def generar(cursor):
+        limite = time.time() + STREAM_MAX_SEGUNDOS
+        while time.time() < limite:
+            eventos, terminado = job.eventos_desde(cursor, timeout=STREAM_PING_SEGUNDOS)
+            for seq, tipo, datos in eventos:
+                cursor = seq
+                yield _evento_sse(seq, tipo, datos)
+            if terminado and not eventos:
+                return
+            if not eventos:
+                yield ": ping\n\n"
+
+    respuesta = Response(generar(desde), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # call_on_close (no un finally en el generador): libera el cupo aunque el
+    # cliente corte antes de que el generador llegue a arrancar.
+    respuesta.call_on_close(conexiones_largas.liberar)
+    return respuesta
@@ -133,31 +133,39 @@ def api_obtener_crecimiento_clientes():
 
 def _generar_excel_comercial_task(task_id, user_id, username, user_role, start_year, end_year, vendedor_filtro, fecha_corte):
     """
-    Trabajo de fondo de exportar_comercial_excel: genera el .xlsx (SQL +
-    pandas + openpyxl, todo delegado al servicio) fuera del hilo HTTP. Corre
-    dentro del app_context que le da task_runner.run_in_background.
+    Trabajo de fondo de exportar_comercial_excel: genera el .xlsx (SQL sobre
+    el cubo + openpyxl write_only, todo delegado al servicio) fuera del hilo
+    HTTP. Corre dentro del app_context que le da task_runner.run_in_background.
+    El libro se escribe directo al archivo temporal que luego sirve
+    /api/tasks/download: no hay copia BytesIO del libro completo en memoria.
     """
+    tmp_path = None
     try:
-        buffer, nombre_archivo = ComercialHistoricoService.generar_excel_ytd_stream(
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', prefix='comercial_')
+        os.close(fd)
+
+        nombre_archivo = ComercialHistoricoService.generar_excel_ytd(
             user_id=user_id,
             username=username,
             user_role=user_role,
             start_year=start_year,
             end_year=end_year,
+            destino=tmp_path,
             vendedor_filtro=vendedor_filtro,
             fecha_corte=fecha_corte
         )
 
-        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', prefix='comercial_')
-        with os.fdopen(fd, 'wb') as f:
-            f.write(buffer.getvalue())
-
         task_runner.set_completed(
             task_id, file_path=tmp_path, filename=nombre_archivo,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     except Exception as e:
         logger.error(f"[COMERCIAL_ROUTES] Error generando Excel comercial (task {task_id}): {e}")
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
         task_runner.set_failed(task_id, str(e))
 
 
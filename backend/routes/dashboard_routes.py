@@ -19,6 +19,15 @@ logger = logging.getLogger(__name__)
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Tablas que lee /stats (KPIs, rankings, analítica de pulido/inyección, stock
+# crítico y tendencia). Un evento de cambio sobre cualquiera de ellas desaloja
+# solo las entradas de /stats, no el resto de namespaces.
+_TABLAS_DASHBOARD_STATS = (
+    'db_inyeccion', 'db_pulido', 'db_ensambles', 'db_pnc_inyeccion',
+    'db_pnc_pulido', 'db_pnc_ensamble', 'db_ventas', 'db_mezcla',
+    'db_costos', 'db_productos',
+)
+
 
 
 
@@ -50,7 +59,7 @@ def obtener_dashboard():
 
 @dashboard_bp.route('/stats', methods=['GET'])
 @require_role(ROL_DASHBOARD_OPERATIVO)
-@cached_route(namespace='dashboard', ttl=600)
+@cached_route(namespace='dashboard', ttl=600, tags=_TABLAS_DASHBOARD_STATS)
 def obtener_metricas_bi():
     """
     Endpoint Unificado para Visión de Científico de Datos.
@@ -5,6 +5,7 @@ from backend.core.responses import api_success, api_error
 from backend.models.sql_models import ProgramacionEnsamble, Ensamble
 from backend.services.audit_service import OwnershipMismatchException
 from backend.services.ensamble_service import EnsambleService, BomNoDisponibleException, StockInsuficienteException
+from backend.services.mrp_service import MrpService
 from backend.config.constants import FALLBACK_OPERARIO
 from backend.utils.auth_middleware import _obtener_usuario_activo, require_role, ROL_ADMINS, ROL_JEFES, ROL_OPERARIOS
 
@@ -101,6 +102,46 @@ def obtener_bom_con_stock(id_codigo):
         logger.error(f"Error al obtener BOM con stock: {e}")
         return api_error(str(e), status_code=500)
 
+# Tope de kits por llamada al endpoint en lote.
+BOM_STOCK_LOTE_MAX = 200
+
+
+@ensamble_bp.route('/api/ensamble/bom_stock', methods=['POST'])
+@require_role(ROLES_ENSAMBLE)
+def obtener_boms_con_stock():
+    """
+    Controlador puro: BOM + stock de varios kits a la vez ({"codigos": [...]})
+    en EnsambleService.obtener_boms_con_stock. Los kits sin ficha van en
+    `errores` en vez de fallar la llamada completa.
+    """
+    data = request.get_json(silent=True) or {}
+    codigos = [str(c).strip() for c in (data.get('codigos') or []) if str(c or '').strip()]
+    if not codigos:
+        return api_error("Se requiere la lista 'codigos'", status_code=400)
+    if len(codigos) > BOM_STOCK_LOTE_MAX:
+        return api_error(f"Máximo {BOM_STOCK_LOTE_MAX} códigos por consulta", status_code=400)
+    try:
+        boms, errores = EnsambleService.obtener_boms_con_stock(codigos)
+        return api_success(data={'boms': boms, 'errores': errores})
+    except Exception as e:
+        logger.error(f"Error al obtener BOMs con stock en lote: {e}")
+        return api_error(str(e), status_code=500)
+
+@ensamble_bp.route('/api/ensamble/mrp', methods=['GET'])
+@require_role(ROLES_ENSAMBLE)
+def plan_mrp():
+    """
+    Controlador puro: faltantes por componente (con fecha) de todos los
+    programas de ensamble y pedidos pendientes, en MrpService. Con
+    ?todos=1 incluye también los componentes cubiertos.
+    """
+    incluir_cubiertos = request.args.get('todos', '').lower() in ('1', 'true', 'si')
+    try:
+        return api_success(data=MrpService.resumen(incluir_cubiertos=incluir_cubiertos))
+    except Exception as e:
+        logger.error(f"Error al calcular el plan MRP: {e}")
+        return api_error(str(e), status_code=500)
+
 @ensamble_bp.route('/api/ensamble/tareas_pendientes', methods=['GET'])
 @require_role(ROLES_ENSAMBLE)
 def tareas_pendientes():
@@ -10,10 +10,15 @@ from backend.utils.auth_middleware import require_role, ROL_ADMINS, ROL_JEFES
 gerencia_bp = Blueprint('gerencia_bp', __name__)
 logger = logging.getLogger(__name__)
 
+_TABLAS_METRICAS_PNC = (
+    'db_pnc_inyeccion', 'db_pnc_pulido', 'db_pnc_ensamble',
+    'db_inyeccion', 'db_pulido', 'db_ensambles', 'db_costos',
+)
+
 
 @gerencia_bp.route('/api/gerencia/metricas-pnc', methods=['GET'])
 @require_role(ROL_ADMINS + ROL_JEFES)
-@cached_route(namespace='gerencia_pnc', ttl=600)
+@cached_route(namespace='gerencia_pnc', ttl=600, tags=_TABLAS_METRICAS_PNC)
 def obtener_metricas_pnc():
     """
     Dashboard PNC (Lean Manufacturing): consolida las métricas de producto
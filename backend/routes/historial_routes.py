@@ -2,7 +2,9 @@ from flask import Blueprint, request, current_app
 from sqlalchemy import text
 from backend.core.responses import api_success, api_error
 from backend.core import task_runner
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+import json
 import logging
 import os
 import tempfile
@@ -56,435 +58,730 @@ def format_maquina(val, tipo_proceso=None):
         return f"Máquina No. {int(match.group(0))}"
     return val_str
 
-def _construir_movimientos_historial(f_desde, f_hasta, tipo_filtro):
+# Filas que el cursor del lado del servidor entrega por round-trip. Acota la
+# memoria del pipeline a ~1 lote por tabla, sin importar el rango de fechas.
+_HISTORIAL_STREAM_BATCH = 1000
+
+# Modo paginado de /api/historial-global (?limit=&after=). Tope duro por
+# página para que un cliente no pueda pedir el rango completo de una vez.
+_HISTORIAL_PAGINA_MAX = 1000
+
+# Fecha de orden para PNC sin lote de producción enlazado ('S/F') o con lote
+# en colisión ('ID AMBIGUO'): no tienen fecha real, así que el keyset los
+# deja al final del recorrido (orden DESC) en vez de usar NULL, que rompería
+# la comparación de tuplas del cursor.
+_FECHA_ORDEN_SIN_FECHA = "TIMESTAMP '1900-01-01 00:00:00'"
+_FECHA_ORDEN_SIN_FECHA_PY = datetime(1900, 1, 1)
+
+# Esquema común de TODAS las ramas del Historial Global. Cada rama proyecta
+# sus columnas a estos nombres/tipos (las que no aplican van en NULL), lo que
+# permite encadenarlas con UNION ALL en el modo paginado y reutilizar los
+# mismos mapeadores fila -> movimiento en el listado completo y en el Excel.
+_COLUMNAS_HISTORIAL = (
+    ('id', 'BIGINT'),
+    ('fecha', 'TIMESTAMP'),
+    ('fecha_orden', 'TIMESTAMP'),
+    ('id_lote', 'TEXT'),
+    ('producto', 'TEXT'),
+    ('responsable', 'TEXT'),
+    ('cantidad', 'NUMERIC'),
+    ('orden', 'TEXT'),
+    ('maquina', 'TEXT'),
+    ('extra', 'TEXT'),
+    ('valor', 'NUMERIC'),
+    ('observaciones', 'TEXT'),
+    ('criterio', 'TEXT'),
+    ('notas', 'TEXT'),
+    ('hora_inicio', 'TEXT'),
+    ('hora_fin', 'TEXT'),
+    ('peso_bujes', 'NUMERIC'),
+    ('cavidades', 'INTEGER'),
+    ('duracion_segundos', 'INTEGER'),
+    ('tiempo_total_minutos', 'NUMERIC'),
+    ('segundos_por_unidad', 'NUMERIC'),
+    ('ambiguo', 'BOOLEAN'),
+)
+
+
+def _rama_historial(hoja, origen, **exprs):
     """
-    Ejecuta las consultas SQL del Historial Global y arma la lista de movimientos.
-    Extraida de obtener_historial_global() para que la exportacion a Excel pueda
-    reutilizar los mismos datos en memoria sin pasar por jsonify()/get_json()
-    (ese round-trip duplicaba la lista completa y fue causa de OOM en Render
-    con rangos de fecha grandes -- ver exportar_excel_historial_global).
+    SELECT de una rama del Historial Global con el esquema _COLUMNAS_HISTORIAL.
+    `origen` es el FROM/WHERE (filtrado por :desde/:hasta) y `exprs` la
+    expresión SQL de cada columna; fecha_orden por defecto es la propia fecha.
     """
-    movimientos = []
+    exprs.setdefault('fecha_orden', exprs.get('fecha', 'NULL'))
+    columnas = [f"'{hoja}'::TEXT AS hoja"]
+    for nombre, tipo in _COLUMNAS_HISTORIAL:
+        columnas.append(f"CAST({exprs.get(nombre, 'NULL')} AS {tipo}) AS {nombre}")
+    return "SELECT " + ", ".join(columnas) + " " + origen
+
+
+# NOTA CRITICA PNC (reemplaza el outerjoin ORM anterior): el campo de enlace
+# (id_inyeccion / id_pulido / id_ensamble) NO es unico por fila en las tablas
+# de produccion -- un mismo lote multi-SKU agrupa varias filas (una por
+# id_codigo), y ademas se detectaron colisiones REALES entre lotes NO
+# relacionados (ej. id_inyeccion 'INY-890801A3' con 7 filas del lote real
+# + 1 fila intrusa de otro dia/otra orden; varios id_pulido cortos tipo
+# 'PUL-52248' compartidos por producciones sin relacion). Un JOIN directo
+# contra la tabla completa multiplicaba cada fila de PNC una vez por cada
+# match (bug de fan-out: un solo PNC aparecia triplicado/quintuplicado en el
+# Historial Global).
+#
+# Fix: cada rama arma una fila "representante" por lote via DISTINCT ON, y
+# ademas cuenta cuantas combinaciones DISTINTAS de (fecha, orden) existen
+# bajo ese mismo id de lote. Si hay mas de una el id esta en colision real
+# entre eventos distintos: NO se adivina cual es el correcto, se marca
+# 'ID AMBIGUO' (columna `ambiguo`) en vez de mostrar una fecha/orden que
+# podria ser la equivocada.
+def _rama_pnc(hoja, sql_pnc):
+    """Rama PNC: envuelve la consulta con representante/ambigüedad de su lote."""
+    return _rama_historial(
+        hoja, f"FROM ({sql_pnc}) x",
+        id='x.id_row', fecha='x.fecha',
+        fecha_orden=f"CASE WHEN x.ambiguo OR x.fecha IS NULL THEN {_FECHA_ORDEN_SIN_FECHA} ELSE x.fecha END",
+        id_lote='x.id_lote', producto='x.producto', cantidad='x.cantidad',
+        orden='x.orden', maquina='x.maquina', criterio='x.criterio',
+        notas='x.codigo_ensamble', ambiguo='x.ambiguo'
+    )
+
+
+# Ramas por hoja de origen. Sobre columnas DateTime el rango es semiabierto
+# [:desde, :hasta_sig) (hasta_sig = día siguiente a `hasta`): un BETWEEN
+# directo dejaba por fuera todo el día `hasta` después de las 00:00, y el
+# CAST(... AS DATE) que lo corregía impedía usar el índice de la fecha.
+_RAMAS_HISTORIAL = {
+    'db_inyeccion': _rama_historial(
+        'db_inyeccion',
+        "FROM db_inyeccion WHERE fecha_inicia >= :desde AND fecha_inicia < :hasta_sig",
+        id='id', fecha='fecha_inicia', id_lote='id_inyeccion', producto='id_codigo',
+        responsable='responsable', cantidad='cantidad_real', orden='orden_produccion',
+        maquina='maquina', extra='molde', observaciones='observaciones',
+        hora_inicio='hora_inicio', hora_fin='hora_termina', peso_bujes='peso_bujes',
+        cavidades='cavidades', duracion_segundos='duracion_segundos',
+        tiempo_total_minutos='tiempo_total_minutos', segundos_por_unidad='segundos_por_unidad'
+    ),
+    'db_pulido': _rama_historial(
+        'db_pulido',
+        "FROM db_pulido WHERE fecha >= :desde AND fecha < :hasta_sig",
+        id='id', fecha='fecha', id_lote='id_pulido', producto='codigo',
+        responsable='responsable', cantidad='cantidad_real', orden='orden_produccion',
+        observaciones='observaciones',
+        hora_inicio="to_char(hora_inicio, 'HH24:MI')", hora_fin="to_char(hora_fin, 'HH24:MI')"
+    ),
+    'db_ensambles': _rama_historial(
+        'db_ensambles',
+        "FROM db_ensambles WHERE fecha >= :desde AND fecha < :hasta_sig",
+        id='id', fecha='fecha', id_lote='id_ensamble', producto='id_codigo',
+        responsable='responsable', cantidad='cantidad', orden='op_numero',
+        extra='buje_ensamble', observaciones='observaciones',
+        hora_inicio="to_char(hora_inicio, 'HH24:MI')", hora_fin="to_char(hora_fin, 'HH24:MI')"
+    ),
+    'db_mezcla': _rama_historial(
+        'db_mezcla',
+        "FROM db_mezcla WHERE fecha BETWEEN :desde AND :hasta",
+        id='id', fecha='fecha', responsable='responsable', maquina='maquina',
+        cantidad='virgen_kg', valor='molido_kg', observaciones='observaciones'
+    ),
+    'db_ventas': _rama_historial(
+        'db_ventas',
+        "FROM db_ventas WHERE fecha BETWEEN :desde AND :hasta",
+        id='id', fecha='fecha', producto='productos', responsable='nombres',
+        cantidad='cantidad', orden='documento', extra='clasificacion',
+        valor='total_ingresos'
+    ),
+    'db_pnc_inyeccion': _rama_pnc('db_pnc_inyeccion', """
+        WITH combos AS (
+            SELECT id_inyeccion, fecha_inicia, orden_produccion, maquina
+            FROM db_inyeccion
+            WHERE id_inyeccion IS NOT NULL
+            GROUP BY id_inyeccion, fecha_inicia, orden_produccion, maquina
+        ),
+        ambiguedad AS (
+            SELECT id_inyeccion, COUNT(*) as n_combinaciones
+            FROM combos
+            GROUP BY id_inyeccion
+        ),
+        representante AS (
+            SELECT DISTINCT ON (id_inyeccion) id_inyeccion, fecha_inicia, orden_produccion, maquina
+            FROM db_inyeccion
+            WHERE id_inyeccion IS NOT NULL
+            ORDER BY id_inyeccion, fecha_inicia DESC
+        )
+        SELECT
+            p.id_row, p.id_codigo AS producto, p.cantidad, p.criterio, p.codigo_ensamble,
+            p.id_inyeccion AS id_lote, r.fecha_inicia AS fecha,
+            r.orden_produccion AS orden, r.maquina,
+            COALESCE(a.n_combinaciones, 1) > 1 AS ambiguo
+        FROM db_pnc_inyeccion p
+        LEFT JOIN representante r ON p.id_inyeccion = r.id_inyeccion
+        LEFT JOIN ambiguedad a ON r.id_inyeccion = a.id_inyeccion
+        WHERE r.id_inyeccion IS NULL
+           OR COALESCE(a.n_combinaciones, 1) > 1
+           OR (CAST(r.fecha_inicia AS DATE) BETWEEN :desde AND :hasta)
+    """),
+    # PNC PULIDO — mismo patron. Pulido no maneja concepto de maquina.
+    'db_pnc_pulido': _rama_pnc('db_pnc_pulido', """
+        WITH combos AS (
+            SELECT id_pulido::text as id_pulido, fecha, orden_produccion
+            FROM db_pulido
+            GROUP BY id_pulido::text, fecha, orden_produccion
+        ),
+        ambiguedad AS (
+            SELECT id_pulido, COUNT(*) as n_combinaciones
+            FROM combos
+            GROUP BY id_pulido
+        ),
+        representante AS (
+            SELECT DISTINCT ON (id_pulido::text) id_pulido::text as id_pulido, fecha, orden_produccion
+            FROM db_pulido
+            ORDER BY id_pulido::text, fecha DESC
+        )
+        SELECT
+            p.id_row, p.codigo AS producto, p.cantidad, p.criterio, p.codigo_ensamble,
+            p.id_pulido AS id_lote, r.fecha, r.orden_produccion AS orden,
+            NULL::TEXT AS maquina,
+            COALESCE(a.n_combinaciones, 1) > 1 AS ambiguo
+        FROM db_pnc_pulido p
+        LEFT JOIN representante r ON p.id_pulido::text = r.id_pulido
+        LEFT JOIN ambiguedad a ON r.id_pulido = a.id_pulido
+        WHERE r.id_pulido IS NULL
+           OR COALESCE(a.n_combinaciones, 1) > 1
+           OR (CAST(r.fecha AS DATE) BETWEEN :desde AND :hasta)
+    """),
+    # PNC ENSAMBLE — mismo patron (auditado: 0 grupos ambiguos hoy, pero se
+    # deja la misma guarda por si aparecen a futuro; sin concepto de maquina).
+    'db_pnc_ensamble': _rama_pnc('db_pnc_ensamble', """
+        WITH combos AS (
+            SELECT id_ensamble, fecha, op_numero
+            FROM db_ensambles
+            GROUP BY id_ensamble, fecha, op_numero
+        ),
+        ambiguedad AS (
+            SELECT id_ensamble, COUNT(*) as n_combinaciones
+            FROM combos
+            GROUP BY id_ensamble
+        ),
+        representante AS (
+            SELECT DISTINCT ON (id_ensamble) id_ensamble, fecha, op_numero
+            FROM db_ensambles
+            ORDER BY id_ensamble, fecha DESC
+        )
+        SELECT
+            p.id_row, p.id_codigo AS producto, p.cantidad, p.criterio, p.codigo_ensamble,
+            p.id_ensamble AS id_lote, r.fecha, r.op_numero AS orden,
+            NULL::TEXT AS maquina,
+            COALESCE(a.n_combinaciones, 1) > 1 AS ambiguo
+        FROM db_pnc_ensamble p
+        LEFT JOIN representante r ON p.id_ensamble = r.id_ensamble
+        LEFT JOIN ambiguedad a ON r.id_ensamble = a.id_ensamble
+        WHERE r.id_ensamble IS NULL
+           OR COALESCE(a.n_combinaciones, 1) > 1
+           OR (CAST(r.fecha AS DATE) BETWEEN :desde AND :hasta)
+    """),
+}
+
+# Filtro ?tipo= -> hojas que cubre, en el orden histórico del listado completo.
+_HOJAS_POR_TIPO = {
+    'INYECCION': ('db_inyeccion',),
+    'PULIDO': ('db_pulido',),
+    'ENSAMBLE': ('db_ensambles',),
+    'MEZCLA': ('db_mezcla',),
+    'VENTA': ('db_ventas',),
+    'VENTAS': ('db_ventas',),
+    'FACTURACION': ('db_ventas',),
+    'PNC': ('db_pnc_inyeccion', 'db_pnc_pulido', 'db_pnc_ensamble'),
+}
+_ORDEN_TIPOS = ('INYECCION', 'PULIDO', 'ENSAMBLE', 'MEZCLA', 'VENTA', 'PNC')
+
+
+def _hojas_historial(tipo_filtro):
+    """Hojas a consultar según ?tipo= (vacío = todas; desconocido = ninguna)."""
+    if not tipo_filtro:
+        return [h for t in _ORDEN_TIPOS for h in _HOJAS_POR_TIPO[t]]
+    return list(_HOJAS_POR_TIPO.get(tipo_filtro, ()))
+
+
+def _ejecutar_stream(sql, params):
+    """
+    Ejecuta `sql` con stream_results: sobre psycopg2 SQLAlchemy abre un cursor
+    con nombre (server-side), así que Postgres entrega las filas por lotes de
+    _HISTORIAL_STREAM_BATCH en vez de materializar el resultado completo en
+    el proceso.
+    """
+    return db.session.execute(
+        text(sql).execution_options(stream_results=True, yield_per=_HISTORIAL_STREAM_BATCH),
+        params
+    )
+
+
+def _fmt_fecha(fecha):
+    return fecha.strftime('%d/%m/%Y') if fecha else ''
+
+
+def _mov_inyeccion(r, revueltos_map=None):
+    cant_real = to_float(r.get('cantidad'))
+    dur_seg = to_int(r.get('duracion_segundos'))
+    tmp_min = to_float(r.get('tiempo_total_minutos'))
+    seg_uni = to_float(r.get('segundos_por_unidad'))
+
+    if (tmp_min == 0.0 or seg_uni == 0.0) and dur_seg > 0:
+        calc_min, calc_seg_uni = calcular_metricas_inyeccion(dur_seg, cant_real)
+        if tmp_min == 0.0: tmp_min = calc_min
+        if seg_uni == 0.0: seg_uni = calc_seg_uni
+
+    return {
+        'Fecha': _fmt_fecha(r.get('fecha')),
+        'Tipo': 'INYECCION',
+        'Producto': safe_str(r.get('producto')),
+        'Responsable': safe_str(r.get('responsable')),
+        'Cant': cant_real,
+        'Orden': safe_str(r.get('orden')) or safe_str(r.get('id_lote')),
+        'maquina': format_maquina(r.get('maquina'), 'INYECCION'),
+        'peso_bujes': round(to_float(r.get('peso_bujes')), 4),
+        'cavidades': to_int(r.get('cavidades'), 1),
+        'duracion_segundos': dur_seg,
+        'tiempo_total_minutos': round(tmp_min, 2),
+        'segundos_por_unidad': round(seg_uni, 2),
+        'Extra': f"Molde: {r.get('extra')}",
+        'Detalle': safe_str(r.get('observaciones')),
+        'HORA_INICIO': safe_str(r.get('hora_inicio')),
+        'HORA_FIN': safe_str(r.get('hora_fin')),
+        'hoja': 'db_inyeccion',
+        'fila': to_int(r.get('id', 0))
+    }
+
+
+def _mov_pulido(r, revueltos_map=None):
+    """Pulido (Lógica Quirúrgica v4.4): anexa al detalle los bujes revueltos del lote."""
+    p_id = str(r.get('id_lote') or '').strip()
+    cant_real = to_float(r.get('cantidad'))
 
-    # 1. INYECCIÓN — SQL nativo con CAST para evitar comparación Date vs DateTime (timestamp)
-    if not tipo_filtro or tipo_filtro == 'INYECCION':
+    # Lookup directo en memoria (cero DB calls, ver _prefetch_revueltos)
+    revs = (revueltos_map or {}).get(p_id, [])
+    det_revueltos = ""
+    if revs:
+        det_revueltos = " | REVUELTOS: " + ", ".join([f"{str(rv['id_codigo'])}({to_float(rv['cantidad'])})" for rv in revs])
+
+    obs = str(r.get('observaciones') or '').strip()
+    detalle_final = f"Obs: {obs}{det_revueltos}" if obs else det_revueltos.strip(" | ")
+
+    return {
+        'Fecha': _fmt_fecha(r.get('fecha')),
+        'Tipo': 'PULIDO',
+        'Producto': str(r.get('producto') or ''),
+        'Responsable': str(r.get('responsable') or 'SISTEMA'),
+        'cantidad_real': cant_real,
+        'Cant': cant_real,
+        'Orden': str(r.get('orden') or p_id or '-'),
+        'maquina': 'N/A',
+        'peso_bujes': None,
+        'cavidades': None,
+        'duracion_segundos': None,
+        'tiempo_total_minutos': None,
+        'segundos_por_unidad': None,
+        'Extra': f"OP: {str(r.get('orden') or '')}",
+        'Detalle': str(detalle_final.strip()),
+        'HORA_INICIO': safe_str(r.get('hora_inicio')),
+        'HORA_FIN': safe_str(r.get('hora_fin')),
+        'hoja': 'db_pulido',
+        'fila': to_int(r.get('id'))
+    }
+
+
+def _mov_ensamble(r, revueltos_map=None):
+    return {
+        'Fecha': _fmt_fecha(r.get('fecha')),
+        'Tipo': 'ENSAMBLE',
+        'Producto': safe_str(r.get('producto')),
+        'Responsable': safe_str(r.get('responsable')),
+        'Cant': to_float(r.get('cantidad')),
+        'Orden': safe_str(r.get('orden')) or safe_str(r.get('id_lote')),
+        'maquina': 'N/A',
+        'peso_bujes': None,
+        'cavidades': None,
+        'duracion_segundos': None,
+        'tiempo_total_minutos': None,
+        'segundos_por_unidad': None,
+        'Extra': safe_str(r.get('extra')),
+        'Detalle': safe_str(r.get('observaciones')),
+        'HORA_INICIO': safe_str(r.get('hora_inicio')),
+        'HORA_FIN': safe_str(r.get('hora_fin')),
+        'hoja': 'db_ensambles',
+        'fila': to_int(r.get('id', 0))
+    }
+
+
+def _mov_mezcla(r, revueltos_map=None):
+    return {
+        'Fecha': _fmt_fecha(r.get('fecha')),
+        'Tipo': 'MEZCLA',
+        'Producto': 'PREPARACION MATERIAL',
+        'Responsable': safe_str(r.get('responsable')),
+        'Cant': f"{to_float(r.get('cantidad'))}Kg V",
+        'maquina': format_maquina(r.get('maquina'), 'MEZCLA'),
+        'peso_bujes': None,
+        'cavidades': None,
+        'duracion_segundos': None,
+        'tiempo_total_minutos': None,
+        'segundos_por_unidad': None,
+        'Extra': f"{to_float(r.get('valor'))}Kg M",
+        'Detalle': safe_str(r.get('observaciones')),
+        'HORA_INICIO': '',
+        'HORA_FIN': '',
+        'hoja': 'db_mezcla',
+        'fila': to_int(r.get('id', 0))
+    }
+
+
+def _mov_venta(r, revueltos_map=None):
+    return {
+        'Fecha': _fmt_fecha(r.get('fecha')),
+        'Tipo': 'VENTA',
+        'Producto': safe_str(r.get('producto')),
+        'Responsable': safe_str(r.get('responsable')),
+        'Cant': to_float(r.get('cantidad')),
+        'Orden': safe_str(r.get('orden')),
+        'maquina': 'N/A',
+        'peso_bujes': None,
+        'cavidades': None,
+        'duracion_segundos': None,
+        'tiempo_total_minutos': None,
+        'segundos_por_unidad': None,
+        'Extra': safe_str(r.get('extra')),
+        'Detalle': f"Ingreso: ${to_float(r.get('valor'))}",
+        'HORA_INICIO': '',
+        'HORA_FIN': '',
+        'hoja': 'db_ventas',
+        'fila': to_int(r.get('id', 0))
+    }
+
+
+# hoja PNC -> (proceso que aparece como Responsable, etiqueta de Extra)
+_ETIQUETAS_PNC = {
+    'db_pnc_inyeccion': ('INYECCION', 'PNC Inyeccion'),
+    'db_pnc_pulido': ('PULIDO', 'PNC Pulido'),
+    'db_pnc_ensamble': ('ENSAMBLE', 'PNC Ensamble'),
+}
+
+
+def _mov_pnc(r, revueltos_map=None):
+    proceso, etiqueta = _ETIQUETAS_PNC[r.get('hoja')]
+    ambiguo = bool(r.get('ambiguo'))
+    fecha = r.get('fecha') if not ambiguo else None
+    return {
+        'Fecha': _fmt_fecha(fecha) or ('ID AMBIGUO' if ambiguo else 'S/F'),
+        'Tipo': 'PNC',
+        'Producto': safe_str(r.get('producto')),
+        'Responsable': proceso,
+        'Cant': to_float(r.get('cantidad', 0)),
+        'Orden': (safe_str(r.get('orden')) if not ambiguo else '') or safe_str(r.get('id_lote')),
+        'maquina': format_maquina(r.get('maquina'), 'INYECCION') if (r.get('maquina') and not ambiguo) else 'N/A',
+        'peso_bujes': None,
+        'cavidades': None,
+        'duracion_segundos': None,
+        'tiempo_total_minutos': None,
+        'segundos_por_unidad': None,
+        'Extra': etiqueta,
+        'Detalle': f"Criterio: {safe_str(r.get('criterio'))} | Notas: {safe_str(r.get('notas'))}",
+        'HORA_INICIO': '',
+        'HORA_FIN': '',
+        'hoja': r.get('hoja'),
+        'fila': to_int(r.get('id', 0))
+    }
+
+
+_MAPEADORES_HISTORIAL = {
+    'db_inyeccion': _mov_inyeccion,
+    'db_pulido': _mov_pulido,
+    'db_ensambles': _mov_ensamble,
+    'db_mezcla': _mov_mezcla,
+    'db_ventas': _mov_venta,
+    'db_pnc_inyeccion': _mov_pnc,
+    'db_pnc_pulido': _mov_pnc,
+    'db_pnc_ensamble': _mov_pnc,
+}
+
+
+def _mapear_lote(filas):
+    """
+    Filas del esquema común -> movimientos. Los revueltos de las filas de
+    pulido del lote se traen con un solo IN (...) (v5.2 - cero queries por
+    fila). Una fila que falla al armarse se loggea y se omite.
+    """
+    revueltos_map = _prefetch_revueltos([r for r in filas if r.get('hoja') == 'db_pulido'])
+    for r in filas:
         try:
-            sql_iny = """
-                SELECT
-                    id, id_inyeccion::TEXT, fecha_inicia, fecha_fin,
-                    id_codigo::TEXT, responsable::TEXT, maquina::TEXT,
-                    cantidad_real, estado::TEXT, molde, cavidades,
-                    hora_llegada::TEXT, hora_inicio::TEXT, hora_termina::TEXT,
-                    cant_contador, almacen_destino::TEXT, codigo_ensamble::TEXT,
-                    orden_produccion::TEXT, observaciones::TEXT,
-                    pnc_total, departamento::TEXT,
-                    peso_bujes, duracion_segundos, tiempo_total_minutos, segundos_por_unidad
-                FROM db_inyeccion
-                WHERE CAST(fecha_inicia AS DATE) BETWEEN :desde AND :hasta
-                ORDER BY fecha_inicia DESC
-            """
-            logger.debug(
-                f"🔍 [Historial-INYECCION] SQL enviado a PostgreSQL: "
-                f"SELECT ... FROM db_inyeccion WHERE CAST(fecha_inicia AS DATE) "
-                f"BETWEEN '{f_desde}' AND '{f_hasta}'"
-            )
-            res_raw = db.session.execute(text(sql_iny), {"desde": f_desde, "hasta": f_hasta})
-            res_iny = [dict(row._mapping) for row in res_raw]
-            logger.debug(f"✅ [Historial-INYECCION] Registros encontrados: {len(res_iny)} (rango {f_desde} → {f_hasta})")
+            mov = _MAPEADORES_HISTORIAL[r.get('hoja')](r, revueltos_map)
+        except Exception as e_row:
+            # Sin rollback: el error es de armado en Python, no de SQL, y un
+            # rollback cerraría el cursor del servidor que sigue entregando
+            # el resto del rango.
+            logger.error(f"❌ [Historial-{r.get('hoja')}] Error procesando fila (ID {r.get('id', '?')}): {e_row}")
+            continue
+        yield mov
 
-            for r in res_iny:
-                try:
-                    fi = r.get('fecha_inicia')
-                    cant_real = to_float(r.get('cantidad_real'))
-                    dur_seg = to_int(r.get('duracion_segundos'))
-                    tmp_min = to_float(r.get('tiempo_total_minutos'))
-                    seg_uni = to_float(r.get('segundos_por_unidad'))
-
-                    if (tmp_min == 0.0 or seg_uni == 0.0) and dur_seg > 0:
-                        calc_min, calc_seg_uni = calcular_metricas_inyeccion(dur_seg, cant_real)
-                        if tmp_min == 0.0: tmp_min = calc_min
-                        if seg_uni == 0.0: seg_uni = calc_seg_uni
-
-                    movimientos.append({
-                        'Fecha': fi.strftime('%d/%m/%Y') if fi else '',
-                        'Tipo': 'INYECCION',
-                        'Producto': safe_str(r.get('id_codigo', '')),
-                        'Responsable': safe_str(r.get('responsable', 'SISTEMA')),
-                        'Cant': cant_real,
-                        'Orden': safe_str(r.get('orden_produccion', '')) or safe_str(r.get('id_inyeccion', '')),
-                        'maquina': format_maquina(r.get('maquina'), 'INYECCION'),
-                        'peso_bujes': round(to_float(r.get('peso_bujes')), 4),
-                        'cavidades': to_int(r.get('cavidades'), 1),
-                        'duracion_segundos': dur_seg,
-                        'tiempo_total_minutos': round(tmp_min, 2),
-                        'segundos_por_unidad': round(seg_uni, 2),
-                        'Extra': f"Molde: {r.get('molde', '')}",
-                        'Detalle': safe_str(r.get('observaciones', '')),
-                        'HORA_INICIO': safe_str(r.get('hora_inicio', '')),
-                        'HORA_FIN': safe_str(r.get('hora_termina', '')),
-                        'hoja': 'db_inyeccion',
-                        'fila': to_int(r.get('id', 0))
-                    })
-                except Exception as e_row:
-                    logger.error(f"❌ [Historial-INYECCION] Error procesando fila (ID {r.get('id', '?')}): {e_row}")
-                    continue
-        except Exception as e:
-            logger.error(f"❌ [Historial-INYECCION] Error crítico en bloque: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
 
-    # 2. PULIDO (Lógica Quirúrgica v4.4)
-    if not tipo_filtro or tipo_filtro == 'PULIDO':
+def _construir_movimientos_historial(f_desde, f_hasta, tipo_filtro):
+    """
+    Lista completa de movimientos (respuesta JSON legacy de
+    obtener_historial_global, sin ?limit). La exportación a Excel NO pasa por
+    aquí: consume directamente el generador _iterar_movimientos_historial
+    para no materializar el rango en memoria.
+    """
+    return list(_iterar_movimientos_historial(f_desde, f_hasta, tipo_filtro))
+
+
+def _iterar_movimientos_historial(f_desde, f_hasta, tipo_filtro):
+    """
+    Ejecuta las ramas SQL del Historial Global hoja por hoja y entrega los
+    movimientos uno a uno (generador). Cada rama lee de un cursor del lado
+    del servidor (_ejecutar_stream), de modo que el consumidor -- p. ej. el
+    writer write_only del Excel -- procesa el rango con memoria plana: antes
+    cada tabla se cargaba completa en una lista y además se duplicaba en las
+    hojas filtradas, causa de OOM en Render con rangos de un año.
+    """
+    params = _params_rango(f_desde, f_hasta)
+    for hoja in _hojas_historial(tipo_filtro):
         try:
-            # Consulta SQL con Casts explícitos
-            sql_pul = """
-                SELECT 
-                    id, id_pulido::TEXT, fecha, codigo::TEXT, responsable::TEXT, 
-                    cantidad_real, orden_produccion::TEXT, observaciones::TEXT,
-                    hora_inicio, hora_fin
-                FROM db_pulido
-                WHERE CAST(fecha AS DATE) BETWEEN :desde AND :hasta
-            """
-            res_raw = db.session.execute(text(sql_pul), {"desde": f_desde, "hasta": f_hasta})
-            res_pul = [dict(row._mapping) for row in res_raw]
-
-            # Batch Pre-fetch Revueltos (v5.2 - Zero queries in loop)
-            all_pul_ids = [str(r.get('id_pulido') or '').strip() for r in res_pul]
-            all_pul_ids = [pid for pid in all_pul_ids if pid]
-
-            revueltos_map = {}
-            if all_pul_ids:
-                placeholders = ', '.join([f':pid_{i}' for i in range(len(all_pul_ids))])
-                sql_revs = f"SELECT id_pulido::TEXT as id_pulido, id_codigo::TEXT as id_codigo, COALESCE(cantidad, 0) as cantidad FROM db_bujes_revueltos WHERE id_pulido IN ({placeholders})"
-                params_revs = {f'pid_{i}': pid for i, pid in enumerate(all_pul_ids)}
-                revs_raw = db.session.execute(text(sql_revs), params_revs)
-                for rv in revs_raw:
-                    rv_dict = dict(rv._mapping)
-                    pid = str(rv_dict['id_pulido'])
-                    if pid not in revueltos_map:
-                        revueltos_map[pid] = []
-                    revueltos_map[pid].append(rv_dict)
-
-            for r in res_pul:
-                try:
-                    p_id = str(r.get('id_pulido') or '').strip()
-                    cant_real = to_float(r.get('cantidad_real'))
-                    
-                    # Lookup directo en memoria (cero DB calls)
-                    revs = revueltos_map.get(p_id, [])
-                    det_revueltos = ""
-                    if revs:
-                        det_revueltos = " | REVUELTOS: " + ", ".join([f"{str(rv['id_codigo'])}({to_float(rv['cantidad'])})" for rv in revs])
-
-                    obs = str(r.get('observaciones') or '').strip()
-                    detalle_final = f"Obs: {obs}{det_revueltos}" if obs else det_revueltos.strip(" | ")
-
-                    movimientos.append({
-                        'Fecha': r['fecha'].strftime('%d/%m/%Y') if r['fecha'] else '',
-                        'Tipo': 'PULIDO',
-                        'Producto': str(r['codigo'] or ''),
-                        'Responsable': str(r['responsable'] or 'SISTEMA'),
-                        'cantidad_real': cant_real,
-                        'Cant': cant_real,
-                        'Orden': str(r['orden_produccion'] or p_id or '-'),
-                        'maquina': 'N/A',
-                        'peso_bujes': None,
-                        'cavidades': None,
-                        'duracion_segundos': None,
-                        'tiempo_total_minutos': None,
-                        'segundos_por_unidad': None,
-                        'Extra': f"OP: {str(r['orden_produccion'] or '')}",
-                        'Detalle': str(detalle_final.strip()),
-                        'HORA_INICIO': format_time_py(r['hora_inicio']),
-                        'HORA_FIN': format_time_py(r['hora_fin']),
-                        'hoja': 'db_pulido',
-                        'fila': to_int(r['id'])
-                    })
-                except Exception as e_row:
-                    db.session.rollback()
-                    logger.debug(f'Error en fila Pulido: {e_row}')
-                    logger.error(f"❌ Error procesando fila Pulido (ID {r.get('id', '?')}): {e_row}")
-                    continue
-        except Exception as e_block:
-            logger.debug(f'Error en Pulido: {e_block}')
-            logger.error(f"❌ ERROR CRÍTICO EN BLOQUE PULIDO: {e_block}")
+            sql = _RAMAS_HISTORIAL[hoja]
+            if hoja == 'db_inyeccion':
+                sql += " ORDER BY fecha_inicia DESC"
+            logger.debug(f"🔍 [Historial-{hoja}] Rango '{f_desde}' -> '{f_hasta}'")
+            res = _ejecutar_stream(sql, params).mappings()
+            for lote in res.partitions():
+                yield from _mapear_lote(lote)
+        except Exception as e:
+            logger.error(f"❌ [Historial-{hoja}] Error crítico en bloque: {e}")
             import traceback
             logger.error(traceback.format_exc())
 
-    # 3. ENSAMBLE
-    if not tipo_filtro or tipo_filtro == 'ENSAMBLE':
-        try:
-            res = Ensamble.query.filter(Ensamble.fecha.between(f_desde, f_hasta)).all()
-            for r in res:
-                movimientos.append({
-                    'Fecha': getattr(r.fecha, 'strftime', lambda x: '')('%d/%m/%Y') if r.fecha else '',
-                    'Tipo': 'ENSAMBLE',
-                    'Producto': safe_str(getattr(r, 'id_codigo', '')),
-                    'Responsable': safe_str(getattr(r, 'responsable', 'SISTEMA')),
-                    'Cant': to_float(getattr(r, 'cantidad', 0)),
-                    'Orden': safe_str(getattr(r, 'op_numero', '')) or safe_str(getattr(r, 'id_ensamble', '')),
-                    'maquina': 'N/A',
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': safe_str(getattr(r, 'buje_ensamble', '')),
-                    'Detalle': safe_str(getattr(r, 'observaciones', '')),
-                    'HORA_INICIO': format_time_py(getattr(r, 'hora_inicio', None)),
-                    'HORA_FIN': format_time_py(getattr(r, 'hora_fin', None)),
-                    'hoja': 'db_ensambles',
-                    'fila': to_int(getattr(r, 'id', 0))
-                })
-        except Exception as e:
-            logger.error(f"Error Ensamble: {e}")
 
-    # 4. MEZCLA
-    if not tipo_filtro or tipo_filtro == 'MEZCLA':
-        try:
-            res = Mezcla.query.filter(Mezcla.fecha.between(f_desde, f_hasta)).all()
-            for r in res:
-                movimientos.append({
-                    'Fecha': getattr(r.fecha, 'strftime', lambda x: '')('%d/%m/%Y') if r.fecha else '',
-                    'Tipo': 'MEZCLA',
-                    'Producto': 'PREPARACION MATERIAL',
-                    'Responsable': safe_str(getattr(r, 'responsable', 'SISTEMA')),
-                    'Cant': f"{to_float(getattr(r, 'virgen_kg', 0))}Kg V",
-                    'maquina': format_maquina(getattr(r, 'maquina', None), 'MEZCLA'),
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': f"{to_float(getattr(r, 'molido_kg', 0))}Kg M",
-                    'Detalle': safe_str(getattr(r, 'observaciones', '')),
-                    'HORA_INICIO': '',
-                    'HORA_FIN': '',
-                    'hoja': 'db_mezcla',
-                    'fila': to_int(getattr(r, 'id', 0))
-                })
-        except Exception as e:
-            logger.error(f"Error Mezcla: {e}")
+def _codificar_cursor_historial(fila):
+    """Cursor opaco (base64 url-safe) con la llave (fecha_orden, hoja, id) de `fila`."""
+    llave = [fila['fecha_orden'].isoformat(), fila['hoja'], int(fila['id'])]
+    return base64.urlsafe_b64encode(json.dumps(llave).encode('utf-8')).decode('ascii')
 
-    # 5. VENTAS
-    if not tipo_filtro or tipo_filtro in ['VENTA', 'VENTAS', 'FACTURACION']:
-        try:
-            res = RawVentas.query.filter(RawVentas.fecha.between(f_desde, f_hasta)).all()
-            for r in res:
-                movimientos.append({
-                    'Fecha': getattr(r.fecha, 'strftime', lambda x: '')('%d/%m/%Y') if r.fecha else '',
-                    'Tipo': 'VENTA',
-                    'Producto': safe_str(getattr(r, 'productos', '')),
-                    'Responsable': safe_str(getattr(r, 'nombres', 'CLIENTE DESCONOCIDO')),
-                    'Cant': to_float(getattr(r, 'cantidad', 0)),
-                    'Orden': safe_str(getattr(r, 'documento', '')),
-                    'maquina': 'N/A',
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': safe_str(getattr(r, 'clasificacion', '')),
-                    'Detalle': f"Ingreso: ${to_float(getattr(r, 'total_ingresos', 0))}",
-                    'HORA_INICIO': '',
-                    'HORA_FIN': '',
-                    'hoja': 'db_ventas',
-                    'fila': to_int(getattr(r, 'id', 0))
-                })
-        except Exception as e:
-            logger.error(f"Error Ventas: {e}")
 
-    # 6. PNC
-    if not tipo_filtro or tipo_filtro == 'PNC':
-        try:
-            # NOTA CRITICA (reemplaza el outerjoin ORM anterior): el campo
-            # de enlace (id_inyeccion / id_pulido / id_ensamble) NO es
-            # unico por fila en las tablas de produccion -- un mismo lote
-            # multi-SKU agrupa varias filas (una por id_codigo), y ademas
-            # se detectaron colisiones REALES entre lotes NO relacionados
-            # (ej. id_inyeccion 'INY-890801A3' con 7 filas del lote real
-            # + 1 fila intrusa de otro dia/otra orden; varios id_pulido
-            # cortos tipo 'PUL-52248' compartidos por producciones sin
-            # relacion). Un JOIN directo contra la tabla completa
-            # multiplicaba cada fila de PNC una vez por cada match (bug
-            # de fan-out: un solo PNC aparecia triplicado/quintuplicado
-            # en el Historial Global).
-            #
-            # Fix: cada bloque arma una fila "representante" por lote via
-            # DISTINCT ON, y ademas cuenta cuantas combinaciones DISTINTAS
-            # de (fecha, orden) existen bajo ese mismo id de lote. Si hay
-            # mas de una (n_combinaciones > 1) el id esta en colision real
-            # entre eventos distintos: NO se adivina cual es el correcto,
-            # se marca 'ID AMBIGUO' en vez de mostrar una fecha/orden que
-            # podria ser la equivocada.
-
-            sql_pnc_iny = text("""
-                WITH combos AS (
-                    SELECT id_inyeccion, fecha_inicia, orden_produccion, maquina
-                    FROM db_inyeccion
-                    WHERE id_inyeccion IS NOT NULL
-                    GROUP BY id_inyeccion, fecha_inicia, orden_produccion, maquina
-                ),
-                ambiguedad AS (
-                    SELECT id_inyeccion, COUNT(*) as n_combinaciones
-                    FROM combos
-                    GROUP BY id_inyeccion
-                ),
-                representante AS (
-                    SELECT DISTINCT ON (id_inyeccion) id_inyeccion, fecha_inicia, orden_produccion, maquina
-                    FROM db_inyeccion
-                    WHERE id_inyeccion IS NOT NULL
-                    ORDER BY id_inyeccion, fecha_inicia DESC
-                )
-                SELECT
-                    p.id_row, p.id_codigo, p.cantidad, p.criterio, p.codigo_ensamble, p.id_inyeccion,
-                    r.fecha_inicia, r.orden_produccion, r.maquina,
-                    COALESCE(a.n_combinaciones, 1) as n_combinaciones
-                FROM db_pnc_inyeccion p
-                LEFT JOIN representante r ON p.id_inyeccion = r.id_inyeccion
-                LEFT JOIN ambiguedad a ON r.id_inyeccion = a.id_inyeccion
-                WHERE r.id_inyeccion IS NULL
-                   OR COALESCE(a.n_combinaciones, 1) > 1
-                   OR (CAST(r.fecha_inicia AS DATE) BETWEEN :desde AND :hasta)
-            """)
-            res_pnc_iny = db.session.execute(sql_pnc_iny, {"desde": f_desde, "hasta": f_hasta}).mappings().all()
-            for r in res_pnc_iny:
-                ambiguo = (r.get('n_combinaciones') or 1) > 1
-                fecha_inicia = r.get('fecha_inicia') if not ambiguo else None
-                movimientos.append({
-                    'Fecha': fecha_inicia.strftime('%d/%m/%Y') if fecha_inicia else ('ID AMBIGUO' if ambiguo else 'S/F'),
-                    'Tipo': 'PNC',
-                    'Producto': safe_str(r.get('id_codigo', '')),
-                    'Responsable': 'INYECCION',
-                    'Cant': to_float(r.get('cantidad', 0)),
-                    'Orden': (safe_str(r.get('orden_produccion', '')) if not ambiguo else '') or safe_str(r.get('id_inyeccion', '')),
-                    'maquina': format_maquina(r.get('maquina'), 'INYECCION') if (r.get('maquina') and not ambiguo) else 'N/A',
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': 'PNC Inyeccion',
-                    'Detalle': f"Criterio: {safe_str(r.get('criterio', ''))} | Notas: {safe_str(r.get('codigo_ensamble', ''))}",
-                    'HORA_INICIO': '',
-                    'HORA_FIN': '',
-                    'hoja': 'db_pnc_inyeccion',
-                    'fila': to_int(r.get('id_row', 0))
-                })
-
-            # PNC PULIDO — mismo patron. Pulido no maneja concepto de
-            # maquina (format_maquina ya fuerza 'N/A' para este proceso).
-            sql_pnc_pul = text("""
-                WITH combos AS (
-                    SELECT id_pulido::text as id_pulido, fecha, orden_produccion
-                    FROM db_pulido
-                    GROUP BY id_pulido::text, fecha, orden_produccion
-                ),
-                ambiguedad AS (
-                    SELECT id_pulido, COUNT(*) as n_combinaciones
-                    FROM combos
-                    GROUP BY id_pulido
-                ),
-                representante AS (
-                    SELECT DISTINCT ON (id_pulido::text) id_pulido::text as id_pulido, fecha, orden_produccion
-                    FROM db_pulido
-                    ORDER BY id_pulido::text, fecha DESC
-                )
-                SELECT
-                    p.id_row, p.codigo, p.cantidad, p.criterio, p.codigo_ensamble, p.id_pulido,
-                    r.fecha, r.orden_produccion,
-                    COALESCE(a.n_combinaciones, 1) as n_combinaciones
-                FROM db_pnc_pulido p
-                LEFT JOIN representante r ON p.id_pulido::text = r.id_pulido
-                LEFT JOIN ambiguedad a ON r.id_pulido = a.id_pulido
-                WHERE r.id_pulido IS NULL
-                   OR COALESCE(a.n_combinaciones, 1) > 1
-                   OR (CAST(r.fecha AS DATE) BETWEEN :desde AND :hasta)
-            """)
-            res_pnc_pul = db.session.execute(sql_pnc_pul, {"desde": f_desde, "hasta": f_hasta}).mappings().all()
-            for r in res_pnc_pul:
-                ambiguo = (r.get('n_combinaciones') or 1) > 1
-                fecha = r.get('fecha') if not ambiguo else None
-                movimientos.append({
-                    'Fecha': fecha.strftime('%d/%m/%Y') if fecha else ('ID AMBIGUO' if ambiguo else 'S/F'),
-                    'Tipo': 'PNC',
-                    'Producto': safe_str(r.get('codigo', '')),
-                    'Responsable': 'PULIDO',
-                    'Cant': to_float(r.get('cantidad', 0)),
-                    'Orden': (safe_str(r.get('orden_produccion', '')) if not ambiguo else '') or safe_str(r.get('id_pulido', '')),
-                    'maquina': 'N/A',
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': 'PNC Pulido',
-                    'Detalle': f"Criterio: {safe_str(r.get('criterio', ''))} | Notas: {safe_str(r.get('codigo_ensamble', ''))}",
-                    'HORA_INICIO': '',
-                    'HORA_FIN': '',
-                    'hoja': 'db_pnc_pulido',
-                    'fila': to_int(r.get('id_row', 0))
-                })
-
-            # PNC ENSAMBLE — mismo patron (auditado: 0 grupos ambiguos
-            # hoy, pero se deja la misma guarda por si aparecen a futuro;
-            # Ensamble tampoco maneja concepto de maquina).
-            sql_pnc_ens = text("""
-                WITH combos AS (
-                    SELECT id_ensamble, fecha, op_numero
-                    FROM db_ensambles
-                    GROUP BY id_ensamble, fecha, op_numero
-                ),
-                ambiguedad AS (
-                    SELECT id_ensamble, COUNT(*) as n_combinaciones
-                    FROM combos
-                    GROUP BY id_ensamble
-                ),
-                representante AS (
-                    SELECT DISTINCT ON (id_ensamble) id_ensamble, fecha, op_numero
-                    FROM db_ensambles
-                    ORDER BY id_ensamble, fecha DESC
-                )
-                SELECT
-                    p.id_row, p.id_codigo, p.cantidad, p.criterio, p.codigo_ensamble, p.id_ensamble,
-                    r.fecha, r.op_numero,
-                    COALESCE(a.n_combinaciones, 1) as n_combinaciones
-                FROM db_pnc_ensamble p
-                LEFT JOIN representante r ON p.id_ensamble = r.id_ensamble
-                LEFT JOIN ambiguedad a ON r.id_ensamble = a.id_ensamble
-                WHERE r.id_ensamble IS NULL
-                   OR COALESCE(a.n_combinaciones, 1) > 1
-                   OR (CAST(r.fecha AS DATE) BETWEEN :desde AND :hasta)
-            """)
-            res_pnc_ens = db.session.execute(sql_pnc_ens, {"desde": f_desde, "hasta": f_hasta}).mappings().all()
-            for r in res_pnc_ens:
-                ambiguo = (r.get('n_combinaciones') or 1) > 1
-                fecha = r.get('fecha') if not ambiguo else None
-                movimientos.append({
-                    'Fecha': fecha.strftime('%d/%m/%Y') if fecha else ('ID AMBIGUO' if ambiguo else 'S/F'),
-                    'Tipo': 'PNC',
-                    'Producto': safe_str(r.get('id_codigo', '')),
-                    'Responsable': 'ENSAMBLE',
-                    'Cant': to_float(r.get('cantidad', 0)),
-                    'Orden': (safe_str(r.get('op_numero', '')) if not ambiguo else '') or safe_str(r.get('id_ensamble', '')),
-                    'maquina': 'N/A',
-                    'peso_bujes': None,
-                    'cavidades': None,
-                    'duracion_segundos': None,
-                    'tiempo_total_minutos': None,
-                    'segundos_por_unidad': None,
-                    'Extra': 'PNC Ensamble',
-                    'Detalle': f"Criterio: {safe_str(r.get('criterio', ''))} | Notas: {safe_str(r.get('codigo_ensamble', ''))}",
-                    'HORA_INICIO': '',
-                    'HORA_FIN': '',
-                    'hoja': 'db_pnc_ensamble',
-                    'fila': to_int(r.get('id_row', 0))
-                })
+def _decodificar_cursor_historial(cursor):
+    """Inverso de _codificar_cursor_historial. ValueError si el cursor no es válido."""
+    try:
+        fecha_orden, hoja, id_fila = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(fecha_orden), str(hoja), int(id_fila)
+    except Exception:
+        raise ValueError("Cursor 'after' inválido")
 
-        except Exception as e:
-            logger.error(f"Error PNC en historial: {e}")
 
-    return movimientos
+def _params_rango(f_desde, f_hasta):
+    """Parámetros de rango comunes a todas las ramas (ver _RAMAS_HISTORIAL)."""
+    return {"desde": f_desde, "hasta": f_hasta, "hasta_sig": f_hasta + timedelta(days=1)}
+
+
+# Modo paginado: columna de fecha real de cada rama simple (la que tiene
+# índice (fecha, id), ver backend/sql/migrate_indices_historial_keyset.py) y
+# si es Date (fecha_orden = medianoche del día) o DateTime.
+_ORDEN_PAGINA_HISTORIAL = {
+    'db_inyeccion': ('db_inyeccion.fecha_inicia', False),
+    'db_pulido': ('db_pulido.fecha', False),
+    'db_ensambles': ('db_ensambles.fecha', False),
+    'db_mezcla': ('db_mezcla.fecha', True),
+    'db_ventas': ('db_ventas.fecha', True),
+}
+
+# Modo paginado de las ramas PNC: tabla de producción del lote, columna de
+# enlace y columnas que definen la "combinación" (fecha, orden[, máquina])
+# con que se detecta un id de lote ambiguo (ver NOTA CRITICA PNC).
+_PNC_PAGINA_HISTORIAL = {
+    'db_pnc_inyeccion': {
+        'pnc': 'db_pnc_inyeccion', 'prod': 'db_inyeccion', 'lote': 'id_inyeccion', 'producto': 'id_codigo',
+        'fecha': 'fecha_inicia', 'orden': 'orden_produccion', 'maquina': 'maquina',
+    },
+    'db_pnc_pulido': {
+        'pnc': 'db_pnc_pulido', 'prod': 'db_pulido', 'lote': 'id_pulido', 'producto': 'codigo',
+        'fecha': 'fecha', 'orden': 'orden_produccion', 'maquina': None,
+    },
+    'db_pnc_ensamble': {
+        'pnc': 'db_pnc_ensamble', 'prod': 'db_ensambles', 'lote': 'id_ensamble', 'producto': 'id_codigo',
+        'fecha': 'fecha', 'orden': 'op_numero', 'maquina': None,
+    },
+}
+
+
+def _combo_pnc(cfg, alias):
+    cols = [cfg['fecha'], cfg['orden']] + ([cfg['maquina']] if cfg['maquina'] else [])
+    return "(" + ", ".join(f"{alias}.{c}" for c in cols) + ")"
+
+
+def _filtro_keyset(hoja, col_fecha, col_id, es_dia, cursor, n):
+    """
+    Predicado del cursor para UNA rama, sobre sus columnas reales. La llave
+    global es (fecha_orden, hoja, id) DESC, pero dentro de una rama `hoja` es
+    constante, así que la comparación de tuplas se resuelve aquí contra la
+    hoja del cursor y a Postgres solo le llega un rango sobre (fecha, id)
+    que el índice recorre desde el cursor. En columnas Date fecha_orden es
+    la medianoche del día: `fecha::timestamp < c` equivale a
+    `fecha <= (c - 1µs)::date`.
+    """
+    if cursor is None:
+        return "", {}
+    c_fecha, c_hoja, c_id = cursor
+    kf, kid = f"kf_{n}", f"kid_{n}"
+    if hoja == c_hoja:
+        limite = c_fecha.date() if es_dia else c_fecha
+        return (f"AND {col_fecha} <= :{kf} AND ({col_fecha}, {col_id}) < (:{kf}, :{kid})",
+                {kf: limite, kid: c_id})
+    if hoja < c_hoja:
+        return f"AND {col_fecha} <= :{kf}", {kf: c_fecha.date() if es_dia else c_fecha}
+    if es_dia:
+        return f"AND {col_fecha} <= :{kf}", {kf: (c_fecha - timedelta(microseconds=1)).date()}
+    return f"AND {col_fecha} < :{kf}", {kf: c_fecha}
+
+
+def _rama_pagina(hoja, cursor, n):
+    """
+    Rama con fecha real del modo paginado: el cursor y un ORDER BY ... LIMIT
+    propios, así cada rama se detiene tras :limite filas del índice en vez
+    de entregar el rango completo al UNION.
+
+    Las ramas PNC no leen los CTE de la consulta completa (que agregan TODA
+    la tabla de producción): se recorre la producción del rango por fecha
+    y, por lote, se toma una sola fila (la de menor id) siempre que el lote
+    NO sea ambiguo -- sin ambigüedad todas sus filas comparten fecha, así
+    que es el mismo representante del listado completo.
+    """
+    if hoja in _PNC_PAGINA_HISTORIAL:
+        cfg = _PNC_PAGINA_HISTORIAL[hoja]
+        filtro, params = _filtro_keyset(hoja, f"r.{cfg['fecha']}", "p.id_row", False, cursor, n)
+        maquina = f"r.{cfg['maquina']}" if cfg['maquina'] else "NULL::TEXT"
+        sql = _rama_pnc(hoja, f"""
+            SELECT
+                p.id_row, p.{cfg['producto']} AS producto, p.cantidad, p.criterio, p.codigo_ensamble,
+                p.{cfg['lote']} AS id_lote, r.{cfg['fecha']} AS fecha, r.{cfg['orden']} AS orden,
+                {maquina} AS maquina, FALSE AS ambiguo
+            FROM {cfg['prod']} r
+            JOIN {cfg['pnc']} p ON p.{cfg['lote']} = r.{cfg['lote']}
+            WHERE r.{cfg['fecha']} >= :desde AND r.{cfg['fecha']} < :hasta_sig
+              AND NOT EXISTS (
+                  SELECT 1 FROM {cfg['prod']} o
+                  WHERE o.{cfg['lote']} = r.{cfg['lote']}
+                    AND (o.id < r.id OR {_combo_pnc(cfg, 'o')} IS DISTINCT FROM {_combo_pnc(cfg, 'r')})
+              )
+              {filtro}
+            ORDER BY r.{cfg['fecha']} DESC, p.id_row DESC
+            LIMIT :limite
+        """)
+        return sql, params
+
+    col_fecha, es_dia = _ORDEN_PAGINA_HISTORIAL[hoja]
+    tabla = col_fecha.split('.')[0]
+    filtro, params = _filtro_keyset(hoja, col_fecha, f"{tabla}.id", es_dia, cursor, n)
+    # Columnas calificadas con la tabla: sin calificar, el ORDER BY tomaría
+    # las columnas de salida (CAST(...)), que no siguen el orden del índice.
+    sql = f"({_RAMAS_HISTORIAL[hoja]} {filtro} ORDER BY {col_fecha} DESC, {tabla}.id DESC LIMIT :limite)"
+    return sql, params
+
+
+def _rama_pagina_sin_fecha(hoja, cursor, n):
+    """
+    Rama PNC sin fecha confiable (lote inexistente o ambiguo) del modo
+    paginado, o None si el cursor ya la dejó atrás. Todas sus filas ordenan
+    en _FECHA_ORDEN_SIN_FECHA, así que el keyset se reduce a id_row.
+    """
+    cfg = _PNC_PAGINA_HISTORIAL[hoja]
+    filtro, params = "", {}
+    if cursor is not None:
+        c_fecha, c_hoja, c_id = cursor
+        llave = (_FECHA_ORDEN_SIN_FECHA_PY, hoja)
+        if llave == (c_fecha, c_hoja):
+            filtro, params = f"AND p.id_row < :kid_{n}", {f"kid_{n}": c_id}
+        elif llave > (c_fecha, c_hoja):
+            return None
+    existe = f"SELECT 1 FROM {cfg['prod']} o WHERE o.{cfg['lote']} = p.{cfg['lote']}"
+    sql = _rama_pnc(hoja, f"""
+        SELECT
+            p.id_row, p.{cfg['producto']} AS producto, p.cantidad, p.criterio, p.codigo_ensamble,
+            p.{cfg['lote']} AS id_lote, NULL::TIMESTAMP AS fecha, NULL::TEXT AS orden,
+            NULL::TEXT AS maquina, EXISTS ({existe}) AS ambiguo
+        FROM {cfg['pnc']} p
+        WHERE (
+            NOT EXISTS ({existe})
+            OR EXISTS (
+                SELECT 1 FROM {cfg['prod']} a
+                JOIN {cfg['prod']} b ON b.{cfg['lote']} = a.{cfg['lote']}
+                WHERE a.{cfg['lote']} = p.{cfg['lote']}
+                  AND {_combo_pnc(cfg, 'a')} IS DISTINCT FROM {_combo_pnc(cfg, 'b')}
+            )
+        )
+        {filtro}
+        ORDER BY p.id_row DESC
+        LIMIT :limite
+    """)
+    return sql, params
+
+
+def _ejecutar_ramas_pagina(ramas, params):
+    """UNION ALL de ramas (sql, params) ya limitadas; el orden final lo pone el caller."""
+    if not ramas:
+        return []
+    params = dict(params)
+    for _, p in ramas:
+        params.update(p)
+    sql = "\nUNION ALL\n".join(r for r, _ in ramas)
+    return [dict(f) for f in db.session.execute(text(sql), params).mappings().all()]
+
+
+def _pagina_movimientos_historial(f_desde, f_hasta, tipo_filtro, limite, after=None):
+    """
+    Una página del Historial Global, ordenada por (fecha, hoja, id) DESC.
+
+    Cada rama de _hojas_historial(tipo_filtro) aplica el cursor sobre sus
+    columnas reales y su propio ORDER BY ... LIMIT :limite+1 (_rama_pagina),
+    de modo que con el índice (fecha, id) de cada tabla una página lee a lo
+    sumo limite+1 filas por rama, empezando en el cursor: el costo depende
+    del tamaño de página, no del ancho del rango ni de la posición. Las
+    ramas se juntan con UNION ALL y el orden final se hace aquí (cada rama ya
+    viene ordenada y acotada).
+
+    Los PNC sin fecha confiable ordenan al final de todo; solo se consultan
+    (_rama_pagina_sin_fecha) cuando las filas con fecha ya no alcanzan para
+    llenar la página. `hoja` desempata en vez de `Tipo` porque los tres PNC
+    comparten Tipo y sus id_row pueden repetirse entre tablas. Devuelve
+    (movimientos, next_cursor | None).
+    """
+    hojas = _hojas_historial(tipo_filtro)
+    if not hojas:
+        return [], None
+
+    cursor = _decodificar_cursor_historial(after) if after else None
+    params = dict(_params_rango(f_desde, f_hasta), limite=limite + 1)
+
+    filas = _ejecutar_ramas_pagina([_rama_pagina(h, cursor, n) for n, h in enumerate(hojas)], params)
+    if len(filas) <= limite:
+        ramas_sin_fecha = [
+            _rama_pagina_sin_fecha(h, cursor, n) for n, h in enumerate(hojas) if h in _PNC_PAGINA_HISTORIAL
+        ]
+        filas += _ejecutar_ramas_pagina([r for r in ramas_sin_fecha if r], params)
+
+    filas.sort(key=lambda r: (r['fecha_orden'], r['hoja'], r['id']), reverse=True)
+    next_cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        next_cursor = _codificar_cursor_historial(filas[-1])
+    return list(_mapear_lote(filas)), next_cursor
+
+
+def _prefetch_revueltos(lote_pul):
+    """Revueltos de db_bujes_revueltos agrupados por id_pulido para un lote de filas de pulido."""
+    ids_lote = [str(r.get('id_lote') or '').strip() for r in lote_pul]
+    ids_lote = [pid for pid in ids_lote if pid]
+
+    revueltos_map = {}
+    if ids_lote:
+        placeholders = ', '.join([f':pid_{i}' for i in range(len(ids_lote))])
+        sql_revs = f"SELECT id_pulido::TEXT as id_pulido, id_codigo::TEXT as id_codigo, COALESCE(cantidad, 0) as cantidad FROM db_bujes_revueltos WHERE id_pulido IN ({placeholders})"
+        params_revs = {f'pid_{i}': pid for i, pid in enumerate(ids_lote)}
+        for rv in db.session.execute(text(sql_revs), params_revs).mappings():
+            revueltos_map.setdefault(str(rv['id_pulido']), []).append(dict(rv))
+    return revueltos_map
 
 
 @historial_bp.route('/api/historial-global', methods=['GET'])
@@ -493,17 +790,36 @@ def obtener_historial_global():
     """
     Historial Global v5.0 SQL-Limpio (Dict Mapping).
     Sincronizado con llaves en Mayúscula para el frontend.
+
+    Con ?limit=N responde por páginas (keyset): devuelve hasta N movimientos
+    y `next_cursor`, que se reenvía como ?after= para la página siguiente
+    (null = no hay más). Sin ?limit conserva la respuesta legacy con la
+    lista completa del rango.
     """
     try:
         desde_str = request.args.get('desde', '')
         hasta_str = request.args.get('hasta', '')
         tipo_filtro = request.args.get('tipo', '')
+        limit_str = request.args.get('limit', '')
 
         # Rango de fechas
         hoy = datetime.now().date()
         f_desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else hoy
         f_hasta = datetime.strptime(hasta_str, '%Y-%m-%d').date() if hasta_str else hoy
 
+        if limit_str:
+            limite = to_int(limit_str)
+            if limite < 1:
+                return api_error("El parámetro 'limit' debe ser un entero positivo", status_code=400)
+            limite = min(limite, _HISTORIAL_PAGINA_MAX)
+            try:
+                movimientos, next_cursor = _pagina_movimientos_historial(
+                    f_desde, f_hasta, tipo_filtro, limite, request.args.get('after') or None
+                )
+            except ValueError as e:
+                return api_error(str(e), status_code=400)
+            return api_success(data=movimientos, next_cursor=next_cursor)
+
         logger.debug(f"🔍 [Historial] Consulta v5.0 SQL-Limpio ({f_desde} -> {f_hasta})")
         movimientos = _construir_movimientos_historial(f_desde, f_hasta, tipo_filtro)
         return api_success(data=movimientos)
@@ -783,24 +1099,27 @@ def _generar_excel_historial_task(task_id, f_desde, f_hasta, tipo_filtro):
     (consulta + normalizacion + Workbook) fuera del hilo HTTP. Corre dentro del
     app_context que le da task_runner.run_in_background -- db.session y demas
     dependen de ese contexto para resolver correctamente en el hilo nuevo.
+
+    Pipeline de una sola pasada y memoria plana: cursor del servidor ->
+    normalización 24h fila a fila -> las 3 hojas write_only -> archivo
+    temporal en disco (el mismo que luego sirve /api/tasks/download). No hay
+    lista intermedia ni copia BytesIO.getvalue() del libro completo.
     """
+    tmp_path = None
     try:
-        resultados = _construir_movimientos_historial(f_desde, f_hasta, tipo_filtro)
-        logger.debug(f"📊 [Historial-Excel] Exportando {len(resultados)} movimientos ({f_desde} -> {f_hasta})")
+        # El archivo temporal sobrevive a este hilo: el endpoint de descarga
+        # es un request HTTP aparte (y con gthread, posiblemente en otro hilo).
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', prefix='historial_')
+        os.close(fd)
 
         # Normalizacion estricta a 24h (delegada al servicio, ver FRITECH V4.5)
-        resultados = preparar_movimientos_para_excel(resultados)
+        movimientos = preparar_movimientos_para_excel(
+            _iterar_movimientos_historial(f_desde, f_hasta, tipo_filtro)
+        )
 
         # Construcción del Workbook delegada al servicio (arquitectura: rutas sin lógica de negocio)
-        output = generar_excel_historial_global(resultados)
-
-        # El BytesIO en memoria no sobrevive a este hilo: el endpoint de
-        # descarga es un request HTTP aparte (y con gthread, posiblemente en
-        # otro hilo), asi que se vuelca a un archivo temporal real en disco
-        # para que send_file lo pueda abrir despues.
-        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', prefix='historial_')
-        with os.fdopen(fd, 'wb') as f:
-            f.write(output.getvalue())
+        total = generar_excel_historial_global(movimientos, tmp_path)
+        logger.debug(f"📊 [Historial-Excel] Exportados {total} movimientos ({f_desde} -> {f_hasta})")
 
         fecha_archivo = datetime.now().strftime('%Y-%m-%d')
         filename = f"Historial_Global_{fecha_archivo}.xlsx"
@@ -813,6 +1132,11 @@ def _generar_excel_historial_task(task_id, f_desde, f_hasta, tipo_filtro):
         logger.error(f"Error exportando Excel Historial Global (task {task_id}): {e}")
         import traceback
         logger.error(traceback.format_exc())
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
         task_runner.set_failed(task_id, str(e))
 
 
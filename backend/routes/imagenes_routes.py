@@ -1,16 +1,40 @@
-from flask import Blueprint, Response, jsonify
+from flask import Blueprint, jsonify, request, send_file
 import requests
-from functools import lru_cache
 import logging
+import os
+import threading
 from backend.utils.auth_middleware import require_role, ROL_ADMINS
+from backend.utils.imagen_cache import DiskImageCache
+from backend.utils.imagen_variantes import normalizar_ancho, elegir_formato, generar_variante
 
 imagenes_bp = Blueprint('imagenes', __name__)
 logger = logging.getLogger(__name__)
 
-# Caché en memoria para 1000 imágenes
-@lru_cache(maxsize=1000)
+# Caché en disco de las imágenes de Drive (ver backend/utils/imagen_cache.py).
+# IMAGEN_CACHE_DIR puede apuntar a un disco persistente para sobrevivir redeploys.
+IMAGEN_CACHE_DIR = os.getenv('IMAGEN_CACHE_DIR', os.path.join(os.getcwd(), 'cache_imagenes'))
+IMAGEN_CACHE_MAX_MB = int(os.getenv('IMAGEN_CACHE_MAX_MB', 256))
+IMAGEN_CACHE_TTL_FALLO = int(os.getenv('IMAGEN_CACHE_TTL_FALLO', 60))
+
+_cache_imagenes = None
+_cache_imagenes_lock = threading.Lock()
+
+
+def get_cache_imagenes():
+    '''Instancia única (perezosa) de la caché en disco: el índice se carga al primer uso.'''
+    global _cache_imagenes
+    with _cache_imagenes_lock:
+        if _cache_imagenes is None:
+            _cache_imagenes = DiskImageCache(
+                IMAGEN_CACHE_DIR,
+                max_bytes=IMAGEN_CACHE_MAX_MB * 1024 * 1024,
+                ttl_fallo=IMAGEN_CACHE_TTL_FALLO,
+            )
+        return _cache_imagenes
+
+
 def obtener_imagen_google_drive(file_id):
-    '''Obtiene imagen de Google Drive con caché en memoria, manejando disclaimers de virus.'''
+    '''Descarga la imagen de Google Drive (sin caché), manejando disclaimers de virus.'''
     try:
         session = requests.Session()
         # Formato de descarga directa que suele ser más estable para el proxy
@@ -41,9 +65,15 @@ def obtener_imagen_google_drive(file_id):
         logger.error(f"Excepción al obtener imagen {file_id}: {str(e)}")
         return None, None
 
+def _generar_variante_desde(original, ancho, formato):
+    '''Lee el original ya cacheado en disco y devuelve (bytes, content_type) de la variante.'''
+    with open(original.ruta, 'rb') as f:
+        return generar_variante(f.read(), ancho, formato)
+
+
 @imagenes_bp.route('/proxy/<file_id>')
 def proxy_imagen(file_id):
-    '''Endpoint de proxy con caché. Acepta IDs de archivo de Google Drive.'''
+    '''Endpoint de proxy con caché. Acepta IDs de archivo de Google Drive y ?w=<ancho> / ?fmt=webp|jpeg.'''
     
     if not file_id or len(file_id) < 5:
         return jsonify({'error': 'ID de archivo inválido'}), 400
@@ -55,24 +85,52 @@ def proxy_imagen(file_id):
         if match:
             file_id = match.group(1)
 
-    content, content_type = obtener_imagen_google_drive(file_id)
-    
-    if content:
-        return Response(
-            content,
-            mimetype=content_type,
-            headers={
-                'Cache-Control': 'public, max-age=31536000',
-                'Access-Control-Allow-Origin': '*'
-            }
-        )
-    else:
-        logger.error(f"❌ Proxy falló para file_id: {file_id}")
-        return jsonify({'error': 'No se pudo obtener la imagen del servidor de Google'}), 502
+    # ?w=<ancho>: variante reducida (miniaturas del catálogo), ver
+    # backend/utils/imagen_variantes.py. Sin ?fmt= el formato se negocia por
+    # el header Accept (WebP si el navegador lo admite).
+    ancho = normalizar_ancho(request.args.get('w'))
+    formato = elegir_formato(request.args.get('fmt'), request.headers.get('Accept')) if ancho else None
+
+    cache = get_cache_imagenes()
+    # Dos intentos: si un desalojo borró el blob entre obtener() y send_file,
+    # el segundo obtener() lo vuelve a descargar.
+    for _ in range(2):
+        entrada = cache.obtener(file_id, lambda: obtener_imagen_google_drive(file_id))
+        if entrada is None:
+            break
+        if ancho:
+            original = entrada
+            variante = cache.obtener(
+                f"{file_id}@w{ancho}.{formato}",
+                lambda: _generar_variante_desde(original, ancho, formato),
+            )
+            # Si el original no se pudo redimensionar (no es una imagen que
+            # Pillow lea), se sirve tal cual en vez de fallar.
+            entrada = variante or original
+        try:
+            # conditional=True + etag: responde 304 si el navegador ya tiene
+            # este contenido (If-None-Match), sin reenviar los bytes.
+            response = send_file(
+                entrada.ruta,
+                mimetype=entrada.content_type,
+                etag=entrada.etag,
+                conditional=True,
+                max_age=31536000,
+            )
+        except FileNotFoundError:
+            continue
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        if ancho and not request.args.get('fmt'):
+            response.vary.add('Accept')
+        return response
+
+    logger.error(f"❌ Proxy falló para file_id: {file_id}")
+    return jsonify({'error': 'No se pudo obtener la imagen del servidor de Google'}), 502
 
 @imagenes_bp.route('/limpiar-cache', methods=['POST'])
 @require_role(ROL_ADMINS)
 def limpiar_cache():
     '''Endpoint para limpiar el caché manualmente.'''
-    obtener_imagen_google_drive.cache_clear()
-    return jsonify({'mensaje': 'Caché limpiado exitosamente'}), 200
+    cache = get_cache_imagenes()
+    cache.limpiar()
+    return jsonify({'mensaje': 'Caché limpiado exitosamente', 'stats': cache.stats()}), 200
@@ -2,10 +2,12 @@
 Rutas de inventario.
 Endpoints REST para operaciones de inventario.
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from backend.services.inventario_service import inventario_service, InventarioService
+from backend.services.catalogo_service import CatalogoService
 from backend.core.base_repository import base_repository
 from backend.core.exceptions import AppException
+from backend.utils.cache_manager import publish_table_change
 from backend.utils.auth_middleware import require_role, require_login, ROL_ADMINS, ROL_JEFES, ROL_COMERCIALES
 from datetime import datetime
 import logging
@@ -164,7 +166,10 @@ def registrar_conteo():
                                 ("p_terminado" if codigo.startswith(('FR-', 'MT-')) else "stock_bodega")
                     
                     # CORRECCIÓN: Usar db_productos según modelo SQLAlchemy
-                    base_repository.update_one('db_productos', {"codigo_sistema": codigo}, {col_target: cantidad})
+                    if base_repository.update_one('db_productos', {"codigo_sistema": codigo}, {col_target: cantidad}):
+                        # SQL crudo: el snapshot de catálogo no lo ve por el listener ORM.
+                        CatalogoService.marcar_modificados(codigos=[codigo])
+                        publish_table_change('db_productos')
                     logger.info(f"Stock físico de {codigo} actualizado en {col_target} a {cantidad} (SQL).")
                 except Exception as e_stock:
                     logger.error(f"Error actualizando stock SQL: {e_stock}")
@@ -206,7 +211,9 @@ def registrar_conteo():
         try:
             col_target = "por_pulir" if tipo_stock == "por_pulir" else \
                         ("p_terminado" if codigo.startswith(('FR-', 'MT-')) else "stock_bodega")
-            base_repository.update_one('db_productos', {"codigo_sistema": codigo}, {col_target: cantidad})
+            if base_repository.update_one('db_productos', {"codigo_sistema": codigo}, {col_target: cantidad}):
+                CatalogoService.marcar_modificados(codigos=[codigo])
+                publish_table_change('db_productos')
             logger.info(f"Stock físico de {codigo} actualizado tras 3er conteo (SQL).")
         except Exception as e_stock:
             logger.error(f"Error actualizando stock SQL (3er conteo): {e_stock}")
@@ -287,9 +294,18 @@ def obtener_fichas():
 @inventario_bp.route('/api/productos/listar_v2', methods=['GET'])
 @require_login
 def listar_productos_v2():
-    """Endpoint optimizado para la tabla de inventario con semáforos."""
+    """
+    Endpoint optimizado para la tabla de inventario con semáforos. Sirve el
+    JSON ya codificado del snapshot de catálogo (catalogo_service) con ETag =
+    versión del snapshot: si el navegador ya tiene esa versión, 304 sin cuerpo.
+    """
     try:
-        return jsonify(InventarioService.listar_productos_v2()), 200
+        snapshot = CatalogoService.obtener()
+        response = Response(snapshot.json_v2(), mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        # no-cache: el navegador revalida siempre (ETag), nunca sirve stock viejo sin preguntar.
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"❌ Error en listar_productos_v2 SQL: {e}")
         return jsonify({"success": False, "error": str(e), "detail": "Error en el servidor al listar productos (V2)"}), 500
@@ -327,6 +343,14 @@ def invalidar_cache_endpoint():
         return jsonify({'status': 'error', 'success': False, 'message': str(e)}), 500
 
 
+@inventario_bp.route('/api/cache/estado', methods=['GET'])
+@require_role(ROL_ADMINS)
+def estado_cache_endpoint():
+    """Contadores por namespace de cache_manager (hits, misses, desalojos)."""
+    from backend.utils.cache_manager import get_cache_stats
+    return jsonify({'status': 'success', 'success': True, 'namespaces': get_cache_stats()}), 200
+
+
 @inventario_bp.route('/api/producto/historial/<codigo>', methods=['GET'])
 @require_login
 def obtener_historial_producto(codigo):
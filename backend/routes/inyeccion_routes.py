@@ -1,17 +1,22 @@
 import uuid
 import logging
-from flask import Blueprint, request
+from flask import Blueprint, request, send_file
 from backend.core.sql_database import db
 from backend.core.responses import api_success, api_error
 from backend.utils.auth_middleware import require_role, require_login, ROL_ADMINS, ROL_JEFES, _obtener_usuario_activo
 from backend.services.audit_service import OwnershipMismatchException, ValidadorRequeridoException, TurnoInvalidoException
 from backend.services.inyeccion_service import InyeccionService, LoteInyeccionNoEncontradoException, ProgramacionNoEncontradaException
+from backend.services.reporte_lote_service import ReportesLoteService
 
 logger = logging.getLogger(__name__)
 inyeccion_bp = Blueprint('inyeccion_bp', __name__)
 
 ROLES_INYECCION_ESCRITURA = ROL_ADMINS + ROL_JEFES + ['INYECCION', 'AUXILIAR INVENTARIO', 'INVENTARIO', 'STAFF FRIMETALS', 'CALIDAD', 'SUPERVISOR']
 ROLES_MES_INYECCION = ROL_ADMINS + ROL_JEFES + ['INYECCION', 'ENSAMBLE']
+ROLES_REPORTE_LOTE = ROL_ADMINS + ROL_JEFES + ['INYECCION', 'AUXILIAR INVENTARIO', 'INVENTARIO', 'STAFF FRIMETALS', 'CALIDAD', 'SUPERVISOR']
+
+# Segundos que la descarga espera a un PDF en curso antes de responder 202.
+ESPERA_PDF_LOTE_SEG = 5
 
 
 @inyeccion_bp.route('/api/inyeccion/lote', methods=['POST'])
@@ -60,6 +65,54 @@ def registrar_inyeccion_lote():
         return api_error(str(e), status_code=500)
 
 
+@inyeccion_bp.route('/api/inyeccion/lote/<id_inyeccion>/pdf/estado', methods=['GET'])
+@require_role(ROLES_REPORTE_LOTE)
+def estado_pdf_lote(id_inyeccion):
+    """
+    Estado del PDF del lote en la cola de ReportesLoteService
+    (PENDIENTE / GENERANDO / LISTO / ERROR). 404 si este proceso no lo
+    conoce: /pdf lo vuelve a generar desde la BD.
+    """
+    estado = ReportesLoteService.estado(id_inyeccion)
+    if estado is None:
+        return api_error("No hay PDF encolado para este lote.", status_code=404)
+    return api_success(data=estado)
+
+
+@inyeccion_bp.route('/api/inyeccion/lote/<id_inyeccion>/pdf', methods=['GET'])
+@require_role(ROLES_REPORTE_LOTE)
+def descargar_pdf_lote(id_inyeccion):
+    """
+    Descarga el PDF del lote desde la caché en disco. Si no está (aún en
+    cola, desalojado o proceso reiniciado) lo encola desde db_inyeccion,
+    espera hasta ESPERA_PDF_LOTE_SEG y, si no alcanzó, responde 202 con el
+    estado para que el cliente consulte /pdf/estado.
+    """
+    try:
+        entrada, estado = ReportesLoteService.obtener_pdf(id_inyeccion)
+        if estado is None:
+            return api_error(f"Lote {id_inyeccion} no encontrado.", status_code=404)
+        if entrada is None and estado['estado'] in ('PENDIENTE', 'GENERANDO'):
+            ReportesLoteService.esperar(id_inyeccion, ESPERA_PDF_LOTE_SEG)
+            entrada, estado = ReportesLoteService.obtener_pdf(id_inyeccion)
+        if entrada is None:
+            if estado['estado'] == 'ERROR':
+                return api_error(estado['error'] or "No se pudo generar el PDF.", status_code=500)
+            return api_success(data=estado, status_code=202)
+
+        respuesta = send_file(
+            entrada.ruta, mimetype='application/pdf',
+            as_attachment=True, download_name=estado['archivo'],
+        )
+        respuesta.set_etag(entrada.etag)
+        return respuesta.make_conditional(request)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Error descargando PDF del lote {id_inyeccion}: {e}")
+        return api_error(str(e), status_code=500)
+
+
 @inyeccion_bp.route('/api/inyeccion/iniciar_turno', methods=['POST'])
 @require_role(ROLES_MES_INYECCION)
 def iniciar_turno_inyeccion():
@@ -3,6 +3,8 @@ from flask import Blueprint, request, make_response, current_app
 from backend.core.responses import api_success, api_error
 from backend.models.sql_models import db, Pedido, MetalsPedido, DespachoPedido
 from backend.services.audit_service import AuditService, OwnershipMismatchException
+from backend.core import conexiones_largas
+from backend.services import pedidos_feed
 from backend.config.constants import FALLBACK_OPERARIO
 from sqlalchemy import text
 from backend.core.tenant import get_tenant_from_request
@@ -434,6 +436,53 @@ def obtener_detalle_pedido(id_pedido):
         logger.error(traceback.format_exc())
         return api_error(str(e), status_code=500)
 
+def _delegados_visibles():
+    """
+    Pedidos pendientes que puede ver quien hace la petición: None = todos
+    (roles con visibilidad global o tenant Frimetals), o la lista de nombres
+    de delegado_a de la operaria. Compartido por /api/pedidos/pendientes y
+    su change-feed /api/pedidos/pendientes/cambios.
+    """
+    from backend.services.auth_service import AuthService
+    from backend.utils.auth_middleware import obtener_identidad_segura
+
+    # 1. Determinar tenant para filtrado
+    tenant = get_tenant_from_request()
+
+    # 2. Filtrar por usuario y rol (Lógica RBAC Estricta)
+    # Identidad extraída EXCLUSIVAMENTE de obtener_identidad_segura (JWT o
+    # sesión Flask ya validados por @require_role). El fallback previo a
+    # request.args.get('rol'/'usuario') permitía que cualquier usuario
+    # autenticado con rol bajo (p.ej. ALISTAMIENTO) anexara ?rol=admin a
+    # la URL y viera los pedidos de todos los demás usuarios, saltándose
+    # el filtro por delegado_a -- un query param nunca es una fuente
+    # válida para una decisión de autorización.
+    user_raw, rol_identidad = obtener_identidad_segura(request)
+    rol_session = str(rol_identidad or '').lower().strip()
+
+    # Correspondencia username <-> nombre completo (delegado_a guarda
+    # cualquiera de los dos): cacheada por identidad en AuthService, este
+    # endpoint lo sondean el modo TV y las tablets cada pocos segundos.
+    identidad = AuthService.resolver_identidad(user_raw) or {'username': '', 'nombre_completo': ''}
+    username_user = identidad['username']
+    nombre_completo_user = identidad['nombre_completo']
+
+    # Roles con visibilidad global (Excluyendo 'alistador', 'alistamiento' y 'auxiliar almacen' que son operarias de planta)
+    es_admin = any(x in rol_session for x in [
+        "admin", "administracion", "administrador", "gerencia", 
+        "jefe almacen", "jefe alistamiento", "jefe de planta", "comercial", "metals_staff", "metals_admin"
+    ])
+
+    # 3. Solo lo visible: si no es admin y es Friparts, solo lo que tiene
+    # asignado (filtro por delegado_a en la consulta SQL).
+    if es_admin or tenant == "frimetals":
+        delegados = None
+    else:
+        delegados = [n for n in {username_user, nombre_completo_user} if n]
+    logger.debug(f"DEBUG ALMACEN: Rol detectado: {rol_session}, Usuario normalizado: {username_user} ({nombre_completo_user})")
+    return delegados
+
+
 @pedidos_bp.route('/api/pedidos/pendientes', methods=['GET'])
 @require_role(ROLES_PEDIDOS_INTERNOS)
 def obtener_pedidos_pendientes():
@@ -443,62 +492,17 @@ def obtener_pedidos_pendientes():
     """
     try:
         from backend.repositories.ventas_repository import VentasRepository
-        from backend.models.sql_models import Usuario
-        from backend.utils.auth_middleware import obtener_identidad_segura
-
-        # 1. Obtener datos desde SQL (JOIN incluido)
-        pedidos = VentasRepository.get_pedidos_pendientes()
-
-        # 2. Determinar tenant para filtrado
-        tenant = get_tenant_from_request()
-
-        # 3. Filtrar por usuario y rol (Lógica RBAC Estricta)
-        # Identidad extraída EXCLUSIVAMENTE de obtener_identidad_segura (JWT o
-        # sesión Flask ya validados por @require_role). El fallback previo a
-        # request.args.get('rol'/'usuario') permitía que cualquier usuario
-        # autenticado con rol bajo (p.ej. ALISTAMIENTO) anexara ?rol=admin a
-        # la URL y viera los pedidos de todos los demás usuarios, saltándose
-        # el filtro por delegado_a -- un query param nunca es una fuente
-        # válida para una decisión de autorización.
-        user_raw, rol_identidad = obtener_identidad_segura(request)
-        rol_session = str(rol_identidad or '').lower().strip()
-
-        nombre_completo_user = ""
-        username_user = ""
-        
-        if user_raw:
-            user_raw_str = str(user_raw).strip()
-            # Buscar usuario en BD para normalizar su correspondencia entre username y nombre completo
-            usuario_db = Usuario.query.filter(
-                (Usuario.username.ilike(user_raw_str)) |
-                (Usuario.nombre_completo.ilike(user_raw_str))
-            ).first()
-            if usuario_db:
-                nombre_completo_user = str(usuario_db.nombre_completo or '').strip().upper()
-                username_user = str(usuario_db.username or '').strip().upper()
-            else:
-                username_user = user_raw_str.upper()
 
-        # Roles con visibilidad global (Excluyendo 'alistador', 'alistamiento' y 'auxiliar almacen' que son operarias de planta)
-        es_admin = any(x in rol_session for x in [
-            "admin", "administracion", "administrador", "gerencia", 
-            "jefe almacen", "jefe alistamiento", "jefe de planta", "comercial", "metals_staff", "metals_admin"
-        ])
-
-        filtrados = []
-        for p in pedidos:
-            if es_admin or tenant == "frimetals":
-                filtrados.append(p)
-            else:
-                # Si no es admin y es Friparts, solo ve lo que tiene asignado
-                delegado = str(p.get("delegado_a", "")).strip().upper()
-                if delegado and (delegado == username_user or (nombre_completo_user and delegado == nombre_completo_user)):
-                    filtrados.append(p)
+        # El cursor se toma ANTES de leer: un commit que caiga entre ambos
+        # vuelve a llegar por el change-feed en vez de perderse.
+        cursor = pedidos_feed.cursor_actual()
+        delegados = _delegados_visibles()
+        filtrados = VentasRepository.get_pedidos_pendientes(delegados=delegados)
 
         # 4. DEBUG EN TERMINAL (Solicitado por el usuario)
-        logger.debug(f"DEBUG ALMACEN: Rol detectado: {rol_session}, Usuario normalizado: {username_user} ({nombre_completo_user}), Pedidos totales SQL: {len(pedidos)}, Pedidos filtrados: {len(filtrados)}")
+        logger.debug(f"DEBUG ALMACEN: Pedidos visibles SQL: {len(filtrados)}")
 
-        response = make_response(api_success(data={"pedidos": filtrados}))
+        response = make_response(api_success(data={"pedidos": filtrados, "cursor": cursor}))
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
@@ -508,6 +512,63 @@ def obtener_pedidos_pendientes():
         return api_error(str(e), status_code=500)
 
 
+# Un long-poll retiene un hilo de gunicorn mientras espera: toma del cupo
+# compartido de conexiones largas (backend/core/conexiones_largas.py) y, sin
+# cupo, responde al instante (304 o cambios).
+LONGPOLL_MAX_SEGUNDOS = 25
+
+
+@pedidos_bp.route('/api/pedidos/pendientes/cambios', methods=['GET'])
+@require_role(ROLES_PEDIDOS_INTERNOS)
+def cambios_pedidos_pendientes():
+    """
+    Change-feed de /api/pedidos/pendientes para almacén y modo TV.
+
+    ?desde=<cursor> es el cursor de la última respuesta (listado completo o
+    este mismo endpoint). ?espera=N (máx. LONGPOLL_MAX_SEGUNDOS) retiene la
+    petición hasta que haya cambios (long-poll).
+      - 304 sin cuerpo: nada cambió; no toca la base.
+      - 200 completo=false: `pedidos` trae solo los pedidos pendientes que
+        cambiaron (reemplazan a los del cliente por id_pedido) y
+        `retirados` los que cambiaron y ya no están pendientes o visibles.
+      - 200 completo=true: cursor ajeno o vencido (reinicio del servidor,
+        cliente muy atrasado); `pedidos` es el listado completo.
+    Cada 200 trae el `cursor` a enviar en la próxima llamada.
+    """
+    try:
+        from backend.repositories.ventas_repository import VentasRepository
+
+        desde = request.args.get('desde', '')
+        espera = min(max(request.args.get('espera', 0, type=float) or 0, 0), LONGPOLL_MAX_SEGUNDOS)
+        # Sin cupo de long-poll se responde al instante: el cliente vuelve a
+        # preguntar en su próximo ciclo.
+        long_poll = bool(espera) and conexiones_largas.tomar()
+        try:
+            ids, cursor = pedidos_feed.cambios_desde(desde, espera=espera if long_poll else 0)
+        finally:
+            if long_poll:
+                conexiones_largas.liberar()
+
+        if ids is not None and not ids:
+            response = make_response('', 304)
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        delegados = _delegados_visibles()
+        filtrados = VentasRepository.get_pedidos_pendientes(delegados=delegados, ids_pedido=ids)
+        data = {"cursor": cursor, "completo": ids is None, "pedidos": filtrados}
+        if ids is not None:
+            vigentes = {p['id_pedido'] for p in filtrados}
+            data["retirados"] = sorted(ids - vigentes)
+
+        response = make_response(api_success(data=data))
+        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+        return response
+    except Exception as e:
+        logger.error(f"Error en change-feed de pedidos pendientes: {e}")
+        return api_error(str(e), status_code=500)
+
+
 @pedidos_bp.route('/api/pedidos/delegar', methods=['POST'])
 @require_role(ROL_ADMINS + ROL_COMERCIALES + ['JEFE ALMACEN', 'JEFE ALISTAMIENTO'])
 def delegar_pedido():
@@ -520,6 +581,7 @@ def delegar_pedido():
         if not id_p: return api_error("ID requerido", status_code=400)
 
         Pedido.query.filter_by(id_pedido=id_p).update({"delegado_a": colab})
+        pedidos_feed.marcar_pedidos(db.session, id_p)
         db.session.commit()
         return api_success(message=f"Pedido {id_p} delegado a {colab}")
     except Exception as e:
@@ -741,146 +803,26 @@ def obtener_pedidos_cliente():
 @pedidos_bp.route('/api/pedidos/listar', methods=['GET'])
 @require_role(ROLES_PEDIDOS_INTERNOS)
 def listar_pedidos():
-    """Listado general de pedidos con soporte estricto para FriMetals."""
+    """
+    Listado general de pedidos con soporte estricto para FriMetals.
+    Paginación keyset: ?despues_de=<id_pedido> con el `siguiente` de la
+    página anterior (None = no hay más); ?limite= hasta 200 pedidos (500 con
+    ?search=, que sin limite trae hasta 500).
+    """
     try:
+        from backend.repositories.ventas_repository import VentasRepository
+
         division = request.args.get('division', 'friparts').lower()
         search = request.args.get('search', '').strip().upper()
-        
-        logger.debug(f"🔍 [API] Listando pedidos - División: {division}, Búsqueda: {search}")
+        despues_de = request.args.get('despues_de', '').strip() or None
+        limite = request.args.get('limite', type=int)
 
-        if division == 'frimetals':
-            # Consulta a la tabla metals_pedidos (mapeada en sql_models.py)
-            query = MetalsPedido.query
-            if search:
-                query = query.filter(
-                    (MetalsPedido.id_pedido.ilike(f'%{search}%')) |
-                    (MetalsPedido.cliente.ilike(f'%{search}%'))
-                )
-            
-            # Orden descendente por fecha e id_pedido
-            rows = query.order_by(MetalsPedido.fecha.desc(), MetalsPedido.id_pedido.desc()).limit(200).all()
-            
-            # Agrupación por id_pedido para soportar múltiples ítems por orden
-            ped_map = {}
-            for r in rows:
-                id_p = r.id_pedido
-                if id_p not in ped_map:
-                    # Extraer fecha_creacion real (original) para no usar la fecha_actualizacion masiva de MetalsPedido
-                    # Pedido ya está importado globalmente en la línea 3 — NO re-importar aquí (causa UnboundLocalError)
-                    original = Pedido.query.filter_by(id_pedido=id_p).first()
-                    fecha_orig = original.fecha.strftime('%Y-%m-%d') if original and original.fecha else str(r.fecha)
-
-                    fecha_str_metal = str(r.fecha) if r.fecha else ""
-                    hora_str_metal = str(r.hora or "").strip()
-                    fecha_mod_metal = f"{fecha_str_metal} {hora_str_metal}".strip() if fecha_str_metal else ""
-
-                    ped_map[id_p] = {
-                        "id_pedido": id_p,
-                        "fecha_creacion": fecha_orig,
-                        "fecha": fecha_str_metal,
-                        "fecha_despacho": fecha_mod_metal,
-                        "cliente": r.cliente,
-                        "vendedor": r.vendedor,
-                        "estado": r.estado or "REGISTRADO",
-                        "progreso": r.progreso or 0,
-                        "items_count": 0,
-                        "total": 0,
-                        "productos": []
-                    }
-                
-                ped_map[id_p]["items_count"] += 1
-                ped_map[id_p]["total"] += (r.total or 0)
-                ped_map[id_p]["productos"].append({
-                    "id_codigo": r.id_codigo,
-                    "descripcion": r.descripcion,
-                    "cantidad": r.cantidad or 0,
-                    "precio": r.precio_unitario or 0,
-                    "total": r.total or 0
-                })
-            
-            # Devolver lista de pedidos agrupados
-            return api_success(data={
-                "pedidos": sorted(list(ped_map.values()), key=lambda x: x['id_pedido'], reverse=True)
-            })
+        logger.debug(f"🔍 [API] Listando pedidos - División: {division}, Búsqueda: {search}")
 
-        else:
-            # Lógica estándar FriParts (db_pedidos)
-            if search:
-                query = Pedido.query.filter(
-                    (Pedido.id_pedido.ilike(f'%{search}%')) |
-                    (Pedido.cliente.ilike(f'%{search}%'))
-                )
-                rows = query.order_by(Pedido.id_pedido.desc()).limit(500).all()
-            else:
-                # 1. Obtener los últimos 100 id_pedido únicos
-                ids_result = db.session.query(Pedido.id_pedido).group_by(Pedido.id_pedido).order_by(Pedido.id_pedido.desc()).limit(100).all()
-                lista_de_ids = [r[0] for r in ids_result if r[0]]
-                
-                # 2. Consultar todas las filas (ítems) para esos IDs
-                if lista_de_ids:
-                    rows = Pedido.query.filter(Pedido.id_pedido.in_(lista_de_ids)).order_by(Pedido.id_pedido.desc()).all()
-                else:
-                    rows = []
-            
-            # Obtener todos los id_pedido únicos
-            id_pedidos = list(set([r.id_pedido for r in rows if r.id_pedido]))
-            
-            # Consultar todos los despachos para estos id_pedido
-            despachos = []
-            if id_pedidos:
-                despachos = DespachoPedido.query.filter(DespachoPedido.id_pedido.in_(id_pedidos)).all()
-            
-            # Mapear el último despacho por id_pedido
-            despachos_map = {}
-            for d in despachos:
-                id_p = d.id_pedido
-                if id_p not in despachos_map or d.fecha > despachos_map[id_p].fecha:
-                    despachos_map[id_p] = d
-
-            ped_map = {}
-            for r in rows:
-                id_p = r.id_pedido
-                if not id_p:
-                    continue
-                if id_p not in ped_map:
-                    fecha_str = r.fecha.strftime('%Y-%m-%d') if r.fecha else ""
-                    hora_str = str(r.hora or "").strip()
-                    # Mapear fecha_creacion única e independiente para evitar fallback a Date() en JS
-                    fecha_creacion_final = f"{fecha_str} {hora_str}".strip() if fecha_str else ""
-                    
-                    d_obj = despachos_map.get(id_p)
-                    # Formato seguro %Y-%m-%d %H:%M:%S
-                    fecha_despacho_final = d_obj.fecha.strftime('%Y-%m-%d %H:%M:%S') if d_obj and d_obj.fecha else ""
-                    
-                    # Fallback si no hay registro de despacho (usa la fecha/hora de creación)
-                    if not fecha_despacho_final:
-                        fecha_despacho_final = fecha_creacion_final
-
-                    ped_map[id_p] = {
-                        "id_pedido": id_p,
-                        "fecha_creacion": fecha_creacion_final or fecha_str,
-                        "fecha": fecha_str,
-                        "fecha_despacho": fecha_despacho_final,
-                        "cliente": r.cliente,
-                        "vendedor": r.vendedor,
-                        "estado": r.estado,
-                        "total": 0,
-                        "items_count": 0,
-                        "productos": []
-                    }
-                ped_map[id_p]["items_count"] += 1
-                ped_map[id_p]["total"] += float(r.total or 0)
-                ped_map[id_p]["productos"].append({
-                    "id_codigo": r.id_codigo,
-                    "descripcion": r.descripcion,
-                    "cantidad": float(r.cantidad or 0),
-                    "precio_unitario": float(r.precio_unitario or 0),
-                    "total": float(r.total or 0)
-                })
-            
-            return api_success(data={
-                "pedidos": sorted(list(ped_map.values()), key=lambda x: x['id_pedido'], reverse=True)
-            })
+        pedidos, siguiente = VentasRepository.listar_pedidos(
+            division=division, busqueda=search, despues_de=despues_de, limite=limite
+        )
+        return api_success(data={"pedidos": pedidos, "siguiente": siguiente})
 
     except Exception as e:
         logger.error(f"❌ Error crítico en listar_pedidos: {e}")
@@ -7,6 +7,7 @@ from backend.services.inventario_service import inventario_service
 from backend.repositories.producto_repository import producto_repo, ProductoRepository
 from backend.core.tenant import get_tenant_from_request
 import logging
+import re
 import time # Juan Sebastian: Para manejo de caché
 import os
 from backend.utils.formatters import normalizar_codigo
@@ -14,11 +15,18 @@ from backend.models.sql_models import Producto
 from backend.core.sql_database import db as sql_db
 from backend.utils.auth_middleware import require_login, require_role, ROL_ADMINS, ROL_JEFES
 from backend.utils.cache_manager import cached_route
+from backend.utils.imagen_variantes import urls_variantes
+from backend.services.catalogo_service import CatalogoService
+from backend.services.busqueda_productos_service import BusquedaProductosService
 
 logger = logging.getLogger(__name__)
 
 productos_bp = Blueprint('productos', __name__)
 
+# Tablas que lee /listar (catálogo FriParts + precios + pendientes de pedidos,
+# o metals_productos para FriMetals).
+_TABLAS_PRODUCTOS_LISTAR = ('db_productos', 'db_precio_venta', 'db_pedidos', 'metals_productos')
+
 # Configuración de rutas de imágenes
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 PRODUCTOS_IMG_DIR = os.path.join(BASE_DIR, 'frontend', 'static', 'img', 'productos')
@@ -37,6 +45,87 @@ def resolver_ruta_imagen(imagen_db, codigo_sistema):
             
     return "/static/img/no-image.svg"
 
+# Prefijos de división que se ignoran al cruzar db_productos.id_codigo con
+# db_precio_venta.codigo (mismo patrón que el REGEXP_REPLACE SQL anterior).
+_PREFIJOS_PRECIO = re.compile(r'^(FR-|CAR-|INT-|ENS-|CB-|DE-|HR-|KIT-|AL-)', re.IGNORECASE)
+
+_SQL_PENDIENTES_PEDIDOS = """
+    SELECT id_codigo, SUM(
+        GREATEST(0,
+            COALESCE(NULLIF(REGEXP_REPLACE(CAST(cantidad AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC -
+            COALESCE(NULLIF(REGEXP_REPLACE(CAST(cant_alistada AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC
+        )
+    ) as total_pendiente
+    FROM db_pedidos
+    WHERE estado IN ('PENDIENTE', 'ABIERTO', 'Alistamiento', 'ALISTADO')
+    {filtro}
+    GROUP BY id_codigo
+"""
+
+
+def _ordenar_por_codigo(productos):
+    """Mismo orden que el ORDER BY codigo_sistema anterior (vacíos al final)."""
+    return sorted(productos, key=lambda p: (not p.codigo_sistema, p.codigo_sistema))
+
+
+def _serializar_catalogo(productos, limpiar_precio, incluir_oem=False, catalogo_completo=False):
+    """
+    Items de /listar y /buscar a partir de registros del snapshot de catálogo.
+    Precio: db_precio_venta por código exacto, luego por código sin prefijo
+    (el primero en orden de código), luego db_productos.precio.
+    Con `catalogo_completo` los pendientes se agrupan sin filtrar por código.
+    """
+    from sqlalchemy import text, bindparam
+
+    precios_exactos, precios_norm = {}, {}
+    for codigo, precio in sql_db.session.execute(
+        text("SELECT codigo, precio FROM db_precio_venta ORDER BY codigo")
+    ):
+        if codigo is None:
+            continue
+        precios_exactos.setdefault(codigo, precio)
+        precios_norm.setdefault(_PREFIJOS_PRECIO.sub('', codigo), precio)
+
+    ids = [p.id_codigo for p in productos if p.id_codigo]
+    pendientes = {}
+    if catalogo_completo:
+        pendientes = {r[0]: r[1] for r in sql_db.session.execute(text(_SQL_PENDIENTES_PEDIDOS.format(filtro="")))}
+    elif ids:
+        sql_pend = text(_SQL_PENDIENTES_PEDIDOS.format(filtro="AND id_codigo IN :ids")).bindparams(
+            bindparam('ids', expanding=True)
+        )
+        pendientes = {r[0]: r[1] for r in sql_db.session.execute(sql_pend, {"ids": ids})}
+
+    resultado = []
+    for p in productos:
+        precio_raw = precios_exactos.get(p.id_codigo)
+        if precio_raw is None:
+            precio_raw = precios_norm.get(_PREFIJOS_PRECIO.sub('', p.id_codigo))
+        if precio_raw is None:
+            precio_raw = p.precio
+        item = {
+            "id_codigo": p.id_codigo,
+            "codigo": p.id_codigo, # Alias para compatibilidad
+            "nombre_producto": p.descripcion,
+            "descripcion": p.descripcion, # Alias para compatibilidad
+            "p_terminado": p.p_terminado,
+            "comprometido": p.comprometido,
+            "disponible": p.stock_disponible,
+            "stock_disponible": p.stock_disponible, # Alias para compatibilidad
+            "stock_bodega": p.stock_bodega,
+            "por_pulir": p.por_pulir,
+            "codigo_sistema": p.codigo_sistema,
+            "imagen": resolver_ruta_imagen(p.imagen_db, p.codigo_sistema),
+            "imagen_variantes": urls_variantes(p.imagen),
+        }
+        if incluir_oem:
+            item["oem"] = p.oem
+        item["precio"] = limpiar_precio(precio_raw)
+        item["pedidos_pendientes"] = float(pendientes.get(p.id_codigo) or 0)
+        resultado.append(item)
+    return resultado
+
+
 @productos_bp.route('/detalle/<codigo_sistema>', methods=['GET'])
 @require_login
 def detalle_producto(codigo_sistema):
@@ -119,140 +208,95 @@ def detalle_producto(codigo_sistema):
 @require_login
 def buscar_productos(query):
     """
-    Busca productos uniendo con la tabla de costos (SQL-Native).
-    Permite obtener Stock y Precio en una sola consulta.
+    Busca productos con el índice de búsqueda (busqueda_productos_service),
+    rankeados por coincidencia de código y similitud, y cruza precio y
+    pedidos pendientes solo para los encontrados.
     Si division=frimetals, busca en metals_productos.
     """
     try:
-        from sqlalchemy import text
-        from backend.models.sql_models import MetalsProducto
-
         division = request.args.get('division', '').lower()
         limite = request.args.get('limite', 30, type=int)
-        termino = f"%{query.strip().upper()}%"
 
         # --- Lógica de Switch para FriMetals ---
         if division == 'frimetals':
-            # LINEA CLAVE: Cambio a tabla metals_productos para DBeaver
-            rows = MetalsProducto.query.filter(
-                (MetalsProducto.codigo.ilike(termino)) |
-                (MetalsProducto.descripcion.ilike(termino))
-            ).limit(limite).all()
-            
             resultado = []
-            for r in rows:
-                # Conversión defensiva de precio (que es String en el modelo ahora)
+            for r, _ in BusquedaProductosService.buscar(query, tenant='frimetals', limite=limite):
                 # Simplificado: El campo ahora es INTEGER en DB
-                precio_val = r.precio or 0
-
                 resultado.append({
-                    "codigo": r.codigo,
-                    "descripcion": r.descripcion,
-                    "precio": "{:.2f}".format(precio_val)
+                    "codigo": r['codigo'],
+                    "descripcion": r['descripcion'],
+                    "precio": "{:.2f}".format(r['precio'])
                 })
             return jsonify({'status': 'success', 'success': True, 'items': resultado}), 200
 
-        PREFIX_PATTERN = "'^(FR-|CAR-|INT-|ENS-|CB-|DE-|HR-|KIT-|AL-)'"
-        sql = f"""
-            WITH precios_norm AS (
-                SELECT 
-                    codigo,
-                    precio,
-                    REGEXP_REPLACE(codigo, {PREFIX_PATTERN}, '', 'i') as cod_norm,
-                    ROW_NUMBER() OVER(PARTITION BY REGEXP_REPLACE(codigo, {PREFIX_PATTERN}, '', 'i') ORDER BY codigo) as rn
-                FROM db_precio_venta
-            ),
-            pedidos_cte AS (
-                SELECT id_codigo, SUM(
-                    GREATEST(0, 
-                        COALESCE(NULLIF(REGEXP_REPLACE(CAST(cantidad AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC - 
-                        COALESCE(NULLIF(REGEXP_REPLACE(CAST(cant_alistada AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC
-                    )
-                ) as total_pendiente
-                FROM db_pedidos
-                WHERE estado IN ('PENDIENTE', 'ABIERTO', 'Alistamiento', 'ALISTADO')
-                GROUP BY id_codigo
-            ),
-            productos_base AS (
-                SELECT 
-                    *,
-                    REGEXP_REPLACE(id_codigo, {PREFIX_PATTERN}, '', 'i') as id_norm
-                FROM db_productos
-                WHERE 
-                    id_codigo ILIKE :t OR 
-                    codigo_sistema ILIKE :t OR 
-                    descripcion ILIKE :t OR
-                    oem ILIKE :t
-            )
-            SELECT 
-                p.id_codigo, 
-                p.descripcion as nombre_producto, 
-                p.p_terminado, 
-                p.comprometido, 
-                p.stock_bodega, 
-                p.por_pulir, 
-                p.codigo_sistema, 
-                p.imagen,
-                p.oem,
-                COALESCE(pv1.precio, pv2.precio, p.precio, 0) as precio_raw,
-                COALESCE(ped.total_pendiente, 0) as pedidos_pendientes
-            FROM productos_base p
-            LEFT JOIN db_precio_venta pv1 ON pv1.codigo = p.id_codigo
-            LEFT JOIN precios_norm pv2 ON pv2.cod_norm = p.id_norm AND pv2.rn = 1
-            LEFT JOIN pedidos_cte ped ON ped.id_codigo = p.id_codigo
-            ORDER BY p.codigo_sistema
-            LIMIT :l
-        """
-        
-        result_query = sql_db.session.execute(text(sql), {"t": termino, "l": limite}).mappings().all()
-        
+        productos = [p for p, _ in BusquedaProductosService.buscar(query, limite=limite)]
+
         def limpiar_precio(p_str):
             if not p_str or str(p_str).strip() in ['', 'None']: return 0
             l = str(p_str).replace('$', '').replace('.', '').replace(',', '').strip()
             try: return float(l)
             except: return 0
- 
-        resultado = []
-        for r in result_query:
-            p_term = float(r['p_terminado'] or 0)
-            comp = float(r['comprometido'] or 0)
-            
-            disponible_final = p_term - comp
-            precio_final = limpiar_precio(r['precio_raw'])
-            
-            resultado.append({
-                "id_codigo": r['id_codigo'],
-                "codigo": r['id_codigo'], # Alias para compatibilidad
-                "nombre_producto": r['nombre_producto'],
-                "descripcion": r['nombre_producto'], # Alias para compatibilidad
-                "p_terminado": p_term,
-                "comprometido": comp,
-                "disponible": disponible_final,
-                "stock_disponible": disponible_final, # Alias para compatibilidad
-                "stock_bodega": float(r['stock_bodega'] or 0),
-                "por_pulir": float(r['por_pulir'] or 0),
-                "codigo_sistema": r['codigo_sistema'],
-                "imagen": resolver_ruta_imagen(r['imagen'], r['codigo_sistema']),
-                "oem": r['oem'] or "",
-                "precio": precio_final,
-                "pedidos_pendientes": float(r['pedidos_pendientes'] or 0)
-            })
-            
+
+        resultado = _serializar_catalogo(productos, limpiar_precio, incluir_oem=True)
+
         return jsonify({
             'status': 'success', 'success': True,
             'resultados': resultado
         }), 200
         
     except Exception as e:
-        logger.error(f"❌ Error en búsqueda SQL-JOIN: {e}")
+        logger.error(f"❌ Error en /api/productos/buscar: {e}")
         return jsonify({
             'status': 'error', 'success': False,
             'message': str(e)
         }), 500
 
+
+@productos_bp.route('/busqueda', methods=['GET'])
+@require_login
+def busqueda_productos():
+    """
+    API de búsqueda para los buscadores (inventario, pedidos, PNC):
+    ?q=<término>&limite=<n>&division=frimetals. Tolera errores de tipeo y
+    prefijos (FR-9304 / 9304) y devuelve cada item con su `puntaje`.
+    Solo lee el índice en memoria: no consulta precios ni pedidos.
+    """
+    try:
+        termino = request.args.get('q', '')
+        limite = request.args.get('limite', 20, type=int)
+        tenant = 'frimetals' if request.args.get('division', '').lower() == 'frimetals' else 'friparts'
+
+        items = []
+        for r, puntaje in BusquedaProductosService.buscar(termino, tenant=tenant, limite=limite):
+            if tenant == 'frimetals':
+                items.append({
+                    "codigo": r['codigo'],
+                    "descripcion": r['descripcion'],
+                    "precio": r['precio'],
+                    "puntaje": puntaje,
+                })
+            else:
+                items.append({
+                    "codigo": r.codigo_sistema,
+                    "id_codigo": r.id_codigo,
+                    "descripcion": r.descripcion,
+                    "oem": r.oem,
+                    "stock_disponible": r.stock_disponible,
+                    "imagen": r.imagen,
+                    "imagen_variantes": urls_variantes(r.imagen),
+                    "semaforo": r.semaforo,
+                    "puntaje": puntaje,
+                })
+        return jsonify({'status': 'success', 'success': True, 'items': items}), 200
+
+    except Exception as e:
+        logger.error(f"❌ Error en /api/productos/busqueda: {e}")
+        return jsonify({'status': 'error', 'success': False, 'message': str(e)}), 500
+
+
 @productos_bp.route('/listar', methods=['GET'])
 @require_login
-@cached_route(namespace='productos_listar', ttl=120)
+@cached_route(namespace='productos_listar', ttl=120, tags=_TABLAS_PRODUCTOS_LISTAR)
 def listar_productos():
     """
     Lista todos los productos.
@@ -281,54 +325,10 @@ def listar_productos():
             return jsonify({"items": resultado}), 200
             
         # --- Lógica Estándar (FriParts) ---
-        # JOIN optimizado con CTE para pre-normalización
-        PREFIX_PATTERN = "'^(FR-|CAR-|INT-|ENS-|CB-|DE-|HR-|KIT-|AL-)'"
-        sql = f"""
-            WITH precios_norm AS (
-                SELECT 
-                    codigo,
-                    precio,
-                    REGEXP_REPLACE(codigo, {PREFIX_PATTERN}, '', 'i') as cod_norm,
-                    ROW_NUMBER() OVER(PARTITION BY REGEXP_REPLACE(codigo, {PREFIX_PATTERN}, '', 'i') ORDER BY codigo) as rn
-                FROM db_precio_venta
-            ),
-            pedidos_cte AS (
-                SELECT id_codigo, SUM(
-                    GREATEST(0, 
-                        COALESCE(NULLIF(REGEXP_REPLACE(CAST(cantidad AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC - 
-                        COALESCE(NULLIF(REGEXP_REPLACE(CAST(cant_alistada AS TEXT), '[^0-9.]', '', 'g'), ''), '0')::NUMERIC
-                    )
-                ) as total_pendiente
-                FROM db_pedidos
-                WHERE estado IN ('PENDIENTE', 'ABIERTO', 'Alistamiento', 'ALISTADO')
-                GROUP BY id_codigo
-            ),
-            productos_base AS (
-                SELECT 
-                    *,
-                    REGEXP_REPLACE(id_codigo, {PREFIX_PATTERN}, '', 'i') as id_norm
-                FROM db_productos
-            )
-            SELECT 
-                p.id_codigo, 
-                p.descripcion as nombre_producto, 
-                p.p_terminado, 
-                p.comprometido, 
-                p.stock_bodega, 
-                p.por_pulir, 
-                p.codigo_sistema, 
-                p.imagen,
-                COALESCE(pv1.precio, pv2.precio, p.precio, 0) as precio_raw,
-                COALESCE(ped.total_pendiente, 0) as pedidos_pendientes
-            FROM productos_base p
-            LEFT JOIN db_precio_venta pv1 ON pv1.codigo = p.id_codigo
-            LEFT JOIN precios_norm pv2 ON pv2.cod_norm = p.id_norm AND pv2.rn = 1
-            LEFT JOIN pedidos_cte ped ON ped.id_codigo = p.id_codigo
-            ORDER BY p.codigo_sistema
-        """
-        
-        result_query = sql_db.session.execute(text(sql)).mappings().all()
-        
+        # Productos desde el snapshot de catálogo (catalogo_service); precio de
+        # db_precio_venta y pendientes de db_pedidos se cruzan en memoria.
+        productos = _ordenar_por_codigo(CatalogoService.obtener().productos)
+
         def limpiar_precio(val):
             if val is None or str(val).strip() in ['', 'None']: return 0
             if isinstance(val, (int, float)): return float(val)
@@ -345,32 +345,9 @@ def listar_productos():
                 
             try: return float(s)
             except: return 0
-   
-        resultado = []
-        for r in result_query:
-            p_term = float(r['p_terminado'] or 0)
-            comp = float(r['comprometido'] or 0)
-            
-            disponible_final = p_term - comp
-            precio_final = limpiar_precio(r['precio_raw'])
-            
-            resultado.append({
-                "id_codigo": r['id_codigo'],
-                "codigo": r['id_codigo'], # Alias
-                "nombre_producto": r['nombre_producto'],
-                "descripcion": r['nombre_producto'], # Alias para compatibilidad
-                "p_terminado": p_term,
-                "comprometido": comp,
-                "disponible": disponible_final,
-                "stock_disponible": disponible_final, # Alias para compatibilidad
-                "stock_bodega": float(r['stock_bodega'] or 0),
-                "por_pulir": float(r['por_pulir'] or 0),
-                "codigo_sistema": r['codigo_sistema'],
-                "imagen": resolver_ruta_imagen(r['imagen'], r['codigo_sistema']),
-                "precio": precio_final,
-                "pedidos_pendientes": float(r['pedidos_pendientes'] or 0)
-            })
-            
+
+        resultado = _serializar_catalogo(productos, limpiar_precio, catalogo_completo=True)
+
         return jsonify({"items": resultado}), 200
 
     except Exception as e:
@@ -750,6 +727,9 @@ def sincronizar_precios_wo():
                 logger.warning(f"⚠️ [SincronizarPrecios] Error general en fila ({codigo_raw}): {e_row}")
                 continue
 
+        if actualizados:
+            # UPDATE por SQL crudo: el listener ORM del catálogo no lo ve.
+            CatalogoService.invalidar()
         logger.info(f"✅ [SincronizarPrecios] Completado: {actualizados} actualizados, {omitidos} no encontrados, {errores} errores.")
         return jsonify({
             'success': True,
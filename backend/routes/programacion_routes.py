@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, current_app, request, jsonify, session
+import json
 import logging
+import time
 import traceback
 
+from backend.core import conexiones_largas
+from backend.services import mes_estado
 from backend.services.programacion_service import (
     ProgramacionService,
     ProgramacionNoEncontradaException,
@@ -14,6 +18,17 @@ logger = logging.getLogger(__name__)
 
 ROLES_PLANTA = ROL_ADMINS + ROL_JEFES + ROL_OPERARIOS
 
+# Pantallas de planta con el tablero MES abierto por push (SSE). Cada stream
+# retiene un hilo de gunicorn mientras dura y toma del cupo compartido de
+# conexiones largas; sin cupo, 429 y la pantalla revalida
+# /api/mes/dashboard por ETag (304).
+STREAM_MAX_SEGUNDOS = 300
+STREAM_PING_SEGUNDOS = 15
+
+
+def _evento_sse(cursor, tipo, datos):
+    return f"id: {cursor}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+
 
 # ====================================================================
 # CATÁLOGO DE PLANTA
@@ -85,14 +100,82 @@ def mes_get_programaciones(maquina):
 @programacion_bp.route('/api/mes/dashboard', methods=['GET'])
 @require_role(ROLES_PLANTA)
 def mes_dashboard():
-    """Estado completo de las máquinas (MES)."""
+    """
+    Estado completo de las máquinas (MES). Sirve el JSON ya codificado del
+    tablero en memoria (mes_estado) con ETag = revisión: si la pantalla ya
+    tiene esa revisión, 304 sin cuerpo. Incluye el cursor para /api/mes/stream.
+    """
     try:
-        return jsonify({'maquinas': ProgramacionService.obtener_dashboard_mes()}), 200
+        etag, cuerpo = mes_estado.tablero_json()
+        response = Response(cuerpo, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"❌ Error en mes_dashboard SQL: {e}")
         return jsonify({'maquinas': []}), 200
 
 
+@programacion_bp.route('/api/mes/stream', methods=['GET'])
+@require_role(ROLES_PLANTA)
+def mes_stream():
+    """
+    Server-Sent Events del tablero MES: 'tablero' con todas las máquinas al
+    conectar (o si el cursor ya no sirve) y luego 'maquinas' solo con las que
+    cambiaron. El id de cada evento es el cursor: el navegador lo reenvía en
+    Last-Event-ID al reconectar y solo recibe lo que se perdió. 429 si ya hay
+    ocupado el cupo de conexiones largas: el cliente sigue por
+    /api/mes/dashboard.
+    """
+    if not conexiones_largas.tomar():
+        return jsonify({'success': False, 'error': 'Sin cupo de streaming.', 'usar_polling': True}), 429
+
+    app = current_app._get_current_object()
+    desde = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+
+    def generar(cursor):
+        limite = time.time() + STREAM_MAX_SEGUNDOS
+        espera = 0
+        while time.time() < limite:
+            # Contexto propio por vuelta: el generador corre fuera del request
+            # y la relectura de máquinas marcadas usa db.session.
+            with app.app_context():
+                try:
+                    cambios, nuevo = mes_estado.cambios_desde(cursor, espera=espera)
+                    if cambios is None:
+                        nuevo, maquinas = mes_estado.tablero()
+                except Exception as e:
+                    logger.error(f"❌ Error en mes_stream: {e}")
+                    return
+            if cambios is None:
+                yield _evento_sse(nuevo, 'tablero', {'maquinas': maquinas})
+            elif cambios:
+                yield _evento_sse(nuevo, 'maquinas', {'maquinas': cambios})
+            elif espera:
+                yield ": ping\n\n"
+            cursor, espera = nuevo, STREAM_PING_SEGUNDOS
+
+    respuesta = Response(generar(desde), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    respuesta.call_on_close(conexiones_largas.liberar)
+    return respuesta
+
+
+@programacion_bp.route('/api/mes/estado/reconstruir', methods=['POST'])
+@require_role(ROL_ADMINS + ROL_JEFES)
+def mes_reconstruir_estado():
+    """Reconstruye el tablero MES desde SQL (tras cargas o correcciones hechas fuera de la app)."""
+    try:
+        mes_estado.reconstruir()
+        _, maquinas = mes_estado.tablero()
+        return jsonify({'success': True, 'maquinas': len(maquinas)}), 200
+    except Exception as e:
+        logger.error(f"❌ Error reconstruyendo tablero MES: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @programacion_bp.route('/api/mes/pendientes_calidad', methods=['GET'])
 @require_role(ROLES_PLANTA)
 def mes_get_pendientes_calidad():
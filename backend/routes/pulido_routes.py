@@ -12,6 +12,7 @@ from backend.services.audit_service import AuditService, OwnershipMismatchExcept
 from backend.services.pulido_service import PulidoService
 from backend.services.pausas_service import PausasService
 from backend.utils.time_utils import get_colombia_time
+from backend.utils.cache_manager import publish_table_change
 import uuid
 from datetime import datetime
 import logging
@@ -306,6 +307,7 @@ def _ejecutar_persistencia_pulido(registro, data, responsable, ahora):
         logger.error(f"Error actualizando inventario directo en pulido: {err}")
 
     db.session.commit()
+    publish_table_change('db_pulido', 'db_pnc_pulido', 'db_productos', 'db_trazabilidad_lotes')
     return {
         "success": True, 
         "message": "Registro de pulido sincronizado (Flujo directo)",
@@ -1011,6 +1013,7 @@ def liquidar_lote():
             lotes_procesados += 1
 
         db.session.commit()
+        publish_table_change('db_trazabilidad_lotes')
         logger.info(f"⚡ [Liquidar Lote] Se liquidaron/cerraron {lotes_procesados} referencia(s) de {id_lote} por {responsable} (por_pulir establecido en 0 y estado -> PENDIENTE_VALIDACION).")
         return api_success(message=f"Lote {id_lote} cerrado administrativamente correctamente.")
 
@@ -1184,6 +1187,10 @@ def reporte_masivo():
                             piezas_por_repartir = 0
 
         db.session.commit()
+        publish_table_change(
+            'db_pulido', 'db_pnc_pulido', 'db_productos',
+            'db_trazabilidad_lotes', 'db_distribucion_op_pedidos',
+        )
         return api_success(message=f"Se registraron con éxito {len(items)} reportes del lote.")
 
     except Exception as e:
@@ -1263,6 +1270,7 @@ def registrar_pnc_pulido():
                 prod_pul.cantidad_real = max(0, int(round(cant_bruta - total_pnc)))
 
             db.session.commit()
+            publish_table_change('db_pulido', 'db_pnc_pulido')
             logger.info(f"✅ PNC Pulido registrado para {id_cod} en {id_pulido}: Total={total_pnc}")
             return api_success(data={"total_pnc": total_pnc}, message="PNC de Pulido registrado en db_pnc_pulido")
         else:
@@ -1270,6 +1278,7 @@ def registrar_pnc_pulido():
                 prod_pul.pnc_pulido = 0
                 prod_pul.criterio_pnc_pulido = ""
             db.session.commit()
+            publish_table_change('db_pulido', 'db_pnc_pulido')
             return api_success(data={"total_pnc": 0}, message="Sin defectos de PNC para Pulido")
 
     except Exception as e:
@@ -6,6 +6,7 @@ from flask import Blueprint, request, jsonify, session
 import logging
 
 from backend.services.simulador_service import SimuladorService
+from backend.services.simulador_planificador import PlanificadorSimulador
 from backend.utils.auth_middleware import require_role, ROL_ADMINS
 
 simulador_bp = Blueprint('simulador_bp', __name__)
@@ -14,6 +15,15 @@ logger = logging.getLogger(__name__)
 ROLES_SIMULADOR = ROL_ADMINS + ['JEFE INYECCION']
 
 
+@simulador_bp.route('/api/simulador/grafo/invalidar', methods=['POST'])
+@require_role(ROLES_SIMULADOR)
+def invalidar_grafo():
+    """Relee catálogos (rel_*, db_portamoldes, db_machos) en la próxima consulta,
+    tras editarlos a mano en la BD, sin esperar GRAFO_TTL_SEGUNDOS."""
+    SimuladorService.invalidar_grafo()
+    return jsonify({'success': True}), 200
+
+
 @simulador_bp.route('/api/simulador/snapshot', methods=['POST'])
 @require_role(ROLES_SIMULADOR)
 def cargar_snapshot():
@@ -89,6 +99,49 @@ def sugerir_combo():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+_PESOS_PLANIFICADOR = ('peso_faltante', 'peso_cambio', 'peso_ocio')
+
+
+def _pesos_planificador(pesos):
+    """Pesos del body acotados a [0, 10000]; claves desconocidas se ignoran.
+    Un peso negativo premiaría dejar faltante, cambiar molde o dejar ocio."""
+    if not pesos:
+        return None
+    if not isinstance(pesos, dict):
+        raise ValueError("pesos debe ser un objeto")
+    return {
+        k: max(0.0, min(float(pesos[k]), 10000.0))
+        for k in _PESOS_PLANIFICADOR if pesos.get(k) is not None
+    }
+
+
+@simulador_bp.route('/api/simulador/planificar', methods=['POST'])
+@require_role(ROLES_SIMULADOR)
+def planificar():
+    """Plan de varios días para todas las referencias con brecha.
+    Body (todo opcional): {"dias": 5, "horas_por_dia": 16, "tiempo_max_seg": 2,
+    "horas_cambio": 1.5, "pesos": {"peso_faltante", "peso_cambio", "peso_ocio"},
+    "cargar": false}. Con cargar=true el escenario resultante reemplaza el
+    snapshot inicial del sandbox."""
+    data = request.json or {}
+    try:
+        resultado = PlanificadorSimulador.planificar(
+            dias=max(1, min(int(data.get('dias', 5)), 14)),
+            horas_por_dia=max(1.0, min(float(data.get('horas_por_dia', 16)), 24.0)),
+            tiempo_max_seg=max(0.0, min(float(data.get('tiempo_max_seg', 2)), 10.0)),
+            horas_cambio=max(0.0, min(float(data.get('horas_cambio', 1.5)), 24.0)),
+            pesos=_pesos_planificador(data.get('pesos')),
+            cargar=bool(data.get('cargar')),
+            responsable=session.get('user', 'SISTEMA'),
+        )
+        return jsonify({'success': True, **resultado}), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en planificar: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @simulador_bp.route('/api/simulador/aceptar', methods=['POST'])
 @require_role(ROLES_SIMULADOR)
 def aceptar():
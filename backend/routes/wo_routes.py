@@ -219,6 +219,31 @@ def recibir_comercial():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@wo_bp.route('/api/wo/watermark_comercial', methods=['GET'])
+def watermark_comercial():
+    """
+    Watermark de la sync comercial para el modo delta de
+    agente_wo_comercial.py: la fecha de la última sincronización EXITOSA
+    (la misma que sella recibir_comercial en su último chunk). El agente
+    extrae solo los documentos con fecha >= watermark - ventana y los envía
+    con modo='delta'; null indica que debe hacer una extracción completa.
+    """
+    api_key_header = request.headers.get('X-API-Key') or request.headers.get('X-Sync-Token')
+    api_key_env = os.environ.get('SYNC_TOKEN') or os.environ.get('WO_SYNC_API_KEY')
+
+    if not api_key_env or api_key_header != api_key_env:
+        return jsonify({"success": False, "error": "No autorizado."}), 401
+
+    from backend.core.sql_database import db
+    from backend.models.sql_models import AppConfig
+
+    registro = db.session.get(AppConfig, SYNC_EXITOSA_COMERCIAL_KEY)
+    return jsonify({
+        "success": True,
+        "watermark": registro.valor if registro and registro.valor else None,
+    }), 200
+
+
 # ====================================================================
 # ENDPOINT: DISPARAR SINCRONIZACIÓN AUTOMÁTICA DESDE SERVIDOR LOCAL / PLANTA
 # ====================================================================
@@ -476,13 +501,9 @@ def _bg_procesar_sincronizar_cartera(app, datos_limpios, documentos_vigentes, ca
         try:
             from backend.repositories.ventas_repository import VentasRepository
 
-            BATCH_SIZE = 500
-            procesados_totales = 0
-            for i in range(0, len(datos_limpios), BATCH_SIZE):
-                chunk = datos_limpios[i:i + BATCH_SIZE]
-                procesados = VentasRepository.upsert_cartera_wo(chunk)
-                procesados_totales += procesados
-                logger.info(f"[BG] Procesado chunk {i // BATCH_SIZE + 1} de Cartera: {procesados} registros")
+            # Una sola pasada: upsert_cartera_wo carga por COPY y fusiona en
+            # una sentencia, ya no hace falta trocear en chunks de 500.
+            procesados_totales = VentasRepository.upsert_cartera_wo(datos_limpios)
 
             eliminados = 0
             if caida_anomala:
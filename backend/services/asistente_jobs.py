@@ -0,0 +1,142 @@
+"""
+Jobs del Asistente de Dashboard: cada pregunta corre en segundo plano y el
+cliente lee su progreso por SSE (o por polling).
+
+Antes /api/dashboard/asistente/preguntar ejecutaba AsistenteService.responder
+dentro de la petición: un hilo de gunicorn (hay 4, ver gunicorn.conf.py)
+quedaba bloqueado hasta dos vueltas de 30s a Gemini, y tres o cuatro
+usuarios del asistente a la vez dejaban sin hilos a los formularios de
+planta.
+
+Ahora:
+  - crear_job encola la pregunta en un pool propio de
+    ASISTENTE_MAX_CONCURRENTES hilos (con cola de ASISTENTE_COLA_MAX
+    preguntas; más allá se rechaza con ColaAsistenteLlena). La espera a
+    Gemini ocurre ahí, nunca en un hilo de gunicorn.
+  - El job acumula los eventos de AsistenteService.responder_eventos
+    (estado, tool, texto, fin) con un número de secuencia, así un cliente
+    que se reconecta (Last-Event-ID) o que hace polling retoma donde iba.
+  - Un job terminado se purga JOB_TTL_SEGUNDOS después.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.asistente_service import AsistenteService
+
+logger = logging.getLogger(__name__)
+
+ASISTENTE_MAX_CONCURRENTES = int(os.environ.get("ASISTENTE_MAX_CONCURRENTES", 2))
+ASISTENTE_COLA_MAX = int(os.environ.get("ASISTENTE_COLA_MAX", 10))
+JOB_TTL_SEGUNDOS = 10 * 60
+
+
+class ColaAsistenteLlena(Exception):
+    pass
+
+
+class AsistenteJob:
+    """Eventos de una pregunta en curso; lectores esperan en la condición."""
+
+    def __init__(self, user):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.eventos = []  # [(seq, tipo, datos)], seq desde 1
+        self.terminado = False
+        self.creado_en = time.time()
+        self.terminado_en = None
+        self._cond = threading.Condition()
+
+    def publicar(self, tipo, datos):
+        with self._cond:
+            self.eventos.append((len(self.eventos) + 1, tipo, datos))
+            self._cond.notify_all()
+
+    def terminar(self):
+        with self._cond:
+            self.terminado = True
+            self.terminado_en = time.time()
+            self._cond.notify_all()
+
+    def eventos_desde(self, desde, timeout=0):
+        """
+        (eventos con seq > desde, terminado). Si no hay nada nuevo y el job
+        sigue vivo, espera hasta `timeout` segundos a que llegue algo.
+        """
+        with self._cond:
+            if len(self.eventos) <= desde and not self.terminado and timeout:
+                self._cond.wait_for(lambda: len(self.eventos) > desde or self.terminado, timeout)
+            return self.eventos[desde:], self.terminado
+
+
+_jobs = {}
+_lock = threading.Lock()
+_en_cola = 0
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=ASISTENTE_MAX_CONCURRENTES, thread_name_prefix='asistente-job'
+        )
+    return _executor
+
+
+def _purgar_vencidos():
+    """Requiere _lock tomado."""
+    ahora = time.time()
+    vencidos = [
+        job_id for job_id, job in _jobs.items()
+        if job.terminado and ahora - job.terminado_en > JOB_TTL_SEGUNDOS
+    ]
+    for job_id in vencidos:
+        del _jobs[job_id]
+
+
+def crear_job(app, pregunta, contexto_dashboard, user, user_id, role, tenant):
+    """Registra y encola la pregunta; devuelve el AsistenteJob (ya PENDIENTE)."""
+    global _en_cola
+    job = AsistenteJob(user)
+    with _lock:
+        _purgar_vencidos()
+        if _en_cola >= ASISTENTE_MAX_CONCURRENTES + ASISTENTE_COLA_MAX:
+            raise ColaAsistenteLlena()
+        _en_cola += 1
+        _jobs[job.id] = job
+        executor = _get_executor()
+    job.publicar('estado', {'mensaje': 'En cola...'})
+    executor.submit(_correr, app, job, pregunta, contexto_dashboard, user, user_id, role, tenant)
+    return job
+
+
+def obtener_job(job_id, user):
+    """El job si existe y es de `user` (nadie lee las respuestas de otro)."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None or job.user != user:
+        return None
+    return job
+
+
+def _correr(app, job, pregunta, contexto_dashboard, user, user_id, role, tenant):
+    global _en_cola
+    inicio = time.perf_counter()
+    try:
+        with app.app_context():
+            for tipo, datos in AsistenteService.responder_eventos(
+                pregunta, contexto_dashboard, user, user_id, role, tenant
+            ):
+                job.publicar(tipo, datos)
+    except Exception as e:
+        logger.error(f"[Asistente] Job {job.id} falló: {e}")
+        job.publicar('fin', {'success': False, 'error': 'No fue posible procesar la pregunta.'})
+    finally:
+        with _lock:
+            _en_cola -= 1
+        job.terminar()
+        logger.info(f"[Asistente] Job {job.id} user={user} terminado en {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,107 @@
+"""
+Modelo local (sin red) que reemplaza a Gemini en el Asistente de Dashboard.
+
+Se activa con ASISTENTE_MODELO=local: pruebas offline, desarrollo sin
+GOOGLE_API_KEY y medir la carga del backend sin pagar ni esperar al modelo.
+Imita solo lo que AsistenteService usa del ChatSession de
+google.generativeai: send_message(contenido, stream=..., request_options=...)
+y respuestas/chunks con .candidates[0].content.parts y .text.
+
+Comportamiento deterministico:
+  - Primer mensaje (la pregunta): pide las tools cuyo nombre aparece en la
+    pregunta (todas las palabras de 'stock_critico' -> "stock critico"), con
+    desde/hasta si la pregunta trae fechas YYYY-MM-DD. Sin coincidencias
+    responde con texto y no pide tools.
+  - Mensaje con function_response: redacta un resumen con los campos que
+    devolvio cada tool, en chunks palabra por palabra cuando stream=True.
+"""
+import re
+import time
+import unicodedata
+
+import google.generativeai.protos as genai_protos
+
+_FECHA = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFD', str(texto or '').lower())
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+
+
+class _Candidato:
+    def __init__(self, parts):
+        self.content = genai_protos.Content(role='model', parts=parts)
+
+
+class RespuestaLocal:
+    """Respuesta o chunk con la misma forma que GenerateContentResponse."""
+
+    def __init__(self, parts):
+        self.candidates = [_Candidato(parts)]
+
+    @property
+    def text(self):
+        return ''.join(p.text for p in self.candidates[0].content.parts if p.text)
+
+
+class ChatLocal:
+    def __init__(self, tools=None, system_instruction=None, demora_token=0.0):
+        declaraciones = (tools or [{}])[0].get('function_declarations', []) if tools else []
+        self.tools = {d['name']: d for d in declaraciones}
+        self.system_instruction = system_instruction
+        self.demora_token = demora_token
+        self.history = []
+
+    def send_message(self, contenido, stream=False, request_options=None):
+        if isinstance(contenido, str):
+            parts = self._responder_pregunta(contenido)
+        else:
+            parts = self._responder_datos(contenido)
+        self.history.append(contenido)
+        if not stream:
+            return RespuestaLocal(parts)
+        return self._stream(parts)
+
+    def _stream(self, parts):
+        for part in parts:
+            if not part.text:
+                yield RespuestaLocal([part])
+                continue
+            for palabra in re.findall(r'\S+\s*', part.text):
+                if self.demora_token:
+                    time.sleep(self.demora_token)
+                yield RespuestaLocal([genai_protos.Part(text=palabra)])
+
+    def _responder_pregunta(self, pregunta):
+        texto = _normalizar(pregunta)
+        fechas = _FECHA.findall(pregunta)
+        llamadas = []
+        for nombre, declaracion in self.tools.items():
+            if not all(palabra in texto for palabra in nombre.split('_')):
+                continue
+            propiedades = (declaracion.get('parameters') or {}).get('properties') or {}
+            args = {}
+            if fechas and 'desde' in propiedades:
+                args['desde'] = fechas[0]
+            if len(fechas) > 1 and 'hasta' in propiedades:
+                args['hasta'] = fechas[1]
+            llamadas.append(genai_protos.Part(
+                function_call=genai_protos.FunctionCall(name=nombre, args=args)
+            ))
+        if llamadas:
+            return llamadas
+        return [genai_protos.Part(text='No tengo una consulta disponible para esa pregunta.')]
+
+    def _responder_datos(self, contenido):
+        lineas = []
+        for part in contenido.parts:
+            respuesta = part.function_response
+            datos = dict(respuesta.response)
+            if 'error' in datos:
+                lineas.append(f"- {respuesta.name}: {datos['error']}")
+                continue
+            resultado = datos.get('result')
+            campos = sorted(resultado.keys()) if hasattr(resultado, 'keys') else []
+            lineas.append(f"- {respuesta.name}: {', '.join(campos) or 'sin datos'}")
+        return [genai_protos.Part(text='Resumen (modelo local):\n' + '\n'.join(lineas))]
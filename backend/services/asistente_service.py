@@ -1,10 +1,10 @@
 """
 Orquestacion del Asistente de Dashboard.
 
-Flujo: el usuario pregunta en lenguaje natural -> Gemini elige UNA tool entre
-las ya validadas para su rol (backend.services.asistente_tools) -> el backend
-ejecuta esa tool contra datos reales -> Gemini redacta la respuesta final
-sobre esos datos reales.
+Flujo: el usuario pregunta en lenguaje natural -> Gemini elige una o varias
+tools entre las ya validadas para su rol (backend.services.asistente_tools)
+-> el backend las ejecuta EN PARALELO contra datos reales (pool acotado, ver
+_ejecutar_tools_iter) -> Gemini redacta la respuesta final sobre esos datos reales.
 
 El LLM nunca genera SQL y nunca recibe la identidad del usuario como
 parametro libre: el contexto (user/user_id/role/tenant) siempre lo arma el
@@ -15,10 +15,13 @@ import json
 import time
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
 
 import google.generativeai as genai
 import google.generativeai.protos as genai_protos
 
+from flask import current_app
+
 from backend.services.asistente_tools import tools_visibles_para_rol, ejecutar_tool
 from backend.utils.time_utils import get_colombia_time
 
@@ -30,6 +33,10 @@ if API_KEY:
 
 MODEL_NAME = "gemini-3.1-flash-lite"
 
+# 'gemini' (default) o 'local': modelo deterministico sin red para pruebas
+# offline (backend/services/asistente_modelo_local.py).
+MODELO = os.environ.get("ASISTENTE_MODELO", "gemini").strip().lower()
+
 SYSTEM_INSTRUCTION = """
 Eres el asistente de datos del dashboard de FriTech (fabrica de bujes y componentes plasticos/metalicos).
 Reglas estrictas:
@@ -90,6 +97,83 @@ def _rate_limit_excedido(username):
         return False
 
 
+# ── Ejecucion concurrente de tools ───────────────────────────────────────────
+# El prompt pide 2-3 tools por turno; antes corrian una tras otra y la latencia
+# del asistente era la SUMA de sus queries. Ahora corren en un pool acotado
+# (compartido por todas las preguntas en curso, para no abrir mas conexiones
+# de las que aguanta el pool de SQLAlchemy) y la latencia es la de la mas lenta.
+ASISTENTE_TOOLS_WORKERS = int(os.environ.get("ASISTENTE_TOOLS_WORKERS", 4))
+TOOL_TIMEOUT_SECONDS = 30
+
+_executor_tools = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor_tools():
+    global _executor_tools
+    with _executor_lock:
+        if _executor_tools is None:
+            _executor_tools = ThreadPoolExecutor(
+                max_workers=ASISTENTE_TOOLS_WORKERS, thread_name_prefix='asistente-tool'
+            )
+        return _executor_tools
+
+
+def _ejecutar_en_contexto(app, nombre, args, ctx):
+    """Corre una tool en un hilo del pool con su propio app_context: db.session
+    es por contexto, asi que cada tool usa su propia sesion/conexion y el
+    teardown del contexto la devuelve al pool al terminar."""
+    with app.app_context():
+        return ejecutar_tool(nombre, args, ctx)
+
+
+def _ejecutar_tools_iter(app, llamadas, ctx):
+    """
+    Ejecuta [(nombre, args), ...] en paralelo y genera (indice, nombre,
+    resultado, error) a medida que cada tool termina (para reportar progreso
+    por streaming): resultado es la 4-tupla de ejecutar_tool y error el
+    mensaje para el modelo si la tool fallo (mismo criterio de mensajes que
+    antes: PermissionError/ValueError se explican tal cual, el resto se
+    oculta tras un mensaje generico).
+    """
+    if len(llamadas) == 1:
+        # Una sola tool: se ejecuta en el hilo actual, sin pagar el salto al
+        # pool ni un segundo app_context.
+        nombre, args = llamadas[0]
+        resultado, error = _resultado_tool(nombre, lambda: ejecutar_tool(nombre, args, ctx))
+        yield 0, nombre, resultado, error
+        return
+
+    pool = _get_executor_tools()
+    futuros = {
+        pool.submit(_ejecutar_en_contexto, app, nombre, args, ctx): indice
+        for indice, (nombre, args) in enumerate(llamadas)
+    }
+    pendientes = set(futuros)
+    try:
+        for futuro in as_completed(futuros, timeout=TOOL_TIMEOUT_SECONDS):
+            pendientes.discard(futuro)
+            indice = futuros[futuro]
+            nombre = llamadas[indice][0]
+            resultado, error = _resultado_tool(nombre, futuro.result)
+            yield indice, nombre, resultado, error
+    except FuturesTimeout:
+        for futuro in pendientes:
+            nombre = llamadas[futuros[futuro]][0]
+            logger.error(f"[Asistente] Tool '{nombre}' excedio {TOOL_TIMEOUT_SECONDS}s")
+            yield futuros[futuro], nombre, None, 'No fue posible obtener ese dato en este momento.'
+
+
+def _resultado_tool(nombre, obtener):
+    try:
+        return obtener(), None
+    except (PermissionError, ValueError) as e:
+        return None, str(e)
+    except Exception as e:
+        logger.error(f"[Asistente] Error ejecutando tool '{nombre}': {e}")
+        return None, 'No fue posible obtener ese dato en este momento.'
+
+
 def _json_seguro(valor):
     """Normaliza el resultado de una tool (Decimal/date/etc.) a tipos JSON puros
     antes de mandarlo de vuelta a Gemini o al frontend."""
@@ -107,27 +191,61 @@ def _construir_tools_gemini(role):
     return [{'function_declarations': declarations}]
 
 
+def _partes(respuesta):
+    """Parts del primer candidato de una respuesta/chunk (vacio si no hay)."""
+    try:
+        return list(respuesta.candidates[0].content.parts)
+    except (AttributeError, IndexError):
+        return []
+
+
+def _crear_chat(gemini_tools, system_instruction):
+    if MODELO == 'local':
+        from backend.services.asistente_modelo_local import ChatLocal
+        return ChatLocal(tools=gemini_tools, system_instruction=system_instruction)
+    model = genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        tools=gemini_tools,
+        system_instruction=system_instruction,
+    )
+    return model.start_chat()
+
+
 class AsistenteService:
     @staticmethod
-    def responder(pregunta, contexto_dashboard, user, user_id, role, tenant):
+    def responder_eventos(pregunta, contexto_dashboard, user, user_id, role, tenant):
+        """
+        Generador de eventos (tipo, datos) de una pregunta, para streaming
+        (ver backend/services/asistente_jobs.py):
+          ('estado', {'mensaje'})             -- fase actual
+          ('tool',   {'nombre', 'estado'})    -- 'inicio' / 'fin' / 'error' por tool
+          ('texto',  {'delta'})               -- fragmento de la respuesta del modelo
+          ('fin',    {...})                   -- SIEMPRE el ultimo: el mismo dict que
+                                                 antes devolvia /preguntar (success/error,
+                                                 respuesta, datos, grafica, enlace)
+        """
         pregunta = (pregunta or '').strip()
         if not pregunta:
-            return {'success': False, 'error': 'La pregunta no puede estar vacia.'}
+            yield 'fin', {'success': False, 'error': 'La pregunta no puede estar vacia.'}
+            return
 
-        if not API_KEY:
-            return {'success': False, 'error': 'El asistente no esta configurado (falta GOOGLE_API_KEY).'}
+        if MODELO != 'local' and not API_KEY:
+            yield 'fin', {'success': False, 'error': 'El asistente no esta configurado (falta GOOGLE_API_KEY).'}
+            return
 
         if _rate_limit_excedido(user or 'anon'):
-            return {
+            yield 'fin', {
                 'success': False,
                 'error': 'Has hecho muchas preguntas seguidas. Espera unos minutos e intenta de nuevo.',
             }
+            return
 
         ctx = {'user': user, 'user_id': user_id, 'role': role, 'tenant': tenant}
 
         gemini_tools = _construir_tools_gemini(role)
         if not gemini_tools:
-            return {'success': False, 'error': 'Tu rol no tiene consultas disponibles en el asistente.'}
+            yield 'fin', {'success': False, 'error': 'Tu rol no tiene consultas disponibles en el asistente.'}
+            return
 
         # La empresa opera en hora Colombia (America/Bogota, GMT-5), pero Gemini no
         # tiene forma de saberlo por su cuenta -- sin esto, una pregunta relativa
@@ -143,20 +261,29 @@ class AsistenteService:
                 f"Si la pregunta no especifica fechas, usa ese rango."
             )
 
+        yield 'estado', {'mensaje': 'Analizando la pregunta...'}
+
+        # Ambas vueltas al modelo van en streaming: el texto se reenvia al
+        # cliente a medida que llega. Las function_call de la primera vuelta
+        # se acumulan y se ejecutan al terminar de leerla.
+        texto = []
+        function_calls = []
         try:
-            model = genai.GenerativeModel(
-                model_name=MODEL_NAME,
-                tools=gemini_tools,
-                system_instruction=SYSTEM_INSTRUCTION + contexto_txt,
-            )
-            chat = model.start_chat()
+            chat = _crear_chat(gemini_tools, SYSTEM_INSTRUCTION + contexto_txt)
             # Timeout explícito: sin él, una respuesta lenta/colgada de Gemini
-            # inmoviliza uno de los threads del worker gunicorn indefinidamente
-            # (ver gunicorn.conf.py -- worker_class='gthread', threads=4).
-            response = chat.send_message(pregunta, request_options={"timeout": 30})
+            # inmoviliza indefinidamente uno de los hilos del pool de jobs
+            # (ver asistente_jobs.ASISTENTE_MAX_CONCURRENTES).
+            for chunk in chat.send_message(pregunta, stream=True, request_options={"timeout": 30}):
+                for p in _partes(chunk):
+                    if p.function_call and p.function_call.name:
+                        function_calls.append(p.function_call)
+                    elif p.text:
+                        texto.append(p.text)
+                        yield 'texto', {'delta': p.text}
         except Exception as e:
             logger.error(f"[Asistente] Error llamando a Gemini: {e}")
-            return {'success': False, 'error': 'No fue posible contactar al asistente en este momento.'}
+            yield 'fin', {'success': False, 'error': 'No fue posible contactar al asistente en este momento.'}
+            return
 
         tool_usado = []
         datos_por_tool = {}
@@ -165,17 +292,29 @@ class AsistenteService:
         enlace_sugerido = None
 
         try:
-            parts = response.candidates[0].content.parts
-            function_calls = [p.function_call for p in parts if p.function_call and p.function_call.name]
-
             if function_calls:
-                response_parts = []
+                llamadas = []
                 for fc in function_calls:
-                    nombre = fc.name
                     args = dict(fc.args) if fc.args else {}
-                    logger.info(f"[Asistente] user={user} role={role} tool={nombre} args={args}")
-                    try:
-                        datos, grafica_tool, serie_tool, enlace_tool = ejecutar_tool(nombre, args, ctx)
+                    logger.info(f"[Asistente] user={user} role={role} tool={fc.name} args={args}")
+                    llamadas.append((fc.name, args))
+                    yield 'tool', {'nombre': fc.name, 'estado': 'inicio'}
+                yield 'estado', {'mensaje': 'Consultando datos...'}
+
+                respuestas = [None] * len(llamadas)
+                app = current_app._get_current_object()
+                for indice, nombre, resultado, error in _ejecutar_tools_iter(app, llamadas, ctx):
+                    respuestas[indice] = (nombre, resultado, error)
+                    yield 'tool', {'nombre': nombre, 'estado': 'error' if error is not None else 'fin'}
+
+                # Los datos se consolidan en el orden en que el modelo pidio las
+                # tools (no en el que terminaron), igual que antes.
+                response_parts = []
+                for nombre, resultado, error in respuestas:
+                    if error is not None:
+                        payload = {'error': error}
+                    else:
+                        datos, grafica_tool, serie_tool, enlace_tool = resultado
                         datos = _json_seguro(datos)
                         tool_usado.append(nombre)
                         datos_por_tool[nombre] = datos
@@ -186,26 +325,31 @@ class AsistenteService:
                         if enlace_tool and not enlace_sugerido:
                             enlace_sugerido = enlace_tool
                         payload = {'result': datos}
-                    except PermissionError as e:
-                        payload = {'error': str(e)}
-                    except ValueError as e:
-                        payload = {'error': str(e)}
-                    except Exception as e:
-                        logger.error(f"[Asistente] Error ejecutando tool '{nombre}': {e}")
-                        payload = {'error': 'No fue posible obtener ese dato en este momento.'}
 
                     response_parts.append(genai_protos.Part(
                         function_response=genai_protos.FunctionResponse(name=nombre, response=payload)
                     ))
 
-                response = chat.send_message(genai_protos.Content(parts=response_parts))
+                yield 'estado', {'mensaje': 'Redactando la respuesta...'}
+                # El texto previo a las function_call (si lo hubo) era relleno
+                # del modelo; la respuesta final es la de esta segunda vuelta.
+                texto = []
+                yield 'texto', {'reiniciar': True, 'delta': ''}
+                for chunk in chat.send_message(
+                    genai_protos.Content(parts=response_parts), stream=True, request_options={"timeout": 30}
+                ):
+                    for p in _partes(chunk):
+                        if p.text:
+                            texto.append(p.text)
+                            yield 'texto', {'delta': p.text}
 
-            texto_final = (response.text or '').strip()
+            texto_final = ''.join(texto).strip()
         except Exception as e:
             logger.error(f"[Asistente] Error procesando respuesta de Gemini: {e}")
-            return {'success': False, 'error': 'El asistente no pudo generar una respuesta.'}
+            yield 'fin', {'success': False, 'error': 'El asistente no pudo generar una respuesta.'}
+            return
 
-        return {
+        yield 'fin', {
             'success': True,
             'respuesta': texto_final or 'No tengo una respuesta para esa pregunta.',
             'tool_usado': tool_usado,
@@ -8,6 +8,7 @@ principal contra inyeccion: el modelo elige QUE tool llamar y con que
 argumentos, pero el SQL que se ejecuta ya estaba escrito y probado de antemano.
 """
 import calendar
+import json
 import logging
 import unicodedata
 from datetime import datetime
@@ -22,11 +23,16 @@ from backend.services.programacion_service import ProgramacionService
 from backend.services import nomina_service
 from backend.models.sql_models import Pedido, Producto, ProgramacionEnsamble
 from backend.utils.auth_middleware import ROL_ADMINS, ROL_COMERCIALES, ROL_JEFES
+from backend.utils.cache_manager import get_cache, tenant_tag
 
 logger = logging.getLogger(__name__)
 
 ROL_TODOS = ROL_ADMINS + ROL_COMERCIALES + ROL_JEFES
 
+# Tablas de las que dependen las tools (tags de caché, ver _datos_tool).
+_TABLAS_PRODUCCION = ('db_inyeccion', 'db_pulido', 'db_ensambles')
+_TABLAS_PNC = ('db_pnc_inyeccion', 'db_pnc_pulido', 'db_pnc_ensamble')
+
 
 def _fecha(valor):
     """Valida que un parametro de fecha tenga forma YYYY-MM-DD; si no, lo descarta."""
@@ -617,6 +623,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_ventas_periodo,
+        'cache_ttl': 120,
+        'tablas': _TABLAS_PRODUCCION + ('db_ventas', 'db_pedidos', 'db_mezcla', 'db_costos', 'db_productos'),
         'tipo_grafica': None,
         # Antes apuntaba a 'dashboard' sin seccion: si el usuario ya estaba en el
         # dashboard el boton no hacia nada visible. Apunta a la seccion real
@@ -649,6 +657,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_comparativo_mensual,
+        'cache_ttl': 300,
+        'tablas': ('db_ventas', 'db_pedidos', 'resumen_ventas_mensual'),
         # 'bar' en vez de 'line': cuando la pregunta acota a un solo mes (caso mas
         # comun: "cuanto vendimos en julio"), una linea de 1 solo punto no se ve
         # (no hay 2do punto para trazar la linea) -- ver _serie_comparativo_mensual.
@@ -680,6 +690,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_ADMINS + ROL_COMERCIALES,
         'handler': _tool_desglose_ventas_mensual,
+        'cache_ttl': 300,
+        'tablas': ('db_ventas', 'db_cliente_equivalencias', 'resumen_ventas_cliente_producto'),
         'tipo_grafica': 'bar',
         'serie_grafica': _serie_desglose_ventas_mensual,
         'enlace': _enlace('dashboard', 'Ver desglose de ventas', 'dashboard-section-jefatura'),
@@ -697,6 +709,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_ADMINS + ROL_COMERCIALES,
         'handler': _tool_backorder_cliente,
+        'cache_ttl': 120,
+        'tablas': ('db_pedidos', 'db_despachos_pedido', 'db_ventas'),
         'tipo_grafica': 'table',
         'enlace': _enlace('dashboard', 'Ver Backorder', 'dashboard-section-incumplimiento'),
     },
@@ -718,6 +732,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_ranking_operarios,
+        'cache_ttl': 120,
+        'tablas': ('db_inyeccion', 'db_pulido', 'db_pnc_inyeccion', 'db_pnc_pulido', 'db_costos'),
         'tipo_grafica': 'bar',
         'serie_grafica': _serie_ranking_operarios,
         'enlace': _enlace('dashboard', 'Ver ranking de operarios', 'dashboard-section-pulido-kpis'),
@@ -727,6 +743,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_TODOS,
         'handler': _tool_produccion_por_maquina,
+        'cache_ttl': 120,
+        'tablas': ('db_inyeccion',),
         'tipo_grafica': 'bar',
         'serie_grafica': _serie_produccion_por_maquina,
         'enlace': _enlace('dashboard', 'Ver producción por máquina', 'dashboard-section-inyeccion'),
@@ -744,6 +762,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_scrap_detalle,
+        'cache_ttl': 120,
+        'tablas': _TABLAS_PNC,
         'tipo_grafica': 'table',
         'enlace': _enlace('dashboard', 'Ver tendencia de scrap', 'dashboard-section-tendencia'),
     },
@@ -759,6 +779,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_productos_sin_rotacion,
+        'cache_ttl': 600,
+        'tablas': ('db_productos', 'db_ventas'),
         'tipo_grafica': 'table',
         'enlace': _enlace('dashboard', 'Ver productos sin rotación', 'dashboard-section-sin-rotacion'),
     },
@@ -772,6 +794,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_ADMINS + ROL_COMERCIALES,
         'handler': _tool_cartera_estado,
+        'cache_ttl': 300,
+        'tablas': ('cartera_wo',),
         'tipo_grafica': 'bar',
         'serie_grafica': _serie_cartera_estado,
         'enlace': _enlace('cartera', 'Ver módulo de Cartera'),
@@ -788,6 +812,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_pnc_metricas,
+        'cache_ttl': 300,
+        'tablas': _TABLAS_PNC + _TABLAS_PRODUCCION + ('db_costos',),
         'tipo_grafica': 'table',
         'enlace': _enlace('pnc', 'Ver módulo de PNC'),
     },
@@ -802,6 +828,8 @@ TOOLS = {
         },
         'allowed_roles': ROL_TODOS,
         'handler': _tool_stock_producto,
+        'cache_ttl': 30,
+        'tablas': ('db_productos',),
         'tipo_grafica': None,
         'enlace': _enlace('inventario', 'Ver Inventario'),
     },
@@ -810,6 +838,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_TODOS,
         'handler': _tool_stock_critico,
+        'cache_ttl': 60,
+        'tablas': ('db_productos',),
         'tipo_grafica': 'table',
         'enlace': _enlace('inventario', 'Ver Inventario'),
     },
@@ -832,6 +862,10 @@ TOOLS = {
         },
         'allowed_roles': ROL_ADMINS + ROL_COMERCIALES,
         'handler': _tool_analitica_comercial,
+        'cache_ttl': 600,
+        'tablas': ('db_ventas', 'db_clientes', 'db_usuarios', 'resumen_ventas_cliente_producto', 'resumen_ventas_mensual'),
+        # La vista depende de quien pregunta (vendedor ve solo lo suyo).
+        'cache_por_usuario': True,
         'tipo_grafica': 'line',
         'serie_grafica': _serie_analitica_comercial,
         'enlace': _enlace('comercial-historico', 'Ver Analítica Comercial'),
@@ -841,6 +875,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_ADMINS,
         'handler': _tool_nomina_consolidado,
+        'cache_ttl': 60,
+        'tablas': ('db_asistencia', 'db_cortes_nomina'),
         'tipo_grafica': 'table',
         'enlace': _enlace('asistencia', 'Ver módulo de Asistencia'),
     },
@@ -849,6 +885,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_ADMINS + ROL_JEFES,
         'handler': _tool_pedidos_pendientes_facturacion,
+        'cache_ttl': 60,
+        'tablas': ('db_pedidos',),
         'tipo_grafica': 'table',
         'enlace': _enlace('facturacion', 'Ver módulo de Facturación'),
     },
@@ -857,6 +895,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_ADMINS + ROL_JEFES,
         'handler': _tool_alertas_abastecimiento,
+        'cache_ttl': 60,
+        'tablas': ('db_productos',),
         'tipo_grafica': 'bar',
         'serie_grafica': _serie_alertas_abastecimiento,
         'enlace': _enlace('inventario', 'Ver módulo de Inventario'),
@@ -866,6 +906,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_TODOS,
         'handler': _tool_programacion_maquinas,
+        'cache_ttl': 30,
+        'tablas': ('db_programacion', 'db_inyeccion', 'db_maquinas'),
         'tipo_grafica': 'table',
         'enlace': _enlace('inyeccion', 'Ver Inyección (MES)'),
     },
@@ -874,6 +916,8 @@ TOOLS = {
         'parameters': {'type': 'object', 'properties': {}, 'required': []},
         'allowed_roles': ROL_TODOS,
         'handler': _tool_ensamble_tareas_pendientes,
+        'cache_ttl': 60,
+        'tablas': ('db_programacion_ensamble',),
         'tipo_grafica': 'table',
         'enlace': _enlace('ensamble', 'Ver módulo de Ensamble'),
     },
@@ -891,6 +935,55 @@ def tools_visibles_para_rol(role):
     }
 
 
+def _llave_params(params):
+    """Args normalizados para la llave de caché: sin vacíos, strings sin
+    espacios sobrantes y orden de claves estable. Así 'desde': '' y la
+    ausencia de 'desde' (mismo resultado del handler) comparten entrada."""
+    limpios = {}
+    for clave, valor in params.items():
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor in (None, ''):
+            continue
+        limpios[clave] = valor
+    return json.dumps(limpios, sort_keys=True, default=str)
+
+
+def _datos_tool(nombre, tool, params, ctx, role_norm):
+    """
+    Resultado del handler, cacheado por (tool, args normalizados, tenant,
+    alcance de rol) en un namespace propio por tool ('asistente_tool:<nombre>')
+    con el TTL corto de esa tool. Cada entrada lleva como tags las tablas que
+    lee la tool y su tenant: publish_table_change() la desaloja apenas cambian
+    los datos, y el TTL acota lo que escriben procesos externos sin publicar
+    evento (sincronización de WO, SQL manual).
+
+    El alcance es el rol normalizado (ya autorizado arriba); las tools cuya
+    respuesta depende de QUIEN pregunta (cache_por_usuario) agregan además el
+    user_id, para que un vendedor nunca reciba la vista cacheada de otro.
+    """
+    ttl = tool.get('cache_ttl')
+    if not ttl:
+        return tool['handler'](params, ctx)
+
+    tenant = ctx.get('tenant')
+    alcance = (role_norm, ctx.get('user_id') if tool.get('cache_por_usuario') else None)
+    llave = (_llave_params(params), tenant, alcance)
+    cache = get_cache(f'asistente_tool:{nombre}', maxsize=64, ttl=ttl)
+
+    datos = cache.get(llave)
+    if datos is not None:
+        logger.debug(f"[Asistente] Cache hit tool={nombre}")
+        return datos
+
+    datos = tool['handler'](params, ctx)
+    tags = set(tool.get('tablas') or ())
+    if tenant:
+        tags.add(tenant_tag(tenant))
+    cache.set(llave, datos, tags=tags)
+    return datos
+
+
 def ejecutar_tool(nombre, params, ctx):
     """Valida rol + existencia y ejecuta el handler real. ctx = {user, user_id, role, tenant}.
     Retorna (datos, tipo_grafica, serie_grafica, enlace). serie_grafica ya viene con el campo
@@ -906,7 +999,7 @@ def ejecutar_tool(nombre, params, ctx):
     if not _rol_autorizado(role_norm, tool['allowed_roles']):
         raise PermissionError(f"El rol actual no tiene acceso a la consulta '{nombre}'.")
 
-    datos = tool['handler'](params or {}, ctx)
+    datos = _datos_tool(nombre, tool, params or {}, ctx, role_norm)
 
     serie = None
     extractor = tool.get('serie_grafica')
@@ -14,9 +14,26 @@ from sqlalchemy import or_
 from werkzeug.security import generate_password_hash, check_password_hash
 from backend.core.sql_database import db
 from backend.models.sql_models import Usuario
+from backend.utils.cache_manager import get_cache, publish_table_change
 
 logger = logging.getLogger(__name__)
 
+TABLA_USUARIOS = 'db_usuarios'
+
+# Identidad normalizada (username / nombre completo / rol en mayúsculas) por
+# el `user` que trae el JWT o la sesión. Los endpoints que sondean cada pocos
+# segundos (pedidos pendientes en modo TV y tablets de almacén) resolvían esa
+# identidad con un ILIKE sobre db_usuarios en cada petición. Se invalida de
+# forma explícita desde este servicio (invalidar_identidad) al crear o
+# modificar cuentas y en cada login; el TTL solo acota cambios hechos a mano
+# en la BD.
+_IDENTIDAD_TTL_SEGUNDOS = 600
+_TAG_USUARIO_PREFIX = 'usuario:'
+
+
+def _cache_identidades():
+    return get_cache('identidad_usuario', maxsize=1024, ttl=_IDENTIDAD_TTL_SEGUNDOS)
+
 
 class UsuarioNoEncontradoException(Exception):
     """El usuario/cliente buscado no existe."""
@@ -194,6 +211,50 @@ class AuthService:
 
         return datos
 
+    @staticmethod
+    def resolver_identidad(user_raw):
+        """
+        Identidad normalizada de `user_raw` (username o nombre completo, tal
+        como llega del JWT/sesión): dict con 'username', 'nombre_completo' y
+        'rol' en mayúsculas sin espacios sobrantes. Si no existe en
+        db_usuarios (operarios legados), username es el propio valor recibido
+        y el resto queda vacío. None si no hay identidad.
+        """
+        llave = str(user_raw or '').strip()
+        if not llave:
+            return None
+        cache = _cache_identidades()
+        identidad = cache.get(llave.upper())
+        if identidad is not None:
+            return identidad
+
+        usuario_db = Usuario.query.filter(
+            (Usuario.username.ilike(llave)) | (Usuario.nombre_completo.ilike(llave))
+        ).first()
+        if usuario_db:
+            identidad = {
+                'username': str(usuario_db.username or '').strip().upper(),
+                'nombre_completo': str(usuario_db.nombre_completo or '').strip().upper(),
+                'rol': str(usuario_db.rol or '').strip().upper(),
+            }
+        else:
+            identidad = {'username': llave.upper(), 'nombre_completo': '', 'rol': ''}
+
+        cache.set(llave.upper(), identidad, tags=(TABLA_USUARIOS, _TAG_USUARIO_PREFIX + identidad['username']))
+        return identidad
+
+    @staticmethod
+    def invalidar_identidad(username=None):
+        """
+        Desaloja la identidad cacheada de `username` (todas las llaves con que
+        se resolvió: username o nombre completo). Sin username, desaloja todas
+        (alta de cuentas: un nombre antes desconocido puede pasar a existir).
+        """
+        if username:
+            _cache_identidades().invalidate_tags([_TAG_USUARIO_PREFIX + str(username).strip().upper()])
+        else:
+            publish_table_change(TABLA_USUARIOS)
+
     @staticmethod
     def login_metals(usuario_nombre, password):
         """
@@ -224,6 +285,7 @@ class AuthService:
             db.session.rollback()
             logger.error(f"Error en login_metals actualizando ultimo_acceso ({usuario_nombre}): {e}")
             raise
+        AuthService.invalidar_identidad(user.username)
 
         pwa_token = AuthService._generar_pwa_token(user.username, rol_upper)
 
@@ -295,6 +357,7 @@ class AuthService:
             db.session.rollback()
             logger.error(f"Error en login_staff actualizando ultimo_acceso ({usuario_nombre}): {e}")
             raise
+        AuthService.invalidar_identidad(user.username)
 
         rol_display = "ADMIN" if user.rol.lower() in ['admin', 'administrador', 'administracion'] else user.rol.capitalize()
         pwa_token = AuthService._generar_pwa_token(user.username, rol_display)
@@ -340,6 +403,7 @@ class AuthService:
             db.session.rollback()
             logger.error(f"Error creando cliente SQL ({email}): {e}")
             raise
+        AuthService.invalidar_identidad()
 
         return {"password_temporal": nit}
 
@@ -423,6 +487,7 @@ class AuthService:
             db.session.rollback()
             logger.error(f"Error en el registro público de cliente ({email}): {e}")
             raise
+        AuthService.invalidar_identidad()
 
     @staticmethod
     def cambiar_password_cliente(email, old_password, new_password):
@@ -491,5 +556,6 @@ class AuthService:
             db.session.rollback()
             logger.error(f"Error cambiando estado de cliente ({email}): {e}")
             raise
+        AuthService.invalidar_identidad(user.username)
 
         return {"activo": user.activo}
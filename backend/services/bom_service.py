@@ -3,17 +3,47 @@ Servicio de Explosión de Materiales (BOM – Bill of Materials) SQL-Native.
 
 Calcula los descuentos de inventario para un ensamble/kit a partir
 de la ficha técnica definida en la tabla nueva_ficha_maestra de PostgreSQL.
+
+Índice compilado de la ficha (IndiceBom): antes cada explosión probaba
+hasta seis consultas en cascada a FichaMaestra (prefijos ILIKE, exactas y
+un barrido por sub-partes) y traducía cada componente con
+traducir_codigo_componente en cada llamada. Ahora la ficha se lee UNA vez
+por proceso y se compila:
+  - líneas por producto con el código de inventario ya traducido,
+  - claves en MAYÚSCULAS ordenadas para resolver los prefijos ILIKE con
+    bisect en vez de recorrer la tabla,
+  - y un memo código de kit -> explosión resuelta, así el kit ya visto se
+    resuelve en O(1).
+La cascada de intentos es la misma de antes (mismo orden, mismo resultado).
+El índice se descarta al confirmarse un cambio de FichaMaestra por ORM, con
+publish_table_change('nueva_ficha_maestra') para cargas por SQL crudo, y
+cada BOM_INDICE_TTL_SEGUNDOS como red de seguridad ante ediciones manuales.
 """
 import re
+import time
+import bisect
 import logging
+import threading
+from itertools import chain
 from typing import List, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from backend.models.sql_models import FichaMaestra
-from backend.core.sql_database import db
+from backend.core.sql_database import db, rollback_seguro
+from backend.utils.cache_manager import subscribe_table_changes
 
 logger = logging.getLogger(__name__)
 
 from backend.utils.formatters import normalizar_codigo
 
+TABLA_FICHA = 'nueva_ficha_maestra'
+BOM_INDICE_TTL_SEGUNDOS = 600
+# Tope del memo de kits resueltos (códigos consultados, incluidos los que no
+# tienen ficha); al llenarse se vacía y se vuelve a poblar con el uso.
+BOM_MEMO_MAX = 5000
+
 # ──────────────────────────────────────────────
 #  Traducción de código de componente
 # ──────────────────────────────────────────────
@@ -44,6 +74,183 @@ def traducir_codigo_componente(codigo_raw: str) -> str:
 
     return codigo_norm
 
+# ──────────────────────────────────────────────
+#  Índice compilado de la ficha maestra
+# ──────────────────────────────────────────────
+class IndiceBom:
+    """Ficha maestra compilada: líneas por producto y resolución memoizada de kits."""
+
+    def __init__(self, filas):
+        # producto (tal como está en la ficha) -> [(id, codigo_ficha, codigo_inventario, cantidad)]
+        self.lineas = {}
+        for id_fila, producto, subproducto, cantidad in filas:
+            if producto is None:
+                continue
+            subpro_raw = str(subproducto).strip()
+            # Normalización para el cruce: primera palabra de la receta
+            self.lineas.setdefault(producto, []).append((
+                id_fila, subpro_raw, traducir_codigo_componente(subpro_raw.split(' ')[0]), float(cantidad or 0)
+            ))
+        self._claves = sorted((p.upper(), p) for p in self.lineas)
+        self._claves_upper = [k for k, _ in self._claves]
+        # Código exacto (primera palabra sin prefijo de división) -> productos,
+        # incluidas las sub-recetas CB: explosión multinivel del MRP.
+        self._por_codigo = {}
+        for producto in self.lineas:
+            primera = str(producto).strip().split(' ')[0]
+            self._por_codigo.setdefault(normalizar_codigo(primera), []).append(producto)
+        self._memo = {}
+        self.construido_en = time.time()
+
+    def _con_prefijo(self, prefijo):
+        """Productos que empiezan por `prefijo` sin distinguir mayúsculas (ILIKE 'prefijo%')."""
+        prefijo = prefijo.upper()
+        i = bisect.bisect_left(self._claves_upper, prefijo)
+        encontrados = []
+        while i < len(self._claves) and self._claves_upper[i].startswith(prefijo):
+            encontrados.append(self._claves[i][1])
+            i += 1
+        return encontrados
+
+    def _exactos(self, *codigos):
+        return [c for c in dict.fromkeys(codigos) if c in self.lineas]
+
+    def _productos_del_kit(self, codigo_kit, codigo_norm, codigo_limpio):
+        # Intento 1: Exacto con prefijo FR- (ej. "FR-9380", "FR-9380 ")
+        # Intento 2: Exacto sin prefijo (ej. "9380")
+        # Intento 3: Coincidencia exacta con código normalizado original
+        # Intento 4: Empieza con el código normalizado (ej: CAR9609%, INT9722%)
+        # Intento 5: Empieza con el código limpio (ej: 9609%, 9722%)
+        for intento in (
+            lambda: self._con_prefijo(f"FR-{codigo_limpio}"),
+            lambda: self._exactos(codigo_limpio),
+            lambda: self._exactos(codigo_kit, codigo_norm),
+            lambda: self._con_prefijo(codigo_norm),
+            lambda: self._con_prefijo(codigo_limpio),
+        ):
+            productos = intento()
+            if productos:
+                return productos
+
+        # Intento 6: Búsqueda inteligente por sub-partes de códigos compuestos (ej: CAR9723 -> CAR9722-9723)
+        limpio_upper = codigo_limpio.upper()
+        return [
+            original for upper, original in self._claves
+            if limpio_upper in upper
+            and (codigo_limpio in original.strip().split(' ')[0] or codigo_norm in original.strip().split(' ')[0])
+        ]
+
+    def resolver(self, codigo_kit):
+        """
+        Explosión por unidad de un kit: dict con 'kit' (código normalizado),
+        'componentes' [(codigo_ficha, codigo_inventario, cantidad_por_kit)] y
+        'error' (None si hay componentes). Memoizada por código de kit.
+        """
+        resuelto = self._memo.get(codigo_kit)
+        if resuelto is not None:
+            return resuelto
+
+        codigo_norm = normalizar_codigo(codigo_kit)
+        codigo_limpio = re.sub(r'^FR-?', '', str(codigo_norm), flags=re.IGNORECASE).strip()
+        resuelto = {"kit": codigo_norm, "componentes": [], "error": None}
+
+        productos = self._productos_del_kit(codigo_kit, codigo_norm, codigo_limpio)
+        # Filtrar sub-recetas: excluir filas donde el PRODUCTO empiece con CB
+        sin_subrecetas = [p for p in productos if not str(p).strip().upper().startswith('CB')]
+        if not productos:
+            resuelto["error"] = f"Ficha técnica no encontrada para {codigo_kit}"
+        elif not sin_subrecetas:
+            resuelto["error"] = f"Solo se encontraron sub-recetas (CB) para {codigo_kit}, no un ensamble"
+        else:
+            # Mismo orden que devolvía la consulta (por id de fila)
+            lineas = sorted(chain.from_iterable(self.lineas[p] for p in sin_subrecetas))
+            resuelto["componentes"] = [
+                (codigo_ficha, codigo_inv, cantidad)
+                for _, codigo_ficha, codigo_inv, cantidad in lineas
+                # Evitar auto-referencia y cantidades no positivas
+                if codigo_inv != codigo_norm and cantidad > 0
+            ]
+            if not resuelto["componentes"]:
+                resuelto["error"] = f"La ficha de {codigo_kit} no tiene componentes válidos"
+
+        if len(self._memo) >= BOM_MEMO_MAX:
+            self._memo.clear()
+        self._memo[codigo_kit] = resuelto
+        return resuelto
+
+
+    def subensamble(self, codigo):
+        """
+        Líneas [(codigo_ficha, codigo_inventario, cantidad)] de la ficha cuyo
+        código es exactamente `codigo` (sin la cascada difusa de resolver,
+        que emparejaría un buje con cualquier kit que empiece por su número),
+        o [] si el código no tiene ficha. Incluye sub-recetas CB.
+        """
+        codigo = normalizar_codigo(codigo)
+        productos = self._por_codigo.get(codigo)
+        if not productos:
+            return []
+        lineas = sorted(chain.from_iterable(self.lineas[p] for p in productos))
+        return [
+            (codigo_ficha, codigo_inv, cantidad)
+            for _, codigo_ficha, codigo_inv, cantidad in lineas
+            if codigo_inv != codigo and cantidad > 0
+        ]
+
+
+_indice_lock = threading.Lock()
+_indice = None
+
+_SESION_FICHA = 'bom_ficha_modificada'
+
+
+def obtener_indice_bom():
+    """Índice vigente; lo compila desde nueva_ficha_maestra si no existe, fue invalidado o venció."""
+    global _indice
+    indice = _indice
+    if indice is not None and time.time() - indice.construido_en <= BOM_INDICE_TTL_SEGUNDOS:
+        return indice
+    with _indice_lock:
+        indice = _indice
+        if indice is None or time.time() - indice.construido_en > BOM_INDICE_TTL_SEGUNDOS:
+            filas = db.session.query(
+                FichaMaestra.id, FichaMaestra.producto, FichaMaestra.subproducto, FichaMaestra.cantidad
+            ).order_by(FichaMaestra.id).all()
+            indice = _indice = IndiceBom(filas)
+            logger.info(f" [BOM SQL] Índice de ficha maestra compilado: {len(indice.lineas)} productos, {len(filas)} líneas")
+        return indice
+
+
+def invalidar_indice_bom():
+    """Descarta el índice; la próxima explosión lo recompila. Llamar tras el commit."""
+    global _indice
+    with _indice_lock:
+        _indice = None
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_ficha_modificada(session, flush_context, instances):
+    if any(isinstance(obj, FichaMaestra) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_SESION_FICHA] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(session):
+    if session.info.pop(_SESION_FICHA, None):
+        invalidar_indice_bom()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(session):
+    session.info.pop(_SESION_FICHA, None)
+
+
+@subscribe_table_changes
+def _invalidar_por_cambio_de_tabla(tablas, tenant):
+    if TABLA_FICHA in tablas:
+        invalidar_indice_bom()
+
+
 # ──────────────────────────────────────────────
 #  Función principal: calcular_descuentos_ensamble (SQL)
 # ──────────────────────────────────────────────
@@ -52,8 +259,8 @@ def calcular_descuentos_ensamble(
     cantidad_armada: int
 ) -> Dict:
     """
-    Explota la BOM de un ensamble (kit) usando PostgreSQL.
-    Cruce inteligente via normalizar_codigo().
+    Explota la BOM de un ensamble (kit) usando el índice compilado de la
+    ficha maestra (ver IndiceBom). Cruce inteligente via normalizar_codigo().
     """
     resultado = {
         "success": False,
@@ -68,99 +275,31 @@ def calcular_descuentos_ensamble(
         return resultado
 
     # 1. Normalizar código del kit
-    codigo_norm = normalizar_codigo(codigo_kit)
-    resultado["kit"] = codigo_norm
-    
-    try:
-        # 2. Consultar Ficha Maestra en SQL
-        codigo_limpio = re.sub(r'^FR-?', '', str(codigo_norm), flags=re.IGNORECASE).strip()
-        
-        # Intento 1: Exacto con prefijo FR- (ej. "FR-9380", "FR-9380 ")
-        query = FichaMaestra.query.filter(
-            FichaMaestra.producto.ilike(f"FR-{codigo_limpio}%")
-        ).all()
-        
-        # Intento 2: Exacto sin prefijo (ej. "9380")
-        if not query:
-            query = FichaMaestra.query.filter(
-                FichaMaestra.producto == codigo_limpio
-            ).all()
-        
-        # Intento 3: Coincidencia exacta con código normalizado original
-        if not query:
-            query = FichaMaestra.query.filter(
-                (FichaMaestra.producto == codigo_kit) |
-                (FichaMaestra.producto == codigo_norm)
-            ).all()
-            
-        # Intento 4: Empieza con el código normalizado (ej: CAR9609%, INT9722%)
-        if not query:
-            query = FichaMaestra.query.filter(
-                FichaMaestra.producto.ilike(f"{codigo_norm}%")
-            ).all()
-
-        # Intento 5: Empieza con el código limpio (ej: 9609%, 9722%)
-        if not query:
-            query = FichaMaestra.query.filter(
-                FichaMaestra.producto.ilike(f"{codigo_limpio}%")
-            ).all()
-
-        # Intento 6: Búsqueda inteligente por sub-partes de códigos compuestos (ej: CAR9723 -> CAR9722-9723)
-        if not query:
-            potential_query = FichaMaestra.query.filter(
-                FichaMaestra.producto.ilike(f"%{codigo_limpio}%")
-            ).all()
-            
-            query = []
-            for row in potential_query:
-                prod_name = str(row.producto).strip()
-                first_word = prod_name.split(' ')[0]
-                if codigo_limpio in first_word or codigo_norm in first_word:
-                    query.append(row)
-        
-        if not query:
-            logger.warning(f" [BOM SQL] No se encontró ficha estricta para {codigo_kit}")
-            resultado["error"] = f"Ficha técnica no encontrada para {codigo_kit}"
-            return resultado
-        
-        # Filtrar sub-recetas: excluir filas donde el PRODUCTO empiece con CB
-        query = [row for row in query if not str(row.producto).strip().upper().startswith('CB')]
-        if not query:
-            resultado["error"] = f"Solo se encontraron sub-recetas (CB) para {codigo_kit}, no un ensamble"
-            return resultado
-
-        componentes_ficha = []
-        for row in query:
-            subpro_raw = str(row.subproducto).strip()
-            
-            # Tarea 1: Normalización de Códigos para el Cruce (Extraer primera palabra)
-            codigo_limpio_receta = subpro_raw.split(' ')[0]
-            subpro_norm = traducir_codigo_componente(codigo_limpio_receta)
-            
-            # Evitar auto-referencia
-            if subpro_norm == codigo_norm:
-                continue
-                
-            qty_por_kit = float(row.cantidad or 0)
-            if qty_por_kit <= 0: continue
-
-            componentes_ficha.append({
-                "codigo_ficha": subpro_raw,
-                "codigo_inventario": subpro_norm, # Este debe cruzar con Producto.codigo_sistema
-                "cantidad_por_kit": qty_por_kit,
-                "cantidad_total_descontar": qty_por_kit * cantidad_armada
-            })
-
-        if not componentes_ficha:
-            resultado["error"] = f"La ficha de {codigo_kit} no tiene componentes válidos"
-            return resultado
-
-        resultado["success"] = True
-        resultado["componentes"] = componentes_ficha
-        logger.info(f" [BOM SQL] Explosión exitosa para {codigo_kit}: {len(componentes_ficha)} items")
-        return resultado
+    resultado["kit"] = normalizar_codigo(codigo_kit)
 
+    try:
+        # 2. Resolver contra el índice compilado de la Ficha Maestra
+        bom = obtener_indice_bom().resolver(codigo_kit)
     except Exception as e:
+        rollback_seguro()
         logger.error(f" [BOM SQL] Error crítico: {e}")
         resultado["error"] = str(e)
         return resultado
+
+    if bom["error"]:
+        logger.warning(f" [BOM SQL] {bom['error']}")
+        resultado["error"] = bom["error"]
+        return resultado
+
+    resultado["success"] = True
+    resultado["componentes"] = [
+        {
+            "codigo_ficha": codigo_ficha,
+            "codigo_inventario": codigo_inv,  # Este debe cruzar con Producto.codigo_sistema
+            "cantidad_por_kit": qty_por_kit,
+            "cantidad_total_descontar": qty_por_kit * cantidad_armada
+        }
+        for codigo_ficha, codigo_inv, qty_por_kit in bom["componentes"]
+    ]
+    logger.debug(f" [BOM SQL] Explosión exitosa para {codigo_kit}: {len(resultado['componentes'])} items")
+    return resultado
@@ -0,0 +1,150 @@
+"""
+Búsqueda de productos por índice de trigramas (backend/utils/indice_busqueda.py),
+para los buscadores de inventario, pedidos y PNC.
+
+Antes: ProductoRepository.buscar_por_termino y /api/productos/buscar hacían
+`ILIKE '%t%'` sobre codigo_sistema, id_codigo, descripcion y oem (y
+codigo/descripcion en metals_productos): un recorrido secuencial de la tabla
+por pulsación, sin ranking (el orden era el del código) y sin tolerancia a
+errores de tipeo.
+
+  - FriParts: el índice se arma desde el snapshot del catálogo
+    (CatalogoService) y solo se reconstruye cuando cambia su
+    `version_textos`, es decir, cuando cambia un código, una descripción o
+    un OEM; los movimientos de stock no lo tocan. Los resultados devuelven
+    el registro del snapshot vigente, así que el stock siempre es el actual.
+  - FriMetals: metals_productos no pasa por el snapshot; su índice se
+    reconstruye cada METALS_TTL_INDICE segundos o ante
+    publish_table_change('metals_productos').
+  - Caché de resultados pequeña (namespace 'busqueda_productos'): guarda
+    posiciones + puntaje por (tenant, versión del índice, término, límite).
+    Una versión nueva del índice deja de coincidir con las llaves viejas.
+"""
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import text
+
+from backend.core.sql_database import db
+from backend.services.catalogo_service import CatalogoService
+from backend.utils.cache_manager import get_cache, subscribe_table_changes
+from backend.utils.indice_busqueda import IndiceTrigramas, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+METALS_TTL_INDICE = 300
+LIMITE_MAXIMO = 100
+
+# Un campo OEM suele traer varias referencias: '12345-ABC / 67890, 555'.
+_SEPARADORES_OEM = re.compile(r'\s*[/,;|]\s*')
+
+_lock = threading.Lock()
+_indices = {}  # tenant -> IndiceTrigramas
+_metals_construido_en = 0.0
+_metals_version = 0
+
+_cache_resultados = get_cache('busqueda_productos', maxsize=512, ttl=600)
+
+
+def _codigos_oem(oem):
+    return [parte for parte in _SEPARADORES_OEM.split(oem or '') if parte]
+
+
+@subscribe_table_changes
+def _invalidar_indice_metals(tablas, tenant):
+    global _metals_construido_en
+    if 'metals_productos' in tablas:
+        with _lock:
+            _metals_construido_en = 0.0
+
+
+class BusquedaProductosService:
+    """Búsqueda rankeada y tolerante a errores sobre el catálogo de cada división."""
+
+    @staticmethod
+    def buscar(termino, tenant='friparts', limite=30):
+        """
+        Lista de (registro, puntaje) de mayor a menor puntaje. El registro es
+        un ProductoCatalogo (FriParts) o un dict codigo/descripcion/precio
+        (FriMetals).
+        """
+        limite = max(1, min(int(limite or 30), LIMITE_MAXIMO))
+        consulta = str(termino or '').strip().upper()
+        if not normalizar_texto(consulta):
+            return []
+
+        if tenant == 'frimetals':
+            indice = BusquedaProductosService._indice_metals()
+            resolver = indice.registros.__getitem__
+        else:
+            snapshot = CatalogoService.obtener()
+            indice = BusquedaProductosService._indice_friparts(snapshot)
+            # El índice guarda ids: el registro (y su stock) sale del snapshot vigente.
+            resolver = lambda i: snapshot.por_id.get(indice.registros[i])
+
+        llave = (tenant, indice.version, consulta, limite)
+        posiciones = _cache_resultados.get(llave)
+        if posiciones is None:
+            posiciones = indice.buscar(consulta, limite)
+            _cache_resultados.set(llave, posiciones)
+
+        resultados = []
+        for posicion, puntaje in posiciones:
+            registro = resolver(posicion)
+            if registro is not None:
+                resultados.append((registro, puntaje))
+        return resultados
+
+    @staticmethod
+    def _indice_friparts(snapshot):
+        indice = _indices.get('friparts')
+        if indice is not None and indice.version == snapshot.version_textos:
+            return indice
+        with _lock:
+            indice = _indices.get('friparts')
+            if indice is None or indice.version != snapshot.version_textos:
+                inicio = time.perf_counter()
+                indice = IndiceTrigramas(
+                    (
+                        (p.id, [p.codigo_sistema, p.id_codigo] + _codigos_oem(p.oem), [p.descripcion])
+                        for p in snapshot.productos
+                    ),
+                    version=snapshot.version_textos,
+                )
+                _indices['friparts'] = indice
+                logger.info(
+                    f"[Busqueda] Índice FriParts v{indice.version}: {len(indice)} productos "
+                    f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+                )
+            return indice
+
+    @staticmethod
+    def _indice_metals():
+        global _metals_construido_en, _metals_version
+        indice = _indices.get('frimetals')
+        if indice is not None and time.time() - _metals_construido_en < METALS_TTL_INDICE:
+            return indice
+        with _lock:
+            indice = _indices.get('frimetals')
+            if indice is None or time.time() - _metals_construido_en >= METALS_TTL_INDICE:
+                filas = db.session.execute(
+                    text("SELECT codigo, descripcion, precio FROM metals_productos ORDER BY codigo")
+                ).mappings().all()
+                _metals_version += 1
+                indice = IndiceTrigramas(
+                    (
+                        (
+                            {"codigo": f['codigo'], "descripcion": f['descripcion'], "precio": f['precio'] or 0},
+                            [f['codigo']],
+                            [f['descripcion']],
+                        )
+                        for f in filas
+                    ),
+                    version=_metals_version,
+                )
+                _indices['frimetals'] = indice
+                _metals_construido_en = time.time()
+                logger.info(f"[Busqueda] Índice FriMetals v{indice.version}: {len(indice)} productos")
+            return indice
@@ -0,0 +1,363 @@
+"""
+Snapshot en memoria del catálogo de productos FriParts (db_productos),
+compartido por todos los endpoints de catálogo.
+
+Antes cada endpoint releía db_productos por su cuenta: listar_productos_v2
+vía ProductoRepository.get_productos_all() (ORM + getattr/_safe_float por
+celda), /api/productos/listar y /api/productos/buscar con su propio JOIN, y
+el semáforo se recalculaba en cada reconstrucción. Ahora hay UNA copia
+compacta por proceso:
+
+  - ProductoCatalogo: un registro con __slots__ por producto, con los
+    agregados de stock y el semáforo YA calculados.
+  - Índice por código normalizado (codigo_sistema, id_codigo y ambos sin
+    prefijo de división) para resolver un código en O(1).
+  - `version`: entero que sube con cada cambio aplicado. listar_v2 guarda su
+    JSON ya codificado y lo sirve con ETag = época del proceso + version (304
+    si no cambió; la época evita que un navegador reciba 304 tras un
+    reinicio, cuando version vuelve a empezar en 1).
+  - `version_textos`: solo sube cuando cambia algún campo buscable (código,
+    descripción, OEM) o el conjunto de productos; el índice de búsqueda
+    (busqueda_productos_service) se reconstruye con ella, no con cada
+    movimiento de stock.
+
+Mantenimiento INCREMENTAL: un listener de SQLAlchemy registra los productos
+que cada sesión modifica por ORM (StockService.actualizar_stock y cualquier
+otra escritura vía Producto) y, tras el COMMIT, los marca como pendientes.
+La siguiente lectura relee solo esas filas. Las escrituras por SQL crudo
+avisan explícitamente: marcar_modificados(codigos=...) cuando saben qué
+productos tocaron (unificación WO, conteos físicos de inventario_routes) o
+invalidar() para una reconstrucción completa (sincronización de precios).
+publish_table_change('db_productos') NO toca el snapshot: solo desaloja las
+cachés por tag, y lo publican también escritores ORM que el listener ya
+cubre. Como red de seguridad ante ediciones manuales en la BD, el snapshot
+se reconstruye completo cada CATALOGO_TTL_RECONSTRUCCION segundos.
+
+La relectura corre FUERA de _lock (que solo protege el estado): mientras un
+hilo consulta la BD, los demás lectores reciben el snapshot vigente en vez de
+hacer fila detrás de la consulta.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from itertools import chain
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session
+
+from backend.core.sql_database import db, rollback_seguro
+from backend.models.sql_models import Producto
+from backend.utils.formatters import normalizar_codigo
+from backend.utils.imagen_variantes import urls_variantes
+
+logger = logging.getLogger(__name__)
+
+CATALOGO_TTL_RECONSTRUCCION = 600
+
+# Identifica el proceso en el ETag: version reinicia en 1 con cada arranque.
+_EPOCA = uuid.uuid4().hex[:8]
+
+_SQL_PRODUCTOS = """
+    SELECT id, codigo_sistema, id_codigo, descripcion, precio, por_pulir, p_terminado,
+           comprometido, producto_ensamblado, stock_bodega, stock_minimo, stock_maximo,
+           punto_reorden, imagen, oem
+    FROM db_productos
+"""
+
+
+def _num(valor):
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ProductoCatalogo:
+    """Registro compacto de un producto con stock y semáforo precalculados."""
+    __slots__ = (
+        'id', 'codigo_sistema', 'id_codigo', 'descripcion', 'precio', 'por_pulir',
+        'p_terminado', 'comprometido', 'producto_ensamblado', 'stock_bodega',
+        'stock_minimo', 'stock_maximo', 'punto_reorden', 'imagen_db', 'imagen', 'oem',
+        'stock_disponible', 'existencias_totales', 'semaforo', 'texto_busqueda',
+    )
+
+    @classmethod
+    def desde_fila(cls, fila, corregir_imagen, calcular_semaforo):
+        p = cls()
+        p.id = fila['id']
+        p.codigo_sistema = fila['codigo_sistema'] or ''
+        p.id_codigo = fila['id_codigo'] or ''
+        p.descripcion = fila['descripcion'] or ''
+        p.precio = _num(fila['precio'])
+        p.por_pulir = _num(fila['por_pulir'])
+        p.p_terminado = _num(fila['p_terminado'])
+        p.comprometido = _num(fila['comprometido'])
+        p.producto_ensamblado = _num(fila['producto_ensamblado'])
+        p.stock_bodega = _num(fila['stock_bodega'])
+        p.stock_minimo = _num(fila['stock_minimo'])
+        p.stock_maximo = _num(fila['stock_maximo']) or 100
+        p.punto_reorden = _num(fila['punto_reorden'])
+        p.imagen_db = fila['imagen'] or ''
+        p.imagen = corregir_imagen(p.imagen_db)
+        p.oem = fila['oem'] or ''
+        p.stock_disponible = p.p_terminado - p.comprometido
+        p.existencias_totales = p.p_terminado + p.por_pulir
+        p.semaforo = calcular_semaforo(
+            p.existencias_totales - p.comprometido, p.stock_minimo, p.punto_reorden, p.stock_maximo
+        )
+        # Campos buscables en una sola cadena: si cambia, cambia version_textos
+        # y se reconstruye el índice de búsqueda.
+        p.texto_busqueda = '\x00'.join(
+            (p.codigo_sistema, p.id_codigo, p.descripcion, p.oem)
+        ).upper()
+        return p
+
+    def codigos_normalizados(self):
+        """Llaves del índice por código: tal cual (mayúsculas) y sin prefijo de división."""
+        codigos = set()
+        for codigo in (self.codigo_sistema, self.id_codigo):
+            if codigo:
+                codigos.add(codigo.strip().upper())
+                codigos.add(normalizar_codigo(codigo))
+        codigos.discard('')
+        return codigos
+
+    def a_dict_v2(self):
+        """Shape de /api/productos/listar_v2 (tabla de inventario con semáforos)."""
+        return {
+            "codigo": self.codigo_sistema,
+            "id_codigo": self.id_codigo,
+            "descripcion": self.descripcion or 'Sin descripción',
+            "imagen": self.imagen,
+            "imagen_variantes": urls_variantes(self.imagen),
+            "precio": self.precio,
+            "stock_por_pulir": self.por_pulir,
+            "stock_terminado": self.p_terminado,
+            "stock_comprometido": self.comprometido,
+            "stock_disponible": self.stock_disponible,
+            "existencias_totales": self.existencias_totales,
+            "metricas": {"min": self.stock_minimo, "max": self.stock_maximo, "reorden": self.punto_reorden},
+            "semaforo": self.semaforo,
+        }
+
+
+class CatalogoSnapshot:
+    """Foto inmutable del catálogo: registros ordenados por id + índice por código."""
+    __slots__ = (
+        'productos', 'por_id', 'por_codigo', 'version', 'version_textos', 'construido_en', '_json_v2',
+    )
+
+    def __init__(self, por_id, version, construido_en, previo=None):
+        self.por_id = por_id
+        self.productos = tuple(por_id[k] for k in sorted(por_id))
+        self.por_codigo = {}
+        for p in self.productos:
+            for codigo in p.codigos_normalizados():
+                self.por_codigo.setdefault(codigo, p)
+        self.version = version
+        self.version_textos = (
+            previo.version_textos if previo is not None and self._mismos_textos(previo) else version
+        )
+        self.construido_en = construido_en
+        self._json_v2 = None
+
+    def _mismos_textos(self, previo):
+        if len(previo.por_id) != len(self.por_id):
+            return False
+        for i, p in self.por_id.items():
+            anterior = previo.por_id.get(i)
+            if anterior is None or anterior.texto_busqueda != p.texto_busqueda:
+                return False
+        return True
+
+    @property
+    def etag(self):
+        return f"catalogo-{_EPOCA}-{self.version}"
+
+    def json_v2(self):
+        """JSON ya codificado de listar_v2 completo (se calcula una vez por versión)."""
+        if self._json_v2 is None:
+            self._json_v2 = json.dumps(
+                [p.a_dict_v2() for p in self.productos], ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+        return self._json_v2
+
+    def buscar_codigo(self, codigo):
+        """Producto por código exacto, con o sin prefijo de división; None si no existe."""
+        if not codigo:
+            return None
+        cod = str(codigo).strip().upper()
+        return self.por_codigo.get(cod) or self.por_codigo.get(normalizar_codigo(cod))
+
+
+# ----------------------------------------------------------------------
+# Estado del proceso
+# ----------------------------------------------------------------------
+
+_lock = threading.Lock()
+# Un solo hilo relee la BD a la vez; se toma sin bloquear salvo que aún no
+# exista ningún snapshot que servir.
+_refresco_lock = threading.Lock()
+_snapshot = None
+_pendientes_ids = set()
+_pendientes_codigos = set()
+_invalidado = False
+
+_SESION_IDS = 'catalogo_ids_modificados'
+_SESION_CODIGOS = 'catalogo_codigos_modificados'
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_productos_modificados(session, flush_context, instances):
+    """Anota en session.info los productos que este flush va a escribir."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Producto):
+            if obj.id is not None:
+                session.info.setdefault(_SESION_IDS, set()).add(obj.id)
+            if obj.codigo_sistema:
+                session.info.setdefault(_SESION_CODIGOS, set()).add(obj.codigo_sistema)
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_modificados_tras_commit(session):
+    ids = session.info.pop(_SESION_IDS, None)
+    codigos = session.info.pop(_SESION_CODIGOS, None)
+    if ids or codigos:
+        CatalogoService.marcar_modificados(ids=ids or (), codigos=codigos or ())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_modificados_tras_rollback(session):
+    session.info.pop(_SESION_IDS, None)
+    session.info.pop(_SESION_CODIGOS, None)
+
+
+class CatalogoService:
+    """Acceso al snapshot compartido del catálogo FriParts."""
+
+    @staticmethod
+    def marcar_modificados(ids=(), codigos=()):
+        """Productos (por id o codigo_sistema) a releer en la próxima lectura. Llamar tras el commit."""
+        with _lock:
+            _pendientes_ids.update(i for i in ids if i is not None)
+            _pendientes_codigos.update(c for c in codigos if c)
+
+    @staticmethod
+    def invalidar():
+        """Fuerza reconstrucción completa en la próxima lectura (escrituras masivas por SQL crudo)."""
+        global _invalidado
+        with _lock:
+            _invalidado = True
+
+    @staticmethod
+    def obtener():
+        """
+        Snapshot vigente. Reconstruye completo si no existe, fue invalidado o
+        venció su TTL; si solo hay productos pendientes, relee esas filas y
+        publica un snapshot nuevo con version + 1. Si otro hilo ya está
+        releyendo, devuelve el snapshot vigente sin esperar. Un fallo de BD al
+        refrescar deja servir el snapshot anterior (si lo hay) en vez de
+        tumbar el catálogo.
+        """
+        global _snapshot, _invalidado
+        with _lock:
+            snap = _snapshot
+            if not CatalogoService._requiere_refresco(snap):
+                return snap
+
+        if not _refresco_lock.acquire(blocking=snap is None):
+            return snap
+        try:
+            with _lock:
+                snap = _snapshot
+                if not CatalogoService._requiere_refresco(snap):
+                    return snap
+                completo = CatalogoService._vencido(snap)
+                # Se consumen ahora: lo que se marque durante la consulta queda
+                # pendiente para la próxima lectura.
+                ids, codigos = set(_pendientes_ids), set(_pendientes_codigos)
+                _pendientes_ids.clear()
+                _pendientes_codigos.clear()
+                if completo:
+                    _invalidado = False
+
+            try:
+                if completo:
+                    nuevo = CatalogoService._construir_completo(snap)
+                else:
+                    nuevo = CatalogoService._aplicar_pendientes(snap, ids, codigos)
+            except Exception as e:
+                rollback_seguro()
+                with _lock:
+                    _pendientes_ids.update(ids)
+                    _pendientes_codigos.update(codigos)
+                    _invalidado = _invalidado or completo
+                if snap is None:
+                    raise
+                logger.error(f"[Catalogo] Error refrescando snapshot, se sirve la versión {snap.version}: {e}")
+                return snap
+
+            with _lock:
+                _snapshot = nuevo
+            return nuevo
+        finally:
+            _refresco_lock.release()
+
+    @staticmethod
+    def _vencido(snap):
+        return (
+            snap is None or _invalidado
+            or time.time() - snap.construido_en > CATALOGO_TTL_RECONSTRUCCION
+        )
+
+    @staticmethod
+    def _requiere_refresco(snap):
+        return CatalogoService._vencido(snap) or bool(_pendientes_ids or _pendientes_codigos)
+
+    @staticmethod
+    def _convertidores():
+        # Import perezoso: inventario_service importa este módulo.
+        from backend.services.inventario_service import InventarioService
+        return InventarioService._corregir_url_imagen, InventarioService._calcular_metricas_semaforo
+
+    @staticmethod
+    def _construir_completo(previo):
+        corregir, semaforo = CatalogoService._convertidores()
+        por_id = {}
+        for fila in db.session.execute(text(_SQL_PRODUCTOS)).mappings():
+            try:
+                por_id[fila['id']] = ProductoCatalogo.desde_fila(fila, corregir, semaforo)
+            except Exception as e_fila:
+                logger.error(f"[Catalogo] Fila corrupta ignorada ({fila.get('codigo_sistema')}): {e_fila}")
+        version = (previo.version + 1) if previo else 1
+        logger.info(f"[Catalogo] Snapshot completo v{version}: {len(por_id)} productos.")
+        return CatalogoSnapshot(por_id, version, time.time(), previo)
+
+    @staticmethod
+    def _aplicar_pendientes(previo, ids, codigos):
+        corregir, semaforo = CatalogoService._convertidores()
+        sql = text(
+            _SQL_PRODUCTOS + " WHERE id IN :ids OR codigo_sistema IN :codigos"
+        ).bindparams(bindparam('ids', expanding=True), bindparam('codigos', expanding=True))
+        # IN () vacío no es SQL válido en todos los dialectos: centinelas que no existen.
+        filas = db.session.execute(sql, {
+            "ids": list(ids) or [-1],
+            "codigos": list(codigos) or [''],
+        }).mappings().all()
+
+        por_id = dict(previo.por_id)
+        # Borrados: ids pedidos que ya no vuelven de la BD.
+        for i in ids:
+            por_id.pop(i, None)
+        for fila in filas:
+            por_id[fila['id']] = ProductoCatalogo.desde_fila(fila, corregir, semaforo)
+        logger.debug(f"[Catalogo] Snapshot v{previo.version + 1}: {len(filas)} productos releídos.")
+        return CatalogoSnapshot(por_id, previo.version + 1, previo.construido_en, previo)
+
+    @staticmethod
+    def version():
+        """Versión del snapshot vigente (0 si aún no se construyó)."""
+        snap = _snapshot
+        return snap.version if snap else 0
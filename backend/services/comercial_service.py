@@ -1,19 +1,40 @@
 import logging
 import re
 from datetime import datetime, date
+from itertools import groupby
 from sqlalchemy import text
 from backend.core.sql_database import db
+from backend.services.resumen_ventas_service import ResumenVentasService
 
 logger = logging.getLogger(__name__)
 
-# Aislamiento estricto por igualdad exacta (no LIKE): permite uso de indice B-Tree
-# sobre db_ventas.vendedor y evita falsos positivos entre nombres similares.
-FILTRO_SCOPE_ROL = "(:es_comercial = FALSE OR UPPER(TRIM(COALESCE(v.vendedor, ''))) = UPPER(TRIM(:vendedor_user)))"
-FILTRO_VENDEDOR_OPCIONAL = "(:vendedor_filtro = '' OR UPPER(TRIM(COALESCE(v.vendedor, ''))) = UPPER(TRIM(:vendedor_filtro)))"
+# Todas las consultas de este servicio leen del cubo resumen_ventas_comercial
+# (alias `c`, ver backend/services/resumen_ventas_service.py), no de db_ventas:
+# el cubo ya trae vendedor/clasificación en UPPER(TRIM), zona/cliente en TRIM
+# y las Notas Crédito restadas, y se mantiene por día afectado en cada sync de
+# WO. Antes cada consulta recorría db_ventas completo con CASE/TRIM por fila y
+# la página histórica lanzaba tres de esas por carga.
+TABLA_CUBO = ResumenVentasService.TABLA_COMERCIAL
+
+# Aislamiento estricto por igualdad exacta (no LIKE): permite uso del índice
+# (vendedor, anio) del cubo y evita falsos positivos entre nombres similares.
+FILTRO_SCOPE_ROL = "(:es_comercial = FALSE OR c.vendedor = UPPER(TRIM(:vendedor_user)))"
+FILTRO_VENDEDOR_OPCIONAL = "(:vendedor_filtro = '' OR c.vendedor = UPPER(TRIM(:vendedor_filtro)))"
 # "Ventas Totales" no debe mezclar Pedidos (db_ventas.clasificacion='pedido'): sin este filtro,
 # toda cifra de este servicio suma venta+pedido en un solo numero (confirmado con datos reales:
 # Andres/2025 daba $5,309,314,039 = venta $2,590,839,285 + pedido $2,718,474,754).
-FILTRO_SOLO_VENTA = "UPPER(TRIM(COALESCE(v.clasificacion, ''))) = 'VENTA'"
+FILTRO_SOLO_VENTA = "c.clasificacion = 'VENTA'"
+# Corte YTD por tupla (mes, día): exacto entre años bisiestos y no bisiestos
+# (evita el corrimiento que introduce el día del año tras el 29-feb).
+FILTRO_CORTE_YTD = "(c.mes, c.dia) <= (:corte_mes, :corte_dia)"
+
+FORMATO_DINERO = '"$" #,##0'
+FORMATO_ENTERO = '#,##0'
+# Filas por lote del cursor del servidor en la hoja Cliente x Mes del Excel YTD.
+_EXCEL_STREAM_BATCH = 2000
+
+SQL_ZONA = "COALESCE(NULLIF(c.zona, ''), 'SIN ZONA')"
+SQL_CLIENTE = "COALESCE(NULLIF(c.cliente, ''), 'CLIENTE DESCONOCIDO')"
 
 # Mapeo estático de configuración: agrupa ciudades (tal como llegan en db_ventas.zona,
 # poblado desde Ciudad_Encabezado de World Office) en macro-zonas comerciales.
@@ -83,24 +104,13 @@ CIUDAD_A_ZONA = {ciudad: zona for zona, ciudades in MAPEO_ZONAS.items() for ciud
 class ComercialHistoricoService:
     """
     Servicio de extracción y analítica comercial histórica.
-    Lee vendedor y zona de forma plana desde las columnas nativas de db_ventas
-    (pobladas por World Office: Nombres_tercero_interno / Ciudad_Encabezado).
-    Garantiza aislamiento estricto por rol y fidelidad contable restando
-    devoluciones (Notas Crédito) directamente en PostgreSQL.
+    Lee vendedor y zona de forma plana desde el cubo resumen_ventas_comercial,
+    agregado desde las columnas nativas de db_ventas (pobladas por World
+    Office: Nombres_tercero_interno / Ciudad_Encabezado). Garantiza
+    aislamiento estricto por rol y fidelidad contable: el cubo ya trae las
+    devoluciones (Notas Crédito) restadas.
     """
 
-    @staticmethod
-    def _expr_ajustado_nc(columna: str) -> str:
-        """CASE que invierte el signo de `columna` cuando el registro es una Nota Crédito."""
-        return f"""
-            CASE
-                WHEN UPPER(TRIM(COALESCE(v.clasificacion, ''))) LIKE '%NC%'
-                  OR UPPER(TRIM(COALESCE(v.documento, ''))) LIKE '%NC%'
-                THEN -ABS(COALESCE(v.{columna}, 0))
-                ELSE COALESCE(v.{columna}, 0)
-            END
-        """
-
     @staticmethod
     def _resolver_alias_vendedor(username: str) -> str:
         """
@@ -140,14 +150,12 @@ class ComercialHistoricoService:
     def obtener_analitica_historica(user_id: int, username: str, user_role: str, start_year: int = 2024, end_year: int = 2026) -> dict:
         """
         Extrae datos consolidados de ventas (Año, Mes, Zona, Cliente) entre start_year y end_year.
-        Resta devoluciones/NC. Vendedor y zona se leen directo de db_ventas (sin JOIN).
+        Resta devoluciones/NC. Vendedor y zona se leen directo del cubo (sin JOIN).
         """
         role_upper = str(user_role or '').strip().upper()
         es_global = role_upper in ['ADMIN', 'ADMINISTRACION', 'ADMINISTRADOR', 'GERENCIA']
         es_comercial = not es_global
 
-        ventas_expr = ComercialHistoricoService._expr_ajustado_nc('total_ingresos')
-        cantidad_expr = ComercialHistoricoService._expr_ajustado_nc('cantidad')
         vendedor_scope = ComercialHistoricoService._resolver_alias_vendedor(username)
 
         params = {
@@ -158,49 +166,44 @@ class ComercialHistoricoService:
             'vendedor_filtro': ''  # sin acotar adicionalmente en esta vista
         }
 
-        query_resumen = text(f"""
-            SELECT
-                EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades,
-                COUNT(v.id)::INTEGER AS total_transacciones
-            FROM db_ventas v
-            WHERE v.fecha >= MAKE_DATE(:start_year, 1, 1)
-              AND v.fecha <= MAKE_DATE(:end_year, 12, 31)
+        where_periodo = f"""
+            WHERE c.anio BETWEEN :start_year AND :end_year
               AND {FILTRO_SCOPE_ROL}
               AND {FILTRO_VENDEDOR_OPCIONAL}
               AND {FILTRO_SOLO_VENTA}
-            GROUP BY EXTRACT(YEAR FROM v.fecha)
+        """
+
+        query_resumen = text(f"""
+            SELECT
+                c.anio,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades,
+                SUM(c.transacciones)::INTEGER AS total_transacciones
+            FROM {TABLA_CUBO} c
+            {where_periodo}
+            GROUP BY c.anio
             ORDER BY anio ASC;
         """)
 
         query_zonas = text(f"""
             SELECT
-                COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA') AS zona,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades
-            FROM db_ventas v
-            WHERE v.fecha >= MAKE_DATE(:start_year, 1, 1)
-              AND v.fecha <= MAKE_DATE(:end_year, 12, 31)
-              AND {FILTRO_SCOPE_ROL}
-              AND {FILTRO_VENDEDOR_OPCIONAL}
-              AND {FILTRO_SOLO_VENTA}
-            GROUP BY COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA')
+                {SQL_ZONA} AS zona,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades
+            FROM {TABLA_CUBO} c
+            {where_periodo}
+            GROUP BY 1
             ORDER BY total_ventas DESC;
         """)
 
         query_top_clientes = text(f"""
             SELECT
-                COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO') AS cliente,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades
-            FROM db_ventas v
-            WHERE v.fecha >= MAKE_DATE(:start_year, 1, 1)
-              AND v.fecha <= MAKE_DATE(:end_year, 12, 31)
-              AND {FILTRO_SCOPE_ROL}
-              AND {FILTRO_VENDEDOR_OPCIONAL}
-              AND {FILTRO_SOLO_VENTA}
-            GROUP BY COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO')
+                {SQL_CLIENTE} AS cliente,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades
+            FROM {TABLA_CUBO} c
+            {where_periodo}
+            GROUP BY 1
             ORDER BY total_ventas DESC
             LIMIT 50;
         """)
@@ -223,7 +226,7 @@ class ComercialHistoricoService:
                                   pagina: int = 1, tam_pagina: int = 100, busqueda: str = '') -> dict:
         """
         Detalle consolidado (Año, Mes, Zona, Cliente) con paginación server-side.
-        La agregación (GROUP BY) y el filtro de búsqueda corren en PostgreSQL;
+        La agregación (GROUP BY sobre el cubo) y el filtro de búsqueda corren en PostgreSQL;
         el LIMIT/OFFSET evita que el DTO crezca sin techo a medida que se acumulan años.
         """
         role_upper = str(user_role or '').strip().upper()
@@ -234,8 +237,6 @@ class ComercialHistoricoService:
         tam_pagina = min(200, max(10, int(tam_pagina or 100)))  # techo duro: nunca mas de 200 filas por respuesta
         offset = (pagina - 1) * tam_pagina
 
-        ventas_expr = ComercialHistoricoService._expr_ajustado_nc('total_ingresos')
-        cantidad_expr = ComercialHistoricoService._expr_ajustado_nc('cantidad')
         vendedor_scope = ComercialHistoricoService._resolver_alias_vendedor(username)
 
         params = {
@@ -252,16 +253,15 @@ class ComercialHistoricoService:
         query = text(f"""
             WITH agrupado AS (
                 SELECT
-                    EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                    EXTRACT(MONTH FROM v.fecha)::INTEGER AS mes,
-                    COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA') AS zona,
-                    COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO') AS cliente,
-                    ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                    ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades,
-                    COUNT(v.id)::INTEGER AS total_transacciones
-                FROM db_ventas v
-                WHERE v.fecha >= MAKE_DATE(:start_year, 1, 1)
-                  AND v.fecha <= MAKE_DATE(:end_year, 12, 31)
+                    c.anio,
+                    c.mes,
+                    {SQL_ZONA} AS zona,
+                    {SQL_CLIENTE} AS cliente,
+                    ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                    ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades,
+                    SUM(c.transacciones)::INTEGER AS total_transacciones
+                FROM {TABLA_CUBO} c
+                WHERE c.anio BETWEEN :start_year AND :end_year
                   AND {FILTRO_SCOPE_ROL}
                   AND {FILTRO_VENDEDOR_OPCIONAL}
                   AND {FILTRO_SOLO_VENTA}
@@ -311,8 +311,8 @@ class ComercialHistoricoService:
         aplicar_ytd=True corta ambos años en el mismo (mes, día) de hoy, para no
         comparar un año cerrado (12 meses) contra uno en curso (ej. 7 meses) — la
         falacia estadística que producía crecimientos negativos irreales cuando
-        anio_comparacion es el año actual. Mismo criterio que _query_ytd, pero vía
-        TO_CHAR(v.fecha, 'MM-DD') en vez de la tupla (mes, día).
+        anio_comparacion es el año actual. Mismo criterio que _query_ytd: la tupla
+        (mes, día) de las celdas del cubo contra la de hoy (FILTRO_CORTE_YTD).
 
         El corte YTD ahora vive dentro de cada CASE (no en el WHERE): además de
         venta_base/venta_comparacion (recortadas a YTD), también se necesita
@@ -326,7 +326,7 @@ class ComercialHistoricoService:
         caso HUGO ARMANDO BALLESTAS JOLY: su única compra en el año base fue en
         agosto, después del corte YTD de julio, y aun así aparecía "NUEVO"). Ahora
         se cruza con `primera_compra_historica` (MIN(fecha) de TODA la vida del
-        cliente en db_ventas, sin importar año) para diferenciar:
+        cliente en el cubo, sin importar año) para diferenciar:
           - NUEVO: su primera compra en la historia es del año de comparación en
             adelante (nunca compró antes).
           - REACTIVADO: tiene historia anterior al año base, pero no compró nada
@@ -339,7 +339,6 @@ class ComercialHistoricoService:
         es_global = role_upper in ['ADMIN', 'ADMINISTRACION', 'ADMINISTRADOR', 'GERENCIA']
         es_comercial = not es_global
 
-        ventas_expr = ComercialHistoricoService._expr_ajustado_nc('total_ingresos')
         vendedor_scope = ComercialHistoricoService._resolver_alias_vendedor(username)
 
         zona_normalizada = str(zona or '').strip()
@@ -348,7 +347,8 @@ class ComercialHistoricoService:
         if zona_normalizada and not ciudades_zona:
             logger.warning(f"[COMERCIAL_SERVICE] Zona '{zona_normalizada}' no está mapeada en MAPEO_ZONAS; se ignora el filtro.")
 
-        limite_mmdd = datetime.now().strftime('%m-%d')
+        hoy = datetime.now()
+        limite_mmdd = hoy.strftime('%m-%d')
 
         params = {
             'anio_base': int(anio_base),
@@ -360,22 +360,25 @@ class ComercialHistoricoService:
             'ciudades_zona': ciudades_zona or [''],  # placeholder inocuo cuando zona_activa=False
             'busqueda': str(busqueda or '').strip(),
             'aplicar_ytd': bool(aplicar_ytd),
-            'limite_mmdd': limite_mmdd,
+            'corte_mes': hoy.month,
+            'corte_dia': hoy.day,
         }
 
-        # (:aplicar_ytd = FALSE OR TO_CHAR(...) <= :limite_mmdd) va DENTRO de cada
+        en_ventana = f"(:aplicar_ytd = FALSE OR {FILTRO_CORTE_YTD})"
+
+        # El corte YTD (en_ventana) va DENTRO de cada
         # CASE (no en el WHERE): venta_base_anio_completo necesita las mismas filas
         # sin el recorte YTD para poder distinguir REACTIVADO de SIN_VENTA_EN_VENTANA.
         query = text(f"""
             WITH cliente_origen AS (
-                -- Primera compra de CADA cliente en TODA la historia de db_ventas,
+                -- Primera compra de CADA cliente en TODA la historia del cubo,
                 -- sin filtrar por año/zona/búsqueda (solo scope de rol + "venta real"):
                 -- filtrar por zona aquí sería incorrecto si el cliente cambió de
                 -- ciudad entre su primera compra y ahora.
                 SELECT
-                    UPPER(TRIM(v.nombres)) AS cliente,
-                    MIN(v.fecha) AS primera_compra_historica
-                FROM db_ventas v
+                    UPPER(c.cliente) AS cliente,
+                    MIN(MAKE_DATE(c.anio, c.mes, c.dia)) AS primera_compra_historica
+                FROM {TABLA_CUBO} c
                 WHERE {FILTRO_SCOPE_ROL}
                   AND {FILTRO_VENDEDOR_OPCIONAL}
                   AND {FILTRO_SOLO_VENTA}
@@ -383,30 +386,26 @@ class ComercialHistoricoService:
             ),
             ventas_periodo AS (
                 SELECT
-                    COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO') AS cliente,
-                    COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA') AS ciudad,
-                    ROUND(SUM(CASE WHEN EXTRACT(YEAR FROM v.fecha) = :anio_base
-                                    AND (:aplicar_ytd = FALSE OR TO_CHAR(v.fecha, 'MM-DD') <= :limite_mmdd)
-                                   THEN {ventas_expr} ELSE 0 END)::NUMERIC, 2) AS venta_base,
-                    ROUND(SUM(CASE WHEN EXTRACT(YEAR FROM v.fecha) = :anio_comparacion
-                                    AND (:aplicar_ytd = FALSE OR TO_CHAR(v.fecha, 'MM-DD') <= :limite_mmdd)
-                                   THEN {ventas_expr} ELSE 0 END)::NUMERIC, 2) AS venta_comparacion,
-                    ROUND(SUM(CASE WHEN EXTRACT(YEAR FROM v.fecha) = :anio_base
-                                   THEN {ventas_expr} ELSE 0 END)::NUMERIC, 2) AS venta_base_anio_completo
-                FROM db_ventas v
-                WHERE EXTRACT(YEAR FROM v.fecha)::INTEGER IN (:anio_base, :anio_comparacion)
+                    {SQL_CLIENTE} AS cliente,
+                    {SQL_ZONA} AS ciudad,
+                    ROUND(SUM(CASE WHEN c.anio = :anio_base AND {en_ventana}
+                                   THEN c.total_ventas ELSE 0 END)::NUMERIC, 2) AS venta_base,
+                    ROUND(SUM(CASE WHEN c.anio = :anio_comparacion AND {en_ventana}
+                                   THEN c.total_ventas ELSE 0 END)::NUMERIC, 2) AS venta_comparacion,
+                    ROUND(SUM(CASE WHEN c.anio = :anio_base
+                                   THEN c.total_ventas ELSE 0 END)::NUMERIC, 2) AS venta_base_anio_completo
+                FROM {TABLA_CUBO} c
+                WHERE c.anio IN (:anio_base, :anio_comparacion)
                   AND {FILTRO_SCOPE_ROL}
                   AND {FILTRO_VENDEDOR_OPCIONAL}
                   AND {FILTRO_SOLO_VENTA}
-                  AND (:zona_activa = FALSE OR TRIM(UPPER(COALESCE(v.zona, ''))) = ANY(:ciudades_zona))
-                  AND (:busqueda = '' OR v.nombres ILIKE '%' || :busqueda || '%')
+                  AND (:zona_activa = FALSE OR UPPER(c.zona) = ANY(:ciudades_zona))
+                  AND (:busqueda = '' OR c.cliente ILIKE '%' || :busqueda || '%')
                 GROUP BY 1, 2
-                HAVING SUM(CASE WHEN EXTRACT(YEAR FROM v.fecha) = :anio_base
-                                 AND (:aplicar_ytd = FALSE OR TO_CHAR(v.fecha, 'MM-DD') <= :limite_mmdd)
-                                THEN {ventas_expr} ELSE 0 END) <> 0
-                    OR SUM(CASE WHEN EXTRACT(YEAR FROM v.fecha) = :anio_comparacion
-                                 AND (:aplicar_ytd = FALSE OR TO_CHAR(v.fecha, 'MM-DD') <= :limite_mmdd)
-                                THEN {ventas_expr} ELSE 0 END) <> 0
+                HAVING SUM(CASE WHEN c.anio = :anio_base AND {en_ventana}
+                                THEN c.total_ventas ELSE 0 END) <> 0
+                    OR SUM(CASE WHEN c.anio = :anio_comparacion AND {en_ventana}
+                                THEN c.total_ventas ELSE 0 END) <> 0
             )
             SELECT
                 vp.cliente,
@@ -474,7 +473,7 @@ class ComercialHistoricoService:
             primera_compra = valores['primera_compra_historica']
 
             # Sin match en cliente_origen (nombre en blanco -> 'CLIENTE DESCONOCIDO'
-            # no cruza contra UPPER(TRIM(nombres))='' ): no hay forma de saber su
+            # no cruza contra el cliente='' del cubo): no hay forma de saber su
             # antigüedad real, se trata como NUEVO por defecto (no se puede probar
             # lo contrario).
             anio_primera_compra = primera_compra.year if primera_compra else anio_comparacion
@@ -532,123 +531,22 @@ class ComercialHistoricoService:
             'clientes': resultado
         }
 
-    @staticmethod
-    def _formatear_hoja(worksheet, df, columnas_dinero=(), columnas_enteras=(), ancho_col=18):
-        """
-        Aplica formato profesional a una hoja ya escrita por pandas (index=False):
-        encabezado con fondo corporativo, freeze panes, formato contable en columnas
-        de dinero/unidades y ancho de columna legible. Reutilizable entre hojas.
-        """
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-
-        fondo_header = PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid')
-        fuente_header = Font(color='FFFFFF', bold=True)
-        num_filas = len(df)
-
-        for idx, nombre_col in enumerate(df.columns, start=1):
-            letra = get_column_letter(idx)
-            celda = worksheet.cell(row=1, column=idx)
-            celda.fill = fondo_header
-            celda.font = fuente_header
-            celda.alignment = Alignment(horizontal='center', vertical='center')
-            worksheet.column_dimensions[letra].width = ancho_col
-
-            if nombre_col in columnas_dinero:
-                formato = '"$" #,##0'
-            elif nombre_col in columnas_enteras:
-                formato = '#,##0'
-            else:
-                formato = None
-
-            if formato:
-                for fila in range(2, num_filas + 2):
-                    worksheet.cell(row=fila, column=idx).number_format = formato
-
-        worksheet.freeze_panes = 'A2'
-
-    @staticmethod
-    def _formatear_hoja_pivot(worksheet, pivot_df, ancho_col=18):
-        """
-        Variante para hojas escritas con index=True (la pivot Y-o-Y): la primera
-        columna es el índice (zona, texto) y el resto son años con valores de dinero.
-        """
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-
-        fondo_header = PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid')
-        fuente_header = Font(color='FFFFFF', bold=True)
-        num_filas = len(pivot_df)
-        num_columnas = len(pivot_df.columns) + 1  # +1 por la columna de índice (zona)
-
-        for idx in range(1, num_columnas + 1):
-            letra = get_column_letter(idx)
-            celda = worksheet.cell(row=1, column=idx)
-            celda.fill = fondo_header
-            celda.font = fuente_header
-            celda.alignment = Alignment(horizontal='center', vertical='center')
-            worksheet.column_dimensions[letra].width = ancho_col
-
-            if idx > 1:  # columnas de años = dinero; columna 1 = nombre de zona (texto)
-                for fila in range(2, num_filas + 2):
-                    worksheet.cell(row=fila, column=idx).number_format = '"$" #,##0'
-
-        worksheet.freeze_panes = 'B2'  # columna de zona siempre visible al hacer scroll horizontal
-
-    @staticmethod
-    def _formatear_hoja_comparativo_cliente(worksheet, pivot_df):
-        """
-        Formato para la hoja comparativa Cliente x Mes (replica el informe de World Office):
-        columna 1 = cliente (texto), columnas intermedias = meses (dinero), última columna
-        'Total' y última fila 'TOTAL VENTAS' resaltadas en negrita, igual que el reporte de WO.
-        """
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-
-        fondo_header = PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid')
-        fuente_header = Font(color='FFFFFF', bold=True)
-        fondo_total = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
-        fuente_negrita = Font(bold=True)
-
-        # pivot_df ya trae agregadas la columna 'Total' (derecha) y la fila 'TOTAL VENTAS' (abajo)
-        num_filas = len(pivot_df)
-        num_columnas = len(pivot_df.columns) + 1  # +1 por la columna de índice (cliente)
-        fila_total_excel = num_filas + 1  # fila 1 = encabezado; ultima fila de datos = TOTAL VENTAS
-
-        for idx in range(1, num_columnas + 1):
-            letra = get_column_letter(idx)
-            celda = worksheet.cell(row=1, column=idx)
-            celda.fill = fondo_header
-            celda.font = fuente_header
-            celda.alignment = Alignment(horizontal='center', vertical='center')
-            worksheet.column_dimensions[letra].width = 32 if idx == 1 else 16
-
-            for fila in range(2, fila_total_excel + 1):
-                celda_dato = worksheet.cell(row=fila, column=idx)
-                if idx > 1:
-                    celda_dato.number_format = '"$" #,##0'
-                if idx == num_columnas or fila == fila_total_excel:  # columna Total o fila TOTAL VENTAS
-                    celda_dato.font = fuente_negrita
-                    celda_dato.fill = fondo_total
-
-        worksheet.freeze_panes = 'B2'
-
     @staticmethod
     def _query_ytd(user_id: int, username: str, user_role: str, start_year: int, end_year: int,
                     vendedor_filtro: str, corte_dt: date):
         """
-        Ejecuta las 4 consultas de agregación YTD (anual, zona, mensual por zona y
-        top clientes) 100% en SQL, todas bajo el mismo corte YTD y scope de vendedor
-        para que las hojas del Excel sean comparables entre sí.
-        El corte YTD compara (mes, dia) por tupla para ser exacto entre años
-        bisiestos y no bisiestos (evita el corrimiento que introduce DOY tras el 29-feb).
+        Ejecuta las consultas de agregación YTD (anual, zona, mensual por zona,
+        top clientes y mensual por cliente) 100% en SQL sobre el cubo, todas bajo
+        el mismo corte YTD y scope de vendedor para que las hojas del Excel sean
+        comparables entre sí. El corte YTD compara (mes, dia) por tupla
+        (FILTRO_CORTE_YTD) para ser exacto entre años bisiestos y no bisiestos.
+        Las cuatro primeras vuelven como listas (decenas de filas); la mensual
+        por cliente vuelve como resultado en streaming, ordenada por cliente.
         """
         role_upper = str(user_role or '').strip().upper()
         es_global = role_upper in ['ADMIN', 'ADMINISTRACION', 'ADMINISTRADOR', 'GERENCIA']
         es_comercial = not es_global
 
-        ventas_expr = ComercialHistoricoService._expr_ajustado_nc('total_ingresos')
-        cantidad_expr = ComercialHistoricoService._expr_ajustado_nc('cantidad')
         vendedor_scope = ComercialHistoricoService._resolver_alias_vendedor(username)
 
         params = {
@@ -657,13 +555,13 @@ class ComercialHistoricoService:
             'es_comercial': es_comercial,
             'vendedor_user': vendedor_scope,
             'vendedor_filtro': str(vendedor_filtro or '').strip(),
-            'corte_dt': corte_dt
+            'corte_mes': corte_dt.month,
+            'corte_dia': corte_dt.day,
         }
 
         where_ytd = f"""
-            WHERE EXTRACT(YEAR FROM v.fecha)::INTEGER BETWEEN :start_year AND :end_year
-              AND (EXTRACT(MONTH FROM v.fecha), EXTRACT(DAY FROM v.fecha))
-                  <= (EXTRACT(MONTH FROM :corte_dt), EXTRACT(DAY FROM :corte_dt))
+            WHERE c.anio BETWEEN :start_year AND :end_year
+              AND {FILTRO_CORTE_YTD}
               AND {FILTRO_SCOPE_ROL}
               AND {FILTRO_VENDEDOR_OPCIONAL}
               AND {FILTRO_SOLO_VENTA}
@@ -671,24 +569,24 @@ class ComercialHistoricoService:
 
         query_anual = text(f"""
             SELECT
-                EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades,
-                COUNT(v.id)::INTEGER AS total_transacciones
-            FROM db_ventas v
+                c.anio,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades,
+                SUM(c.transacciones)::INTEGER AS total_transacciones
+            FROM {TABLA_CUBO} c
             {where_ytd}
-            GROUP BY EXTRACT(YEAR FROM v.fecha)
+            GROUP BY c.anio
             ORDER BY anio ASC;
         """)
 
         query_zona = text(f"""
             SELECT
-                EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA') AS zona,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades,
-                COUNT(v.id)::INTEGER AS total_transacciones
-            FROM db_ventas v
+                c.anio,
+                {SQL_ZONA} AS zona,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades,
+                SUM(c.transacciones)::INTEGER AS total_transacciones
+            FROM {TABLA_CUBO} c
             {where_ytd}
             GROUP BY 1, 2
             ORDER BY zona ASC, anio ASC;
@@ -697,12 +595,12 @@ class ComercialHistoricoService:
         # Desglose mensual por zona: profundidad temporal dentro de cada año
         query_mensual_zona = text(f"""
             SELECT
-                EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                EXTRACT(MONTH FROM v.fecha)::INTEGER AS mes,
-                COALESCE(NULLIF(TRIM(v.zona), ''), 'SIN ZONA') AS zona,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades
-            FROM db_ventas v
+                c.anio,
+                c.mes,
+                {SQL_ZONA} AS zona,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades
+            FROM {TABLA_CUBO} c
             {where_ytd}
             GROUP BY 1, 2, 3
             ORDER BY anio ASC, mes ASC, zona ASC;
@@ -711,11 +609,11 @@ class ComercialHistoricoService:
         # Top clientes del periodo/scope seleccionado (agregado, nunca transacciones sueltas)
         query_top_clientes = text(f"""
             SELECT
-                COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO') AS cliente,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas,
-                ROUND(SUM({cantidad_expr})::NUMERIC, 2) AS total_unidades,
-                COUNT(v.id)::INTEGER AS total_transacciones
-            FROM db_ventas v
+                {SQL_CLIENTE} AS cliente,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas,
+                ROUND(SUM(c.total_unidades)::NUMERIC, 2) AS total_unidades,
+                SUM(c.transacciones)::INTEGER AS total_transacciones
+            FROM {TABLA_CUBO} c
             {where_ytd}
             GROUP BY 1
             ORDER BY total_ventas DESC
@@ -727,11 +625,11 @@ class ComercialHistoricoService:
         # tiene costo de renderizado — respeta el mismo scope que el resto de hojas.
         query_mensual_cliente = text(f"""
             SELECT
-                EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
-                EXTRACT(MONTH FROM v.fecha)::INTEGER AS mes,
-                COALESCE(NULLIF(TRIM(v.nombres), ''), 'CLIENTE DESCONOCIDO') AS cliente,
-                ROUND(SUM({ventas_expr})::NUMERIC, 2) AS total_ventas
-            FROM db_ventas v
+                c.anio,
+                c.mes,
+                {SQL_CLIENTE} AS cliente,
+                ROUND(SUM(c.total_ventas)::NUMERIC, 2) AS total_ventas
+            FROM {TABLA_CUBO} c
             {where_ytd}
             GROUP BY 1, 2, 3
             ORDER BY cliente ASC, anio ASC, mes ASC;
@@ -742,7 +640,11 @@ class ComercialHistoricoService:
             ytd_zona = [dict(r) for r in db.session.execute(query_zona, params).mappings().all()]
             ytd_mensual_zona = [dict(r) for r in db.session.execute(query_mensual_zona, params).mappings().all()]
             top_clientes = [dict(r) for r in db.session.execute(query_top_clientes, params).mappings().all()]
-            ytd_mensual_cliente = [dict(r) for r in db.session.execute(query_mensual_cliente, params).mappings().all()]
+            # Única consulta sin techo de filas (clientes x meses): se lee con
+            # cursor del servidor y la consume el writer fila a fila.
+            ytd_mensual_cliente = db.session.execute(
+                query_mensual_cliente.execution_options(stream_results=True, yield_per=_EXCEL_STREAM_BATCH), params
+            ).mappings()
         except Exception as e:
             logger.error(f"[COMERCIAL_SERVICE] Error generando agregación YTD: {e}")
             raise e
@@ -750,16 +652,24 @@ class ComercialHistoricoService:
         return ytd_anual, ytd_zona, ytd_mensual_zona, top_clientes, ytd_mensual_cliente, es_global
 
     @staticmethod
-    def generar_excel_ytd_stream(user_id: int, username: str, user_role: str, start_year: int, end_year: int,
-                                  vendedor_filtro: str = '', fecha_corte=None):
+    def generar_excel_ytd(user_id: int, username: str, user_role: str, start_year: int, end_year: int,
+                          destino, vendedor_filtro: str = '', fecha_corte=None) -> str:
         """
         Genera el .xlsx de analítica comercial YTD/Y-o-Y con formato profesional
-        (encabezado corporativo, freeze panes, formato contable) y devuelve
-        (buffer, nombre_archivo) listo para pasarle a send_file. Encapsula toda la
-        dependencia de pandas/openpyxl para que el controlador quede limpio.
+        (encabezado corporativo, freeze panes, formato contable), lo guarda en
+        `destino` (ruta o file-like) y devuelve el nombre de archivo para la
+        descarga. Pensado para correr en segundo plano (task_runner, ver
+        comercial_routes._generar_excel_comercial_task).
+
+        Workbook(write_only=True) alimentado directo con las filas de SQL, sin
+        pandas: antes se armaban seis DataFrames más dos pivots y el libro
+        completo en un BytesIO, que luego se copiaba otra vez a disco -- varias
+        copias del mismo dato en la instancia de 512MB. Los dos "pivots" son
+        reshapes de filas ya agregadas y ordenadas por SQL (zona x año, cliente
+        x mes), así que se arman en una pasada sin tabla intermedia; la hoja
+        Cliente x Mes se escribe mientras se lee el cursor del servidor.
         """
-        import pandas as pd
-        import io
+        from openpyxl import Workbook
 
         corte_dt = ComercialHistoricoService._resolver_fecha_corte(fecha_corte)
 
@@ -769,82 +679,121 @@ class ComercialHistoricoService:
             vendedor_filtro=vendedor_filtro, corte_dt=corte_dt
         )
 
-        df_anual = pd.DataFrame(ytd_anual)
-        df_zona = pd.DataFrame(ytd_zona)
-        df_mensual_zona = pd.DataFrame(ytd_mensual_zona)
-        df_top_clientes = pd.DataFrame(top_clientes)
-        df_mensual_cliente = pd.DataFrame(ytd_mensual_cliente)
-
-        # Reshape puro (no reagrega nada): pivotea filas ya sumadas por SQL para lectura Y-o-Y.
-        if not df_zona.empty:
-            pivot_yoy = df_zona.pivot_table(index='zona', columns='anio', values='total_ventas', fill_value=0)
-        else:
-            pivot_yoy = pd.DataFrame()
-
-        # Comparativo Cliente x Mes (replica el informe "Comparativo Agrupado Por Vendedor" de WO):
-        # reshape puro de filas ya agregadas por SQL, más fila/columna de totales (sumas, no recálculo).
+        wb = Workbook(write_only=True)
+        estilos = _estilos_excel_ytd()
+
+        columnas_dinero = {'total_ventas'}
+        columnas_enteras = {'total_unidades', 'total_transacciones'}
+        hojas_planas = (
+            ('YTD Anual', ytd_anual, ['anio', 'total_ventas', 'total_unidades', 'total_transacciones'], 18),
+            ('YTD por Zona', ytd_zona, ['anio', 'zona', 'total_ventas', 'total_unidades', 'total_transacciones'], 18),
+            ('Desglose Mensual Zona', ytd_mensual_zona, ['anio', 'mes', 'zona', 'total_ventas', 'total_unidades'], 18),
+            # nombres de cliente suelen ser largos
+            ('Top Clientes', top_clientes, ['cliente', 'total_ventas', 'total_unidades', 'total_transacciones'], 32),
+        )
+        for titulo, filas, columnas, ancho in hojas_planas:
+            formatos = [
+                FORMATO_DINERO if c in columnas_dinero else FORMATO_ENTERO if c in columnas_enteras else None
+                for c in columnas
+            ]
+            hoja = _HojaExcelYTD(wb.create_sheet(titulo), columnas, [ancho] * len(columnas), estilos, freeze='A2')
+            for fila in filas:
+                hoja.append([fila[c] for c in columnas], formatos)
+
+        # YoY por zona (zona x año): ytd_zona ya viene ordenada por zona, año.
+        anios = sorted({f['anio'] for f in ytd_zona})
+        hoja = _HojaExcelYTD(
+            wb.create_sheet('YoY Zona (Pivot)'), ['zona'] + anios, [18] * (len(anios) + 1), estilos, freeze='B2'
+        )
+        formatos = [None] + [FORMATO_DINERO] * len(anios)
+        for zona, filas in groupby(ytd_zona, key=lambda f: f['zona']):
+            por_anio = {f['anio']: f['total_ventas'] for f in filas}
+            hoja.append([zona] + [por_anio.get(a, 0) for a in anios], formatos)
+
+        # Comparativo Cliente x Mes (replica el informe "Comparativo Agrupado Por
+        # Vendedor" de WO), con columna 'Total' y fila 'TOTAL VENTAS'. Los meses
+        # salen del desglose mensual por zona: mismas filas del cubo, mismo corte.
         MESES_NOMBRE = {
             1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio',
             7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
         }
-        if not df_mensual_cliente.empty:
-            df_mensual_cliente = df_mensual_cliente.copy()
-            df_mensual_cliente['periodo'] = df_mensual_cliente.apply(
-                lambda r: f"{MESES_NOMBRE[int(r['mes'])]} {int(r['anio'])}", axis=1
-            )
-            orden_periodos = (
-                df_mensual_cliente.drop_duplicates(subset=['anio', 'mes'])
-                .sort_values(['anio', 'mes'])['periodo'].tolist()
-            )
-            pivot_cliente_mes = df_mensual_cliente.pivot_table(
-                index='cliente', columns='periodo', values='total_ventas', aggfunc='sum', fill_value=0
-            )[orden_periodos]
-            pivot_cliente_mes['Total'] = pivot_cliente_mes.sum(axis=1)
-            fila_total = pivot_cliente_mes.sum(axis=0)
-            fila_total.name = 'TOTAL VENTAS'
-            pivot_cliente_mes = pd.concat([pivot_cliente_mes, fila_total.to_frame().T])
-        else:
-            pivot_cliente_mes = pd.DataFrame()
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_anual.to_excel(writer, index=False, sheet_name='YTD Anual')
-            ComercialHistoricoService._formatear_hoja(
-                writer.sheets['YTD Anual'], df_anual,
-                columnas_dinero=('total_ventas',), columnas_enteras=('total_unidades', 'total_transacciones')
-            )
+        periodos = sorted({(f['anio'], f['mes']) for f in ytd_mensual_zona})
+        encabezado = ['cliente'] + [f"{MESES_NOMBRE[int(m)]} {int(a)}" for a, m in periodos] + ['Total']
+        hoja = _HojaExcelYTD(
+            wb.create_sheet('Ventas Mensuales Cliente'), encabezado, [32] + [16] * (len(encabezado) - 1),
+            estilos, freeze='B2'
+        )
+        formatos = [None] + [FORMATO_DINERO] * (len(encabezado) - 1)
+        totales = [0] * (len(periodos) + 1)
+        for cliente, filas in groupby(ytd_mensual_cliente, key=lambda f: f['cliente']):
+            por_periodo = {(f['anio'], f['mes']): f['total_ventas'] or 0 for f in filas}
+            valores = [por_periodo.get(p, 0) for p in periodos]
+            valores.append(sum(valores))
+            totales = [t + v for t, v in zip(totales, valores)]
+            hoja.append([cliente] + valores, formatos, columnas_total=(len(encabezado),))
+        if periodos:
+            hoja.append(['TOTAL VENTAS'] + totales, formatos, fila_total=True)
+
+        wb.save(destino)
 
-            df_zona.to_excel(writer, index=False, sheet_name='YTD por Zona')
-            ComercialHistoricoService._formatear_hoja(
-                writer.sheets['YTD por Zona'], df_zona,
-                columnas_dinero=('total_ventas',), columnas_enteras=('total_unidades', 'total_transacciones')
-            )
+        vendedor_slug = re.sub(r'[^A-Za-z0-9_-]+', '_', vendedor_filtro.strip())[:40] if vendedor_filtro else 'GLOBAL'
+        return f"Comercial_YTD_{start_year}-{end_year}_{vendedor_slug}_{corte_dt.isoformat()}.xlsx"
 
-            df_mensual_zona.to_excel(writer, index=False, sheet_name='Desglose Mensual Zona')
-            ComercialHistoricoService._formatear_hoja(
-                writer.sheets['Desglose Mensual Zona'], df_mensual_zona,
-                columnas_dinero=('total_ventas',), columnas_enteras=('total_unidades',)
-            )
 
-            df_top_clientes.to_excel(writer, index=False, sheet_name='Top Clientes')
-            ComercialHistoricoService._formatear_hoja(
-                writer.sheets['Top Clientes'], df_top_clientes,
-                columnas_dinero=('total_ventas',), columnas_enteras=('total_unidades', 'total_transacciones'),
-                ancho_col=32  # nombres de cliente suelen ser largos
-            )
+def _estilos_excel_ytd():
+    """Estilos compartidos por las hojas del Excel YTD (se crean una sola vez por libro)."""
+    from openpyxl.styles import Font, PatternFill, Alignment
 
-            pivot_yoy.to_excel(writer, sheet_name='YoY Zona (Pivot)')
-            if not pivot_yoy.empty:
-                ComercialHistoricoService._formatear_hoja_pivot(writer.sheets['YoY Zona (Pivot)'], pivot_yoy)
+    return {
+        'header_font': Font(color='FFFFFF', bold=True),
+        'header_fill': PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid'),
+        'header_align': Alignment(horizontal='center', vertical='center'),
+        'total_font': Font(bold=True),
+        'total_fill': PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid'),
+    }
 
-            pivot_cliente_mes.to_excel(writer, sheet_name='Ventas Mensuales Cliente')
-            if not pivot_cliente_mes.empty:
-                ComercialHistoricoService._formatear_hoja_comparativo_cliente(
-                    writer.sheets['Ventas Mensuales Cliente'], pivot_cliente_mes
-                )
-        output.seek(0)
 
-        vendedor_slug = re.sub(r'[^A-Za-z0-9_-]+', '_', vendedor_filtro.strip())[:40] if vendedor_filtro else 'GLOBAL'
-        nombre_archivo = f"Comercial_YTD_{start_year}-{end_year}_{vendedor_slug}_{corte_dt.isoformat()}.xlsx"
+class _HojaExcelYTD:
+    """
+    Hoja del Excel YTD en modo write_only: encabezado corporativo, anchos y
+    freeze panes fijados al crearla, y filas que llegan de a una con su
+    formato numérico por columna. Las celdas de totales (columna 'Total' y
+    fila 'TOTAL VENTAS' del comparativo) van en negrita con fondo, igual que
+    el reporte de WO.
+    """
 
-        return output, nombre_archivo
+    def __init__(self, ws, columnas, anchos, estilos, freeze):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+
+        self.ws = ws
+        self.estilos = estilos
+
+        # En modo write_only el ancho/freeze deben fijarse ANTES del primer
+        # ws.append() (ver _HojaHistorial en historial_service).
+        for i, ancho in enumerate(anchos, 1):
+            ws.column_dimensions[get_column_letter(i)].width = ancho
+        ws.freeze_panes = freeze
+
+        fila_header = []
+        for titulo_col in columnas:
+            cell = WriteOnlyCell(ws, value=titulo_col)
+            cell.font = estilos['header_font']
+            cell.fill = estilos['header_fill']
+            cell.alignment = estilos['header_align']
+            fila_header.append(cell)
+        ws.append(fila_header)
+
+    def append(self, valores, formatos, columnas_total=(), fila_total=False):
+        from openpyxl.cell import WriteOnlyCell
+
+        fila = []
+        for idx, (valor, formato) in enumerate(zip(valores, formatos), start=1):
+            cell = WriteOnlyCell(self.ws, value=valor)
+            if formato:
+                cell.number_format = formato
+            if fila_total or idx in columnas_total:
+                cell.font = self.estilos['total_font']
+                cell.fill = self.estilos['total_fill']
+            fila.append(cell)
+        self.ws.append(fila)
@@ -11,6 +11,7 @@ from backend.models.sql_models import Ensamble, OperacionLog, PncEnsamble, Progr
 from backend.services.audit_service import AuditService, OwnershipMismatchException
 from backend.services.bom_service import calcular_descuentos_ensamble
 from backend.services.stock_service import StockService
+from backend.utils.cache_manager import publish_table_change
 from backend.utils.formatters import normalizar_codigo, preservar_o_normalizar_prefijo
 from backend.utils.time_utils import get_colombia_time
 
@@ -97,6 +98,8 @@ class EnsambleService:
         try:
             res = db.session.execute(stmt).fetchone()
             db.session.commit()
+            # El upsert es Core (no pasa por el flush del ORM): avisa al MRP.
+            publish_table_change('db_programacion_ensamble')
             return {'id_prog': res[0] if res else None}
         except Exception as e:
             db.session.rollback()
@@ -110,44 +113,70 @@ class EnsambleService:
         en P. TERMINADO y cuántas unidades del producto final alcanza a armar
         ese stock (stock_almacen // cantidad_por_kit).
         """
-        bom_res = calcular_descuentos_ensamble(id_codigo, 1)  # Cantidad 1 para ver el ratio
+        boms, errores = EnsambleService.obtener_boms_con_stock([id_codigo])
+        if id_codigo in errores:
+            raise BomNoDisponibleException(errores[id_codigo] or 'BOM no disponible')
+        return boms[id_codigo]
 
-        if not bom_res.get('success'):
-            raise BomNoDisponibleException(bom_res.get('error') or 'BOM no disponible')
-
-        componentes = bom_res.get('componentes', [])
-        resultado = []
-
-        for comp in componentes:
-            codigo_inv = comp['codigo_inventario']
-            producto = Producto.query.filter_by(codigo_sistema=codigo_inv).first()
-
-            # La ficha técnica mezcla piezas físicas (bujes, carcazas) con
-            # insumos/químicos (pegantes, TPU, silicona) que no se llevan en
-            # db_productos -- estos últimos no tienen a qué almacén
-            # descontarles stock, así que se excluyen del BOM de ensamble en
-            # vez de generar un registro de consumo fantasma sin movimiento
-            # de inventario real detrás.
-            if not producto:
-                logger.debug(f"[ENSAMBLE-BOM] Excluyendo componente sin ficha de inventario: {codigo_inv} ({comp['codigo_ficha']})")
-                continue
-
-            stock = float(producto.p_terminado or 0)
-            ratio = float(comp['cantidad_por_kit'])
-            alcanza = int(stock // ratio) if ratio > 0 else 0
+    @staticmethod
+    def obtener_boms_con_stock(codigos):
+        """
+        Versión en lote de obtener_bom_con_stock: explota todos los kits
+        contra el índice compilado de la ficha (bom_service.IndiceBom) y
+        trae el stock de TODOS sus componentes en una sola consulta a
+        db_productos, en vez de una consulta por componente.
 
-            resultado.append({
-                'componente': comp['codigo_ficha'],
-                'codigo_inventario': codigo_inv,
-                'stock_almacen': stock,
-                'cantidad_por_unidad': ratio,
-                'alcanza_para': alcanza
-            })
+        :return: (boms, errores) -- boms: {codigo: {'id_codigo', 'componentes'}}
+            de los kits con ficha; errores: {codigo: motivo} del resto.
+        """
+        boms_res, errores = {}, {}
+        for codigo in dict.fromkeys(codigos):
+            bom_res = calcular_descuentos_ensamble(codigo, 1)  # Cantidad 1 para ver el ratio
+            if bom_res.get('success'):
+                boms_res[codigo] = bom_res.get('componentes', [])
+            else:
+                errores[codigo] = bom_res.get('error') or 'BOM no disponible'
+
+        codigos_inv = {comp['codigo_inventario'] for comps in boms_res.values() for comp in comps}
+        stock_por_codigo = dict(
+            db.session.query(Producto.codigo_sistema, Producto.p_terminado)
+            .filter(Producto.codigo_sistema.in_(codigos_inv)).all()
+        ) if codigos_inv else {}
+
+        boms = {}
+        for codigo, componentes in boms_res.items():
+            resultado = []
+            for comp in componentes:
+                codigo_inv = comp['codigo_inventario']
+
+                # La ficha técnica mezcla piezas físicas (bujes, carcazas) con
+                # insumos/químicos (pegantes, TPU, silicona) que no se llevan en
+                # db_productos -- estos últimos no tienen a qué almacén
+                # descontarles stock, así que se excluyen del BOM de ensamble en
+                # vez de generar un registro de consumo fantasma sin movimiento
+                # de inventario real detrás.
+                if codigo_inv not in stock_por_codigo:
+                    logger.debug(f"[ENSAMBLE-BOM] Excluyendo componente sin ficha de inventario: {codigo_inv} ({comp['codigo_ficha']})")
+                    continue
+
+                stock = float(stock_por_codigo[codigo_inv] or 0)
+                ratio = float(comp['cantidad_por_kit'])
+                alcanza = int(stock // ratio) if ratio > 0 else 0
+
+                resultado.append({
+                    'componente': comp['codigo_ficha'],
+                    'codigo_inventario': codigo_inv,
+                    'stock_almacen': stock,
+                    'cantidad_por_unidad': ratio,
+                    'alcanza_para': alcanza
+                })
+
+            boms[codigo] = {
+                'id_codigo': codigo,
+                'componentes': resultado
+            }
 
-        return {
-            'id_codigo': id_codigo,
-            'componentes': resultado
-        }
+        return boms, errores
 
     @staticmethod
     def listar_tareas_pendientes():
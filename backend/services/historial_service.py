@@ -67,38 +67,39 @@ def normalizar_fecha_hora_24h(valor):
 
 def preparar_movimientos_para_excel(movimientos):
     """
-    Recibe la lista de movimientos del Historial Global (propiedad exclusiva del
-    caller de exportacion, no compartida con nadie mas) y la normaliza in-place
+    Recibe los movimientos del Historial Global (cualquier iterable, típicamente
+    el generador del cursor del servidor) y los entrega normalizados uno a uno
     para exportacion a Excel: los campos de hora quedan estrictamente en formato
     militar de 24 horas (HH:MM:SS), eliminando cualquier ambiguedad AM/PM antes
     de llegar a OpenPyXL.
-    Normaliza in-place (no copia la lista completa) para no duplicar el dataset
-    en memoria -- con rangos de fecha grandes esa copia fue causa de OOM.
+    Es un generador: normaliza cada fila al vuelo, sin materializar el rango
+    completo en memoria -- con rangos de fecha grandes eso fue causa de OOM.
     """
     for mov in movimientos:
         mov['HORA_INICIO'] = normalizar_hora_24h(mov.get('HORA_INICIO'))
         mov['HORA_FIN'] = normalizar_hora_24h(mov.get('HORA_FIN'))
-    return movimientos
+        yield mov
 
 
-def generar_excel_historial_global(movimientos):
+def generar_excel_historial_global(movimientos, destino):
     """
     Construye el Workbook del Historial Global con 3 hojas:
       - 'Historial Completo': todos los movimientos (comportamiento anterior).
       - 'Inyección': solo Tipo == 'INYECCION'.
       - 'Control PNC': solo Tipo == 'PNC' (agrupa Inyección/Pulido/Ensamble,
         que en el DTO ya comparten el mismo Tipo 'PNC' — ver historial_routes.py).
-    Devuelve el buffer BytesIO listo para send_file.
-
-    Usa Workbook(write_only=True): en modo normal OpenPyXL retiene en memoria
-    un objeto Cell por cada celda escrita durante toda la vida del Workbook;
-    en write_only cada fila se serializa y se libera al hacer ws.append(), lo
-    que evita mantener el dataset completo duplicado como arbol de objetos.
-    Con rangos de fecha grandes esto fue la causa principal del OOM del server
-    (Render free tier, 512MB, ver gunicorn.conf.py).
+    y lo guarda en `destino` (ruta o file-like). Devuelve cuántos movimientos
+    se escribieron.
+
+    Una sola pasada sobre `movimientos`: cada fila se enruta en el momento a
+    la hoja completa y, según su Tipo, a la hoja filtrada -- ya no se arman
+    listas filtradas aparte. Usa Workbook(write_only=True): cada hoja
+    serializa sus filas a su propio temporal al hacer ws.append(), así que
+    escribir en las 3 hojas intercaladas no retiene objetos Cell. Con rangos
+    de fecha grandes el dataset en memoria fue la causa principal del OOM del
+    server (Render free tier, 512MB, ver gunicorn.conf.py).
     """
     from openpyxl import Workbook
-    from io import BytesIO
 
     columnas = [
         'Fecha', 'Hora Inicio', 'Hora Fin', 'Tipo', 'Responsable',
@@ -109,69 +110,88 @@ def generar_excel_historial_global(movimientos):
     anchos = [12, 11, 11, 12, 20, 18, 15, 15, 10, 14, 10, 12, 16, 12, 40]
 
     wb = Workbook(write_only=True)
+    estilos = _estilos_hoja_historial()
 
-    ws_completo = wb.create_sheet("Historial Completo")
-    _escribir_hoja_historial(ws_completo, movimientos, columnas, anchos)
+    hoja_completa = _HojaHistorial(wb.create_sheet("Historial Completo"), columnas, anchos, estilos)
+    hojas_por_tipo = {
+        'INYECCION': _HojaHistorial(wb.create_sheet("Inyección"), columnas, anchos, estilos),
+        'PNC': _HojaHistorial(wb.create_sheet("Control PNC"), columnas, anchos, estilos),
+    }
 
-    movimientos_inyeccion = [m for m in movimientos if m.get('Tipo') == 'INYECCION']
-    ws_iny = wb.create_sheet("Inyección")
-    _escribir_hoja_historial(ws_iny, movimientos_inyeccion, columnas, anchos)
-
-    movimientos_pnc = [m for m in movimientos if m.get('Tipo') == 'PNC']
-    ws_pnc = wb.create_sheet("Control PNC")
-    _escribir_hoja_historial(ws_pnc, movimientos_pnc, columnas, anchos)
+    total = 0
+    for mov in movimientos:
+        hoja_completa.append(mov)
+        hoja_tipo = hojas_por_tipo.get(mov.get('Tipo'))
+        if hoja_tipo:
+            hoja_tipo.append(mov)
+        total += 1
 
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    wb.save(destino)
+    return total
 
 
 _COLUMNAS_TEXTO_IZQ = {4, 5, 6, 7, 8, 15}  # Tipo, Responsable, Producto, Orden, Máquina, Detalle
 
 
-def _escribir_hoja_historial(ws, movimientos, columnas, anchos):
+def _estilos_hoja_historial():
+    """Estilos compartidos por las 3 hojas (se crean una sola vez por libro)."""
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+    return {
+        'header_font': Font(name='Calibri', bold=True, color='FFFFFF', size=11),
+        'header_fill': PatternFill(start_color='2C3E50', end_color='2C3E50', fill_type='solid'),
+        'header_align': Alignment(horizontal='center', vertical='center', wrap_text=True),
+        'thin_border': Border(
+            left=Side(style='thin', color='D5D8DC'),
+            right=Side(style='thin', color='D5D8DC'),
+            top=Side(style='thin', color='D5D8DC'),
+            bottom=Side(style='thin', color='D5D8DC')
+        ),
+        'zebra_fill': PatternFill(start_color='F2F3F4', end_color='F2F3F4', fill_type='solid'),
+        'data_align': Alignment(horizontal='center', vertical='center'),
+        'text_align': Alignment(horizontal='left', vertical='center', wrap_text=True),
+    }
+
+
+class _HojaHistorial:
     """
-    Escribe cabecera en negrita, filas saneadas, cebreado y anchos en una hoja
-    del Historial Global (worksheet en modo write_only: las celdas se arman
-    fila por fila con WriteOnlyCell y se entregan via ws.append()).
+    Hoja del Historial Global (worksheet en modo write_only) que recibe filas
+    de a una: cabecera en negrita, filas saneadas, cebreado y anchos. Lleva su
+    propio contador de fila para que el cebreado de cada hoja sea
+    independiente aunque las 3 se escriban intercaladas.
     """
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.cell import WriteOnlyCell
-    from openpyxl.utils import get_column_letter
-
-    header_font = Font(name='Calibri', bold=True, color='FFFFFF', size=11)
-    header_fill = PatternFill(start_color='2C3E50', end_color='2C3E50', fill_type='solid')
-    header_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    thin_border = Border(
-        left=Side(style='thin', color='D5D8DC'),
-        right=Side(style='thin', color='D5D8DC'),
-        top=Side(style='thin', color='D5D8DC'),
-        bottom=Side(style='thin', color='D5D8DC')
-    )
-    zebra_fill = PatternFill(start_color='F2F3F4', end_color='F2F3F4', fill_type='solid')
-    data_align = Alignment(horizontal='center', vertical='center')
-    text_align = Alignment(horizontal='left', vertical='center', wrap_text=True)
-
-    # En modo write_only el anchor/freeze deben fijarse ANTES del primer
-    # ws.append(): el writer streamea <cols>/panes al abrir la hoja, y una
-    # vez que arrancó <sheetData> ya no puede insertarlos (quedan en 13.0
-    # default / sin freeze, sin error visible).
-    for i, w in enumerate(anchos, 1):
-        ws.column_dimensions[get_column_letter(i)].width = w
-    ws.freeze_panes = 'A2'
-
-    fila_header = []
-    for titulo_col in columnas:
-        cell = WriteOnlyCell(ws, value=titulo_col)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
-        fila_header.append(cell)
-    ws.append(fila_header)
-
-    for row_idx, r in enumerate(movimientos, 2):
+
+    def __init__(self, ws, columnas, anchos, estilos):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+
+        self.ws = ws
+        self.estilos = estilos
+        self.row_idx = 1
+
+        # En modo write_only el anchor/freeze deben fijarse ANTES del primer
+        # ws.append(): el writer streamea <cols>/panes al abrir la hoja, y una
+        # vez que arrancó <sheetData> ya no puede insertarlos (quedan en 13.0
+        # default / sin freeze, sin error visible).
+        for i, w in enumerate(anchos, 1):
+            ws.column_dimensions[get_column_letter(i)].width = w
+        ws.freeze_panes = 'A2'
+
+        fila_header = []
+        for titulo_col in columnas:
+            cell = WriteOnlyCell(ws, value=titulo_col)
+            cell.font = estilos['header_font']
+            cell.fill = estilos['header_fill']
+            cell.alignment = estilos['header_align']
+            cell.border = estilos['thin_border']
+            fila_header.append(cell)
+        ws.append(fila_header)
+
+    def append(self, r):
+        from openpyxl.cell import WriteOnlyCell
+
+        self.row_idx += 1
+        estilos = self.estilos
         fila = [
             r.get('Fecha', ''),
             r.get('HORA_INICIO', ''),
@@ -190,7 +210,7 @@ def _escribir_hoja_historial(ws, movimientos, columnas, anchos):
             r.get('Detalle', '')
         ]
 
-        es_par = (row_idx % 2 == 0)
+        es_par = (self.row_idx % 2 == 0)
         fila_celdas = []
         for col_idx, valor in enumerate(fila, 1):
             # Purgar estrictamente cualquier representación de nulo a None para celda vacía en Excel
@@ -199,8 +219,8 @@ def _escribir_hoja_historial(ws, movimientos, columnas, anchos):
             else:
                 cell_val = valor
 
-            cell = WriteOnlyCell(ws, value=cell_val)
-            cell.border = thin_border
+            cell = WriteOnlyCell(self.ws, value=cell_val)
+            cell.border = estilos['thin_border']
 
             # Columnas 2 y 3 = Hora Inicio / Hora Fin: forzar formato Texto
             # para que OpenPyXL/Excel nunca reinterprete el string 24h
@@ -208,11 +228,11 @@ def _escribir_hoja_historial(ws, movimientos, columnas, anchos):
             if col_idx in (2, 3):
                 cell.number_format = '@'
 
-            cell.alignment = text_align if col_idx in _COLUMNAS_TEXTO_IZQ else data_align
+            cell.alignment = estilos['text_align'] if col_idx in _COLUMNAS_TEXTO_IZQ else estilos['data_align']
 
             if es_par:
-                cell.fill = zebra_fill
+                cell.fill = estilos['zebra_fill']
 
             fila_celdas.append(cell)
 
-        ws.append(fila_celdas)
+        self.ws.append(fila_celdas)
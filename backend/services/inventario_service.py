@@ -3,7 +3,6 @@ Servicio de inventario.
 Contiene la lógica de negocio para operaciones de inventario.
 """
 import re
-import time
 from datetime import datetime
 from typing import Dict, Tuple, List
 from sqlalchemy import text
@@ -14,18 +13,12 @@ from backend.repositories.inventario_repository import inventario_repo
 from backend.core.exceptions import ProductoNoEncontrado, DatosInvalidos, MoldeNoEncontrado, CavidadesExcedidas
 from backend.utils.validators import Validator
 from backend.utils.formatters import to_int, normalizar_codigo, preservar_o_normalizar_prefijo
-from backend.utils.cache_manager import invalidate_cache
+from backend.utils.cache_manager import invalidate_cache, publish_table_change
+from backend.services.catalogo_service import CatalogoService
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Cache de lectura del catálogo de productos usada por listar_productos_v2().
-# /api/productos/listar (productos_routes.py) usa su propio cache separado,
-# el namespace 'productos_listar' de cache_manager.cached_route.
-PRODUCTOS_CACHE_TTL = 300  # igual al CACHE_TTL_MEDIUM que usaba app.py
-
-PRODUCTOS_V2_CACHE = {"data": None, "timestamp": 0}
-
 
 class InventarioService:
     """Servicio de inventario con lógica de negocio."""
@@ -361,60 +354,12 @@ class InventarioService:
 
     @staticmethod
     def listar_productos_v2() -> List[Dict]:
-        """Catálogo de inventario con semáforos, con cache en memoria de PRODUCTOS_CACHE_TTL segundos."""
-        current_time = time.time()
-        if PRODUCTOS_V2_CACHE["data"] and (current_time - PRODUCTOS_V2_CACHE["timestamp"] < PRODUCTOS_CACHE_TTL):
-            return PRODUCTOS_V2_CACHE["data"]
-
-        productos_sql = producto_repo.get_productos_all()
-
-        lista_final = []
-        filas_corruptas = 0
-        for p in productos_sql:
-            try:
-                def _sf(v):
-                    try:
-                        return float(v or 0)
-                    except Exception:
-                        return 0.0
-
-                terminado = _sf(p.get('P. TERMINADO', p.get('p_terminado', 0)))
-                por_pulir = _sf(p.get('POR PULIR', p.get('por_pulir', 0)))
-                comprometido = _sf(p.get('COMPROMETIDO', p.get('comprometido', 0)))
-
-                p_min = _sf(p.get('STOCK MINIMO', p.get('stock_minimo', 0)))
-                p_reorden = _sf(p.get('PUNTO REORDEN', p.get('punto_reorden', 0)))
-                p_max = _sf(p.get('STOCK MAXIMO', p.get('stock_maximo', 100))) or 100
-
-                stock_global = (terminado + por_pulir) - comprometido
-                semaforo = InventarioService._calcular_metricas_semaforo(stock_global, p_min, p_reorden, p_max)
-
-                lista_final.append({
-                    "codigo": p.get('CODIGO SISTEMA', p.get('codigo_sistema', '')),
-                    "id_codigo": p.get('ID CODIGO', p.get('id_codigo', '')),
-                    "descripcion": p.get('DESCRIPCION', p.get('descripcion', '')),
-                    "imagen": InventarioService._corregir_url_imagen(str(p.get('IMAGEN', p.get('imagen', '')) or '')),
-                    "precio": _sf(p.get('PRECIO', p.get('precio', 0))),
-                    "stock_por_pulir": por_pulir,
-                    "stock_terminado": terminado,
-                    "stock_comprometido": comprometido,
-                    "stock_disponible": terminado - comprometido,
-                    "existencias_totales": terminado + por_pulir,
-                    "metricas": {"min": p_min, "max": p_max, "reorden": p_reorden},
-                    "semaforo": semaforo
-                })
-            except Exception as e_fila:
-                filas_corruptas += 1
-                codigo_err = p.get('CODIGO SISTEMA', p.get('codigo_sistema', '?')) if isinstance(p, dict) else '?'
-                logger.error(f"[listar_v2] Fila corrupta ignorada ({codigo_err}): {e_fila}")
-                continue
-
-        if filas_corruptas:
-            logger.warning(f"[listar_v2] {filas_corruptas} filas ignoradas por datos corruptos. Ver logs anteriores.")
-
-        PRODUCTOS_V2_CACHE["data"] = lista_final
-        PRODUCTOS_V2_CACHE["timestamp"] = current_time
-        return lista_final
+        """
+        Catálogo de inventario con semáforos, servido desde el snapshot
+        compartido (backend/services/catalogo_service.py). El endpoint HTTP
+        usa directamente CatalogoSnapshot.json_v2() (JSON ya codificado + ETag).
+        """
+        return [p.a_dict_v2() for p in CatalogoService.obtener().productos]
 
     @staticmethod
     def estado_sincronizacion_wo() -> Dict:
@@ -520,12 +465,12 @@ class InventarioService:
 
         actualizados = producto_repo.upsert_productos_wo(lote)
 
-        # Invalida ambos caches de lectura de catálogo para que los
-        # productos nuevos/actualizados aparezcan de inmediato en vez de
-        # esperar su TTL respectivo.
-        PRODUCTOS_V2_CACHE["data"] = None
-        PRODUCTOS_V2_CACHE["timestamp"] = 0
-        invalidate_cache('productos_listar')
+        # El UPSERT es SQL Core (no pasa por el listener ORM del snapshot de
+        # catálogo): se marcan explícitamente los códigos tocados para que el
+        # snapshot relea solo esas filas. publish_table_change desaloja las
+        # entradas de 'productos_listar' (tag db_productos).
+        CatalogoService.marcar_modificados(codigos=[r['codigo_sistema'] for r in lote])
+        publish_table_change('db_productos')
 
         logger.info(f"📊 [Unificar WO] UPSERT completado. Filas procesadas: {actualizados}")
 
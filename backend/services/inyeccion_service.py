@@ -8,6 +8,8 @@ from sqlalchemy.exc import SQLAlchemyError
 from backend.models.sql_models import db, ProduccionInyeccion, PncInyeccion, PncPulido, ProgramacionInyeccion, DistribucionOpPedidos, Producto, TrazabilidadLote, Pedido
 from backend.services.audit_service import AuditService, OwnershipMismatchException, ValidadorRequeridoException, TurnoInvalidoException
 from backend.utils.time_utils import get_colombia_time
+from backend.utils.cache_manager import publish_table_change
+from backend.services import mes_estado
 
 logger = logging.getLogger(__name__)
 
@@ -427,45 +429,22 @@ class InyeccionService:
                 ))
 
     @staticmethod
-    def _generar_pdf_lote(turno, items):
+    def _encolar_pdf_lote(id_inyeccion):
         """
-        Genera el PDF del lote y lo deja en disco local (subida a Drive deshabilitada).
-        Resiliente a errores de cuota/permisos: nunca debe tumbar el registro del lote.
+        Encola el PDF del lote en ReportesLoteService (render en segundo plano
+        y caché en disco, ver backend/services/reporte_lote_service.py). Antes
+        se renderizaba aquí mismo y el operario esperaba a ReportLab; ahora
+        solo se encola, con el contenido leído de las filas ya confirmadas.
+        Resiliente: nunca debe tumbar el registro del lote.
         """
-        local_file = None
         try:
-            from backend.utils.report_service import PDFGenerator
-
-            maquina = str(turno.get('maquina') or 'S-M').replace(" ", "-")
-            fecha_raw = str(turno.get('fecha_inicio') or datetime.now().strftime('%Y-%m-%d'))
-            fecha_clean = fecha_raw.split(' ')[0].replace('/', '-')
-            op = str(turno.get('orden_produccion') or 'S-OP').replace(" ", "-")
-            tmp_filename = f"{fecha_clean}_{op}_{maquina}.pdf".replace(" ", "_")
-
-            import re
-            tmp_filename = re.sub(r'[\\/*?:"<>|]', "", tmp_filename)
-            tmp_path = os.path.join(os.getcwd(), "temp_reports")
-            if not os.path.exists(tmp_path):
-                os.makedirs(tmp_path)
-
-            local_file = os.path.join(tmp_path, tmp_filename)
-
-            success = PDFGenerator.generar_reporte_inyeccion_lote(turno, items, local_file)
-            if not success:
-                return False, "Error al generar el archivo PDF localmente."
-
-            logger.debug(f" ✅ PDF generado localmente: {tmp_filename}. (Subida a Drive deshabilitada)")
-            return True, None
-
+            from backend.services.reporte_lote_service import ReportesLoteService
+            return ReportesLoteService.encolar(id_inyeccion) or {
+                'id_inyeccion': id_inyeccion, 'estado': 'ERROR', 'error': 'Lote sin filas en db_inyeccion.'
+            }
         except Exception as e:
-            logger.error(f" ❌ ERROR CRÍTICO en proceso PDF/Drive: {str(e)}")
-            return False, str(e)
-        finally:
-            if local_file and os.path.exists(local_file):
-                try:
-                    os.remove(local_file)
-                except Exception:
-                    pass
+            logger.error(f" ❌ No se pudo encolar el PDF del lote {id_inyeccion}: {e}")
+            return {'id_inyeccion': id_inyeccion, 'estado': 'ERROR', 'error': str(e)}
 
     @staticmethod
     def registrar_lote(data, usuario_activo):
@@ -662,6 +641,7 @@ class InyeccionService:
 
             db.session.commit()
             logger.info(f" ✅ Lote {id_iny_lote} (PENDIENTE) procesado con {len(items)} items.")
+            publish_table_change('db_inyeccion', 'db_pnc_inyeccion', 'db_programacion')
 
         except Exception as e:
             db.session.rollback()
@@ -670,7 +650,9 @@ class InyeccionService:
             raise
 
         # --- PDF (opcional y resiliente, fuera de la transacción ya confirmada) ---
-        pdf_ok, _ = InyeccionService._generar_pdf_lote(turno, items)
+        # Solo se encola: el supervisor lo descarga luego desde
+        # /api/inyeccion/lote/<id>/pdf.
+        pdf_estado = InyeccionService._encolar_pdf_lote(id_iny_lote)
 
         # DTO por item, construido DESPUÉS del commit para reflejar valores
         # definitivos (id_sql autoincremental incluido). Contrato explícito:
@@ -691,8 +673,8 @@ class InyeccionService:
         return {
             'success': True,
             'mensaje': 'Lote registrado exitosamente. Queda PENDIENTE de validación.',
-            'pdf_generated': pdf_ok,
-            'pdf_status': "success" if pdf_ok else "failed",
+            'pdf_generated': pdf_estado['estado'] == 'LISTO',
+            'pdf_status': {'LISTO': 'success', 'ERROR': 'failed'}.get(pdf_estado['estado'], 'queued'),
             'id_inyeccion': id_iny_lote,
             'items': items_resultado
         }
@@ -891,6 +873,10 @@ class InyeccionService:
                 })
 
             db.session.commit()
+            publish_table_change(
+                'db_inyeccion', 'db_pnc_inyeccion', 'db_pnc_pulido',
+                'db_productos', 'db_trazabilidad_lotes',
+            )
 
         except Exception as e:
             db.session.rollback()
@@ -1215,8 +1201,13 @@ class InyeccionService:
                     ProgramacionInyeccion.maquina == prod.maquina,
                     ProgramacionInyeccion.estado == 'EN_PROCESO'
                 ).update({"estado": 'FINALIZADO'}, synchronize_session=False)
+                mes_estado.marcar_maquinas(db.session, prod.maquina)
 
             db.session.commit()
+            publish_table_change(
+                'db_inyeccion', 'db_trazabilidad_lotes',
+                'db_distribucion_op_pedidos', 'db_programacion',
+            )
 
         except Exception as e:
             db.session.rollback()
@@ -1389,6 +1380,13 @@ class InyeccionService:
                 logger.error(f"❌ Error crítico en InyeccionService.guardar_programacion: {e}")
             raise
 
+        # Tablero MES: relee las máquinas que tocó el commit. Best-effort, la
+        # programación ya quedó confirmada.
+        try:
+            mes_estado.refrescar_pendientes()
+        except Exception as e:
+            logger.error(f"❌ No se pudo refrescar el tablero MES tras guardar_programacion: {e}")
+
         logger.info(f"✅ {len(programaciones_ids)} Programación(es) creada(s)/actualizada(s) exitosamente. Pedidos distribuidos: {len(pedidos_asignados)}")
         return {
             "success": True,
@@ -1495,6 +1493,7 @@ class InyeccionService:
 
                 db.session.commit()
                 logger.info(f"✅ PNC registrado para {id_cod} en {id_iny}: Total: {total_cantidad}")
+                publish_table_change('db_inyeccion', 'db_pnc_inyeccion')
                 return {
                     "success": True,
                     "message": "PNC registrado correctamente en db_pnc_inyeccion",
@@ -1507,6 +1506,7 @@ class InyeccionService:
                     cant_bruta = prod_iny.cant_contador or prod_iny.cantidad_real or 0
                     prod_iny.cantidad_real = int(round(cant_bruta))
                 db.session.commit()
+                publish_table_change('db_inyeccion', 'db_pnc_inyeccion')
                 return {
                     "success": True,
                     "message": "No se reportaron defectos de PNC",
@@ -1676,6 +1676,7 @@ class InyeccionService:
             StockService.registrar_entrada(codigo_norm, cantidad_final - pnc, "POR PULIR")
 
             db.session.commit()
+            publish_table_change('db_inyeccion', 'db_productos')
 
             from backend.services.programacion_service import ProgramacionService
             ProgramacionService.clear_mes_cache()
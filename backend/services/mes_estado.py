@@ -0,0 +1,360 @@
+"""
+Tablero de estado de máquinas del MES (inyección) en memoria, con push a
+las pantallas de planta.
+
+Antes cada carga de /api/mes/dashboard leía TODAS las máquinas activas,
+TODA la producción EN_PROCESO y TODA la programación PROGRAMADO y las
+repartía por máquina con list comprehensions (máquinas x filas), y
+/api/mes/status/<maquina> hacía hasta tres consultas más; el `_mes_cache`
+de ProgramacionService nunca se llegó a poblar.
+
+Ahora el estado vive en un almacén por máquina (nombre en mayúsculas ->
+entrada del tablero + status de la máquina + revisión):
+  - Se construye completo desde SQL solo en la primera lectura del proceso
+    (arranque) o a pedido (reconstruir(), POST /api/mes/estado/reconstruir).
+  - Cada commit que toca ProduccionInyeccion o ProgramacionInyeccion por
+    ORM anota la(s) máquina(s) afectada(s) en before_flush (igual que
+    pedidos_feed); las escrituras por Query.update las anotan con
+    marcar_maquinas(). En after_commit la sesión ya no puede consultar, así
+    que las marcas quedan pendientes y refrescar_pendientes() -- que llaman
+    las escrituras del MES justo después del commit vía
+    ProgramacionService.clear_mes_cache(), y cualquier lectura antes de
+    responder -- relee SOLO esas máquinas. Un cambio en db_maquinas fuerza
+    la reconstrucción completa.
+  - Cada máquina que cambia recibe la siguiente revisión global; el
+    tablero se codifica a JSON una vez por revisión y se sirve con ETag, y
+    /api/mes/stream (SSE) empuja solo las máquinas con revisión nueva. Un
+    espectador más no cuesta ninguna consulta.
+
+El cursor de los clientes lleva la época del proceso ("<epoca>.<revision>"):
+tras un reinicio, o si cambió el catálogo de máquinas, cambios_desde
+responde None y el cliente recibe el tablero completo.
+"""
+import json
+import logging
+import threading
+import uuid
+from itertools import chain
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from backend.models.sql_models import db, Maquina, ProduccionInyeccion, ProgramacionInyeccion
+
+logger = logging.getLogger(__name__)
+
+# Tablero cuando db_maquinas no tiene máquinas activas (mismo fallback de siempre).
+MAQUINAS_POR_DEFECTO = ['MAQUINA No.1', 'MAQUINA No.2', 'MAQUINA No.3', 'MAQUINA No.4']
+ESTADOS_ACTIVOS = ('EN_PROCESO', 'ABIERTO')
+
+_EPOCA = uuid.uuid4().hex[:8]
+_cond = threading.Condition()
+_refresco_lock = threading.Lock()
+_revision = 0
+# Revisión en que cambió por última vez el catálogo de máquinas: un cursor
+# anterior necesita el tablero completo (pudo desaparecer una máquina).
+_revision_catalogo = 0
+_catalogo = None      # nombres del tablero en orden; None = aún sin construir
+_maquinas = {}        # NOMBRE -> {'revision', 'tablero', 'status'}
+_json_tablero = None  # (revision, bytes)
+
+# Marcas confirmadas que aún no se releen de SQL.
+_pendientes = set()
+_completo_pendiente = False
+
+_SESION_MAQUINAS = 'mes_maquinas_modificadas'
+_COMPLETO = '*'
+
+
+def _clave(maquina):
+    return str(maquina or '').strip().upper()
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_maquinas_modificadas(session, flush_context, instances):
+    """Anota en session.info las máquinas (actual y anterior) que este flush toca."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (ProduccionInyeccion, ProgramacionInyeccion)):
+            marcas = session.info.setdefault(_SESION_MAQUINAS, set())
+            marcas.add(_clave(obj.maquina))
+            marcas.update(_clave(m) for m in inspect(obj).attrs.maquina.history.deleted)
+        elif isinstance(obj, Maquina):
+            session.info.setdefault(_SESION_MAQUINAS, set()).add(_COMPLETO)
+
+
+@event.listens_for(Session, 'after_commit')
+def _pendientes_tras_commit(session):
+    global _completo_pendiente
+    marcas = session.info.pop(_SESION_MAQUINAS, None)
+    if marcas:
+        with _cond:
+            if _COMPLETO in marcas:
+                _completo_pendiente = True
+            _pendientes.update(m for m in marcas if m and m != _COMPLETO)
+            # Despierta a los streams en espera: refrescan y empujan el cambio.
+            _cond.notify_all()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(session):
+    session.info.pop(_SESION_MAQUINAS, None)
+
+
+def marcar_maquinas(db_session, *maquinas):
+    """
+    Anota máquinas modificadas sin pasar por el ORM (Query.update, SQL
+    crudo) en la transacción en curso; quedan pendientes en su commit.
+    """
+    claves = {_clave(m) for m in maquinas if _clave(m)}
+    if claves:
+        db_session.info.setdefault(_SESION_MAQUINAS, set()).update(claves)
+
+
+# ----------------------------------------------------------------------
+# Construcción desde SQL
+# ----------------------------------------------------------------------
+
+def _estado_maquina(nombre, activos, programados):
+    """Entrada del tablero y status de una máquina a partir de sus filas vivas."""
+    en_proceso = [r for r in activos if r.estado == 'EN_PROCESO']
+    trabajo_activo = None
+    estado = 'LIBRE'
+    if en_proceso:
+        primer = en_proceso[0]
+        trabajo_activo = {
+            'id_inyeccion': primer.id_inyeccion,
+            'molde': primer.molde,
+            'hora_inicio': primer.fecha_inicia.strftime('%H:%M') if primer.fecha_inicia else '',
+            'producto': ", ".join([str(r.id_codigo or '') for r in en_proceso]),
+            'cavidades': sum([int(r.cavidades or 0) for r in en_proceso]),
+            'productos_activos': [
+                {
+                    'id_inyeccion': r.id_inyeccion,
+                    'codigo_sistema': r.id_codigo,
+                    'cavidades': r.cavidades,
+                    'molde': r.molde,
+                    'hora_inicio': r.hora_inicio or (r.fecha_inicia.strftime('%H:%M') if r.fecha_inicia else '')
+                } for r in en_proceso
+            ]
+        }
+        estado = 'EN_PROCESO'
+
+    cola = [
+        {
+            'id_programacion': r.id,
+            'codigo_sistema': r.codigo_sistema,
+            'molde': r.molde,
+            'cavidades': r.cavidades,
+            'cantidad': float(r.cantidad or 0)
+        }
+        for r in programados
+    ]
+    if cola and estado == 'LIBRE':
+        estado = 'PROGRAMADO'
+
+    if activos:
+        primer = activos[0]
+        status = {
+            'estado': primer.estado,
+            'id_inyeccion': primer.id_inyeccion,
+            'id_programacion': primer.id_inyeccion,
+            'producto': ", ".join([str(r.id_codigo or '') for r in activos]),
+            'molde': str(primer.molde or ''),
+            'cavidades': sum([int(r.cavidades or 0) for r in activos]),
+            'inicio': primer.fecha_inicia.strftime('%H:%M') if primer.fecha_inicia else '',
+            'teorica': 0
+        }
+    elif programados:
+        # Siguiente bloque en cola: mismo fecha+molde+OP que el programado más antiguo.
+        primer = programados[0]
+        bloque = [
+            r for r in programados
+            if (r.fecha, r.molde, r.op_world_office) == (primer.fecha, primer.molde, primer.op_world_office)
+        ]
+        status = {
+            'estado': 'PROGRAMADO',
+            'id_programacion': primer.id,
+            'producto': ", ".join([str(r.codigo_sistema or '') for r in bloque]),
+            'molde': str(primer.molde or ''),
+            'cavidades': sum([int(r.cavidades or 0) for r in bloque])
+        }
+    else:
+        status = {'estado': 'LIBRE'}
+
+    return {
+        'tablero': {'nombre': nombre, 'estado': estado, 'trabajo_activo': trabajo_activo, 'cola': cola},
+        'status': status,
+    }
+
+
+def _leer_filas(claves=None):
+    """(activos, programados) por máquina; `claves` limita a esas máquinas."""
+    activos_q = db.session.query(ProduccionInyeccion).filter(ProduccionInyeccion.estado.in_(ESTADOS_ACTIVOS))
+    programados_q = db.session.query(ProgramacionInyeccion).filter(ProgramacionInyeccion.estado == 'PROGRAMADO')
+    if claves is not None:
+        activos_q = activos_q.filter(func.upper(func.trim(ProduccionInyeccion.maquina)).in_(claves))
+        programados_q = programados_q.filter(func.upper(func.trim(ProgramacionInyeccion.maquina)).in_(claves))
+
+    activos, programados = {}, {}
+    for r in activos_q.order_by(ProduccionInyeccion.id.asc()).all():
+        activos.setdefault(_clave(r.maquina), []).append(r)
+    for r in programados_q.order_by(ProgramacionInyeccion.id.asc()).all():
+        programados.setdefault(_clave(r.maquina), []).append(r)
+    return activos, programados
+
+
+def _aplicar(nuevos, catalogo=None):
+    """Publica los estados que cambiaron (y el catálogo si viene); despierta a los streams."""
+    global _revision, _revision_catalogo, _catalogo
+    with _cond:
+        cambiadas = [
+            clave for clave, estado in nuevos.items()
+            if clave not in _maquinas or {k: _maquinas[clave][k] for k in ('tablero', 'status')} != estado
+        ]
+        cambia_catalogo = catalogo is not None and catalogo != _catalogo
+        if not cambiadas and not cambia_catalogo:
+            return 0
+        _revision += 1
+        for clave in cambiadas:
+            _maquinas[clave] = dict(nuevos[clave], revision=_revision)
+        if catalogo is not None:
+            for clave in set(_maquinas) - set(nuevos):
+                del _maquinas[clave]
+        if cambia_catalogo:
+            _catalogo = catalogo
+            _revision_catalogo = _revision
+        _cond.notify_all()
+        return len(cambiadas)
+
+
+def _construir_completo():
+    catalogo = [m.nombre for m in db.session.query(Maquina).filter(Maquina.activa == True).all()]
+    if not catalogo:
+        catalogo = list(MAQUINAS_POR_DEFECTO)
+    activos, programados = _leer_filas()
+    nombres = {_clave(n): n for n in catalogo}
+    for clave in chain(activos, programados):
+        nombres.setdefault(clave, clave)
+    _aplicar(
+        {clave: _estado_maquina(nombre, activos.get(clave, []), programados.get(clave, []))
+         for clave, nombre in nombres.items()},
+        catalogo=catalogo,
+    )
+    logger.info(f"[MES] Tablero construido desde SQL: {len(catalogo)} máquinas (revisión {_revision})")
+
+
+def _refrescar(claves):
+    activos, programados = _leer_filas(claves)
+    nombres = {_clave(n): n for n in _catalogo}
+    cambiadas = _aplicar({
+        clave: _estado_maquina(nombres.get(clave, clave), activos.get(clave, []), programados.get(clave, []))
+        for clave in claves
+    })
+    logger.debug(f"[MES] Refrescadas {sorted(claves)}: {cambiadas} con cambios (revisión {_revision})")
+
+
+def refrescar_pendientes():
+    """
+    Relee de SQL las máquinas marcadas por commits ya confirmados (o todo el
+    tablero si nunca se construyó o cambió el catálogo). Barato si no hay
+    marcas: no consulta.
+    """
+    global _completo_pendiente
+    if _catalogo is not None and not _pendientes and not _completo_pendiente:
+        return
+    with _refresco_lock:
+        with _cond:
+            completo = _catalogo is None or _completo_pendiente
+            claves = set(_pendientes)
+            _pendientes.clear()
+            _completo_pendiente = False
+        try:
+            if completo:
+                _construir_completo()
+            elif claves:
+                _refrescar(claves)
+        except Exception:
+            # Las marcas no se pierden: el siguiente lector lo reintenta.
+            with _cond:
+                _completo_pendiente = _completo_pendiente or completo
+                _pendientes.update(claves)
+            raise
+
+
+def reconstruir():
+    """Reconstrucción completa desde SQL a pedido (p.ej. tras escrituras fuera de la app)."""
+    global _completo_pendiente
+    with _cond:
+        _completo_pendiente = True
+    refrescar_pendientes()
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+def _entrada(clave):
+    estado = _maquinas[clave]
+    return dict(estado['tablero'], revision=estado['revision'])
+
+
+def _tablero_bloqueado():
+    return [_entrada(_clave(n)) for n in _catalogo]
+
+
+def tablero():
+    """(cursor, lista de máquinas del tablero) al día."""
+    refrescar_pendientes()
+    with _cond:
+        return f"{_EPOCA}.{_revision}", _tablero_bloqueado()
+
+
+def tablero_json():
+    """(etag, bytes) del tablero {'cursor', 'maquinas'}: se codifica una vez por revisión."""
+    global _json_tablero
+    refrescar_pendientes()
+    with _cond:
+        if _json_tablero is None or _json_tablero[0] != _revision:
+            cuerpo = {'cursor': f"{_EPOCA}.{_revision}", 'maquinas': _tablero_bloqueado()}
+            _json_tablero = (_revision, json.dumps(cuerpo, ensure_ascii=False, default=str).encode('utf-8'))
+        return f"mes-{_EPOCA}-{_json_tablero[0]}", _json_tablero[1]
+
+
+def status(maquina):
+    """Estado actual de una máquina (mismo contrato que obtener_status_maquina)."""
+    refrescar_pendientes()
+    with _cond:
+        estado = _maquinas.get(_clave(maquina))
+        return dict(estado['status']) if estado else {'estado': 'LIBRE'}
+
+
+def _parsear_cursor(cursor):
+    epoca, _, rev = str(cursor or '').partition('.')
+    if epoca != _EPOCA or not rev.isdigit():
+        return None
+    return int(rev)
+
+
+def cambios_desde(cursor, espera=0):
+    """
+    (máquinas del tablero con revisión posterior a `cursor`, cursor nuevo).
+
+    Sin cambios espera hasta `espera` segundos a que un commit marque alguna
+    máquina, la relee y devuelve lo que haya cambiado (lista vacía si nada).
+    Devuelve (None, cursor) cuando el cursor no sirve (otra época, futuro o
+    anterior al último cambio de catálogo): el caller debe mandar el
+    tablero completo. Usa db.session: requiere app_context.
+    """
+    refrescar_pendientes()
+    desde = _parsear_cursor(cursor)
+    if espera and desde is not None:
+        with _cond:
+            _cond.wait_for(lambda: _revision != desde or _pendientes or _completo_pendiente, timeout=espera)
+        refrescar_pendientes()
+    with _cond:
+        if desde is None or desde > _revision or desde < _revision_catalogo:
+            return None, f"{_EPOCA}.{_revision}"
+        cambiadas = [
+            _entrada(_clave(n)) for n in _catalogo if _maquinas[_clave(n)]['revision'] > desde
+        ]
+        return cambiadas, f"{_EPOCA}.{_revision}"
@@ -0,0 +1,387 @@
+"""
+Planificador de requerimientos de materiales (MRP) de ensamble.
+
+Antes la factibilidad se calculaba kit por kit (obtener_bom_con_stock ->
+alcanza_para) y nadie veía cómo los programas de ensamble pendientes y los
+pedidos abiertos compiten por las mismas carcasas, bujes e insumos. Este
+servicio arma UN plan para toda la planta:
+
+  Demanda
+    - Programas de ensamble abiertos (db_programacion_ensamble, estado !=
+      COMPLETADO): el faltante (objetivo - realizada) explota por la ficha
+      del kit (misma resolución que usa el reporte de ensamble) como
+      demanda de sus componentes en fecha_programada, y a la vez es una
+      recepción programada del kit en esa fecha.
+    - Pedidos pendientes (db_pedidos abiertos): cantidad - despachado por
+      ítem, en la fecha del pedido.
+  Abastecimiento por código
+    - en_mano: p_terminado (stock_bodega para CAR/INT, que es de donde los
+      descuenta el ensamble -- ver EnsambleService.finalizar).
+    - por_pulir de db_productos y WIP de inyección (por_pulir de los lotes
+      de db_trazabilidad_lotes aún no validados).
+  Neteo por niveles (padres antes que hijos): la demanda de cada código se
+  recorre en orden de fecha contra su abastecimiento y sus recepciones
+  programadas; lo que queda sin cubrir es un faltante con fecha. Si el
+  código tiene ficha propia (sub-ensamble, p.ej. sub-recetas CB) su
+  faltante explota como demanda de sus componentes en la misma fecha.
+
+Incremental: el stock se lee del snapshot del catálogo (CatalogoService),
+que ya absorbe cada movimiento de StockService confirmado. Cuando su
+versión cambia solo se re-netean los códigos del plan cuyo abastecimiento
+cambió y sus descendientes en la BOM; el resto del plan se conserva. Un
+cambio de demanda (pedidos, despachos, programas o ficha) por ORM o por
+publish_table_change reconstruye el plan completo en la próxima lectura,
+igual que vencer MRP_TTL_SEGUNDOS.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from itertools import chain
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from backend.core.sql_database import db, rollback_seguro
+from backend.models.sql_models import (
+    DespachoPedido, FichaMaestra, Pedido, ProgramacionEnsamble, TrazabilidadLote,
+)
+from backend.services.bom_service import obtener_indice_bom
+from backend.services.catalogo_service import CatalogoService
+from backend.utils.cache_manager import subscribe_table_changes
+from backend.utils.formatters import normalizar_codigo
+from backend.utils.time_utils import get_colombia_time
+
+logger = logging.getLogger(__name__)
+
+MRP_TTL_SEGUNDOS = 600
+ESTADOS_PEDIDO_CERRADOS = ('COMPLETADO', 'DESPACHADO', 'ENTREGADO', 'FACTURADO', 'CANCELADO')
+ESTADO_LOTE_VALIDADO = 'APROBADO_CERRADO'
+PREFIJOS_BODEGA = ('CAR', 'INT')
+
+TABLAS_DEMANDA = frozenset({
+    'db_pedidos', 'db_despachos_pedido', 'db_programacion_ensamble', 'nueva_ficha_maestra',
+})
+TABLA_WIP = 'db_trazabilidad_lotes'
+_MODELOS_DEMANDA = (Pedido, DespachoPedido, ProgramacionEnsamble, FichaMaestra)
+
+# Tolerancia de redondeo al netear cantidades fraccionarias de la ficha.
+_EPSILON = 1e-9
+
+
+class PlanMrp:
+    """Plan neteado; las estructuras de demanda son fijas, el neteo se rehace por código."""
+
+    def __init__(self, base, recepciones, hijos, sin_ficha):
+        self.base = base                  # codigo -> [(fecha, cantidad, origen)]
+        self.recepciones = recepciones    # codigo -> [(fecha, cantidad, origen)]
+        self.hijos = hijos                # codigo -> [(codigo_hijo, cantidad_por_unidad)]
+        self.sin_ficha = sin_ficha        # programas cuyo kit no resolvió ficha
+        self.aportes = defaultdict(dict)  # hijo -> {padre: [(fecha, cantidad, origen)]}
+        self.abastecimiento = {}          # codigo -> dict en_mano/por_pulir/wip_inyeccion
+        self.filas = {}                   # codigo -> fila del resultado
+        self.orden, self.nivel = _orden_por_niveles(set(base) | set(recepciones), hijos)
+        self.version_catalogo = None
+        self.wip = None
+        self.construido_en = time.time()
+        self.actualizado_en = self.construido_en
+
+    def descendientes(self, codigos):
+        """`codigos` y todo lo que cuelga de ellos en la BOM."""
+        vistos = set(codigos)
+        pendientes = deque(vistos)
+        while pendientes:
+            for hijo, _ in self.hijos.get(pendientes.popleft(), ()):
+                if hijo not in vistos:
+                    vistos.add(hijo)
+                    pendientes.append(hijo)
+        return vistos
+
+
+def _orden_por_niveles(raices, hijos):
+    """
+    Orden topológico (padres antes que hijos) y nivel de cada código
+    alcanzable desde `raices`. Un ciclo en la ficha no corta el plan: sus
+    códigos van al final con el último nivel conocido.
+    """
+    nodos = set()
+    pendientes = deque(raices)
+    while pendientes:
+        c = pendientes.popleft()
+        if c in nodos:
+            continue
+        nodos.add(c)
+        pendientes.extend(h for h, _ in hijos.get(c, ()))
+
+    entradas = defaultdict(int)
+    for c in nodos:
+        for h, _ in hijos.get(c, ()):
+            entradas[h] += 1
+    nivel = {}
+    cola = deque(sorted(c for c in nodos if not entradas[c]))
+    for c in cola:
+        nivel[c] = 0
+    orden = []
+    while cola:
+        c = cola.popleft()
+        orden.append(c)
+        for h, _ in hijos.get(c, ()):
+            nivel[h] = max(nivel.get(h, 0), nivel[c] + 1)
+            entradas[h] -= 1
+            if entradas[h] == 0:
+                cola.append(h)
+    en_ciclo = sorted(nodos - set(orden))
+    if en_ciclo:
+        logger.warning(f"[MRP] Ciclo en la ficha maestra entre {en_ciclo[:10]}: se netean al final")
+        for c in en_ciclo:
+            nivel.setdefault(c, max(nivel.values(), default=0) + 1)
+        orden.extend(en_ciclo)
+    return orden, nivel
+
+
+def _cargar_demanda():
+    """(base, recepciones, hijos, sin_ficha) desde programas, pedidos y la ficha."""
+    indice = obtener_indice_bom()
+    hoy = get_colombia_time().date()
+    base, recepciones, sin_ficha = defaultdict(list), defaultdict(list), []
+
+    programas = ProgramacionEnsamble.query.filter(ProgramacionEnsamble.estado != 'COMPLETADO').all()
+    for prog in programas:
+        faltante = float((prog.cantidad_objetivo or 0) - (prog.cantidad_realizada or 0))
+        if faltante <= 0 or not prog.id_codigo:
+            continue
+        origen = f"PROG-{prog.id_prog}"
+        recepciones[normalizar_codigo(prog.id_codigo)].append((prog.fecha_programada, faltante, origen))
+        bom = indice.resolver(prog.id_codigo)
+        if bom['error']:
+            sin_ficha.append({'id_prog': prog.id_prog, 'id_codigo': prog.id_codigo, 'error': bom['error']})
+            continue
+        for _, codigo_inv, cantidad in bom['componentes']:
+            base[codigo_inv].append((prog.fecha_programada, faltante * cantidad, origen))
+
+    enviados = db.session.query(
+        DespachoPedido.id_pedido, DespachoPedido.id_codigo,
+        func.sum(DespachoPedido.cantidad_enviada).label('enviado'),
+    ).group_by(DespachoPedido.id_pedido, DespachoPedido.id_codigo).subquery()
+    pedidos = db.session.query(
+        Pedido.id_pedido, Pedido.id_codigo, Pedido.fecha, Pedido.cantidad,
+        func.coalesce(enviados.c.enviado, 0),
+    ).outerjoin(
+        enviados, (enviados.c.id_pedido == Pedido.id_pedido) & (enviados.c.id_codigo == Pedido.id_codigo)
+    ).filter(
+        Pedido.estado.isnot(None), Pedido.estado.notin_(ESTADOS_PEDIDO_CERRADOS)
+    ).all()
+    for id_pedido, id_codigo, fecha, cantidad, enviado in pedidos:
+        pendiente = float(cantidad or 0) - float(enviado or 0)
+        if pendiente > 0 and id_codigo:
+            base[normalizar_codigo(id_codigo)].append((fecha or hoy, pendiente, id_pedido))
+
+    # Multinivel: todo código con ficha propia (match exacto) se puede ensamblar.
+    hijos = {}
+    pendientes = deque(set(base) | set(recepciones))
+    while pendientes:
+        c = pendientes.popleft()
+        if c in hijos:
+            continue
+        hijos[c] = [(codigo_inv, cantidad) for _, codigo_inv, cantidad in indice.subensamble(c)]
+        pendientes.extend(h for h, _ in hijos[c] if h not in hijos)
+
+    return base, recepciones, hijos, sin_ficha
+
+
+def _cargar_wip():
+    """codigo -> piezas inyectadas en lotes aún no validados (no están en db_productos)."""
+    filas = db.session.query(
+        TrazabilidadLote.id_codigo, func.sum(TrazabilidadLote.por_pulir)
+    ).filter(TrazabilidadLote.estado_actual != ESTADO_LOTE_VALIDADO).group_by(TrazabilidadLote.id_codigo).all()
+    wip = defaultdict(float)
+    for id_codigo, piezas in filas:
+        if id_codigo and piezas:
+            wip[normalizar_codigo(id_codigo)] += float(piezas)
+    return dict(wip)
+
+
+def _abastecimiento(codigo, snap, wip):
+    p = snap.buscar_codigo(codigo)
+    if p is None:
+        en_mano = por_pulir = 0.0
+    else:
+        en_mano = p.stock_bodega if codigo.startswith(PREFIJOS_BODEGA) else p.p_terminado
+        por_pulir = p.por_pulir
+    return {'en_mano': en_mano, 'por_pulir': por_pulir, 'wip_inyeccion': wip.get(codigo, 0.0)}
+
+
+def _netear(plan, codigo, snap):
+    """Netea `codigo` contra su abastecimiento y propaga su faltante a sus componentes."""
+    abast = plan.abastecimiento[codigo]
+    demandas = sorted(
+        chain(plan.base.get(codigo, ()), chain.from_iterable(plan.aportes[codigo].values())),
+        key=lambda d: (d[0], d[2]),
+    )
+    recepciones = sorted(plan.recepciones.get(codigo, ()), key=lambda r: r[0])
+
+    disponible = abast['en_mano'] + abast['por_pulir'] + abast['wip_inyeccion']
+    faltantes = []
+    i = 0
+    for fecha, cantidad, origen in demandas:
+        while i < len(recepciones) and recepciones[i][0] <= fecha:
+            disponible += recepciones[i][1]
+            i += 1
+        cubierto = min(disponible, cantidad)
+        disponible -= cubierto
+        if cantidad - cubierto > _EPSILON:
+            faltantes.append((fecha, cantidad - cubierto, origen))
+
+    for hijo, por_unidad in plan.hijos.get(codigo, ()):
+        plan.aportes[hijo][codigo] = [(f, c * por_unidad, f"{o}>{codigo}") for f, c, o in faltantes]
+
+    producto = snap.buscar_codigo(codigo)
+    plan.filas[codigo] = {
+        'codigo': codigo,
+        'descripcion': producto.descripcion if producto else '',
+        'nivel': plan.nivel.get(codigo, 0),
+        'se_ensambla': bool(plan.hijos.get(codigo)),
+        'requerido': sum(d[1] for d in demandas),
+        'programado': sum(r[1] for r in recepciones),
+        **abast,
+        'faltante': sum(f[1] for f in faltantes),
+        'fecha_faltante': faltantes[0][0].isoformat() if faltantes else None,
+        'faltantes': [{'fecha': f.isoformat(), 'cantidad': c, 'origen': o} for f, c, o in faltantes],
+        'demandas': [{'fecha': f.isoformat(), 'cantidad': c, 'origen': o} for f, c, o in demandas],
+    }
+
+
+def _construir(snap):
+    base, recepciones, hijos, sin_ficha = _cargar_demanda()
+    plan = PlanMrp(base, recepciones, hijos, sin_ficha)
+    plan.wip = _cargar_wip()
+    plan.version_catalogo = snap.version
+    for codigo in plan.orden:
+        plan.abastecimiento[codigo] = _abastecimiento(codigo, snap, plan.wip)
+        _netear(plan, codigo, snap)
+    logger.info(f"[MRP] Plan construido: {len(plan.orden)} códigos, {len(sin_ficha)} programas sin ficha")
+    return plan
+
+
+def _refrescar_abastecimiento(plan, snap, wip):
+    """Re-netea solo los códigos cuyo abastecimiento cambió y sus descendientes."""
+    cambiados = set()
+    for codigo in plan.orden:
+        nuevo = _abastecimiento(codigo, snap, wip)
+        if nuevo != plan.abastecimiento[codigo]:
+            plan.abastecimiento[codigo] = nuevo
+            cambiados.add(codigo)
+    plan.version_catalogo = snap.version
+    plan.wip = wip
+    if not cambiados:
+        return 0
+    afectados = plan.descendientes(cambiados)
+    for codigo in plan.orden:
+        if codigo in afectados:
+            _netear(plan, codigo, snap)
+    plan.actualizado_en = time.time()
+    logger.debug(f"[MRP] Re-neteo incremental: {len(cambiados)} con stock nuevo, {len(afectados)} afectados")
+    return len(afectados)
+
+
+# ----------------------------------------------------------------------
+# Estado del proceso
+# ----------------------------------------------------------------------
+
+_lock = threading.Lock()
+_plan = None
+_demanda_sucia = False
+_wip_sucio = False
+
+_SESION_DEMANDA = 'mrp_demanda_modificada'
+_SESION_WIP = 'mrp_wip_modificado'
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_cambios_mrp(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _MODELOS_DEMANDA):
+            session.info[_SESION_DEMANDA] = True
+        elif isinstance(obj, TrazabilidadLote):
+            session.info[_SESION_WIP] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _marcar_tras_commit(session):
+    global _demanda_sucia, _wip_sucio
+    if session.info.pop(_SESION_DEMANDA, None):
+        _demanda_sucia = True
+    if session.info.pop(_SESION_WIP, None):
+        _wip_sucio = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(session):
+    session.info.pop(_SESION_DEMANDA, None)
+    session.info.pop(_SESION_WIP, None)
+
+
+@subscribe_table_changes
+def _marcar_por_cambio_de_tabla(tablas, tenant):
+    global _demanda_sucia, _wip_sucio
+    if tablas & TABLAS_DEMANDA:
+        _demanda_sucia = True
+    if TABLA_WIP in tablas:
+        _wip_sucio = True
+
+
+class MrpService:
+    """Plan de requerimientos de materiales compartido por el proceso."""
+
+    @staticmethod
+    def invalidar():
+        """Fuerza reconstrucción completa en la próxima lectura."""
+        global _demanda_sucia
+        _demanda_sucia = True
+
+    @staticmethod
+    def obtener_plan():
+        """
+        Plan vigente. Reconstruye si no existe, cambió la demanda o venció
+        MRP_TTL_SEGUNDOS; si solo se movió stock (versión del catálogo) o el
+        WIP de inyección, re-netea de forma incremental.
+        """
+        global _plan, _demanda_sucia, _wip_sucio
+        with _lock:
+            try:
+                snap = CatalogoService.obtener()
+                plan = _plan
+                if plan is None or _demanda_sucia or time.time() - plan.construido_en > MRP_TTL_SEGUNDOS:
+                    # Se limpian ANTES de leer: un commit que llegue durante la
+                    # construcción vuelve a marcar y fuerza otra en la siguiente.
+                    _demanda_sucia = _wip_sucio = False
+                    _plan = _construir(snap)
+                    return _plan
+                wip = plan.wip
+                if _wip_sucio:
+                    _wip_sucio = False
+                    wip = _cargar_wip()
+                if snap.version != plan.version_catalogo or wip != plan.wip:
+                    _refrescar_abastecimiento(plan, snap, wip)
+                return plan
+            except Exception:
+                rollback_seguro()
+                raise
+
+    @staticmethod
+    def resumen(incluir_cubiertos=False):
+        """
+        Vista de planeación: componentes con faltante (o todos con
+        `incluir_cubiertos`) ordenados por fecha del primer faltante, más los
+        programas cuyo kit no tiene ficha.
+        """
+        plan = MrpService.obtener_plan()
+        filas = [f for f in plan.filas.values() if incluir_cubiertos or f['faltante'] > _EPSILON]
+        filas.sort(key=lambda f: (f['fecha_faltante'] is None, f['fecha_faltante'] or '', f['nivel'], f['codigo']))
+        return {
+            'componentes': filas,
+            'programas_sin_ficha': plan.sin_ficha,
+            'version_catalogo': plan.version_catalogo,
+            'construido_en': plan.construido_en,
+            'actualizado_en': plan.actualizado_en,
+        }
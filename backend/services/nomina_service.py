@@ -17,6 +17,8 @@ import logging
 from datetime import datetime
 from typing import Optional
 
+import numpy as np
+import pandas as pd
 from sqlalchemy import text, func
 from backend.core.sql_database import db
 from backend.models.sql_models import CorteNomina, RegistroAsistencia as RegistroAsistenciaSQL, Usuario
@@ -71,6 +73,48 @@ def _normalizar_hora(hora_str) -> str:
     return ""
 
 
+def _minutos_hora(hora_str) -> int:
+    """Minutos desde medianoche de una hora cruda, o -1 si es irreconocible (mismo criterio que el cálculo escalar)."""
+    try:
+        t = datetime.strptime(_normalizar_hora(hora_str), "%H:%M")
+    except ValueError:
+        return -1
+    return t.hour * 60 + t.minute
+
+
+def _dia_semana(fecha) -> int:
+    """weekday() de la fecha; texto ISO inválido (o ausente) cuenta como lunes, igual que el cálculo escalar."""
+    if isinstance(fecha, str):
+        try:
+            return datetime.strptime(fecha, '%Y-%m-%d').weekday()
+        except ValueError:
+            return 0
+    return fecha.weekday() if fecha is not None else 0
+
+
+def _compilar_perfiles() -> tuple:
+    """
+    PERFILES_HORARIO precompilado a minutos: (índice perfil -> fila,
+    matrices [perfil, weekday] de inicio, fin y deducción). Sábado y domingo
+    quedan en 0: esos días no usan el perfil.
+    """
+    indice = {perfil: i for i, perfil in enumerate(PERFILES_HORARIO)}
+    inicio, fin, deduccion = (np.zeros((len(indice), 7), dtype=np.int64) for _ in range(3))
+    for perfil, fila in indice.items():
+        for weekday, regla in PERFILES_HORARIO[perfil].items():
+            inicio[fila, weekday] = _minutos_hora(regla['inicio'])
+            fin[fila, weekday] = _minutos_hora(regla['fin'])
+            deduccion[fila, weekday] = regla['deduccion']
+    return indice, inicio, fin, deduccion
+
+
+_PERFILES_MINUTOS = _compilar_perfiles()
+
+# round(minutos / 60.0, 2) tabulado para todo minuto posible del día: el
+# cálculo en lote redondea exactamente igual que el escalar.
+_HORAS_POR_MINUTO = np.array([round(m / 60.0, 2) for m in range(24 * 60 + 1)])
+
+
 def _condicion_rol(division: str) -> str:
     """Devuelve el fragmento SQL que aísla la división correcta."""
     if division.lower() == 'all':
@@ -235,6 +279,224 @@ def actualizar_registro_asistencia(registro_id: int, nuevo_ingreso: str, nueva_s
     }
 
 
+# Filas por sentencia INSERT ... VALUES (11 parámetros por fila).
+LOTE_ASISTENCIA_MAX = 500
+
+_COLUMNAS_ASISTENCIA = (
+    'fecha', 'colaborador', 'ingreso_real', 'salida_real', 'horas_ordinarias', 'horas_extras',
+    'estado', 'estado_pago', 'motivo', 'comentarios', 'registrado_por',
+)
+
+
+def _clave_asistencia(fecha, colaborador) -> tuple:
+    # fecha puede volver como date (Postgres) o como texto ISO (SQLite).
+    return (str(fecha)[:10], colaborador)
+
+
+def guardar_asistencia_masiva(registros: list, usuario_registra: str) -> dict:
+    """
+    Guarda un lote de registros de asistencia (uno por colaborador-día)
+    recalculando horas server-side con ReglasAsistencia.
+
+    Antes se hacía un SELECT por registro y se mutaban objetos ORM uno a uno:
+    una semana de 60 personas eran cientos de consultas en un solo request.
+    Ahora son siempre:
+      1. Un SELECT de las filas existentes del lote (solo para reportar
+         creado/actualizado/bloqueado por fila).
+      2. Un INSERT ... ON CONFLICT (fecha, colaborador) DO UPDATE por cada
+         LOTE_ASISTENCIA_MAX filas, respaldado por uq_asistencia_fecha_colaborador
+         (backend/sql/migrate_asistencia_unique_fecha_colaborador.py).
+
+    La inmutabilidad contable la aplica el propio UPDATE (WHERE estado_pago
+    <> 'PROCESADO'): una fila liquidada no se toca aunque el corte ocurra
+    entre el SELECT y el INSERT; la ausencia de su id en el RETURNING la
+    reporta como 'bloqueado'. Si un colaborador-día llega repetido gana la
+    última ocurrencia y las anteriores se reportan 'reemplazado'.
+
+    Retorna {'resultados': [{indice, colaborador, fecha, resultado, id}],
+    'creados', 'actualizados', 'bloqueados'}. No hace commit: el caller
+    confirma o revierte la transacción.
+    """
+    hoy = datetime.now().date()
+    resultados = []
+    filas = {}  # clave -> (indice en resultados, parámetros)
+
+    for reg in registros:
+        nombre = reg.get('colaborador') or reg.get('nombre')
+        if not nombre:
+            resultados.append({'colaborador': None, 'fecha': None, 'resultado': 'omitido', 'id': None})
+            continue
+
+        # Determinar fecha (ISO -> Date) de forma estricta
+        try:
+            fecha_dt = datetime.strptime(reg.get('fecha') or '', '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            fecha_dt = hoy
+
+        ing_real = reg.get('ingreso_real') or reg.get('hora_entrada', '')
+        sal_real = reg.get('salida_real') or reg.get('hora_salida', '')
+
+        # Recálculo de Reglas de Negocio en Servidor (Descarte de horas provenientes del cliente)
+        calculo = ReglasAsistencia.calcular_jornada_y_extras(RegistroAsistencia(
+            fecha=fecha_dt, ingreso_real=ing_real, salida_real=sal_real, colaborador=nombre
+        ))
+
+        clave = _clave_asistencia(fecha_dt, nombre)
+        if clave in filas:
+            resultados[filas[clave][0]]['resultado'] = 'reemplazado'
+        resultados.append({'colaborador': nombre, 'fecha': clave[0], 'resultado': None, 'id': None})
+        filas[clave] = (len(resultados) - 1, {
+            'fecha': fecha_dt,
+            'colaborador': nombre,
+            'ingreso_real': ing_real,
+            'salida_real': sal_real,
+            'horas_ordinarias': calculo['horas_ordinarias'],
+            'horas_extras': calculo['horas_extras'],
+            'estado': reg.get('estado', 'REGISTRADO'),
+            'estado_pago': 'PENDIENTE',
+            'motivo': reg.get('motivo'),
+            'comentarios': reg.get('comentarios', ''),
+            'registrado_por': usuario_registra,
+        })
+
+    conteo = {'creados': 0, 'actualizados': 0, 'bloqueados': 0}
+    if not filas:
+        return {'resultados': [dict(r, indice=i) for i, r in enumerate(resultados)], **conteo}
+
+    # 1. Prefetch: un superconjunto por fechas y colaboradores del lote.
+    existentes = {
+        _clave_asistencia(fecha, colaborador): id_registro
+        for id_registro, fecha, colaborador in db.session.query(
+            RegistroAsistenciaSQL.id, RegistroAsistenciaSQL.fecha, RegistroAsistenciaSQL.colaborador
+        ).filter(
+            RegistroAsistenciaSQL.fecha.in_({fila['fecha'] for _, fila in filas.values()}),
+            RegistroAsistenciaSQL.colaborador.in_({fila['colaborador'] for _, fila in filas.values()}),
+        )
+    }
+
+    # 2. UPSERT por lotes; el WHERE del DO UPDATE protege lo liquidado.
+    escritos = {}
+    lote = list(filas.values())
+    for inicio in range(0, len(lote), LOTE_ASISTENCIA_MAX):
+        parametros, valores = {}, []
+        for n, (_, fila) in enumerate(lote[inicio:inicio + LOTE_ASISTENCIA_MAX]):
+            valores.append('(' + ', '.join(f':{col}_{n}' for col in _COLUMNAS_ASISTENCIA) + ')')
+            parametros.update({f'{col}_{n}': fila[col] for col in _COLUMNAS_ASISTENCIA})
+        sql = text(f"""
+            INSERT INTO db_asistencia ({', '.join(_COLUMNAS_ASISTENCIA)})
+            VALUES {', '.join(valores)}
+            ON CONFLICT (fecha, colaborador) DO UPDATE SET
+                ingreso_real     = EXCLUDED.ingreso_real,
+                salida_real      = EXCLUDED.salida_real,
+                horas_ordinarias = EXCLUDED.horas_ordinarias,
+                horas_extras     = EXCLUDED.horas_extras,
+                estado           = EXCLUDED.estado,
+                motivo           = COALESCE(EXCLUDED.motivo, db_asistencia.motivo),
+                comentarios      = EXCLUDED.comentarios,
+                registrado_por   = EXCLUDED.registrado_por
+            WHERE COALESCE(db_asistencia.estado_pago, '') <> 'PROCESADO'
+            RETURNING id, fecha, colaborador
+        """)
+        for id_registro, fecha, colaborador in db.session.execute(sql, parametros):
+            escritos[_clave_asistencia(fecha, colaborador)] = id_registro
+
+    for clave, (indice, _) in filas.items():
+        resultado = resultados[indice]
+        if clave not in escritos:
+            resultado.update(resultado='bloqueado', id=existentes.get(clave))
+            conteo['bloqueados'] += 1
+            logger.warning(
+                f"[INMUTABILIDAD] Omiso intento de sobreescritura en registro sellado "
+                f"ID {existentes.get(clave)} del colaborador '{clave[1]}'."
+            )
+        elif clave in existentes:
+            resultado.update(resultado='actualizado', id=escritos[clave])
+            conteo['actualizados'] += 1
+        else:
+            resultado.update(resultado='creado', id=escritos[clave])
+            conteo['creados'] += 1
+
+    return {'resultados': [dict(r, indice=i) for i, r in enumerate(resultados)], **conteo}
+
+
+# Filas por sentencia del UPDATE de recalcular_periodo (3 parámetros por fila).
+LOTE_RECALCULO_MAX = 1000
+
+
+def recalcular_periodo(division: str, p_inicio=None, p_fin=None, aplicar: bool = True) -> dict:
+    """
+    Recalcula horas_ordinarias/horas_extras de los registros NO procesados
+    de la división entre p_inicio y p_fin (por defecto el periodo pendiente
+    de get_periodo_pendiente) con ReglasAsistencia.calcular_lote, y reescribe
+    solo las filas cuyo valor cambió con un UPDATE ... FROM (VALUES ...) por
+    cada LOTE_RECALCULO_MAX filas. Sirve para backfills tras cambiar
+    PERFILES_HORARIO/MAPEO_PERFILES o corregir datos importados.
+
+    Con aplicar=False solo reporta cuántas filas cambiarían. No hace commit.
+    Lanza ValueError si no hay periodo pendiente.
+    """
+    if p_inicio is None or p_fin is None:
+        pendiente_inicio, pendiente_fin = get_periodo_pendiente(division)
+        p_inicio = p_inicio or pendiente_inicio
+        p_fin = p_fin or pendiente_fin
+    if not p_inicio or not p_fin:
+        raise ValueError("No hay registros pendientes para recalcular.")
+
+    filtro_division = "" if division.lower() == 'all' else (
+        f"AND EXISTS (SELECT 1 FROM db_usuarios u WHERE {_join_colaborador()} {_condicion_rol(division)})"
+    )
+    filas = db.session.execute(text(f"""
+        SELECT a.id, a.fecha, a.colaborador, a.ingreso_real, a.salida_real,
+               a.horas_ordinarias, a.horas_extras
+        FROM db_asistencia a
+        WHERE a.fecha >= :p_inicio
+          AND a.fecha <= :p_fin
+          AND COALESCE(a.estado_pago, 'PENDIENTE') != 'PROCESADO'
+          {filtro_division}
+    """), {"p_inicio": p_inicio, "p_fin": p_fin}).fetchall()
+
+    registros = pd.DataFrame(filas, columns=[
+        'id', 'fecha', 'colaborador', 'ingreso_real', 'salida_real', 'ord_actual', 'extra_actual',
+    ])
+    calculado = ReglasAsistencia.calcular_lote(registros)
+    cambiados = calculado[
+        (np.abs(calculado['ord_actual'].map(_parse_hours) - calculado['horas_ordinarias']) > 0.001)
+        | (np.abs(calculado['extra_actual'].map(_parse_hours) - calculado['horas_extras']) > 0.001)
+    ]
+
+    if aplicar and len(cambiados):
+        valores = list(zip(
+            cambiados['id'].tolist(), cambiados['horas_ordinarias'].tolist(), cambiados['horas_extras'].tolist()
+        ))
+        for inicio in range(0, len(valores), LOTE_RECALCULO_MAX):
+            lote = valores[inicio:inicio + LOTE_RECALCULO_MAX]
+            parametros = {}
+            for n, (id_registro, h_ord, h_ext) in enumerate(lote):
+                parametros.update({f'id_{n}': id_registro, f'ord_{n}': h_ord, f'ext_{n}': h_ext})
+            db.session.execute(text(f"""
+                WITH v (id, horas_ordinarias, horas_extras) AS (
+                    VALUES {', '.join(f'(:id_{n}, :ord_{n}, :ext_{n})' for n in range(len(lote)))}
+                )
+                UPDATE db_asistencia
+                SET horas_ordinarias = v.horas_ordinarias,
+                    horas_extras     = v.horas_extras
+                FROM v
+                WHERE db_asistencia.id = v.id
+                  AND COALESCE(db_asistencia.estado_pago, 'PENDIENTE') != 'PROCESADO'
+            """), parametros)
+
+    logger.info(
+        f"[NOMINA] Recálculo {division} {p_inicio} a {p_fin}: {len(calculado)} registros, "
+        f"{len(cambiados)} con horas distintas{'' if aplicar else ' (sin aplicar)'}."
+    )
+    return {
+        "p_inicio": p_inicio,
+        "p_fin": p_fin,
+        "registros": len(calculado),
+        "actualizados": len(cambiados),
+    }
+
+
 # ── API pública — Consultas de Consolidado ────────────────────────────────────
 
 def get_consolidado_pendiente(division: str) -> list:
@@ -432,6 +694,81 @@ class ReglasAsistencia:
 
         return resultado
 
+    @classmethod
+    def calcular_lote(cls, registros: pd.DataFrame) -> pd.DataFrame:
+        """
+        Versión vectorizada de calcular_jornada_y_extras para cortes,
+        recálculos y backfills: recibe un DataFrame con fecha, ingreso_real,
+        salida_real y colaborador y devuelve una copia con horas_ordinarias y
+        horas_extras, idénticas a las del cálculo escalar fila por fila.
+
+        Horas, días y perfiles se resuelven una vez por valor distinto (un
+        periodo repite pocas horas, fechas y colaboradores); el resto es
+        aritmética de arreglos sobre minutos con los perfiles precompilados en
+        _PERFILES_MINUTOS. Una fecha ausente cuenta como lunes (el escalar
+        fallaría con ella).
+        """
+        resultado = registros.copy()
+        n = len(resultado)
+        # Los vacíos llegan como None (pandas >= 3 los infiere como NaN en
+        # columnas de texto): se restituye None para replicar al escalar.
+        ingreso, salida, fechas, colaboradores = (
+            resultado[col].astype(object).where(resultado[col].notna(), None)
+            for col in ('ingreso_real', 'salida_real', 'fecha', 'colaborador')
+        )
+        if n == 0:
+            resultado['horas_ordinarias'] = np.zeros(0)
+            resultado['horas_extras'] = np.zeros(0)
+            return resultado
+
+        ausente = ingreso.map(lambda h: isinstance(h, str) and h.upper() == 'AUSENTE').to_numpy(dtype=bool)
+        vacio = ~(ingreso.map(bool).to_numpy(dtype=bool) & salida.map(bool).to_numpy(dtype=bool))
+
+        def por_valor(serie, funcion):
+            tabla = {v: funcion(v) for v in set(serie)}
+            return np.fromiter((tabla[v] for v in serie), dtype=np.int64, count=n)
+
+        t_in = por_valor(ingreso, lambda h: _minutos_hora(h) if isinstance(h, str) else -1)
+        t_out = por_valor(salida, lambda h: _minutos_hora(h) if isinstance(h, str) else -1)
+        weekday = por_valor(fechas, _dia_semana)
+
+        indice, inicio, fin, deduccion = _PERFILES_MINUTOS
+        perfil = por_valor(
+            colaboradores,
+            lambda c: indice[MAPEO_PERFILES.get(cls._resolver_username_colaborador(c), 'ESTANDAR')],
+        )
+
+        irreconocible = ~(vacio | ausente) & ((t_in < 0) | (t_out < 0))
+        invertido = ~(vacio | ausente | irreconocible) & (t_out <= t_in)
+        if irreconocible.any() or invertido.any():
+            logger.warning(
+                f"[NOMINA] Cálculo en lote: {int(irreconocible.sum())} registros con hora irreconocible y "
+                f"{int(invertido.sum())} con salida <= ingreso registrados como 0.0/0.0."
+            )
+        valido = ~(vacio | ausente | irreconocible | invertido)
+        fin_de_semana = valido & (weekday >= 5)
+        habil = valido & ~fin_de_semana
+
+        w_start = inicio[perfil, weekday]
+        w_end = fin[perfil, weekday]
+        ded = deduccion[perfil, weekday]
+
+        ord_mins = np.maximum(0, np.minimum(t_out, w_end) - np.maximum(t_in, w_start))
+        ord_mins = np.where(ord_mins > ded, ord_mins - ded, 0)
+
+        extra_mins = np.maximum(0, w_start - t_in) + np.maximum(0, t_out - w_end)
+        # Candado aritmético (ver calcular_jornada_y_extras).
+        incompleta = (t_out < w_end) | (ord_mins < w_end - w_start - ded)
+        extra_mins = np.where(incompleta, 0, extra_mins)
+
+        total_mins = np.where(valido, t_out - t_in, 0)
+        ord_final = np.where(habil, ord_mins, 0)
+        extra_final = np.where(habil, extra_mins, np.where(fin_de_semana, total_mins, 0))
+
+        resultado['horas_ordinarias'] = _HORAS_POR_MINUTO[ord_final]
+        resultado['horas_extras'] = _HORAS_POR_MINUTO[extra_final]
+        return resultado
+
     @classmethod
     def calcular_jornada_y_extras(cls, registro: RegistroAsistencia) -> dict:
         if not registro.ingreso_real or not registro.salida_real or registro.ingreso_real.upper() == 'AUSENTE':
@@ -0,0 +1,132 @@
+"""
+Change-feed de pedidos pendientes (almacén, tablets y modo TV).
+
+Antes cada pantalla de almacén re-pedía /api/pedidos/pendientes cada 15s
+(30s en modo TV) y cada llamada re-ejecutaba el JOIN contra el agregado de
+cartera_wo y re-armaba el JSON agrupado completo, aunque casi nunca hubiera
+cambiado nada.
+
+Ahora cada commit que toca db_pedidos sube una revisión monótona del
+proceso y anota qué id_pedido cambió en esa revisión:
+  - Las escrituras por ORM (instancias Pedido nuevas, modificadas o
+    borradas) se detectan solas en before_flush, igual que el snapshot del
+    catálogo (backend/services/catalogo_service.py).
+  - Las escrituras masivas (Query.update, SQL crudo) no pasan por el flush:
+    el código que las hace llama marcar_pedidos(db_session, ...) dentro de
+    la misma transacción (p.ej. PedidosService.actualizar_alistamiento y
+    /api/pedidos/delegar).
+  En ambos casos la revisión se publica en after_commit y se descarta en
+    after_rollback: un cliente nunca ve una revisión cuyos datos aún no son
+    visibles en la base.
+
+El cliente guarda el cursor que le devolvió la última respuesta y pregunta
+/api/pedidos/pendientes/cambios?desde=<cursor>: si no hay revisiones nuevas
+la respuesta es un 304 que no toca la base; si las hay, solo se consultan
+los pedidos que cambiaron (ver cambios_desde).
+
+El cursor lleva la época del proceso ("<epoca>.<revision>"): tras un
+reinicio, o si el cliente quedó más atrás de lo que guarda el historial
+(HISTORIAL_MAX pedidos), cambios_desde responde None y el cliente recibe
+el listado completo.
+"""
+import threading
+import uuid
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.models.sql_models import Pedido
+
+HISTORIAL_MAX = 5000
+
+_EPOCA = uuid.uuid4().hex[:8]
+_cond = threading.Condition()
+_revision = 0
+# Revisión más antigua que el historial todavía puede responder: un cursor
+# anterior a esta perdió cambios podados y necesita el listado completo.
+_revision_base = 0
+_cambios = {}  # id_pedido -> última revisión en que cambió
+
+_SESION_PEDIDOS = 'pedidos_feed_modificados'
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_pedidos_modificados(session, flush_context, instances):
+    """Anota en session.info los id_pedido que este flush va a escribir."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Pedido) and obj.id_pedido:
+            session.info.setdefault(_SESION_PEDIDOS, set()).add(str(obj.id_pedido).strip())
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_tras_commit(session):
+    ids = session.info.pop(_SESION_PEDIDOS, None)
+    if ids:
+        publicar(ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(session):
+    session.info.pop(_SESION_PEDIDOS, None)
+
+
+def marcar_pedidos(db_session, *ids_pedido):
+    """
+    Anota pedidos modificados sin pasar por el ORM (Query.update, SQL
+    crudo) en la transacción en curso; se publican en su commit.
+    """
+    ids = {str(i).strip() for i in ids_pedido if i and str(i).strip()}
+    if ids:
+        db_session.info.setdefault(_SESION_PEDIDOS, set()).update(ids)
+
+
+def publicar(ids_pedido):
+    """Sube la revisión y despierta a los long-polls en espera. Llamar tras el commit."""
+    global _revision, _revision_base
+    with _cond:
+        _revision += 1
+        for id_pedido in ids_pedido:
+            _cambios[id_pedido] = _revision
+        if len(_cambios) > HISTORIAL_MAX:
+            # Poda la mitad más antigua; quien venga de antes hace recarga completa.
+            ordenados = sorted(_cambios.items(), key=lambda kv: kv[1])
+            for id_pedido, rev in ordenados[:len(ordenados) // 2]:
+                del _cambios[id_pedido]
+                _revision_base = max(_revision_base, rev)
+        _cond.notify_all()
+
+
+def cursor_actual():
+    with _cond:
+        return f"{_EPOCA}.{_revision}"
+
+
+def _parsear_cursor(cursor):
+    """Revisión del cursor si es de este proceso; None si es ajeno o inválido."""
+    epoca, _, rev = str(cursor or '').partition('.')
+    if epoca != _EPOCA or not rev.isdigit():
+        return None
+    return int(rev)
+
+
+def cambios_desde(cursor, espera=0):
+    """
+    (ids de pedidos cambiados después de `cursor`, cursor nuevo).
+
+    Sin cambios devuelve un set vacío, después de esperar hasta `espera`
+    segundos a que algún commit publique una revisión (long-poll). Devuelve
+    (None, cursor) cuando el cursor no sirve (otra época, más nuevo que la
+    revisión actual o anterior a lo que el historial conserva): el caller
+    debe mandar el listado completo.
+    """
+    desde = _parsear_cursor(cursor)
+    with _cond:
+        if desde is None or desde > _revision or desde < _revision_base:
+            return None, f"{_EPOCA}.{_revision}"
+        if espera and _revision == desde:
+            _cond.wait_for(lambda: _revision != desde, timeout=espera)
+        if desde < _revision_base:
+            return None, f"{_EPOCA}.{_revision}"
+        ids = {id_pedido for id_pedido, rev in _cambios.items() if rev > desde}
+        return ids, f"{_EPOCA}.{_revision}"
@@ -5,6 +5,7 @@ from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime
 from backend.models.sql_models import Pedido, DistribucionOpPedidos
+from backend.services.pedidos_feed import marcar_pedidos
 
 logger = logging.getLogger(__name__)
 
@@ -589,6 +590,11 @@ class PedidosService:
             if update_data:
                 db_session.query(Pedido).filter_by(id_pedido=id_pedido).update(update_data)
 
+        # El update masivo de cabecera no pasa por el flush del ORM: se anota
+        # a mano para que el change-feed de pendientes publique el pedido al
+        # confirmar el caller (backend/services/pedidos_feed.py).
+        marcar_pedidos(db_session, id_pedido)
+
         db_session.flush()
         logger.info(f"✅ [SQL-ALISTAMIENTO] {items_actualizados} items actualizados para {id_pedido}")
 
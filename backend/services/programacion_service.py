@@ -3,6 +3,7 @@ import uuid
 from datetime import datetime, date
 from sqlalchemy import text
 from backend.models.sql_models import db, Maquina, ProgramacionInyeccion, ProduccionInyeccion
+from backend.services import mes_estado
 from backend.utils.formatters import resolver_operario
 from backend.utils.time_utils import get_colombia_time
 
@@ -27,19 +28,6 @@ class MaquinaOcupadaException(Exception):
         super().__init__(self.message)
 
 
-# Cache de lectura del MES: nunca se llegó a poblar/leer (`_mes_cache[k]['data']`
-# no se usa en ningún lado), solo se invalida en cada escritura. Se preserva tal
-# cual en la migración — purgarlo es un cambio de comportamiento fuera del
-# alcance de esta extracción, no una decisión a tomar de forma unilateral.
-_mes_cache = {
-    'dashboard': {'data': None, 'ts': 0},
-    'prog_todas': {'data': None, 'ts': 0},
-    'pendientes_calidad': {'data': None, 'ts': 0},
-    'pendientes_validacion': {'data': None, 'ts': 0}
-}
-MES_CACHE_TTL = 60  # Aumentado a 60s para proteger cuota de API
-
-
 class ProgramacionService:
     """
     Dominio de Programación y Planta (MES): catálogo de máquinas, cola de
@@ -51,10 +39,13 @@ class ProgramacionService:
 
     @staticmethod
     def clear_mes_cache():
-        """Limpia todos los caches de lectura del MES (llamar en toda operación de escritura)."""
-        logger.info("🗑️ [CACHE] Invalidando cache MES por operacion de escritura")
-        for key in _mes_cache:
-            _mes_cache[key]['ts'] = 0
+        """
+        Lleva al tablero del MES (backend/services/mes_estado.py) lo que acaba
+        de confirmarse: relee de SQL solo las máquinas que tocó el commit y
+        empuja el cambio a los streams. Llamar después del commit en toda
+        operación de escritura del MES.
+        """
+        mes_estado.refrescar_pendientes()
 
     @staticmethod
     def obtener_maquinas_activas():
@@ -124,6 +115,7 @@ class ProgramacionService:
                     ids_creados.append(nueva_prog.id)
 
             db.session.commit()
+            ProgramacionService.clear_mes_cache()
             return {'ids_programacion': ids_creados, 'count': len(productos)}
         except Exception as e:
             db.session.rollback()
@@ -197,65 +189,14 @@ class ProgramacionService:
 
     @staticmethod
     def obtener_dashboard_mes():
-        """Estado completo de las máquinas: trabajo activo (ProduccionInyeccion EN_PROCESO) + cola (ProgramacionInyeccion PROGRAMADO), agrupado por máquina."""
-        maquinas_sql = db.session.query(Maquina).filter(Maquina.activa == True).all()
-        maquinas_set = [m.nombre for m in maquinas_sql]
-        if not maquinas_set:
-            maquinas_set = ['MAQUINA No.1', 'MAQUINA No.2', 'MAQUINA No.3', 'MAQUINA No.4']
-
-        en_proceso = db.session.query(ProduccionInyeccion).filter(ProduccionInyeccion.estado == 'EN_PROCESO').all()
-        programaciones = db.session.query(ProgramacionInyeccion).filter(ProgramacionInyeccion.estado == 'PROGRAMADO').all()
-
-        resultado = []
-        for maquina_nom in maquinas_set:
-            maquina_upper = maquina_nom.upper()
-            activos_maq = [r for r in en_proceso if (r.maquina or '').upper() == maquina_upper]
-
-            trabajo_activo = None
-            estado_maquina = 'LIBRE'
-
-            if activos_maq:
-                primer = activos_maq[0]
-                trabajo_activo = {
-                    'id_inyeccion': primer.id_inyeccion,
-                    'molde': primer.molde,
-                    'hora_inicio': primer.fecha_inicia.strftime('%H:%M') if primer.fecha_inicia else '',
-                    'producto': ", ".join([str(r.id_codigo or '') for r in activos_maq]),
-                    'cavidades': sum([int(r.cavidades or 0) for r in activos_maq]),
-                    'productos_activos': [
-                        {
-                            'id_inyeccion': r.id_inyeccion,
-                            'codigo_sistema': r.id_codigo,
-                            'cavidades': r.cavidades,
-                            'molde': r.molde,
-                            'hora_inicio': r.hora_inicio or (r.fecha_inicia.strftime('%H:%M') if r.fecha_inicia else '')
-                        } for r in activos_maq
-                    ]
-                }
-                estado_maquina = 'EN_PROCESO'
-
-            cola = [
-                {
-                    'id_programacion': r.id,
-                    'codigo_sistema': r.codigo_sistema,
-                    'molde': r.molde,
-                    'cavidades': r.cavidades,
-                    'cantidad': float(r.cantidad or 0)
-                }
-                for r in programaciones if (r.maquina or '').upper() == maquina_upper
-            ]
-
-            if cola and estado_maquina == 'LIBRE':
-                estado_maquina = 'PROGRAMADO'
-
-            resultado.append({
-                'nombre': maquina_nom,
-                'estado': estado_maquina,
-                'trabajo_activo': trabajo_activo,
-                'cola': cola
-            })
-
-        return resultado
+        """
+        Estado completo de las máquinas: trabajo activo (ProduccionInyeccion
+        EN_PROCESO) + cola (ProgramacionInyeccion PROGRAMADO), agrupado por
+        máquina. Se lee del tablero en memoria de mes_estado, que solo va a
+        SQL por las máquinas que cambiaron desde la última lectura.
+        """
+        _, maquinas = mes_estado.tablero()
+        return maquinas
 
     @staticmethod
     def obtener_pendientes_calidad():
@@ -293,59 +234,12 @@ class ProgramacionService:
     @staticmethod
     def obtener_status_maquina(maquina):
         """
-        Estado actual de una máquina agrupando montajes Multi-SKU: primero busca
-        producción EN_PROCESO/ABIERTO; si no hay, el siguiente bloque PROGRAMADO
-        en cola (mismo fecha+molde+OP); si no hay nada, LIBRE.
+        Estado actual de una máquina agrupando montajes Multi-SKU: primero
+        producción EN_PROCESO/ABIERTO; si no hay, el siguiente bloque
+        PROGRAMADO en cola (mismo fecha+molde+OP); si no hay nada, LIBRE.
+        Sale del tablero en memoria de mes_estado.
         """
-        maquina_upper = str(maquina).strip().upper()
-
-        activos = db.session.query(ProduccionInyeccion).filter(
-            ProduccionInyeccion.maquina == maquina_upper,
-            ProduccionInyeccion.estado.in_(['EN_PROCESO', 'ABIERTO'])
-        ).all()
-
-        if activos:
-            primer = activos[0]
-            codigos_concatenados = ", ".join([str(r.id_codigo or '') for r in activos])
-            total_cavidades = sum([int(r.cavidades or 0) for r in activos])
-
-            return {
-                'estado': primer.estado,
-                'id_inyeccion': primer.id_inyeccion,
-                'id_programacion': primer.id_inyeccion,
-                'producto': codigos_concatenados,
-                'molde': str(primer.molde or ''),
-                'cavidades': total_cavidades,
-                'inicio': primer.fecha_inicia.strftime('%H:%M') if primer.fecha_inicia else '',
-                'teorica': 0
-            }
-
-        primer_programado = db.session.query(ProgramacionInyeccion).filter(
-            ProgramacionInyeccion.maquina == maquina_upper,
-            ProgramacionInyeccion.estado == 'PROGRAMADO'
-        ).order_by(ProgramacionInyeccion.id.asc()).first()
-
-        if primer_programado:
-            programados_bloque = db.session.query(ProgramacionInyeccion).filter(
-                ProgramacionInyeccion.maquina == maquina_upper,
-                ProgramacionInyeccion.fecha == primer_programado.fecha,
-                ProgramacionInyeccion.molde == primer_programado.molde,
-                ProgramacionInyeccion.op_world_office == primer_programado.op_world_office,
-                ProgramacionInyeccion.estado == 'PROGRAMADO'
-            ).all()
-
-            codigos_concatenados = ", ".join([str(r.codigo_sistema or '') for r in programados_bloque])
-            total_cavidades = sum([int(r.cavidades or 0) for r in programados_bloque])
-
-            return {
-                'estado': 'PROGRAMADO',
-                'id_programacion': primer_programado.id,
-                'producto': codigos_concatenados,
-                'molde': str(primer_programado.molde or ''),
-                'cavidades': total_cavidades
-            }
-
-        return {'estado': 'LIBRE'}
+        return mes_estado.status(maquina)
 
     @staticmethod
     def iniciar_produccion_batch(id_programacion, responsable_raw):
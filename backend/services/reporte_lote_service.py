@@ -0,0 +1,286 @@
+"""
+Cola de generación de los PDF de lote de Inyección, con caché en disco.
+
+Antes: InyeccionService.registrar_lote llamaba _generar_pdf_lote después del
+commit, dentro de la misma petición HTTP. El render de ReportLab ocupaba el
+hilo de gunicorn todo lo que tardara (más con lotes multi-SKU largos), el
+operario esperaba ese tiempo en el formulario y al final el archivo se
+borraba: nadie podía volver a descargar el reporte.
+
+Ahora:
+  - registrar_lote solo ENCOLA (encolar) y responde; el render corre en un
+    ThreadPoolExecutor acotado (PDF_LOTE_WORKERS hilos, PDF_LOTE_COLA_MAX
+    trabajos en espera como máximo). Si la cola está llena el lote queda en
+    ERROR y se genera a demanda cuando alguien lo pida.
+  - El contenido del PDF (turno/items) se arma SIEMPRE desde las filas
+    guardadas en db_inyeccion, tanto al encolar tras el registro como al
+    pedirlo después: el mismo lote da el mismo PDF y la misma llave por
+    cualquiera de los dos caminos.
+  - El PDF queda en una caché en disco con presupuesto de bytes (mismo
+    DiskImageCache del proxy de imágenes, ver backend/utils/imagen_cache.py)
+    bajo la llave '<id_inyeccion>:<hash del contenido>'. Si el lote cambia
+    (p.ej. al validarlo) cambia el hash y se genera uno nuevo; el viejo sale
+    por LRU.
+  - Estado por lote (PENDIENTE / GENERANDO / LISTO / ERROR) para
+    /api/inyeccion/lote/<id>/pdf/estado. Cada descarga (obtener_pdf)
+    vuelve a leer el lote: si ese contenido ya está en disco lo sirve sin
+    renderizar, y si cambió desde el último PDF encola uno nuevo.
+
+El render no toca la BD (turno/items se leen antes de encolar), así que los
+hilos del pool no necesitan app_context.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from backend.utils.imagen_cache import DiskImageCache
+
+logger = logging.getLogger(__name__)
+
+PDF_LOTE_CACHE_DIR = os.getenv('PDF_LOTE_CACHE_DIR', os.path.join(os.getcwd(), 'cache_reportes_lote'))
+PDF_LOTE_CACHE_MAX_MB = int(os.getenv('PDF_LOTE_CACHE_MAX_MB', 64))
+PDF_LOTE_WORKERS = int(os.getenv('PDF_LOTE_WORKERS', 2))
+PDF_LOTE_COLA_MAX = int(os.getenv('PDF_LOTE_COLA_MAX', 50))
+
+PENDIENTE = 'PENDIENTE'
+GENERANDO = 'GENERANDO'
+LISTO = 'LISTO'
+ERROR = 'ERROR'
+
+# Cuántos lotes recuerda el dict de estados (los más viejos se olvidan; su
+# PDF, si sigue en disco, se encuentra igual al reconstruir el contenido).
+_MAX_ESTADOS = 2000
+
+_lock = threading.Lock()
+_estados = OrderedDict()  # id_inyeccion -> dict de estado
+_eventos = {}  # llave -> threading.Event del render en curso
+_en_cola = 0
+_executor = None
+_cache = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PDF_LOTE_WORKERS, thread_name_prefix='pdf-lote')
+        return _executor
+
+
+def _get_cache():
+    '''Instancia única (perezosa) de la caché en disco: el índice se carga al primer uso.'''
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = DiskImageCache(PDF_LOTE_CACHE_DIR, max_bytes=PDF_LOTE_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
+
+
+def _hash_contenido(turno, items):
+    crudo = json.dumps({'turno': turno, 'items': items}, sort_keys=True, default=str)
+    return hashlib.sha256(crudo.encode('utf-8')).hexdigest()[:16]
+
+
+def _nombre_archivo(turno):
+    maquina = str(turno.get('maquina') or 'S-M').replace(" ", "-")
+    fecha_raw = str(turno.get('fecha_inicio') or datetime.now().strftime('%Y-%m-%d'))
+    fecha_clean = fecha_raw.split(' ')[0].replace('/', '-')
+    op = str(turno.get('orden_produccion') or 'S-OP').replace(" ", "-")
+    nombre = f"{fecha_clean}_{op}_{maquina}.pdf".replace(" ", "_")
+    return re.sub(r'[\\/*?:"<>|]', "", nombre)
+
+
+def _publico(estado):
+    return {k: v for k, v in estado.items() if k != 'llave'}
+
+
+class ReportesLoteService:
+    """Render en segundo plano y caché en disco de los PDF de lote de Inyección."""
+
+    @staticmethod
+    def encolar(id_inyeccion):
+        """
+        Encola el PDF del lote (contenido leído de db_inyeccion) y devuelve
+        su estado público, o None si el lote no existe. Si ese mismo
+        contenido ya está en disco queda LISTO sin renderizar, y si ya se
+        está generando no se encola dos veces.
+        """
+        contenido = ReportesLoteService._contenido_desde_bd(id_inyeccion)
+        if contenido is None:
+            return None
+        return ReportesLoteService._encolar_contenido(id_inyeccion, *contenido)
+
+    @staticmethod
+    def estado(id_inyeccion):
+        with _lock:
+            estado = _estados.get(id_inyeccion)
+            return _publico(estado) if estado else None
+
+    @staticmethod
+    def esperar(id_inyeccion, timeout):
+        """Bloquea hasta `timeout` segundos a que termine el render en curso del lote."""
+        with _lock:
+            estado = _estados.get(id_inyeccion)
+            evento = _eventos.get(estado['llave']) if estado else None
+        if evento is not None:
+            evento.wait(timeout)
+        return ReportesLoteService.estado(id_inyeccion)
+
+    @staticmethod
+    def obtener_pdf(id_inyeccion):
+        """
+        (entrada, estado): entrada es la ImagenCacheada del PDF si ya está en
+        disco, si no None y el lote queda (re)encolado. (None, None) si el
+        lote no existe.
+
+        Siempre relee el lote de db_inyeccion y compara la llave: si el lote
+        cambió desde el último render (validación, edición de PNC o
+        cantidades) se encola el PDF nuevo en vez de servir el anterior.
+        """
+        nuevo = ReportesLoteService.encolar(id_inyeccion)
+        if nuevo is None:
+            return None, None
+        if nuevo['estado'] == LISTO:
+            with _lock:
+                llave = _estados[id_inyeccion]['llave']
+            return _get_cache().get(llave), nuevo
+        return None, nuevo
+
+    @staticmethod
+    def stats():
+        with _lock:
+            conteo = {}
+            for estado in _estados.values():
+                conteo[estado['estado']] = conteo.get(estado['estado'], 0) + 1
+            en_cola = _en_cola
+        return {'en_cola': en_cola, 'estados': conteo, 'cache': _get_cache().stats()}
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encolar_contenido(id_inyeccion, turno, items):
+        global _en_cola
+        llave = f"{id_inyeccion}:{_hash_contenido(turno, items)}"
+        estado = {
+            'id_inyeccion': id_inyeccion,
+            'llave': llave,
+            'estado': PENDIENTE,
+            'archivo': _nombre_archivo(turno),
+            'error': None,
+            'encolado_en': time.time(),
+            'terminado_en': None,
+        }
+
+        if _get_cache().get(llave) is not None:
+            estado.update(estado=LISTO, terminado_en=time.time())
+            ReportesLoteService._guardar_estado(estado)
+            return _publico(estado)
+
+        with _lock:
+            previo = _estados.get(id_inyeccion)
+            if previo and previo['llave'] == llave and previo['estado'] in (PENDIENTE, GENERANDO):
+                return _publico(previo)
+            if _en_cola >= PDF_LOTE_COLA_MAX:
+                estado.update(estado=ERROR, error='Cola de PDFs llena; se generará al descargarlo.')
+                ReportesLoteService._guardar_estado_unlocked(estado)
+                logger.warning(f"[PDF Lote] Cola llena, {id_inyeccion} queda para generación a demanda")
+                return _publico(estado)
+            _en_cola += 1
+            _eventos[llave] = threading.Event()
+            ReportesLoteService._guardar_estado_unlocked(estado)
+
+        _get_executor().submit(ReportesLoteService._renderizar, estado, turno, items)
+        return _publico(estado)
+
+    @staticmethod
+    def _guardar_estado(estado):
+        with _lock:
+            ReportesLoteService._guardar_estado_unlocked(estado)
+
+    @staticmethod
+    def _guardar_estado_unlocked(estado):
+        _estados[estado['id_inyeccion']] = estado
+        _estados.move_to_end(estado['id_inyeccion'])
+        while len(_estados) > _MAX_ESTADOS:
+            _estados.popitem(last=False)
+
+    @staticmethod
+    def _renderizar(estado, turno, items):
+        global _en_cola
+        from backend.utils.report_service import PDFGenerator
+
+        estado['estado'] = GENERANDO
+        fd, ruta_tmp = tempfile.mkstemp(suffix='.pdf', prefix='lote_')
+        os.close(fd)
+        inicio = time.perf_counter()
+        try:
+            if not PDFGenerator.generar_reporte_inyeccion_lote(turno, items, ruta_tmp):
+                raise RuntimeError('Error al generar el archivo PDF.')
+            with open(ruta_tmp, 'rb') as f:
+                _get_cache().set(estado['llave'], f.read(), 'application/pdf')
+            estado['estado'] = LISTO
+            logger.debug(
+                f"[PDF Lote] {estado['id_inyeccion']} generado en "
+                f"{(time.perf_counter() - inicio) * 1000:.0f} ms"
+            )
+        except Exception as e:
+            estado.update(estado=ERROR, error=str(e))
+            logger.error(f"[PDF Lote] Error generando {estado['id_inyeccion']}: {e}")
+        finally:
+            estado['terminado_en'] = time.time()
+            try:
+                os.remove(ruta_tmp)
+            except OSError:
+                pass
+            with _lock:
+                _en_cola -= 1
+                evento = _eventos.pop(estado['llave'], None)
+            if evento is not None:
+                evento.set()
+
+    @staticmethod
+    def _contenido_desde_bd(id_inyeccion):
+        """
+        (turno, items) del lote armados desde db_inyeccion, con las mismas
+        llaves que manda el formulario, o None si no hay filas. Las buenas
+        manuales ya van en cantidad_real (buenas + PNC); el peso de la vela
+        de máquina no se persiste y no se incluye (el PDF lo muestra N/D).
+        """
+        from backend.models.sql_models import ProduccionInyeccion
+
+        filas = ProduccionInyeccion.query.filter_by(id_inyeccion=id_inyeccion).order_by(ProduccionInyeccion.id).all()
+        if not filas:
+            return None
+        primera = filas[0]
+        turno = {
+            'fecha_inicio': primera.fecha_inicia.strftime('%Y-%m-%d') if primera.fecha_inicia else '',
+            'responsable': primera.responsable or '',
+            'maquina': primera.maquina or '',
+            'orden_produccion': primera.orden_produccion or '',
+            'entrada_manual': float(primera.entrada or 0),
+            'salida_manual': float(primera.salida or 0),
+            'hora_inicio': primera.hora_inicio or '',
+            'hora_termina': primera.hora_termina or '',
+            'almacen_destino': primera.almacen_destino or '',
+            'observaciones': primera.observaciones or '',
+        }
+        items = [{
+            'codigo_producto': f.id_codigo,
+            'no_cavidades': f.cavidades or 1,
+            'disparos': f.cant_contador or 0,
+            'cantidad_real': f.cantidad_real or 0,
+            'pnc': f.pnc_total or 0,
+            'peso_bujes': float(f.peso_bujes or 0),
+            'observaciones': f.observaciones or '',
+        } for f in filas]
+        return turno, items
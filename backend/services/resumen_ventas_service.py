@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+resumen_ventas_service.py — Mantenimiento INCREMENTAL de los resúmenes de
+db_ventas que alimentan el panel de Jefatura (/api/admin/dashboard) sin
+filtro de fecha:
+
+  - resumen_ventas_cliente_producto: (cliente resuelto, producto) para
+    Backorder, Top y Peores Productos.
+  - resumen_ventas_mensual: (año, mes) para el comparativo Ventas vs Pedidos.
+  - resumen_ventas_comercial: cubo (año, mes, día, vendedor, zona, cliente,
+    clasificación) del que lee toda la analítica comercial histórica
+    (backend/services/comercial_service.py).
+
+Reemplazan a las vistas materializadas mv_dashboard_ventas_analitica y
+mv_rendimiento_mensual. Un REFRESH MATERIALIZED VIEW CONCURRENTLY recalculaba
+las ~100k+ filas de db_ventas (Seq Scan + HashAggregate de ~7s) en cada
+sincronización de WO, aunque el delta solo tocara unas pocas decenas de
+filas (ver WoSyncService._volcar_staging_a_produccion). Ahora se recalculan
+SOLO los grupos afectados por el delta: los (cliente, producto) y meses de
+las filas insertadas, actualizadas (valor viejo y nuevo) o borradas.
+
+Se recalcula el grupo completo (DELETE + INSERT ... SELECT ... GROUP BY del
+grupo) en vez de sumar/restar deltas: avg_price es un MAX, que no se puede
+mantener restando, y recalcular desde db_ventas evita que un error de
+aritmética incremental se arrastre para siempre. Cada grupo se lee por los
+índices de db_ventas (productos / fecha), no con un scan completo.
+
+Todo corre DENTRO de la transacción del delta: el resumen queda consistente
+con db_ventas en el mismo commit (el REFRESH anterior iba en una conexión
+aparte y podía fallar dejando la vista desfasada hasta el próximo sync).
+
+Cada aplicación incrementa VERSION_KEY en app_config. El panel de Jefatura
+incluye esa versión en su llave de caché (ver admin_routes), así que una
+respuesta cacheada con datos de una versión anterior nunca se vuelve a servir.
+"""
+import logging
+
+from sqlalchemy import text
+
+from backend.core.sql_database import db, rollback_seguro
+
+logger = logging.getLogger(__name__)
+
+
+# Misma resolución de cliente que la antigua mv_dashboard_ventas_analitica y
+# que el camino en vivo de DashboardRepository (regla DISTRIBUJES + alias de
+# db_cliente_equivalencias). `b` = db_ventas (o una tabla con su forma), `e` =
+# db_cliente_equivalencias.
+_SQL_CLIENTE_RESUELTO = (
+    "CASE WHEN UPPER(TRIM(b.nombres)) ILIKE '%DISTRIBUJES%' "
+    "THEN 'FELIPE DUARTE MORENO' ELSE COALESCE(e.nombre_canonical, b.nombres) END"
+)
+_SQL_JOIN_EQUIVALENCIAS = (
+    "LEFT JOIN db_cliente_equivalencias e ON UPPER(TRIM(b.nombres)) = UPPER(TRIM(e.alias))"
+)
+_SQL_EXCLUIR_FRIPARTS = "UPPER(TRIM(b.nombres)) NOT ILIKE '%FRIPARTS%'"
+
+_SQL_AGREGADO_CLIENTE_PRODUCTO = f"""
+    SELECT
+        {_SQL_CLIENTE_RESUELTO} AS nombres,
+        b.productos AS producto,
+        SUM(CASE WHEN b.clasificacion ILIKE '%pedido%' THEN COALESCE(b.cantidad, 0) ELSE 0 END) AS pedidos_qty,
+        SUM(CASE WHEN b.clasificacion ILIKE '%venta%'  THEN COALESCE(b.cantidad, 0) ELSE 0 END) AS ventas_qty,
+        SUM(CASE WHEN b.clasificacion ILIKE '%venta%'  THEN COALESCE(b.total_ingresos, 0) ELSE 0 END) AS ventas_dinero,
+        MAX(COALESCE(b.precio_promedio, 0)) AS avg_price
+    FROM db_ventas b
+    {_SQL_JOIN_EQUIVALENCIAS}
+    WHERE {_SQL_EXCLUIR_FRIPARTS} {{filtro}}
+    GROUP BY 1, 2
+"""
+
+_SQL_AGREGADO_MENSUAL = """
+    SELECT
+        EXTRACT(YEAR FROM v.fecha)::INTEGER AS ano,
+        EXTRACT(MONTH FROM v.fecha)::INTEGER AS mes,
+        SUM(CASE WHEN v.clasificacion ILIKE '%venta%'  THEN COALESCE(v.total_ingresos, 0) ELSE 0 END) AS ventas_dinero,
+        SUM(CASE WHEN v.clasificacion ILIKE '%pedido%' THEN COALESCE(v.total_ingresos, 0) ELSE 0 END) AS pedidos_dinero,
+        SUM(CASE WHEN v.clasificacion ILIKE '%venta%'  THEN COALESCE(v.cantidad, 0) ELSE 0 END) AS ventas_unidades,
+        SUM(CASE WHEN v.clasificacion ILIKE '%pedido%' THEN COALESCE(v.cantidad, 0) ELSE 0 END) AS pedidos_unidades
+    FROM db_ventas v
+    {join}
+    WHERE v.fecha IS NOT NULL
+    GROUP BY 1, 2
+"""
+
+
+def _sql_ajustado_nc(columna):
+    """CASE que invierte el signo de `columna` cuando el registro es una Nota Crédito."""
+    return (
+        "CASE WHEN UPPER(TRIM(COALESCE(v.clasificacion, ''))) LIKE '%NC%' "
+        "OR UPPER(TRIM(COALESCE(v.documento, ''))) LIKE '%NC%' "
+        f"THEN -ABS(COALESCE(v.{columna}, 0)) ELSE COALESCE(v.{columna}, 0) END"
+    )
+
+
+# Cubo de la analítica comercial. Las dimensiones se guardan ya normalizadas
+# tal como las compara comercial_service (vendedor/clasificación en
+# UPPER(TRIM), zona/cliente en TRIM, '' en vez de NULL para que la llave
+# única funcione) y las medidas ya con las Notas Crédito restadas: las
+# consultas del cubo no repiten ningún CASE/TRIM por fila. El día se guarda
+# como (mes, día) y no como día del año: el corte YTD compara la tupla, que
+# es exacta entre años bisiestos y no bisiestos.
+_SQL_AGREGADO_COMERCIAL = f"""
+    SELECT
+        EXTRACT(YEAR FROM v.fecha)::INTEGER AS anio,
+        EXTRACT(MONTH FROM v.fecha)::INTEGER AS mes,
+        EXTRACT(DAY FROM v.fecha)::INTEGER AS dia,
+        UPPER(TRIM(COALESCE(v.vendedor, ''))) AS vendedor,
+        TRIM(COALESCE(v.zona, '')) AS zona,
+        TRIM(COALESCE(v.nombres, '')) AS cliente,
+        UPPER(TRIM(COALESCE(v.clasificacion, ''))) AS clasificacion,
+        SUM({_sql_ajustado_nc('total_ingresos')}) AS total_ventas,
+        SUM({_sql_ajustado_nc('cantidad')}) AS total_unidades,
+        COUNT(v.id) AS transacciones
+    FROM db_ventas v
+    {{join}}
+    WHERE v.fecha IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6, 7
+"""
+
+_COLUMNAS_CLIENTE_PRODUCTO = 'nombres, producto, pedidos_qty, ventas_qty, ventas_dinero, avg_price'
+_COLUMNAS_MENSUAL = 'ano, mes, ventas_dinero, pedidos_dinero, ventas_unidades, pedidos_unidades'
+_COLUMNAS_COMERCIAL = (
+    'anio, mes, dia, vendedor, zona, cliente, clasificacion, total_ventas, total_unidades, transacciones'
+)
+
+
+class ResumenVentasService:
+    """Resúmenes de db_ventas (Jefatura y Comercial), mantenidos por grupo afectado."""
+
+    TABLA_CLIENTE_PRODUCTO = 'resumen_ventas_cliente_producto'
+    TABLA_MENSUAL = 'resumen_ventas_mensual'
+    TABLA_COMERCIAL = 'resumen_ventas_comercial'
+
+    # app_config: versión (entero creciente) de los resúmenes.
+    VERSION_KEY = 'version_resumen_ventas'
+
+    @staticmethod
+    def capturar_grupos_afectados():
+        """
+        Registra en tmp_grupos_ventas (temporal, ON COMMIT DROP) los
+        (nombres, productos, fecha) crudos que el delta de tmp_delta_ventas va
+        a tocar: los valores VIEJOS de las filas a actualizar/borrar (hay que
+        leerlos de db_ventas ANTES de aplicar el delta) y los NUEVOS de las
+        filas a insertar/actualizar. Un UPDATE que mueve una fila de cliente o
+        de mes afecta a ambos grupos, el de origen y el de destino.
+        """
+        db.session.execute(text("""
+            CREATE TEMP TABLE tmp_grupos_ventas ON COMMIT DROP AS
+            SELECT v.nombres, v.productos, v.fecha
+            FROM db_ventas v
+            JOIN tmp_delta_ventas d ON d.id_produccion = v.id
+            WHERE d.accion IN ('U', 'D')
+            UNION
+            SELECT nombres, productos, fecha
+            FROM tmp_delta_ventas
+            WHERE accion IN ('I', 'U')
+        """))
+
+    @staticmethod
+    def aplicar_grupos_afectados():
+        """
+        Recalcula, con db_ventas YA actualizada, solo los grupos registrados
+        por capturar_grupos_afectados() y sube la versión. No hace commit:
+        corre en la transacción del delta. Si los resúmenes nunca se
+        construyeron (sin versión), hace la reconstrucción completa.
+        Devuelve (grupos_cliente_producto, meses, dias_cubo) recalculados.
+        """
+        if ResumenVentasService._version_actual_en_transaccion() is None:
+            ResumenVentasService._reconstruir_en_transaccion()
+            return None, None, None
+
+        # Llaves ya resueltas (alias -> canónico): el grupo del resumen es el
+        # del cliente canónico, que reúne las filas de TODOS sus alias.
+        db.session.execute(text(f"""
+            CREATE TEMP TABLE tmp_grupos_cliente_producto ON COMMIT DROP AS
+            SELECT DISTINCT {_SQL_CLIENTE_RESUELTO} AS nombres, b.productos AS producto
+            FROM tmp_grupos_ventas b
+            {_SQL_JOIN_EQUIVALENCIAS}
+            WHERE {_SQL_EXCLUIR_FRIPARTS}
+        """))
+        db.session.execute(text(f"""
+            DELETE FROM {ResumenVentasService.TABLA_CLIENTE_PRODUCTO} r
+            USING tmp_grupos_cliente_producto g
+            WHERE r.nombres IS NOT DISTINCT FROM g.nombres
+              AND r.producto IS NOT DISTINCT FROM g.producto
+        """))
+        # El filtro por productos deja usar el índice de db_ventas.productos;
+        # el JOIN final descarta los clientes del mismo producto que no
+        # estaban afectados (se recalculan, pero no se reinsertan dos veces).
+        filtro_productos = """
+            AND (b.productos IN (SELECT producto FROM tmp_grupos_cliente_producto)
+                 OR (b.productos IS NULL
+                     AND EXISTS (SELECT 1 FROM tmp_grupos_cliente_producto WHERE producto IS NULL)))
+        """
+        grupos = db.session.execute(text(f"""
+            INSERT INTO {ResumenVentasService.TABLA_CLIENTE_PRODUCTO} ({_COLUMNAS_CLIENTE_PRODUCTO})
+            SELECT a.nombres, a.producto, a.pedidos_qty, a.ventas_qty, a.ventas_dinero, a.avg_price
+            FROM ({_SQL_AGREGADO_CLIENTE_PRODUCTO.format(filtro=filtro_productos)}) a
+            JOIN tmp_grupos_cliente_producto g
+              ON a.nombres IS NOT DISTINCT FROM g.nombres
+             AND a.producto IS NOT DISTINCT FROM g.producto
+        """)).rowcount
+
+        db.session.execute(text("""
+            CREATE TEMP TABLE tmp_meses_ventas ON COMMIT DROP AS
+            SELECT DISTINCT CAST(DATE_TRUNC('month', fecha) AS DATE) AS inicio
+            FROM tmp_grupos_ventas
+            WHERE fecha IS NOT NULL
+        """))
+        db.session.execute(text(f"""
+            DELETE FROM {ResumenVentasService.TABLA_MENSUAL} r
+            USING tmp_meses_ventas m
+            WHERE r.ano = EXTRACT(YEAR FROM m.inicio) AND r.mes = EXTRACT(MONTH FROM m.inicio)
+        """))
+        join_meses = (
+            "JOIN tmp_meses_ventas m "
+            "ON v.fecha >= m.inicio AND v.fecha < CAST(m.inicio + INTERVAL '1 month' AS DATE)"
+        )
+        meses = db.session.execute(text(f"""
+            INSERT INTO {ResumenVentasService.TABLA_MENSUAL} ({_COLUMNAS_MENSUAL})
+            {_SQL_AGREGADO_MENSUAL.format(join=join_meses)}
+        """)).rowcount
+
+        dias = ResumenVentasService._aplicar_cubo_comercial()
+
+        ResumenVentasService._incrementar_version()
+        logger.info(
+            f"📊 Resumen de ventas actualizado: {grupos} grupos cliente/producto, {meses} meses, "
+            f"{dias if dias is not None else 'todos los'} días del cubo comercial."
+        )
+        return grupos, meses, dias
+
+    @staticmethod
+    def _aplicar_cubo_comercial():
+        """
+        Recalcula las celdas del cubo comercial de los DÍAS que tocó el delta
+        (todas sus combinaciones vendedor/zona/cliente/clasificación): la
+        fecha es la única dimensión del cubo que tmp_grupos_ventas conserva
+        de la fila vieja, y un día de db_ventas son unas decenas de filas que
+        se leen por el índice de fecha. Si el cubo está vacío (instalación
+        cuyos resúmenes ya tenían versión antes de existir el cubo) se
+        construye completo, una sola vez. Devuelve los días recalculados
+        (None si fue la construcción completa).
+        """
+        tabla = ResumenVentasService.TABLA_COMERCIAL
+        if not db.session.execute(text(f"SELECT EXISTS (SELECT 1 FROM {tabla})")).scalar():
+            db.session.execute(text(f"""
+                INSERT INTO {tabla} ({_COLUMNAS_COMERCIAL})
+                {_SQL_AGREGADO_COMERCIAL.format(join='')}
+            """))
+            return None
+
+        db.session.execute(text("""
+            CREATE TEMP TABLE tmp_dias_ventas ON COMMIT DROP AS
+            SELECT DISTINCT fecha FROM tmp_grupos_ventas WHERE fecha IS NOT NULL
+        """))
+        db.session.execute(text(f"""
+            DELETE FROM {tabla} r
+            USING tmp_dias_ventas d
+            WHERE r.anio = EXTRACT(YEAR FROM d.fecha)
+              AND r.mes = EXTRACT(MONTH FROM d.fecha)
+              AND r.dia = EXTRACT(DAY FROM d.fecha)
+        """))
+        db.session.execute(text(f"""
+            INSERT INTO {tabla} ({_COLUMNAS_COMERCIAL})
+            {_SQL_AGREGADO_COMERCIAL.format(join='JOIN tmp_dias_ventas d ON v.fecha = d.fecha')}
+        """))
+        return db.session.execute(text("SELECT COUNT(*) FROM tmp_dias_ventas")).scalar()
+
+    @staticmethod
+    def reconstruir():
+        """
+        Reconstrucción completa de los resúmenes desde db_ventas, con
+        commit. Para el backfill inicial (backend/sql/migrate_resumen_ventas.py)
+        o tras editar a mano db_cliente_equivalencias (cambia la resolución
+        de clientes de grupos que ningún delta va a tocar).
+        """
+        try:
+            ResumenVentasService._reconstruir_en_transaccion()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def _reconstruir_en_transaccion():
+        db.session.execute(text(
+            f"TRUNCATE {ResumenVentasService.TABLA_CLIENTE_PRODUCTO}, {ResumenVentasService.TABLA_MENSUAL}, "
+            f"{ResumenVentasService.TABLA_COMERCIAL}"
+        ))
+        db.session.execute(text(f"""
+            INSERT INTO {ResumenVentasService.TABLA_CLIENTE_PRODUCTO} ({_COLUMNAS_CLIENTE_PRODUCTO})
+            {_SQL_AGREGADO_CLIENTE_PRODUCTO.format(filtro='')}
+        """))
+        db.session.execute(text(f"""
+            INSERT INTO {ResumenVentasService.TABLA_MENSUAL} ({_COLUMNAS_MENSUAL})
+            {_SQL_AGREGADO_MENSUAL.format(join='')}
+        """))
+        db.session.execute(text(f"""
+            INSERT INTO {ResumenVentasService.TABLA_COMERCIAL} ({_COLUMNAS_COMERCIAL})
+            {_SQL_AGREGADO_COMERCIAL.format(join='')}
+        """))
+        ResumenVentasService._incrementar_version()
+        logger.info("📊 Resumen de ventas reconstruido por completo desde db_ventas.")
+
+    @staticmethod
+    def _incrementar_version():
+        db.session.execute(text("""
+            INSERT INTO app_config (clave, valor, actualizado_en)
+            VALUES (:clave, '1', NOW())
+            ON CONFLICT (clave) DO UPDATE
+               SET valor = CAST(CAST(app_config.valor AS BIGINT) + 1 AS TEXT),
+                   actualizado_en = NOW()
+        """), {"clave": ResumenVentasService.VERSION_KEY})
+
+    @staticmethod
+    def _version_actual_en_transaccion():
+        valor = db.session.execute(
+            text("SELECT valor FROM app_config WHERE clave = :clave"),
+            {"clave": ResumenVentasService.VERSION_KEY},
+        ).scalar()
+        return int(valor) if valor is not None else None
+
+    @staticmethod
+    def version_actual():
+        """
+        Versión vigente de los resúmenes (None si nunca se construyeron o no
+        se pudo leer). Lectura por PK de app_config: barata para hacerse en
+        cada petición del panel, incluso cuando la respuesta sale de caché.
+        """
+        try:
+            return ResumenVentasService._version_actual_en_transaccion()
+        except Exception as e:
+            rollback_seguro()
+            logger.warning(f"[ResumenVentasService.version_actual] No se pudo leer la versión: {e}")
+            return None
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Planificador por lotes del simulador de inyección: asigna TODAS las
+referencias con brecha a máquinas sobre un horizonte de varios días, en vez
+de aceptar sugerencias de obtener_candidatos() una por una.
+
+Mismo aislamiento que SimuladorService (ver su docstring): solo lee el
+catálogo (a través del grafo de recursos en memoria) y el histórico de
+ciclo; lo único que escribe, y solo si se pide, es el escenario resultante
+como SNAPSHOT_INICIAL vía cargar_snapshot_inicial().
+
+Modelo:
+  - Trabajo = una referencia con brecha (faltante en unidades). Opción =
+    (molde, portamolde alternativo, máquina que lo acepta, macho por
+    diámetro). Duración = unidades x segundos_por_unidad histórico; sin
+    histórico se estima con SEGUNDOS_POR_DISPARO_DEFECTO / cavidades y el
+    trabajo queda marcado 'ciclo_estimado'.
+  - Recursos de capacidad 1: máquina, portamolde (1 pieza física por letra)
+    y molde (no puede estar montado en dos máquinas a la vez). Macho:
+    capacidad = cantidad_fisica_disponible trabajos simultáneos (mismo
+    criterio que _recursos_ocupados).
+  - Cambio de molde en una máquina = horas_cambio sin producir. Dos
+    referencias consecutivas del mismo molde no pagan cambio.
+  - Lo que no alcanza a terminar dentro del horizonte se produce parcial.
+
+Objetivo (menor es mejor), con pesos explícitos y devueltos en el resultado:
+    peso_faltante * unidades sin cubrir
+  + peso_cambio   * montajes de molde
+  + peso_ocio     * horas de máquina sin producir ni cambiar
+
+Heurística: orden inicial por faltante (más urgente primero) con la opción
+que más produce; luego búsqueda local (intercambiar dos trabajos en la
+prioridad, mover uno, o cambiarle la opción) que acepta movimientos que no
+empeoran, acotada por tiempo_max_seg y MAX_ITERACIONES. Semilla fija: la
+misma entrada da el mismo plan. Sin solver externo: corre en el proceso.
+"""
+import logging
+import random
+import time
+
+from sqlalchemy import text
+
+from backend.core.sql_database import db
+from backend.services.simulador_service import SimuladorService
+
+logger = logging.getLogger(__name__)
+
+SEGUNDOS_POR_DISPARO_DEFECTO = 45.0
+HORAS_CAMBIO_MOLDE = 1.5
+PESO_FALTANTE = 1.0
+PESO_CAMBIO = 200.0
+PESO_OCIO = 10.0
+MAX_ITERACIONES = 20000
+SEMILLA = 20260806
+
+
+class _Opcion:
+    __slots__ = ('molde', 'cavidades', 'portamolde', 'maquina', 'macho', 'horas_por_unidad')
+
+    def __init__(self, molde, cavidades, portamolde, maquina, macho, horas_por_unidad):
+        self.molde = molde
+        self.cavidades = cavidades
+        self.portamolde = portamolde
+        self.maquina = maquina
+        self.macho = macho
+        self.horas_por_unidad = horas_por_unidad
+
+
+class _Agenda:
+    """Intervalos ocupados por recurso, con capacidad (trabajos simultáneos)."""
+
+    def __init__(self, capacidades):
+        self.capacidades = capacidades
+        self.intervalos = {}
+
+    def conflicto(self, recurso, inicio, fin):
+        """None si `recurso` admite [inicio, fin); si no, el primer instante en que se libera algo."""
+        solapados = [f for i, f in self.intervalos.get(recurso, ()) if i < fin and f > inicio]
+        if len(solapados) < self.capacidades.get(recurso, 1):
+            return None
+        return min(solapados)
+
+    def ocupar(self, recurso, inicio, fin):
+        self.intervalos.setdefault(recurso, []).append((inicio, fin))
+
+
+class _Plan:
+    """Estado de un plan en construcción: cola por máquina + agenda de recursos."""
+
+    def __init__(self, maquinas, horizonte_h, horas_cambio, capacidades_macho):
+        self.horizonte_h = horizonte_h
+        self.horas_cambio = horas_cambio
+        self.libre = {m: 0.0 for m in maquinas}
+        self.ultimo_molde = {m: None for m in maquinas}
+        self.ocupado = {m: 0.0 for m in maquinas}
+        self.agenda = _Agenda({('macho', c): n for c, n in capacidades_macho.items()})
+        self.tareas = []
+        self.sin_cubrir = 0.0
+        self.cambios = 0
+
+    @staticmethod
+    def _recursos(op):
+        recursos = [('portamolde', op.portamolde), ('molde', op.molde)]
+        if op.macho:
+            recursos.append(('macho', op.macho))
+        return recursos
+
+    def ubicar(self, trabajo, op):
+        """
+        (inicio, cambio, fin, producido) si el trabajo va al final de la cola
+        de su máquina, en el primer instante en que portamolde, molde y macho
+        están libres. No modifica el plan.
+        """
+        cambio = self.horas_cambio if self.ultimo_molde[op.maquina] != op.molde else 0.0
+        recursos = self._recursos(op)
+        inicio = self.libre[op.maquina]
+        while inicio + cambio < self.horizonte_h:
+            fin = min(inicio + cambio + trabajo['faltante'] * op.horas_por_unidad, self.horizonte_h)
+            siguiente = None
+            for recurso in recursos:
+                t = self.agenda.conflicto(recurso, inicio, fin)
+                if t is not None:
+                    siguiente = t if siguiente is None else min(siguiente, t)
+            if siguiente is None:
+                producido = min(trabajo['faltante'], int((fin - inicio - cambio) / op.horas_por_unidad + 1e-9))
+                return inicio, cambio, fin, producido
+            inicio = siguiente
+        return inicio, cambio, inicio, 0
+
+    def confirmar(self, j, trabajo, op, ubicacion):
+        inicio, cambio, fin, producido = ubicacion
+        if producido <= 0:
+            self.sin_cubrir += trabajo['faltante']
+            return
+        for recurso in self._recursos(op):
+            self.agenda.ocupar(recurso, inicio, fin)
+        # Se cuenta el montaje, no su duración (con horas_cambio=0 también cuenta).
+        if self.ultimo_molde[op.maquina] != op.molde:
+            self.cambios += 1
+        self.libre[op.maquina] = fin
+        self.ultimo_molde[op.maquina] = op.molde
+        self.ocupado[op.maquina] += fin - inicio
+        self.sin_cubrir += trabajo['faltante'] - producido
+        self.tareas.append((j, op, inicio, cambio, fin, producido))
+
+    def costo(self, pesos):
+        horas_ocio = sum(self.horizonte_h - h for h in self.ocupado.values())
+        desglose = {
+            'unidades_sin_cubrir': round(self.sin_cubrir, 1),
+            'cambios_molde': self.cambios,
+            'horas_ocio': round(horas_ocio, 2),
+        }
+        costo = (
+            pesos['peso_faltante'] * self.sin_cubrir
+            + pesos['peso_cambio'] * self.cambios
+            + pesos['peso_ocio'] * horas_ocio
+        )
+        return costo, desglose
+
+
+def evaluar(orden, elecciones, trabajos, maquinas, horizonte_h, horas_cambio, capacidades_macho, pesos):
+    """
+    Decodifica (orden de prioridad, opción elegida por trabajo) en un plan
+    y devuelve (costo, desglose, tareas).
+    """
+    plan = _Plan(maquinas, horizonte_h, horas_cambio, capacidades_macho)
+    for j in orden:
+        trabajo = trabajos[j]
+        op = trabajo['opciones'][elecciones[j]]
+        plan.confirmar(j, trabajo, op, plan.ubicar(trabajo, op))
+    costo, desglose = plan.costo(pesos)
+    return costo, desglose, plan.tareas
+
+
+def optimizar(trabajos, maquinas, horizonte_h, capacidades_macho, horas_cambio=HORAS_CAMBIO_MOLDE,
+              pesos=None, tiempo_max_seg=2.0, max_iteraciones=MAX_ITERACIONES, semilla=SEMILLA):
+    """
+    Greedy + búsqueda local sobre `trabajos` (dicts con 'faltante' y
+    'opciones': lista de _Opcion no vacía). Devuelve (costo, desglose,
+    tareas, iteraciones).
+    """
+    pesos = pesos or {'peso_faltante': PESO_FALTANTE, 'peso_cambio': PESO_CAMBIO, 'peso_ocio': PESO_OCIO}
+
+    def _evaluar(orden, elecciones):
+        return evaluar(orden, elecciones, trabajos, maquinas, horizonte_h, horas_cambio, capacidades_macho, pesos)
+
+    # Greedy: más urgente primero; para cada uno, la opción que más produce
+    # dado lo ya asignado (desempate: sin cambio de molde, termina antes).
+    orden = sorted(range(len(trabajos)), key=lambda j: -trabajos[j]['faltante'])
+    elecciones = {}
+    plan = _Plan(maquinas, horizonte_h, horas_cambio, capacidades_macho)
+    for j in orden:
+        trabajo = trabajos[j]
+        mejor = None
+        for k, op in enumerate(trabajo['opciones']):
+            ubicacion = plan.ubicar(trabajo, op)
+            _, cambio, fin, producido = ubicacion
+            clave = (-producido, cambio, fin)
+            if mejor is None or clave < mejor[0]:
+                mejor = (clave, k, ubicacion)
+        elecciones[j] = mejor[1]
+        plan.confirmar(j, trabajo, trabajo['opciones'][mejor[1]], mejor[2])
+
+    costo, desglose, tareas = _evaluar(orden, elecciones)
+    azar = random.Random(semilla)
+    limite = time.perf_counter() + tiempo_max_seg
+    iteraciones = 0
+    n = len(orden)
+    while n and iteraciones < max_iteraciones and time.perf_counter() < limite:
+        iteraciones += 1
+        nuevo_orden, nuevas = orden, elecciones
+        movimiento = azar.random()
+        if movimiento < 0.4 and n > 1:
+            a, b = azar.sample(range(n), 2)
+            nuevo_orden = list(orden)
+            nuevo_orden[a], nuevo_orden[b] = nuevo_orden[b], nuevo_orden[a]
+        elif movimiento < 0.7 and n > 1:
+            nuevo_orden = list(orden)
+            j = nuevo_orden.pop(azar.randrange(n))
+            nuevo_orden.insert(azar.randrange(n), j)
+        else:
+            j = orden[azar.randrange(n)]
+            opciones = len(trabajos[j]['opciones'])
+            if opciones < 2:
+                continue
+            nuevas = dict(elecciones)
+            nuevas[j] = (elecciones[j] + azar.randrange(1, opciones)) % opciones
+
+        resultado = _evaluar(nuevo_orden, nuevas)
+        if resultado[0] <= costo:
+            costo, desglose, tareas = resultado
+            orden, elecciones = nuevo_orden, nuevas
+
+    return costo, desglose, tareas, iteraciones
+
+
+class PlanificadorSimulador:
+
+    @staticmethod
+    def _ocupado_no_reemplazable():
+        """Máquinas/portamoldes/moldes/machos tomados por asignaciones que el
+        escenario NO reemplaza (AUTO_DETECTADO, SUGERIDO_ACEPTADO): quedan
+        fuera del plan. SNAPSHOT_INICIAL sí se reemplaza al cargar."""
+        rows = db.session.execute(text("""
+            SELECT maquina, codigo_portamolde, codigo_molde, codigo_macho FROM simulador_asignaciones
+            WHERE estado = 'ACTIVA' AND origen != 'SNAPSHOT_INICIAL'
+        """)).fetchall()
+        machos = {}
+        for r in rows:
+            if r[3]:
+                machos[r[3]] = machos.get(r[3], 0) + 1
+        return {r[0] for r in rows}, {r[1] for r in rows}, {r[2] for r in rows}, machos
+
+    @staticmethod
+    def planificar(dias=5, horas_por_dia=16, tiempo_max_seg=2.0, limite_referencias=200,
+                   horas_cambio=HORAS_CAMBIO_MOLDE, pesos=None, cargar=False, responsable=None):
+        """
+        Plan completo del horizonte (dias x horas_por_dia horas de máquina)
+        para todas las referencias con brecha. Con cargar=True el escenario
+        (el primer trabajo de cada máquina) reemplaza el SNAPSHOT_INICIAL.
+        """
+        inicio_reloj = time.perf_counter()
+        horizonte_h = float(dias) * float(horas_por_dia)
+        pesos = {
+            'peso_faltante': PESO_FALTANTE, 'peso_cambio': PESO_CAMBIO, 'peso_ocio': PESO_OCIO,
+            **{k: float(v) for k, v in (pesos or {}).items() if v is not None},
+        }
+
+        brechas = SimuladorService._brechas_reales(limite=limite_referencias)
+        grafo = SimuladorService._obtener_grafo()
+        ciclos = SimuladorService._ciclos_historicos()
+        maquinas_ocupadas, portamoldes_ocupados, moldes_ocupados, machos_en_uso = (
+            PlanificadorSimulador._ocupado_no_reemplazable()
+        )
+        maquinas = sorted(m for m in grafo.portamoldes_por_maquina if m not in maquinas_ocupadas)
+
+        trabajos, sin_opciones, capacidades_macho = [], [], {}
+        for b in brechas:
+            codigo_ref = b['codigo_referencia']
+            historial = SimuladorService._tiempo_ciclo_historico(codigo_ref, ciclos)
+            macho = grafo.macho_compatible(b['diametro_interno'])
+            if macho:
+                libres = (macho['cantidad_fisica_disponible'] or 0) - machos_en_uso.get(macho['codigo_macho'], 0)
+                if libres <= 0:
+                    sin_opciones.append({'codigo_referencia': codigo_ref, 'faltante': b['faltante'],
+                                         'motivo': 'macho_sin_unidades_libres'})
+                    continue
+                capacidades_macho[macho['codigo_macho']] = libres
+
+            opciones = []
+            for codigo_molde, cavidades, _ in grafo.moldes_por_referencia.get(codigo_ref, ()):
+                if codigo_molde in moldes_ocupados:
+                    continue
+                if historial:
+                    segundos = historial['segundos_por_unidad_promedio']
+                else:
+                    segundos = SEGUNDOS_POR_DISPARO_DEFECTO / max(cavidades or 1, 1)
+                for portamolde in grafo.portamoldes_por_molde.get(codigo_molde, ()):
+                    if portamolde in portamoldes_ocupados:
+                        continue
+                    for maquina in grafo.maquinas_por_portamolde.get(portamolde, ()):
+                        if maquina in maquinas_ocupadas:
+                            continue
+                        opciones.append(_Opcion(
+                            codigo_molde, cavidades, portamolde, maquina,
+                            macho['codigo_macho'] if macho else None, segundos / 3600.0,
+                        ))
+            if not opciones:
+                sin_opciones.append({'codigo_referencia': codigo_ref, 'faltante': b['faltante'],
+                                     'motivo': 'sin_molde_portamolde_o_maquina_libre'})
+                continue
+            trabajos.append({
+                'codigo_referencia': codigo_ref,
+                'descripcion': b['descripcion'],
+                'faltante': b['faltante'],
+                'ciclo_estimado': historial is None,
+                'opciones': opciones,
+            })
+
+        costo, desglose, tareas, iteraciones = optimizar(
+            trabajos, maquinas, horizonte_h, capacidades_macho,
+            horas_cambio=horas_cambio, pesos=pesos, tiempo_max_seg=tiempo_max_seg,
+        )
+
+        plan = {m: [] for m in maquinas}
+        asignados = {tarea[0] for tarea in tareas}
+        for j, op, inicio, cambio, fin, producido in sorted(tareas, key=lambda t: (t[1].maquina, t[2])):
+            trabajo = trabajos[j]
+            plan[op.maquina].append({
+                'codigo_referencia': trabajo['codigo_referencia'],
+                'descripcion': trabajo['descripcion'],
+                'codigo_molde': op.molde,
+                'codigo_portamolde': op.portamolde,
+                'codigo_macho': op.macho,
+                'cavidades': op.cavidades,
+                'unidades': producido,
+                'faltante': trabajo['faltante'],
+                'inicio_h': round(inicio, 2),
+                'produccion_desde_h': round(inicio + cambio, 2),
+                'fin_h': round(fin, 2),
+                'dia': int(inicio // horas_por_dia) + 1,
+                'cambio_molde': bool(cambio),
+                'ciclo_estimado': trabajo['ciclo_estimado'],
+            })
+
+        # Escenario cargable: lo que queda montado al arrancar el plan.
+        escenario = [
+            {
+                'maquina': maquina,
+                'codigo_molde': tareas_maquina[0]['codigo_molde'],
+                'codigo_portamolde': tareas_maquina[0]['codigo_portamolde'],
+                'codigo_referencia': tareas_maquina[0]['codigo_referencia'],
+                'codigo_macho': tareas_maquina[0]['codigo_macho'],
+                'cavidades': tareas_maquina[0]['cavidades'],
+            }
+            for maquina, tareas_maquina in plan.items() if tareas_maquina
+        ]
+
+        resultado = {
+            'horizonte': {'dias': dias, 'horas_por_dia': horas_por_dia, 'horas_totales': horizonte_h},
+            'objetivo': {'costo': round(costo, 2), **desglose},
+            'pesos': {**pesos, 'horas_cambio_molde': horas_cambio},
+            'plan': plan,
+            'sin_asignar': sin_opciones + [
+                {'codigo_referencia': t['codigo_referencia'], 'faltante': t['faltante'], 'motivo': 'no_cabe_en_horizonte'}
+                for j, t in enumerate(trabajos) if j not in asignados
+            ],
+            'maquinas_excluidas': sorted(maquinas_ocupadas),
+            'escenario': escenario,
+            'iteraciones': iteraciones,
+            'tiempo_ms': None,
+            'cargado': False,
+        }
+
+        if cargar:
+            resultado['cargado'] = SimuladorService.cargar_snapshot_inicial(escenario, responsable)['filas_creadas']
+
+        resultado['tiempo_ms'] = round((time.perf_counter() - inicio_reloj) * 1000)
+        logger.info(
+            f"[Simulador] Plan {dias}d x {horas_por_dia}h: {len(trabajos)} referencias, "
+            f"{iteraciones} iteraciones, objetivo {resultado['objetivo']}"
+        )
+        return resultado
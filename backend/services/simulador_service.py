@@ -56,12 +56,16 @@ Reglas de negocio confirmadas por el usuario:
 """
 import logging
 import re
+import threading
+import time
+from bisect import bisect_left
 from datetime import datetime
 
 from sqlalchemy import text
 
 from backend.core.sql_database import db
 from backend.models.sql_models import SimuladorAsignacion
+from backend.utils.cache_manager import subscribe_table_changes
 from backend.utils.formatters import normalizar_codigo_sin_prefijo
 
 logger = logging.getLogger(__name__)
@@ -69,6 +73,85 @@ logger = logging.getLogger(__name__)
 TOLERANCIA_MACHO_MM = 1.0
 TOLERANCIA_PARED_MM = 1.5
 
+# ----------------------------------------------------------------------
+# Grafo de recursos en memoria
+# ----------------------------------------------------------------------
+# Antes cada clic "what-if" hacía varias consultas POR referencia con
+# brecha (moldes, macho, portamoldes de cada molde, historial de ciclo
+# dentro del bucle de moldes, máquinas de cada portamolde): cientos de
+# idas y vueltas a la BD. Ahora el grafo referencia -> molde -> portamolde
+# -> máquina, los machos ordenados por diámetro y las estadísticas de
+# ciclo se cargan con unas pocas consultas por conjunto y se enumeran los
+# candidatos solo en memoria.
+#
+# Los catálogos (rel_*, db_portamoldes, db_machos) solo se editan a mano en
+# la BD: ninguna escritura de la app los toca ni publica cambios, así que el
+# grafo se invalida SOLO por tiempo (GRAFO_TTL_SEGUNDOS) o a pedido tras
+# una edición manual (POST /api/simulador/grafo/invalidar ->
+# SimuladorService.invalidar_grafo()). Los ciclos históricos sí se invalidan
+# con cada cambio publicado en db_inyeccion.
+
+GRAFO_TTL_SEGUNDOS = 600
+TABLAS_CICLOS = frozenset({'db_inyeccion'})
+
+
+class GrafoRecursos:
+    """Compatibilidades del catálogo de inyección, indexadas para consulta O(1)."""
+
+    def __init__(self, moldes, molde_portamolde, maquina_portamolde, machos):
+        self.moldes_por_referencia = {}  # referencia -> [(molde, cavidades, tipo_vinculo)]
+        for referencia, molde, cavidades, tipo_vinculo in moldes:
+            self.moldes_por_referencia.setdefault(referencia, []).append((molde, cavidades, tipo_vinculo))
+
+        self.portamoldes_por_molde = {}  # molde -> [portamolde] (sin repetidos)
+        for molde, portamolde in molde_portamolde:
+            lista = self.portamoldes_por_molde.setdefault(molde, [])
+            if portamolde not in lista:
+                lista.append(portamolde)
+
+        self.maquinas_por_portamolde = {}  # portamolde -> [máquina]
+        self.portamoldes_por_maquina = {}  # máquina -> {portamolde}
+        for maquina, portamolde in maquina_portamolde:
+            self.maquinas_por_portamolde.setdefault(portamolde, []).append(maquina)
+            self.portamoldes_por_maquina.setdefault(maquina, set()).add(portamolde)
+
+        # Machos activos ordenados por diámetro: el más cercano sale por bisect.
+        self._machos = sorted(
+            (
+                (float(diametro), {'codigo_macho': codigo, 'diametro_interno_mm': diametro,
+                                   'cantidad_fisica_disponible': cantidad})
+                for codigo, diametro, cantidad in machos
+                if diametro is not None
+            ),
+            key=lambda m: m[0],
+        )
+        self._diametros = [d for d, _ in self._machos]
+        self.cargado_en = time.time()
+
+    def macho_compatible(self, diametro_interno):
+        """Macho activo de diámetro más cercano dentro de TOLERANCIA_MACHO_MM, o None."""
+        if diametro_interno is None or not self._machos:
+            return None
+        d = float(diametro_interno)
+        i = bisect_left(self._diametros, d)
+        cercanos = [self._machos[j] for j in (i - 1, i) if 0 <= j < len(self._machos)]
+        diametro, macho = min(cercanos, key=lambda m: abs(m[0] - d))
+        return macho if abs(diametro - d) <= TOLERANCIA_MACHO_MM else None
+
+
+_grafo_lock = threading.Lock()
+_grafo = None
+_ciclos = None  # id_codigo crudo -> (suma segundos_por_unidad, corridas)
+_ciclos_cargados_en = 0.0
+
+
+@subscribe_table_changes
+def _invalidar_ciclos(tablas, tenant):
+    global _ciclos
+    if tablas & TABLAS_CICLOS:
+        with _grafo_lock:
+            _ciclos = None
+
 
 class SimuladorService:
 
@@ -168,10 +251,7 @@ class SimuladorService:
 
     @staticmethod
     def _portamoldes_de_maquina(maquina):
-        rows = db.session.execute(text(
-            "SELECT codigo_portamolde FROM rel_maquina_portamolde WHERE maquina = :m"
-        ), {'m': maquina}).fetchall()
-        return {r[0] for r in rows}
+        return set(SimuladorService._obtener_grafo().portamoldes_por_maquina.get(maquina, ()))
 
     @staticmethod
     def detectar_estado_actual():
@@ -189,6 +269,7 @@ class SimuladorService:
             WHERE estado = 'EN_PROCESO' AND id_codigo IS NOT NULL AND maquina IS NOT NULL
         """)).fetchall()
 
+        grafo = SimuladorService._obtener_grafo()
         resueltas, sin_resolver = [], []
         for id_codigo_raw, maquina_raw in rows:
             maquina = SimuladorService._normalizar_nombre_maquina(maquina_raw)
@@ -198,17 +279,17 @@ class SimuladorService:
                 sin_resolver.append({'maquina_original': maquina_raw, 'codigo_referencia': codigo, 'motivo': 'maquina_no_reconocida'})
                 continue
 
-            moldes = db.session.execute(text(
-                "SELECT DISTINCT codigo_molde, cavidades FROM rel_producto_molde WHERE codigo_referencia = :c AND activo = TRUE"
-            ), {'c': codigo}).fetchall()
+            moldes = list(dict.fromkeys(
+                (molde, cavidades) for molde, cavidades, _ in grafo.moldes_por_referencia.get(codigo, ())
+            ))
             if not moldes:
                 sin_resolver.append({'maquina': maquina, 'codigo_referencia': codigo, 'motivo': 'sin_molde_mapeado_en_rel_producto_molde'})
                 continue
 
-            portamoldes_maquina = SimuladorService._portamoldes_de_maquina(maquina)
+            portamoldes_maquina = grafo.portamoldes_por_maquina.get(maquina, set())
             opciones = []
             for codigo_molde, cavidades in moldes:
-                portamoldes_molde = set(SimuladorService._portamoldes_de_molde(codigo_molde))
+                portamoldes_molde = set(grafo.portamoldes_por_molde.get(codigo_molde, ()))
                 for portamolde in (portamoldes_molde & portamoldes_maquina):
                     opciones.append({'codigo_molde': codigo_molde, 'codigo_portamolde': portamolde, 'cavidades': cavidades})
 
@@ -261,19 +342,69 @@ class SimuladorService:
     # Helpers de factibilidad (leen catálogo, nunca escriben)
     # ------------------------------------------------------------------
 
+    @staticmethod
+    def invalidar_grafo():
+        """Fuerza a releer catálogos y ciclos en la próxima consulta."""
+        global _grafo, _ciclos
+        with _grafo_lock:
+            _grafo = None
+            _ciclos = None
+
+    @staticmethod
+    def _obtener_grafo():
+        """Grafo vigente; lo (re)carga con 4 consultas si no existe o venció."""
+        global _grafo
+        grafo = _grafo
+        if grafo is not None and time.time() - grafo.cargado_en < GRAFO_TTL_SEGUNDOS:
+            return grafo
+        with _grafo_lock:
+            if _grafo is None or time.time() - _grafo.cargado_en >= GRAFO_TTL_SEGUNDOS:
+                inicio = time.perf_counter()
+                _grafo = GrafoRecursos(
+                    moldes=db.session.execute(text("""
+                        SELECT codigo_referencia, codigo_molde, cavidades, tipo_vinculo
+                        FROM rel_producto_molde WHERE activo = TRUE ORDER BY id
+                    """)).fetchall(),
+                    molde_portamolde=db.session.execute(text(
+                        "SELECT codigo_molde, codigo_portamolde FROM rel_molde_portamoldes ORDER BY id"
+                    )).fetchall(),
+                    maquina_portamolde=db.session.execute(text(
+                        "SELECT maquina, codigo_portamolde FROM rel_maquina_portamolde ORDER BY id"
+                    )).fetchall(),
+                    machos=db.session.execute(text("""
+                        SELECT codigo_macho, diametro_interno_mm, cantidad_fisica_disponible
+                        FROM db_machos WHERE activo = TRUE
+                    """)).fetchall(),
+                )
+                logger.info(f"[Simulador] Grafo de recursos cargado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+            return _grafo
+
+    @staticmethod
+    def _ciclos_historicos():
+        """id_codigo -> (suma, corridas) de segundos_por_unidad > 0 en db_inyeccion, en una consulta."""
+        global _ciclos, _ciclos_cargados_en
+        ciclos = _ciclos
+        if ciclos is not None and time.time() - _ciclos_cargados_en < GRAFO_TTL_SEGUNDOS:
+            return ciclos
+        with _grafo_lock:
+            if _ciclos is None or time.time() - _ciclos_cargados_en >= GRAFO_TTL_SEGUNDOS:
+                rows = db.session.execute(text("""
+                    SELECT id_codigo, SUM(segundos_por_unidad), COUNT(*)
+                    FROM db_inyeccion
+                    WHERE segundos_por_unidad > 0 AND id_codigo IS NOT NULL
+                    GROUP BY id_codigo
+                """)).fetchall()
+                _ciclos = {r[0]: (float(r[1]), r[2]) for r in rows}
+                _ciclos_cargados_en = time.time()
+            return _ciclos
+
     @staticmethod
     def _portamoldes_de_molde(codigo_molde):
-        rows = db.session.execute(text(
-            "SELECT DISTINCT codigo_portamolde FROM rel_molde_portamoldes WHERE codigo_molde = :m"
-        ), {'m': codigo_molde}).fetchall()
-        return [r[0] for r in rows]
+        return list(SimuladorService._obtener_grafo().portamoldes_por_molde.get(codigo_molde, ()))
 
     @staticmethod
     def _maquinas_que_aceptan(portamolde):
-        rows = db.session.execute(text(
-            "SELECT maquina FROM rel_maquina_portamolde WHERE codigo_portamolde = :p"
-        ), {'p': portamolde}).fetchall()
-        return [r[0] for r in rows]
+        return list(SimuladorService._obtener_grafo().maquinas_por_portamolde.get(portamolde, ()))
 
     @staticmethod
     def _recursos_ocupados():
@@ -290,27 +421,19 @@ class SimuladorService:
 
     @staticmethod
     def _macho_compatible(diametro_interno):
-        if diametro_interno is None:
-            return None
-        rows = db.session.execute(text("""
-            SELECT codigo_macho, diametro_interno_mm, cantidad_fisica_disponible
-            FROM db_machos
-            WHERE activo = TRUE AND ABS(diametro_interno_mm - :d) <= :tol
-            ORDER BY ABS(diametro_interno_mm - :d) ASC
-            LIMIT 1
-        """), {'d': float(diametro_interno), 'tol': TOLERANCIA_MACHO_MM}).fetchone()
-        return dict(rows._mapping) if rows else None
+        return SimuladorService._obtener_grafo().macho_compatible(diametro_interno)
 
     @staticmethod
-    def _tiempo_ciclo_historico(codigo_referencia):
-        row = db.session.execute(text("""
-            SELECT AVG(segundos_por_unidad)::NUMERIC(10,1) as promedio, COUNT(*) as n
-            FROM db_inyeccion
-            WHERE segundos_por_unidad > 0
-              AND (id_codigo = :c OR id_codigo = :c_fr)
-        """), {'c': codigo_referencia, 'c_fr': f'FR-{codigo_referencia}'}).fetchone()
-        if row and row[1] > 0:
-            return {'segundos_por_unidad_promedio': float(row[0]), 'corridas_historicas': row[1]}
+    def _tiempo_ciclo_historico(codigo_referencia, ciclos=None):
+        """Promedio de segundos_por_unidad de la referencia, con o sin prefijo 'FR-'."""
+        ciclos = ciclos if ciclos is not None else SimuladorService._ciclos_historicos()
+        suma, n = 0.0, 0
+        for codigo in (codigo_referencia, f'FR-{codigo_referencia}'):
+            s_codigo, n_codigo = ciclos.get(codigo, (0.0, 0))
+            suma += s_codigo
+            n += n_codigo
+        if n > 0:
+            return {'segundos_por_unidad_promedio': round(suma / n, 1), 'corridas_historicas': n}
         return None
 
     # ------------------------------------------------------------------
@@ -372,35 +495,36 @@ class SimuladorService:
         brechas = SimuladorService._brechas_reales(limite=limite)
 
         maquinas_ocupadas, portamoldes_ocupados, machos_en_uso = SimuladorService._recursos_ocupados()
+        grafo = SimuladorService._obtener_grafo()
+        ciclos = SimuladorService._ciclos_historicos()
 
+        # De aquí en adelante, solo memoria: ni una consulta por referencia.
         candidatos = []
         for b in brechas:
             codigo_ref, descripcion, faltante = b['codigo_referencia'], b['descripcion'], b['faltante']
             pared, diametro_interno = b['pared'], b['diametro_interno']
-            moldes = db.session.execute(text(
-                "SELECT codigo_molde, cavidades, tipo_vinculo FROM rel_producto_molde WHERE codigo_referencia = :c AND activo = TRUE"
-            ), {'c': codigo_ref}).fetchall()
+            moldes = grafo.moldes_por_referencia.get(codigo_ref, ())
 
-            macho = SimuladorService._macho_compatible(diametro_interno)
+            macho = grafo.macho_compatible(diametro_interno)
             macho_disponible = True
             if macho:
                 en_uso = machos_en_uso.get(macho['codigo_macho'], 0)
                 macho_disponible = en_uso < macho['cantidad_fisica_disponible']
 
+            historial = SimuladorService._tiempo_ciclo_historico(codigo_ref, ciclos)
+
             for codigo_molde, cavidades, tipo_vinculo in moldes:
-                alternativas = SimuladorService._portamoldes_de_molde(codigo_molde)
+                alternativas = grafo.portamoldes_por_molde.get(codigo_molde)
                 if not alternativas:
                     continue
 
-                historial = SimuladorService._tiempo_ciclo_historico(codigo_ref)
-
                 # Alternativas intercambiables (ver docstring del módulo): se
                 # prueba cada portamolde libre y, para cada uno, cada máquina
                 # libre que lo acepte — no se exige que TODAS estén libres.
                 for portamolde in alternativas:
                     if portamolde in portamoldes_ocupados:
                         continue
-                    maquinas = [m for m in SimuladorService._maquinas_que_aceptan(portamolde) if m not in maquinas_ocupadas]
+                    maquinas = [m for m in grafo.maquinas_por_portamolde.get(portamolde, ()) if m not in maquinas_ocupadas]
                     for maquina in maquinas:
                         candidatos.append({
                             'codigo_referencia': codigo_ref,
@@ -409,7 +533,7 @@ class SimuladorService:
                             'codigo_molde': codigo_molde,
                             'tipo_vinculo': tipo_vinculo,
                             'cavidades': cavidades,
-                            'portamoldes_alternativos': alternativas,
+                            'portamoldes_alternativos': list(alternativas),
                             'portamolde_sugerido': portamolde,
                             'maquina_sugerida': maquina,
                             'pared': float(pared) if pared is not None else None,
@@ -17,7 +17,10 @@ from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 from backend.core.sql_database import db
-from backend.models.sql_models import RawVentas, OperacionLog
+from backend.core.bulk_copy import copiar_filas, copiar_a_temporal, COLUMNA_ORDEN_COPY
+from backend.models.sql_models import OperacionLog
+from backend.services.resumen_ventas_service import ResumenVentasService
+from backend.utils.cache_manager import publish_table_change
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +52,68 @@ class WoSyncPersistenciaError(WoSyncError):
 class WoSyncService:
     """Operaciones de sincronización con World Office (ERP)."""
 
-    INVENTARIO_BATCH_SIZE = 500
-    VENTAS_BATCH_SIZE = 500
+    # Columnas de db_ventas / db_ventas_staging que llena la ingesta comercial
+    # (mismo orden que _mapear_fila_comercial). Las filas viajan por COPY
+    # (backend/core/bulk_copy.py), no por executemany.
+    COLUMNAS_VENTAS = (
+        'fecha', 'documento', 'nombres', 'productos', 'cantidad', 'total_ingresos',
+        'precio_promedio', 'clasificacion', 'vendedor', 'zona',
+        'descripcion_producto', 'iva', 'identificacion_cliente',
+    )
+    COLUMNAS_INVENTARIO = (
+        'codigo_producto', 'descripcion', 'stock_wo', 'precio_wo',
+        'codigo_alterno', 'referencia',
+    )
+
+    # Diff staging vs producción dentro de la ventana {filtro_ventana}. WO no
+    # expone un id de renglón estable, así que la llave es (documento,
+    # productos, línea) con `línea` = ROW_NUMBER() dentro del par ordenado por
+    # el CONTENIDO de la fila: no depende del orden físico de inserción, y dos
+    # renglones idénticos del mismo documento emparejan entre sí sin generar
+    # cambios. Resultado en tmp_delta_ventas: accion I (insertar), U
+    # (actualizar id_produccion) o D (borrar id_produccion).
+    _SQL_DELTA_VENTAS = """
+        CREATE TEMP TABLE tmp_delta_ventas ON COMMIT DROP AS
+        WITH s AS (
+            SELECT fecha, documento, nombres, productos, cantidad, total_ingresos, precio_promedio,
+                   clasificacion, vendedor, zona, descripcion_producto, iva, identificacion_cliente,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY COALESCE(documento, ''), COALESCE(productos, '')
+                       ORDER BY fecha, cantidad, total_ingresos, precio_promedio, clasificacion,
+                                nombres, vendedor, zona, descripcion_producto, iva, identificacion_cliente
+                   ) AS linea
+            FROM db_ventas_staging
+            {filtro_ventana}
+        ),
+        p AS (
+            SELECT id, fecha, documento, nombres, productos, cantidad, total_ingresos, precio_promedio,
+                   clasificacion, vendedor, zona, descripcion_producto, iva, identificacion_cliente,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY COALESCE(documento, ''), COALESCE(productos, '')
+                       ORDER BY fecha, cantidad, total_ingresos, precio_promedio, clasificacion,
+                                nombres, vendedor, zona, descripcion_producto, iva, identificacion_cliente
+                   ) AS linea
+            FROM db_ventas
+            {filtro_ventana}
+        )
+        SELECT
+            CASE WHEN p.id IS NULL THEN 'I' WHEN s.linea IS NULL THEN 'D' ELSE 'U' END AS accion,
+            p.id AS id_produccion,
+            s.fecha, s.documento, s.nombres, s.productos, s.cantidad, s.total_ingresos, s.precio_promedio,
+            s.clasificacion, s.vendedor, s.zona, s.descripcion_producto, s.iva, s.identificacion_cliente
+        FROM s
+        FULL OUTER JOIN p
+            ON COALESCE(s.documento, '') = COALESCE(p.documento, '')
+           AND COALESCE(s.productos, '') = COALESCE(p.productos, '')
+           AND s.linea = p.linea
+        WHERE p.id IS NULL
+           OR s.linea IS NULL
+           OR (s.fecha, s.nombres, s.cantidad, s.total_ingresos, s.precio_promedio, s.clasificacion,
+               s.vendedor, s.zona, s.descripcion_producto, s.iva, s.identificacion_cliente)
+              IS DISTINCT FROM
+              (p.fecha, p.nombres, p.cantidad, p.total_ingresos, p.precio_promedio, p.clasificacion,
+               p.vendedor, p.zona, p.descripcion_producto, p.iva, p.identificacion_cliente)
+    """
     # Umbral del circuit breaker de ingesta comercial: si el volumen total
     # recibido en la sincronización cae por debajo de este porcentaje del
     # volumen actual en db_ventas, se aborta el volcado a la tabla principal
@@ -91,38 +154,6 @@ class WoSyncService:
             except ValueError:
                 return None
 
-    @staticmethod
-    def refrescar_mv_dashboard_ventas():
-        """
-        Refresca en cascada las vistas materializadas derivadas de db_ventas que
-        alimentan el panel de Jefatura tras una sincronización exitosa de World Office:
-          - mv_dashboard_ventas_analitica (Backorder/Top/Peores Productos)
-          - mv_rendimiento_mensual (comparativo mensual Ventas vs Pedidos)
-        Ver backend/sql/create_mv_dashboard_ventas_analitica.sql y
-        backend/sql/create_mv_rendimiento_mensual.sql.
-
-        REFRESH ... CONCURRENTLY no puede correr dentro de una transacción, así que se
-        abre una conexión aparte en autocommit. Cada vista se refresca de forma
-        independiente: si una falla, la otra igual se intenta. Un fallo aquí se loggea
-        pero no debe tumbar la respuesta de sync: los datos de db_ventas ya se
-        confirmaron con éxito, y el dashboard simplemente seguirá sirviendo el
-        snapshot anterior de la vista que falló hasta el próximo refresh exitoso.
-        """
-        vistas = ["mv_dashboard_ventas_analitica", "mv_rendimiento_mensual"]
-        try:
-            conn = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
-            try:
-                for vista in vistas:
-                    try:
-                        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}"))
-                        logger.debug(f"✅ {vista} refrescada tras sincronización de WO.")
-                    except Exception as e_vista:
-                        logger.error(f"⚠️ Fallo al refrescar {vista} tras sync de WO: {e_vista}")
-            finally:
-                conn.close()
-        except Exception as e:
-            logger.error(f"⚠️ Fallo al abrir conexión para refrescar vistas materializadas tras sync de WO: {e}")
-
     # ------------------------------------------------------------------
     # /api/wo/recibir_datos (Inventario WO)
     # ------------------------------------------------------------------
@@ -164,7 +195,7 @@ class WoSyncService:
 
     @staticmethod
     def _procesar_inventario(datos):
-        """UPSERT atómico (DELETE + INSERT por lotes) de inventario_wo."""
+        """UPSERT atómico (COPY a temporal + merge set-based) de inventario_wo."""
         datos_normalizados = [WoSyncService._normalizar_llaves(item) for item in datos]
 
         logger.debug(f"[DEBUG] Recibidos {len(datos_normalizados)} registros para insertar.")
@@ -196,88 +227,79 @@ class WoSyncService:
                 "Verifique las columnas del reporte exportado."
             )
 
+        filas = []
+        for j, r in enumerate(datos_normalizados):
+            codigo_producto = str(
+                r.get('codigo_producto') or r.get('codigo') or
+                r.get('codigo_alterno') or ""
+            ).strip()
+            if not codigo_producto:
+                continue
+
+            descripcion    = str(r.get('descripcion') or r.get('nombre') or "").strip()[:500]
+            codigo_alterno = str(r.get('codigo_alterno') or "").strip()[:100]
+            referencia     = str(r.get('referencia') or r.get('ref') or "").strip()[:100]
+
+            # Mapeo Explícito y Constante de Columna
+            columna_stock_leida = 'stock_wo' if 'stock_wo' in r else 'existencia' if 'existencia' in r else 'stock'
+            stock_raw = r.get(columna_stock_leida)
+
+            if j == 0:
+                logger.debug(f"[AUDITORIA EXPLICITA] Leyendo valor de stock desde la clave: '{columna_stock_leida}'")
+            if j < 5:
+                logger.debug(f"[CARGA WO] Procesando Ref: {codigo_producto} | Valor Detectado: {stock_raw}")
+
+            if stock_raw is None or str(stock_raw).strip() == "":
+                stock_wo = None  # Se preservará como NULL para no sobreescribir con 0
+            else:
+                try:
+                    stock_wo = float(stock_raw)
+                except (ValueError, TypeError):
+                    stock_wo = None
+
+            try:
+                precio_wo = float(r.get('precio_wo') or r.get('precio') or r.get('precio_venta') or 0)
+            except (ValueError, TypeError):
+                precio_wo = 0.0
+
+            filas.append((codigo_producto, descripcion, stock_wo, precio_wo, codigo_alterno, referencia))
+
         try:
-            logger.debug("[AUDITORIA] Estrategia de UPSERT Atómica iniciada. No se usará TRUNCATE.")
-            rows_insertados = 0
-
-            for i in range(0, len(datos_normalizados), WoSyncService.INVENTARIO_BATCH_SIZE):
-                batch = datos_normalizados[i:i + WoSyncService.INVENTARIO_BATCH_SIZE]
-                values_parts = []
-                params = {}
-                ids_lote = []
-
-                for j, r in enumerate(batch):
-                    codigo_producto = str(
-                        r.get('codigo_producto') or r.get('codigo') or
-                        r.get('codigo_alterno') or ""
-                    ).strip()
-                    if not codigo_producto:
-                        continue
-
-                    ids_lote.append(codigo_producto)
-
-                    descripcion    = str(r.get('descripcion') or r.get('nombre') or "").strip()[:500]
-                    codigo_alterno = str(r.get('codigo_alterno') or "").strip()[:100]
-                    referencia     = str(r.get('referencia') or r.get('ref') or "").strip()[:100]
-
-                    # Mapeo Explícito y Constante de Columna
-                    columna_stock_leida = 'stock_wo' if 'stock_wo' in r else 'existencia' if 'existencia' in r else 'stock'
-                    stock_raw = r.get(columna_stock_leida)
-
-                    if j == 0 and i == 0:
-                        logger.debug(f"[AUDITORIA EXPLICITA] Leyendo valor de stock desde la clave: '{columna_stock_leida}'")
-                    if j < 5 and i == 0:
-                        logger.debug(f"[CARGA WO] Procesando Ref: {codigo_producto} | Valor Detectado: {stock_raw}")
-
-                    if stock_raw is None or str(stock_raw).strip() == "":
-                        stock_wo = None  # Se preservará como NULL para no sobreescribir con 0
-                    else:
-                        try:
-                            stock_wo = float(stock_raw)
-                        except (ValueError, TypeError):
-                            stock_wo = None
-
-                    try:
-                        precio_wo = float(r.get('precio_wo') or r.get('precio') or r.get('precio_venta') or 0)
-                    except (ValueError, TypeError):
-                        precio_wo = 0.0
-
-                    k = f"r{i}_{j}"
-                    params[f"cod_{k}"]    = codigo_producto
-                    params[f"desc_{k}"]   = descripcion
-                    params[f"stock_{k}"]  = stock_wo
-                    params[f"precio_{k}"] = precio_wo
-                    params[f"alt_{k}"]    = codigo_alterno
-                    params[f"ref_{k}"]    = referencia
-                    values_parts.append(
-                        f"(:cod_{k}, :desc_{k}, :stock_{k}, :precio_{k}, :alt_{k}, :ref_{k}, NOW())"
-                    )
-
-                if values_parts and ids_lote:
-                    # DELETE atómico de los IDs que vamos a actualizar (evita duplicados sin vaciar la tabla)
-                    ids_placeholders = [f":del_{idx}" for idx in range(len(ids_lote))]
-                    del_params = {f"del_{idx}": id_val for idx, id_val in enumerate(ids_lote)}
-                    sql_del = text(f"DELETE FROM inventario_wo WHERE codigo_producto IN ({', '.join(ids_placeholders)})")
-                    db.session.execute(sql_del, del_params)
-
-                if values_parts:
-                    sql = text(
-                        "INSERT INTO inventario_wo "
-                        "(codigo_producto, descripcion, stock_wo, precio_wo, codigo_alterno, referencia, fecha_sincronizacion) "
-                        f"VALUES {', '.join(values_parts)}"
-                    )
-                    db.session.execute(sql, params)
-                    rows_insertados += len(values_parts)
+            # COPY a una temporal + un único UPSERT set-based (no se usa
+            # TRUNCATE: los códigos que no vienen en el reporte se conservan).
+            # DISTINCT ON se queda con la última ocurrencia de un código
+            # repetido en el payload, en vez de reventar contra la PK.
+            logger.debug("[AUDITORIA] Estrategia de UPSERT Atómica (COPY + merge) iniciada. No se usará TRUNCATE.")
+            rows_insertados = copiar_a_temporal(
+                'tmp_inventario_wo', 'inventario_wo', WoSyncService.COLUMNAS_INVENTARIO, filas
+            )
+            if rows_insertados:
+                db.session.execute(text(f"""
+                    INSERT INTO inventario_wo
+                        (codigo_producto, descripcion, stock_wo, precio_wo, codigo_alterno, referencia, fecha_sincronizacion)
+                    SELECT DISTINCT ON (codigo_producto)
+                        codigo_producto, descripcion, stock_wo, precio_wo, codigo_alterno, referencia, NOW()
+                    FROM tmp_inventario_wo
+                    ORDER BY codigo_producto, {COLUMNA_ORDEN_COPY} DESC
+                    ON CONFLICT (codigo_producto) DO UPDATE SET
+                        descripcion = EXCLUDED.descripcion,
+                        stock_wo = EXCLUDED.stock_wo,
+                        precio_wo = EXCLUDED.precio_wo,
+                        codigo_alterno = EXCLUDED.codigo_alterno,
+                        referencia = EXCLUDED.referencia,
+                        fecha_sincronizacion = EXCLUDED.fecha_sincronizacion
+                """))
 
             db.session.commit()
+            publish_table_change('inventario_wo')
 
             count_res = db.session.execute(text("SELECT COUNT(*) FROM inventario_wo")).scalar()
-            logger.debug(f"[DEBUG] Registros guardados en inventario_wo tras INSERT: {count_res}")
-            logger.info(f"✅ INSERT masivo completado: {rows_insertados} filas insertadas en inventario_wo.")
+            logger.debug(f"[DEBUG] Registros guardados en inventario_wo tras COPY: {count_res}")
+            logger.info(f"✅ COPY masivo completado: {rows_insertados} filas cargadas en inventario_wo.")
 
         except SQLAlchemyError as e_sql:
             db.session.rollback()
-            logger.error(f"❌ Error de base de datos en INSERT masivo de inventario_wo: {e_sql}")
+            logger.error(f"❌ Error de base de datos en COPY masivo de inventario_wo: {e_sql}")
             raise WoSyncPersistenciaError(str(e_sql)) from e_sql
 
     # ------------------------------------------------------------------
@@ -357,6 +379,13 @@ class WoSyncService:
         """
         is_chunk = bool(payload.get("is_chunk", False)) if isinstance(payload, dict) else False
 
+        # Modo delta: el agente solo envía los documentos con fecha >= `desde`
+        # (ventana calculada a partir del watermark de la última sync exitosa)
+        # y el volcado final reconcilia únicamente esa ventana de db_ventas.
+        desde = None
+        if isinstance(payload, dict) and payload.get("modo") == "delta":
+            desde = WoSyncService._parse_date(payload.get("desde"))
+
         if is_chunk:
             index = payload.get("index", 0)
             total_chunks = payload.get("total_chunks", 1)
@@ -381,12 +410,7 @@ class WoSyncService:
 
             # Paso 2: persistir el chunk actual en Staging
             if mappings_chunk:
-                sql_insert = text("""
-                    INSERT INTO db_ventas_staging
-                    (fecha, documento, nombres, productos, cantidad, total_ingresos, precio_promedio, clasificacion, vendedor, zona, descripcion_producto, iva, identificacion_cliente)
-                    VALUES (:fecha, :documento, :nombres, :productos, :cantidad, :total_ingresos, :precio_promedio, :clasificacion, :vendedor, :zona, :descripcion_producto, :iva, :identificacion_cliente)
-                """)
-                db.session.execute(sql_insert, mappings_chunk)
+                copiar_filas('db_ventas_staging', WoSyncService.COLUMNAS_VENTAS, mappings_chunk)
                 db.session.commit()
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -396,7 +420,7 @@ class WoSyncService:
         # Paso 3: en el último chunk, circuit breaker + volcado atómico a producción
         estado = "En progreso (Staging)"
         if index == total_chunks - 1:
-            estado = WoSyncService._volcar_staging_a_produccion()
+            estado = WoSyncService._volcar_staging_a_produccion(desde)
 
         return {
             "total_insertados_chunk": len(mappings_chunk),
@@ -406,25 +430,45 @@ class WoSyncService:
         }
 
     @staticmethod
-    def _volcar_staging_a_produccion():
+    def _volcar_staging_a_produccion(desde=None):
         """
-        Circuit Breaker de ingesta comercial + volcado atómico staging ->
+        Circuit Breaker de ingesta comercial + aplicación del DELTA staging ->
         db_ventas. Se ejecuta únicamente en el último chunk de una
-        sincronización comercial.
-
-        Si el volumen total recibido (contado en db_ventas_staging, que ya
-        acumula todos los chunks de esta sincronización) es 0, o cae por
-        debajo de UMBRAL_CAIDA_ANOMALA_VENTAS respecto al volumen actual en
-        db_ventas, se ABORTA sin ejecutar el TRUNCATE/INSERT sobre la tabla
-        principal y se lanza un error de negocio explícito -- db_ventas
-        queda intacta con su snapshot anterior.
+        sincronización comercial (y al final de sincronizar_automatica).
+
+        Antes se hacía TRUNCATE db_ventas + reinserción de todo el histórico
+        en cada sync: la tabla quedaba bloqueada durante el volcado, cada
+        corrida reescribía (y generaba WAL de) dos años de filas aunque solo
+        hubieran cambiado unas pocas, y las vistas materializadas se
+        recalculaban siempre. Ahora se compara staging contra producción por
+        la llave (documento, productos, línea) -- ver _SQL_DELTA_VENTAS -- y se
+        aplican solo los INSERT/UPDATE/DELETE necesarios. Los resúmenes del
+        panel de Jefatura se recalculan en la misma transacción, solo para
+        los grupos que tocó el delta (ResumenVentasService).
+
+        `desde` (modo delta del agente) acota la reconciliación a las filas
+        con fecha >= desde: el agente envió la verdad completa de esa ventana
+        y lo anterior no se toca. Sin `desde`, la ventana es la tabla completa
+        (equivalente al reemplazo total anterior, pero escribiendo solo las
+        diferencias).
+
+        El circuit breaker se evalúa sobre la ventana: si lo recibido cae por
+        debajo de UMBRAL_CAIDA_ANOMALA_VENTAS de lo que hay hoy en ella, o si
+        el delta borraría más de (1 - UMBRAL) de sus filas, se ABORTA sin
+        tocar db_ventas (rollback) y se lanza un error de negocio explícito.
         """
-        logger.debug("Último lote recibido. Evaluando circuit breaker antes del volcado a producción...")
-
-        total_recibidos = db.session.execute(text("SELECT COUNT(*) FROM db_ventas_staging")).scalar() or 0
-        count_actual = db.session.execute(text("SELECT COUNT(*) FROM db_ventas")).scalar() or 0
-
-        if total_recibidos == 0:
+        logger.debug("Último lote recibido. Evaluando circuit breaker antes de aplicar el delta a producción...")
+
+        params = {"desde": desde}
+        filtro_ventana = "WHERE CAST(:desde AS DATE) IS NULL OR fecha >= CAST(:desde AS DATE)"
+        total_recibidos = db.session.execute(
+            text(f"SELECT COUNT(*) FROM db_ventas_staging {filtro_ventana}"), params
+        ).scalar() or 0
+        count_actual = db.session.execute(
+            text(f"SELECT COUNT(*) FROM db_ventas {filtro_ventana}"), params
+        ).scalar() or 0
+
+        if total_recibidos == 0 and desde is None:
             logger.critical(
                 "❌ [CRÍTICO] La sincronización comercial de WO no trajo ningún registro "
                 "utilizable. Se aborta el volcado a db_ventas para no vaciar la tabla."
@@ -436,7 +480,7 @@ class WoSyncService:
         if count_actual > 0 and total_recibidos < count_actual * WoSyncService.UMBRAL_CAIDA_ANOMALA_VENTAS:
             logger.critical(
                 f"❌ [CRÍTICO] Caída anómala en la sincronización comercial: "
-                f"recibidos={total_recibidos} vs actuales={count_actual} "
+                f"recibidos={total_recibidos} vs actuales={count_actual} (desde={desde}) "
                 f"(umbral {WoSyncService.UMBRAL_CAIDA_ANOMALA_VENTAS:.0%}). Se aborta el volcado a db_ventas."
             )
             raise CaidaAnomalaError(
@@ -445,20 +489,60 @@ class WoSyncService:
             )
 
         try:
-            logger.debug("Circuit breaker superado. Iniciando Volcado Atómico desde Staging a db_ventas...")
-            db.session.execute(text("TRUNCATE db_ventas"))
+            db.session.execute(text(WoSyncService._SQL_DELTA_VENTAS.format(filtro_ventana=filtro_ventana)), params)
+            delta = dict(db.session.execute(
+                text("SELECT accion, COUNT(*) FROM tmp_delta_ventas GROUP BY accion")
+            ).all())
+            inserts, updates, deletes = delta.get('I', 0), delta.get('U', 0), delta.get('D', 0)
+
+            if count_actual > 0 and deletes > count_actual * (1 - WoSyncService.UMBRAL_CAIDA_ANOMALA_VENTAS):
+                db.session.rollback()
+                logger.critical(
+                    f"❌ [CRÍTICO] El delta comercial borraría {deletes} de {count_actual} filas de db_ventas "
+                    f"(desde={desde}). Se aborta sin aplicar cambios."
+                )
+                raise CaidaAnomalaError(
+                    f"Caída anómala: la sincronización eliminaría {deletes} de {count_actual} registros "
+                    "de db_ventas. Verifique la extracción en el agente local."
+                )
+
+            if not (inserts or updates or deletes):
+                db.session.commit()
+                logger.info(f"✅ Sincronización comercial sin cambios (desde={desde}). db_ventas intacta.")
+                return "Completado sin cambios"
+
+            cols = ', '.join(WoSyncService.COLUMNAS_VENTAS)
+            set_cols = ', '.join(f"{c} = d.{c}" for c in WoSyncService.COLUMNAS_VENTAS)
+            # Grupos del resumen de Jefatura que toca el delta: los valores
+            # viejos hay que leerlos antes del DELETE/UPDATE.
+            ResumenVentasService.capturar_grupos_afectados()
             db.session.execute(text("""
-                INSERT INTO db_ventas (fecha, documento, nombres, productos, cantidad, total_ingresos, precio_promedio, clasificacion, vendedor, zona, descripcion_producto, iva, identificacion_cliente)
-                SELECT fecha, documento, nombres, productos, cantidad, total_ingresos, precio_promedio, clasificacion, vendedor, zona, descripcion_producto, iva, identificacion_cliente
-                FROM db_ventas_staging
+                DELETE FROM db_ventas v USING tmp_delta_ventas d
+                WHERE d.accion = 'D' AND v.id = d.id_produccion
+            """))
+            db.session.execute(text(f"""
+                UPDATE db_ventas v SET {set_cols}
+                FROM tmp_delta_ventas d
+                WHERE d.accion = 'U' AND v.id = d.id_produccion
+            """))
+            db.session.execute(text(f"""
+                INSERT INTO db_ventas ({cols})
+                SELECT {cols} FROM tmp_delta_ventas WHERE accion = 'I'
             """))
+            ResumenVentasService.aplicar_grupos_afectados()
             db.session.commit()
-            logger.info("✅ Sincronización comercial completada con volcado atómico desde Staging Table.")
-            WoSyncService.refrescar_mv_dashboard_ventas()
-            return "Completado y Volcado a Producción"
+            logger.info(
+                f"✅ Sincronización comercial aplicada como delta (desde={desde}): "
+                f"+{inserts} ~{updates} -{deletes} sobre {count_actual} filas de la ventana."
+            )
+            publish_table_change(
+                'db_ventas', ResumenVentasService.TABLA_CLIENTE_PRODUCTO, ResumenVentasService.TABLA_MENSUAL,
+                ResumenVentasService.TABLA_COMERCIAL,
+            )
+            return f"Completado (delta: +{inserts} ~{updates} -{deletes})"
         except SQLAlchemyError as e:
             db.session.rollback()
-            logger.error(f"❌ Error de base de datos en volcado de staging a producción: {e}")
+            logger.error(f"❌ Error de base de datos aplicando el delta de staging a producción: {e}")
             raise WoSyncPersistenciaError(str(e)) from e
 
     # ------------------------------------------------------------------
@@ -469,8 +553,9 @@ class WoSyncService:
     def sincronizar_automatica():
         """
         Extrae ventas/pedidos/devoluciones directamente desde SQL Server (WO)
-        vía pyodbc y las vuelca en db_ventas (DELETE total + bulk insert en
-        una única transacción). Registra inicio/fin/error en OperacionLog.
+        vía pyodbc, las carga por COPY en db_ventas_staging y aplica el delta
+        contra db_ventas (_volcar_staging_a_produccion). Registra
+        inicio/fin/error en OperacionLog.
 
         :raises WoSyncConfigError: pyodbc no instalado o WO_PASSWORD ausente.
         :raises WoSyncPersistenciaError: fallo de conexión/consulta a WO o de
@@ -579,20 +664,20 @@ class WoSyncService:
             conn.close()
             conn = None
 
-            # Borrado total de db_ventas e inserción masiva en transacción atómica
-            db.session.query(RawVentas).delete(synchronize_session=False)
-            if datos_mapeados:
-                db.session.bulk_insert_mappings(RawVentas, datos_mapeados)
+            # Misma ruta que recibir_comercial: staging por COPY y delta
+            # (con circuit breaker) contra db_ventas en una transacción.
+            db.session.execute(text("TRUNCATE db_ventas_staging"))
+            copiar_filas('db_ventas_staging', WoSyncService.COLUMNAS_VENTAS, datos_mapeados)
+            estado = WoSyncService._volcar_staging_a_produccion()
 
             db.session.add(OperacionLog(
                 fecha=datetime.now(),
                 modulo="SincronizacionComercial",
                 operario="Sistema (Auto)",
                 accion="Fin Sincronización Automática",
-                detalles=f"Exito. Procesados: {len(datos_mapeados)} (Ventas: {cant_fv}, Pedidos: {cant_pd})"
+                detalles=f"Exito. Procesados: {len(datos_mapeados)} (Ventas: {cant_fv}, Pedidos: {cant_pd}). {estado}"
             ))
             db.session.commit()
-            WoSyncService.refrescar_mv_dashboard_ventas()
 
             return {"registros": len(datos_mapeados)}
 
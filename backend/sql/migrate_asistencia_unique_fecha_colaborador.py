@@ -0,0 +1,50 @@
+"""
+Migración: índice único uq_asistencia_fecha_colaborador sobre
+db_asistencia (fecha, colaborador).
+
+nomina_service.guardar_asistencia_masiva (/api/asistencia/registrar_masivo
+y /api/asistencia/guardar_ausencia) guarda el lote completo con un único
+INSERT ... ON CONFLICT (fecha, colaborador) DO UPDATE, que en Postgres
+exige un índice único exactamente sobre esas columnas. Hasta ahora la
+unicidad colaborador-día solo la garantizaba el SELECT previo por registro
+(y guardar_ausencia ni siquiera eso), así que puede haber duplicados
+históricos.
+
+No destructiva: si existen duplicados NO se borra nada (cuál fila conservar
+es una decisión de nómina, sobre todo si alguna ya está PROCESADO); se
+listan y la migración termina sin crear el índice. Una vez depurados, volver
+a correrla. CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS en modo
+autocommit, igual que migrate_indices_funcionales_codigo.py, para no
+bloquear las escrituras de asistencia durante la construcción.
+"""
+from backend.core.sql_database import db
+from backend.app import app
+from sqlalchemy import text
+
+with app.app_context():
+    duplicados = db.session.execute(text("""
+        SELECT fecha, colaborador, COUNT(*) AS filas, STRING_AGG(id::text || ':' || COALESCE(estado_pago, ''), ', ')
+        FROM db_asistencia
+        WHERE fecha IS NOT NULL AND colaborador IS NOT NULL
+        GROUP BY fecha, colaborador
+        HAVING COUNT(*) > 1
+        ORDER BY fecha, colaborador
+    """)).fetchall()
+    db.session.rollback()
+
+    if duplicados:
+        print(f"ERROR: {len(duplicados)} colaborador-día duplicados en db_asistencia; índice NO creado.")
+        for fecha, colaborador, filas, ids in duplicados:
+            print(f"  {fecha} {colaborador}: {filas} filas (id:estado_pago -> {ids})")
+    else:
+        conn = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_asistencia_fecha_colaborador "
+                "ON db_asistencia (fecha, colaborador)"
+            ))
+            print("OK: uq_asistencia_fecha_colaborador")
+        except Exception as e:
+            print(f"ERROR creando uq_asistencia_fecha_colaborador: {e}")
+        finally:
+            conn.close()
@@ -22,6 +22,12 @@ db_trazabilidad_lotes.estado_actual, el campo de filtrado central del ciclo
 de vida del lote (ABIERTO_PRODUCCION -> EN_PULIDO -> PENDIENTE_VALIDACION ->
 APROBADO_CERRADO) que hasta ahora no tenía índice propio.
 
+Y un índice funcional PARCIAL sobre UPPER(TRIM(db_pedidos.delegado_a)),
+solo de los pedidos abiertos (mismo predicado de estado que
+VentasRepository.get_pedidos_pendientes): el listado de pendientes que
+sondean el modo TV y las tablets de almacén filtra por la operaria asignada
+en SQL, y el índice queda pequeño porque los pedidos cerrados no entran.
+
 No destructiva: CREATE INDEX CONCURRENTLY IF NOT EXISTS en todos los casos.
 CONCURRENTLY evita el lock de escritura que un CREATE INDEX normal tomaría
 sobre tablas que reciben escrituras constantes en horario de planta (no se
@@ -58,6 +64,13 @@ INDICES = [
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_db_trazabilidad_lotes_estado_actual "
         "ON db_trazabilidad_lotes (estado_actual)"
     ),
+    (
+        "idx_db_pedidos_pendientes_delegado",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_db_pedidos_pendientes_delegado "
+        "ON db_pedidos (UPPER(TRIM(delegado_a))) "
+        "WHERE estado NOT IN ('COMPLETADO', 'DESPACHADO', 'ENTREGADO', 'FACTURADO', 'CANCELADO') "
+        "AND estado IS NOT NULL"
+    ),
 ]
 
 with app.app_context():
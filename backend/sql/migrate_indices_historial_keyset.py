@@ -0,0 +1,43 @@
+"""
+Migración: índices (fecha, id) para el modo paginado de /api/historial-global.
+
+historial_routes._pagina_movimientos_historial arma cada página con una
+rama por tabla que aplica el cursor como rango sobre (fecha, id) y termina
+en ORDER BY fecha DESC, id DESC LIMIT n: con un índice compuesto sobre esas
+dos columnas Postgres recorre el índice hacia atrás desde el cursor y se
+detiene tras n filas, en vez de leer y ordenar todo el rango de fechas. Los
+índices simples existentes sobre la fecha no alcanzan para el desempate por
+id dentro del mismo instante (lotes multi-SKU comparten fecha_inicia).
+
+También indexa db_ensambles.id_ensamble: las ramas PNC de ensamble buscan
+por lote (representante y detección de ambigüedad) y era la única columna
+de enlace PNC -> producción sin índice.
+
+No destructiva: CREATE INDEX CONCURRENTLY IF NOT EXISTS en modo autocommit,
+igual que migrate_indices_funcionales_codigo.py.
+"""
+from backend.core.sql_database import db
+from backend.app import app
+from sqlalchemy import text
+
+INDICES = [
+    ("idx_db_inyeccion_fecha_inicia_id", "db_inyeccion (fecha_inicia, id)"),
+    ("idx_db_pulido_fecha_id", "db_pulido (fecha, id)"),
+    ("idx_db_ensambles_fecha_id", "db_ensambles (fecha, id)"),
+    ("idx_db_mezcla_fecha_id", "db_mezcla (fecha, id)"),
+    ("idx_db_ventas_fecha_id", "db_ventas (fecha, id)"),
+    ("idx_db_ensambles_id_ensamble", "db_ensambles (id_ensamble)"),
+]
+
+with app.app_context():
+    conn = db.engine.connect()
+    conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        for nombre, destino in INDICES:
+            try:
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {destino}"))
+                print(f"OK: {nombre}")
+            except Exception as e:
+                print(f"ERROR creando {nombre}: {e}")
+    finally:
+        conn.close()
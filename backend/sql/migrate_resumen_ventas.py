@@ -0,0 +1,39 @@
+"""
+Migración: reemplaza las vistas materializadas mv_dashboard_ventas_analitica
+y mv_rendimiento_mensual por las tablas resumen_ventas_cliente_producto y
+resumen_ventas_mensual, mantenidas de forma incremental por
+ResumenVentasService (backend/services/resumen_ventas_service.py) en cada
+delta de la sincronización comercial de WO. También crea y llena el cubo
+resumen_ventas_comercial del que lee la analítica comercial histórica.
+
+Pasos:
+  1. Crea las tablas (mismo DDL que db.create_all() al arrancar la app).
+  2. Backfill completo desde db_ventas y primera versión en app_config
+     ('version_resumen_ventas').
+  3. DROP de las vistas materializadas: ya nadie las lee ni las refresca.
+
+Re-ejecutable: CREATE IF NOT EXISTS, el backfill hace TRUNCATE + INSERT y
+el DROP lleva IF EXISTS. Correrla también tras editar a mano
+db_cliente_equivalencias, para re-resolver clientes de grupos que ningún
+delta de WO vaya a tocar.
+"""
+from backend.core.sql_database import db
+from backend.app import app
+from backend.models.sql_models import ResumenVentasClienteProducto, ResumenVentasMensual, ResumenVentasComercial
+from backend.services.resumen_ventas_service import ResumenVentasService
+from sqlalchemy import text
+
+with app.app_context():
+    try:
+        db.metadata.create_all(db.engine, tables=[
+            ResumenVentasClienteProducto.__table__, ResumenVentasMensual.__table__, ResumenVentasComercial.__table__,
+        ])
+        ResumenVentasService.reconstruir()
+
+        db.session.execute(text("DROP MATERIALIZED VIEW IF EXISTS mv_dashboard_ventas_analitica"))
+        db.session.execute(text("DROP MATERIALIZED VIEW IF EXISTS mv_rendimiento_mensual"))
+        db.session.commit()
+        print("Migración exitosa: resúmenes de ventas construidos y vistas materializadas eliminadas.")
+    except Exception as e:
+        db.session.rollback()
+        print("Error en migración:", e)
@@ -0,0 +1,49 @@
+"""
+Recálculo de horas del periodo de nómina abierto (backfill).
+
+Reescribe horas_ordinarias/horas_extras de db_asistencia con las reglas
+vigentes (PERFILES_HORARIO / MAPEO_PERFILES) para todos los registros NO
+procesados del rango, usando el cálculo vectorizado
+ReglasAsistencia.calcular_lote y un UPDATE set-based
+(nomina_service.recalcular_periodo). Los registros PROCESADO nunca se tocan.
+
+Uso:
+    python -m backend.sql.recalcular_horas_periodo [division] [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--aplicar]
+
+  division   all (defecto), frimetals o friparts, igual que el corte.
+  --desde / --hasta  rango explícito; por defecto el periodo pendiente.
+  --aplicar  sin esta bandera solo informa cuántas filas cambiarían.
+"""
+import argparse
+from datetime import datetime
+
+from backend.core.sql_database import db
+from backend.app import app
+from backend.services.nomina_service import recalcular_periodo
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+parser = argparse.ArgumentParser(description="Recalcula horas del periodo de nómina abierto.")
+parser.add_argument('division', nargs='?', default='all')
+parser.add_argument('--desde', type=_fecha)
+parser.add_argument('--hasta', type=_fecha)
+parser.add_argument('--aplicar', action='store_true')
+args = parser.parse_args()
+
+with app.app_context():
+    try:
+        resumen = recalcular_periodo(args.division, args.desde, args.hasta, aplicar=args.aplicar)
+        if args.aplicar:
+            db.session.commit()
+        else:
+            db.session.rollback()
+        print(
+            f"{'Aplicado' if args.aplicar else 'Simulación'}: {resumen['actualizados']} de "
+            f"{resumen['registros']} registros con horas distintas ({resumen['p_inicio']} a {resumen['p_fin']})."
+        )
+    except Exception as e:
+        db.session.rollback()
+        print("Error en recálculo:", e)
@@ -10,55 +10,138 @@ logger = logging.getLogger(__name__)
 _caches = {}
 _caches_lock = threading.Lock()
 
+# Suscriptores a eventos "tabla cambiada" (ver publish_table_change). Cada
+# callback recibe (tablas: frozenset, tenant: str | None). Permite que cachés
+# que no viven en NamespaceTTLCache (snapshots propios de un servicio) se
+# invaliden con el mismo evento sin que el publicador tenga que conocerlas.
+_suscriptores = []
+_suscriptores_lock = threading.Lock()
+
+TENANT_TAG_PREFIX = "tenant:"
+
+
+def tenant_tag(tenant):
+    """Tag canónico de tenant, ej. tenant_tag('friparts') -> 'tenant:friparts'."""
+    return f"{TENANT_TAG_PREFIX}{tenant}"
+
+
 class NamespaceTTLCache:
     """
     Caché en memoria con límite de tamaño (maxsize) e invalidación por tiempo (TTL).
     Implementación segura frente a accesos concurrentes de múltiples hilos (Thread-Safe)
     mediante threading.Lock.
 
+    Cada entrada puede llevar un conjunto de tags (tablas de las que depende,
+    ej. 'db_inyeccion', y su tenant, ej. 'tenant:friparts'). invalidate_tags()
+    desaloja SOLO las entradas que dependen de esos tags, en vez de vaciar el
+    namespace completo: una escritura en db_pulido ya no tira los rangos de
+    fecha cacheados que no leen db_pulido. Un índice inverso tag -> llaves
+    evita recorrer todo el store en cada evento.
+
+    Expone contadores de hits/misses/desalojos (stats()) para medir si el TTL
+    y el maxsize de cada namespace están bien dimensionados.
+
     ADVERTENCIA DE PRODUCCIÓN (GUNICORN / WORKERS):
-    Esta caché utiliza memoria RAM local del proceso Python. Si la aplicación corre 
-    detrás de un servidor WSGI como Gunicorn con múltiples procesos activos (workers > 1), 
-    cada worker tendrá su propia instancia de esta caché aislada en memoria. Las escrituras 
-    o invalidaciones en un proceso no se reflejarán en los demás. 
-    Esta implementación es consistente y adecuada si la aplicación se ejecuta con un 
-    solo worker (worker=1). Para despliegues horizontales multi-worker, se debe migrar 
+    Esta caché utiliza memoria RAM local del proceso Python. Si la aplicación corre
+    detrás de un servidor WSGI como Gunicorn con múltiples procesos activos (workers > 1),
+    cada worker tendrá su propia instancia de esta caché aislada en memoria. Las escrituras
+    o invalidaciones en un proceso no se reflejarán en los demás.
+    Esta implementación es consistente y adecuada si la aplicación se ejecuta con un
+    solo worker (worker=1). Para despliegues horizontales multi-worker, se debe migrar
     este gestor de caché a una solución compartida y centralizada como Redis o Memcached.
+    El mismo supuesto de un solo worker (gunicorn.conf.py) sostiene el resto del
+    estado en memoria del proceso: snapshots e índices (CatalogoService,
+    busqueda_productos_service, bom_service, simulador_service, mrp_service),
+    feeds y colas (pedidos_feed, mes_estado, asistente_jobs, reporte_lote_service,
+    task_runner), la caché en disco de imagen_cache y el cupo de conexiones largas
+    (backend/core/conexiones_largas.py). Con más de un worker cada proceso vería solo
+    sus propias escrituras y eventos.
     """
     def __init__(self, maxsize=100, ttl=600):
         self.maxsize = maxsize
         self.ttl = ttl
-        self.store = {}  # key -> (value, expires_at)
+        self.store = {}  # key -> (value, expires_at, tags)
+        self._tag_index = {}  # tag -> set(keys)
         self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions_capacity = 0
+        self.evictions_expired = 0
+        self.evictions_tag = 0
 
     def get(self, key):
         with self._lock:
             now = time.time()
             if key in self.store:
-                value, expires_at = self.store[key]
+                value, expires_at, _ = self.store[key]
                 if now < expires_at:
+                    self.hits += 1
                     return value
                 else:
-                    del self.store[key]
+                    self._remove_unlocked(key)
+                    self.evictions_expired += 1
+            self.misses += 1
             return None
 
-    def set(self, key, value):
+    def set(self, key, value, tags=None):
+        tags = frozenset(tags or ())
         with self._lock:
             now = time.time()
             self._cleanup_unlocked()
+            if key in self.store:
+                self._remove_unlocked(key)
             if len(self.store) >= self.maxsize:
                 # Desalojo FIFO simple para evitar rebasar el límite de tamaño
                 oldest_key = next(iter(self.store))
-                del self.store[oldest_key]
+                self._remove_unlocked(oldest_key)
+                self.evictions_capacity += 1
                 logger.debug(f"[CacheEvict] Evicted oldest key: {oldest_key}")
-            self.store[key] = (value, now + self.ttl)
+            self.store[key] = (value, now + self.ttl, tags)
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+
+    def _remove_unlocked(self, key):
+        """Quita `key` del store y del índice de tags. Requiere self._lock tomado."""
+        entry = self.store.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
 
     def _cleanup_unlocked(self):
         """Método interno de limpieza que se asume llamado dentro de self._lock."""
         now = time.time()
-        expired = [k for k, (_, exp) in self.store.items() if now >= exp]
+        expired = [k for k, (_, exp, _) in self.store.items() if now >= exp]
         for k in expired:
-            del self.store[k]
+            self._remove_unlocked(k)
+        self.evictions_expired += len(expired)
+
+    def invalidate_tags(self, tags, tenant=None):
+        """
+        Desaloja las entradas que dependen de CUALQUIERA de `tags`. Si se pasa
+        `tenant`, solo se desalojan las de ese tenant (o las que no declaran
+        tenant, que por seguridad se consideran compartidas). Devuelve cuántas
+        entradas se desalojaron.
+        """
+        with self._lock:
+            candidatas = set()
+            for tag in tags:
+                candidatas |= self._tag_index.get(tag, set())
+            if tenant is not None:
+                propio = tenant_tag(tenant)
+                candidatas = {
+                    k for k in candidatas
+                    if propio in self.store[k][2]
+                    or not any(t.startswith(TENANT_TAG_PREFIX) for t in self.store[k][2])
+                }
+            for k in candidatas:
+                self._remove_unlocked(k)
+            self.evictions_tag += len(candidatas)
+            return len(candidatas)
 
     def cleanup(self):
         with self._lock:
@@ -67,6 +150,24 @@ class NamespaceTTLCache:
     def clear(self):
         with self._lock:
             self.store.clear()
+            self._tag_index.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "size": len(self.store),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+                "evictions": {
+                    "capacity": self.evictions_capacity,
+                    "expired": self.evictions_expired,
+                    "tag": self.evictions_tag,
+                },
+            }
 
 def get_cache(namespace, maxsize=100, ttl=600):
     with _caches_lock:
@@ -74,10 +175,32 @@ def get_cache(namespace, maxsize=100, ttl=600):
             _caches[namespace] = NamespaceTTLCache(maxsize=maxsize, ttl=ttl)
         return _caches[namespace]
 
-def cached_route(namespace, maxsize=100, ttl=600, key_builder=None):
+
+def _tenant_actual():
+    """Tenant de la petición en curso; None si no hay sesión/contexto resoluble."""
+    try:
+        from backend.core.tenant import get_tenant_from_request
+        return get_tenant_from_request()
+    except Exception:
+        return None
+
+
+def cached_route(namespace, maxsize=100, ttl=600, key_builder=None, tags=None, version=None):
     """
     Decorador para cachear respuestas de rutas Flask basado en namespaces.
     Soporta bypass con ?nocache=1 en URL.
+
+    `tags` declara las tablas de las que depende la respuesta (iterable, o
+    callable(*args, **kwargs) que devuelve un iterable si dependen de los
+    parámetros). A cada entrada se le agrega además el tag de su tenant, que
+    también forma parte de la llave por defecto: dos tenants con la misma URL
+    ya no comparten entrada. publish_table_change() usa esos tags para
+    desalojar solo lo que quedó obsoleto.
+
+    `version` (callable sin argumentos) devuelve la versión vigente de los
+    datos que sirve la ruta y se agrega a la llave: cuando la versión cambia
+    (p.ej. otro proceso aplicó una sincronización y este nunca recibió el
+    evento), las entradas viejas dejan de coincidir y se recalcula.
     """
     cache = get_cache(namespace, maxsize=maxsize, ttl=ttl)
 
@@ -85,14 +208,18 @@ def cached_route(namespace, maxsize=100, ttl=600, key_builder=None):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             nocache = request.args.get('nocache') == '1'
-            
+            tenant = _tenant_actual()
+
             # Construir la llave de caché
             if key_builder:
                 key = key_builder(*args, **kwargs)
             else:
-                # Llave por defecto: combinación de ruta y parámetros de búsqueda ordenados
-                query_params = tuple(sorted(request.args.items()))
-                key = (request.path, query_params)
+                # Llave por defecto: tenant + ruta + parámetros de búsqueda ordenados
+                # (sin 'nocache', que no altera la respuesta).
+                query_params = tuple(sorted((k, v) for k, v in request.args.items() if k != 'nocache'))
+                key = (tenant, request.path, query_params)
+            if version:
+                key = (key, version())
 
             if nocache:
                 logger.info(f"[CacheMiss] Cache bypass para namespace='{namespace}', key={key}")
@@ -105,7 +232,7 @@ def cached_route(namespace, maxsize=100, ttl=600, key_builder=None):
 
             logger.info(f"[CacheMiss] Ejecutando ruta para namespace='{namespace}', key={key}")
             response = f(*args, **kwargs)
-            
+
             # Solo cachear si la respuesta es exitosa (código 200)
             status_code = 200
             if isinstance(response, tuple):
@@ -115,8 +242,11 @@ def cached_route(namespace, maxsize=100, ttl=600, key_builder=None):
                 status_code = response.status_code
 
             if status_code == 200:
-                cache.set(key, response)
-                
+                entry_tags = set(tags(*args, **kwargs) if callable(tags) else (tags or ()))
+                if tenant:
+                    entry_tags.add(tenant_tag(tenant))
+                cache.set(key, response, tags=entry_tags)
+
             return response
         return decorated_function
     return decorator
@@ -133,3 +263,53 @@ def invalidate_cache(namespace):
         return True
     logger.debug(f"[CacheInvalidate] No se encontró el namespace='{namespace}' para invalidar.")
     return False
+
+
+def subscribe_table_changes(callback):
+    """
+    Registra callback(tablas, tenant) para cada publish_table_change(). Un
+    callback que lanza excepción se loggea y NO corta la notificación al
+    resto: la escritura que originó el evento ya se confirmó.
+    """
+    with _suscriptores_lock:
+        if callback not in _suscriptores:
+            _suscriptores.append(callback)
+    return callback
+
+
+def publish_table_change(*tables, tenant=None):
+    """
+    Evento "tabla cambiada": desaloja de TODOS los namespaces las entradas
+    que dependen de alguna de `tables` y notifica a los suscriptores.
+    Llamar DESPUÉS del commit que modificó las tablas -- publicar antes
+    permitiría que otro hilo re-cachee el estado previo al commit.
+
+    Devuelve el total de entradas desalojadas.
+    """
+    tablas = frozenset(t for t in tables if t)
+    if not tablas:
+        return 0
+    with _caches_lock:
+        caches = list(_caches.items())
+    total = 0
+    for namespace, cache in caches:
+        n = cache.invalidate_tags(tablas, tenant=tenant)
+        if n:
+            logger.info(f"[CacheInvalidate] {n} entradas de namespace='{namespace}' desalojadas por cambio en {sorted(tablas)}")
+        total += n
+
+    with _suscriptores_lock:
+        suscriptores = list(_suscriptores)
+    for callback in suscriptores:
+        try:
+            callback(tablas, tenant)
+        except Exception as e:
+            logger.error(f"[CacheInvalidate] Suscriptor {getattr(callback, '__name__', callback)} falló ante cambio en {sorted(tablas)}: {e}")
+    return total
+
+
+def get_cache_stats():
+    """Contadores por namespace (hits, misses, desalojos) para diagnóstico."""
+    with _caches_lock:
+        caches = list(_caches.items())
+    return {namespace: cache.stats() for namespace, cache in caches}
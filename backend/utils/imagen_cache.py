@@ -0,0 +1,259 @@
+"""
+Caché en disco, direccionada por contenido, para el proxy de imágenes de
+Google Drive (backend/routes/imagenes_routes.py).
+
+Antes el proxy usaba @lru_cache(maxsize=1000) sobre los bytes completos de
+cada imagen: hasta 1000 fotos de varios MB en la RAM de una instancia de
+512MB, vaciada en cada redeploy/reinicio, y un fallo (None, None) quedaba
+cacheado para siempre (una imagen que Drive no sirvió una vez no volvía a
+intentarse hasta reiniciar).
+
+Diseño:
+  - blobs/<sha256>: el contenido, nombrado por su hash. El hash es también
+    el ETag (If-None-Match -> 304 sin reenviar bytes), y dos llaves con el
+    mismo contenido comparten un único archivo.
+  - claves/<sha256 de la llave>.json: llave -> {sha, content_type}. El mtime
+    de este archivo es el "último uso" que ordena el LRU entre reinicios.
+  - Presupuesto en bytes (suma de blobs distintos) con desalojo LRU.
+  - Fallos cacheados solo `ttl_fallo` segundos, en memoria.
+  - Single-flight: si 20 miniaturas del catálogo piden el mismo file_id a la
+    vez, solo el primer hilo va a Drive; el resto espera su resultado.
+
+El índice en memoria se reconstruye desde disco al arrancar.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ImagenCacheada:
+    """Entrada servible: ruta del blob en disco, tipo MIME y ETag."""
+    __slots__ = ('ruta', 'content_type', 'etag', 'tamano')
+
+    def __init__(self, ruta, content_type, etag, tamano):
+        self.ruta = ruta
+        self.content_type = content_type
+        self.etag = etag
+        self.tamano = tamano
+
+
+class _Vuelo:
+    """Descarga en curso de una llave; los hilos que llegan tarde esperan su evento."""
+    __slots__ = ('evento', 'resultado')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+
+
+class DiskImageCache:
+    """Caché LRU en disco con presupuesto de bytes, ETag por contenido y single-flight."""
+
+    def __init__(self, directorio, max_bytes, ttl_fallo=60, espera_vuelo=30):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl_fallo = ttl_fallo
+        self.espera_vuelo = espera_vuelo
+        self._dir_blobs = os.path.join(directorio, 'blobs')
+        self._dir_claves = os.path.join(directorio, 'claves')
+        self._lock = threading.Lock()
+        self._claves = OrderedDict()  # llave -> (sha, content_type), más antigua primero
+        self._refs = {}  # sha -> cantidad de llaves que lo usan
+        self._tamanos = {}  # sha -> bytes
+        self._total_bytes = 0
+        self._fallos = {}  # llave -> expira_en
+        self._en_vuelo = {}  # llave -> _Vuelo
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+        os.makedirs(self._dir_blobs, exist_ok=True)
+        os.makedirs(self._dir_claves, exist_ok=True)
+        self._cargar_indice()
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _nombre_clave(llave):
+        return hashlib.sha256(llave.encode('utf-8')).hexdigest() + '.json'
+
+    def _cargar_indice(self):
+        """Reconstruye el índice desde claves/*.json, ordenado por último uso (mtime)."""
+        entradas = []
+        for nombre in os.listdir(self._dir_claves):
+            if not nombre.endswith('.json'):
+                self._borrar_silencioso(os.path.join(self._dir_claves, nombre))
+                continue
+            ruta = os.path.join(self._dir_claves, nombre)
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                blob = os.path.join(self._dir_blobs, meta['sha'])
+                entradas.append((os.path.getmtime(ruta), meta, os.path.getsize(blob)))
+            except (OSError, ValueError, KeyError):
+                # Metadato corrupto o blob perdido: se descarta la entrada.
+                self._borrar_silencioso(ruta)
+        for _, meta, tamano in sorted(entradas, key=lambda e: e[0]):
+            self._indexar_unlocked(meta['llave'], meta['sha'], meta['content_type'], tamano)
+
+        # Blobs huérfanos (p.ej. proceso muerto entre escribir el blob y su clave).
+        for sha in os.listdir(self._dir_blobs):
+            if sha not in self._refs:
+                self._borrar_silencioso(os.path.join(self._dir_blobs, sha))
+        self._desalojar_unlocked()
+        logger.info(
+            f"[ImagenCache] {len(self._claves)} imágenes ({self._total_bytes / 1e6:.1f} MB) "
+            f"cargadas desde {self.directorio}"
+        )
+
+    def _indexar_unlocked(self, llave, sha, content_type, tamano):
+        self._claves[llave] = (sha, content_type)
+        self._claves.move_to_end(llave)
+        if sha not in self._refs:
+            self._refs[sha] = 0
+            self._tamanos[sha] = tamano
+            self._total_bytes += tamano
+        self._refs[sha] += 1
+
+    def _quitar_unlocked(self, llave):
+        sha, _ = self._claves.pop(llave)
+        self._borrar_silencioso(os.path.join(self._dir_claves, self._nombre_clave(llave)))
+        self._refs[sha] -= 1
+        if not self._refs[sha]:
+            del self._refs[sha]
+            self._total_bytes -= self._tamanos.pop(sha)
+            self._borrar_silencioso(os.path.join(self._dir_blobs, sha))
+
+    def _desalojar_unlocked(self):
+        while self._total_bytes > self.max_bytes and self._claves:
+            llave = next(iter(self._claves))
+            self._quitar_unlocked(llave)
+            self.desalojos += 1
+            logger.debug(f"[ImagenCache] Desalojada '{llave}' por presupuesto de bytes")
+
+    @staticmethod
+    def _borrar_silencioso(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _escribir_atomico(ruta, datos):
+        tmp = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+
+    def _entrada(self, llave, sha, content_type):
+        return ImagenCacheada(os.path.join(self._dir_blobs, sha), content_type, sha, self._tamanos[sha])
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def get(self, llave):
+        """ImagenCacheada si `llave` está en disco (y la marca como recién usada), si no None."""
+        with self._lock:
+            valor = self._claves.get(llave)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._claves.move_to_end(llave)
+            self.hits += 1
+            entrada = self._entrada(llave, *valor)
+        try:
+            os.utime(os.path.join(self._dir_claves, self._nombre_clave(llave)))
+        except OSError:
+            pass
+        return entrada
+
+    def set(self, llave, contenido, content_type):
+        """Guarda `contenido` bajo `llave` y devuelve su ImagenCacheada."""
+        sha = hashlib.sha256(contenido).hexdigest()
+        meta = json.dumps({'llave': llave, 'sha': sha, 'content_type': content_type}).encode('utf-8')
+        # Las escrituras van bajo el lock: así un desalojo concurrente nunca
+        # borra un blob entre que se escribe y se indexa. Son raras (solo en
+        # misses, ya deduplicados por obtener()).
+        with self._lock:
+            if llave in self._claves:
+                self._quitar_unlocked(llave)
+            ruta_blob = os.path.join(self._dir_blobs, sha)
+            if sha not in self._refs:
+                self._escribir_atomico(ruta_blob, contenido)
+            self._escribir_atomico(os.path.join(self._dir_claves, self._nombre_clave(llave)), meta)
+            self._fallos.pop(llave, None)
+            self._indexar_unlocked(llave, sha, content_type, len(contenido))
+            entrada = self._entrada(llave, sha, content_type)
+            self._desalojar_unlocked()
+        return entrada
+
+    def obtener(self, llave, cargar):
+        """
+        Entrada de `llave`; en un miss llama `cargar()` -> (bytes, content_type)
+        o (None, None), una sola vez aunque haya varios hilos pidiendo la misma
+        llave. Un fallo se recuerda `ttl_fallo` segundos y devuelve None.
+        """
+        entrada = self.get(llave)
+        if entrada is not None:
+            return entrada
+
+        with self._lock:
+            expira = self._fallos.get(llave)
+            if expira is not None:
+                if time.time() < expira:
+                    return None
+                del self._fallos[llave]
+            vuelo = self._en_vuelo.get(llave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[llave] = _Vuelo()
+
+        if not lider:
+            vuelo.evento.wait(self.espera_vuelo)
+            return vuelo.resultado
+
+        try:
+            contenido, content_type = cargar()
+            if contenido:
+                vuelo.resultado = self.set(llave, contenido, content_type)
+            else:
+                with self._lock:
+                    self._fallos[llave] = time.time() + self.ttl_fallo
+        except Exception as e:
+            logger.error(f"[ImagenCache] Error cargando '{llave}': {e}")
+            with self._lock:
+                self._fallos[llave] = time.time() + self.ttl_fallo
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(llave, None)
+            vuelo.evento.set()
+        return vuelo.resultado
+
+    def limpiar(self):
+        """Vacía la caché completa (disco y memoria)."""
+        with self._lock:
+            for llave in list(self._claves):
+                self._quitar_unlocked(llave)
+            self._fallos.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "imagenes": len(self._claves),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+                "desalojos": self.desalojos,
+                "fallos_vigentes": len(self._fallos),
+            }
@@ -0,0 +1,90 @@
+"""
+Variantes redimensionadas de las imágenes de producto servidas por el proxy
+de Drive (/imagenes/proxy/<file_id>?w=<ancho>).
+
+Las imágenes del catálogo son en su mayoría fotos de celular de varios MB;
+la tabla de inventario las pinta a 40px y las tarjetas móviles a ~300px. Se
+genera (una vez, y se guarda en la caché en disco del proxy) una versión
+reducida y re-codificada en WebP (o JPEG si el navegador no acepta WebP).
+
+Los anchos se redondean hacia ARRIBA al escalón permitido más cercano: un
+?w=150 y un ?w=160 comparten variante, y un cliente no puede llenar el
+disco pidiendo un ancho distinto por petición.
+"""
+import io
+
+ANCHOS_VARIANTE = (160, 320, 640, 1280)
+
+# Variantes que el catálogo incluye en su JSON (imagen_variantes).
+VARIANTES_CATALOGO = {'miniatura': 160, 'mediana': 640}
+
+FORMATOS_VARIANTE = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_PREFIJO_PROXY = '/imagenes/proxy/'
+
+
+def normalizar_ancho(valor):
+    """Ancho de variante permitido para `valor` (?w=), o None si no se pidió o no es válido."""
+    try:
+        ancho = int(valor)
+    except (TypeError, ValueError):
+        return None
+    if ancho <= 0:
+        return None
+    for permitido in ANCHOS_VARIANTE:
+        if ancho <= permitido:
+            return permitido
+    return ANCHOS_VARIANTE[-1]
+
+
+def elegir_formato(formato, accept):
+    """`formato` explícito (?fmt=) si es conocido; si no, WebP cuando el header Accept lo admite."""
+    formato = (formato or '').lower()
+    if formato == 'jpg':
+        formato = 'jpeg'
+    if formato in FORMATOS_VARIANTE:
+        return formato
+    return 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+
+
+def generar_variante(contenido, ancho, formato):
+    """
+    Reduce `contenido` (bytes de imagen) a `ancho` px como máximo, respetando
+    proporción y la orientación EXIF de las fotos de celular, y lo codifica
+    en `formato`. Nunca amplía. Devuelve (bytes, content_type).
+    Lanza la excepción de Pillow si el contenido no es una imagen legible.
+    """
+    # Import perezoso: el catálogo usa urls_variantes() sin necesitar Pillow.
+    from PIL import Image, ImageOps
+
+    pil_formato, content_type, opciones = FORMATOS_VARIANTE[formato]
+    with Image.open(io.BytesIO(contenido)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen.thumbnail((ancho, ancho * 4), Image.LANCZOS)
+
+        if pil_formato == 'JPEG' and imagen.mode != 'RGB':
+            # JPEG no admite transparencia: fondo blanco, como se ve en el catálogo.
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            rgba = imagen.convert('RGBA')
+            fondo.paste(rgba, mask=rgba.getchannel('A'))
+            imagen = fondo
+        elif imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA')
+
+        salida = io.BytesIO()
+        imagen.save(salida, pil_formato, **opciones)
+    return salida.getvalue(), content_type
+
+
+def urls_variantes(url_imagen):
+    """
+    {'miniatura': '/imagenes/proxy/<id>?w=160', 'mediana': ...} para una URL
+    del proxy; {} para cualquier otra (imágenes locales, vacías).
+    """
+    if not url_imagen or not url_imagen.startswith(_PREFIJO_PROXY):
+        return {}
+    base = url_imagen.split('?', 1)[0]
+    return {nombre: f"{base}?w={ancho}" for nombre, ancho in VARIANTES_CATALOGO.items()}
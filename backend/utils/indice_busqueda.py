@@ -0,0 +1,243 @@
+"""
+Índice de búsqueda en memoria por trigramas para catálogos de productos
+(usado por backend/services/busqueda_productos_service.py).
+
+Reemplaza los `ILIKE '%termino%'` sobre cuatro columnas OR-eadas, que no
+pueden usar ningún índice B-tree y recorren la tabla completa en cada
+pulsación. Mismo modelo que pg_trgm, pero dentro del proceso (no requiere la
+extensión en Postgres ni cambios de esquema):
+
+  - Cada documento se normaliza: mayúsculas, sin tildes, cualquier carácter
+    que no sea letra/dígito pasa a espacio. Los códigos se guardan además
+    "compactos" (sin separadores) y sin prefijo FR- (normalizar_codigo_sin_prefijo)
+    ni de otra división (normalizar_codigo): '9304', 'fr-9304' y 'FR 9304'
+    resuelven al mismo producto.
+  - Postings: trigrama -> lista de documentos que lo contienen, con las
+    palabras rellenadas con espacios como pg_trgm ('  93', ' 93', '930', ...).
+
+Una consulta se resuelve sin recorrer el catálogo:
+  - código exacto: diccionario; prefijo de código: bisect sobre los códigos
+    ordenados.
+  - subcadena (código o palabras de la descripción): intersección de los
+    postings de los trigramas internos (todo documento que contiene la
+    subcadena los contiene) y verificación sobre esos candidatos.
+  - tolerancia a errores de tipeo: fracción de trigramas de la consulta
+    presentes en el documento (similitud tipo word_similarity); entra si
+    supera UMBRAL_SIMILITUD (0.3, el default de pg_trgm).
+
+Puntaje por niveles con rangos que no se solapan: exacto de código (100) >
+prefijo de código (80-100) > subcadena de código (60-80) > todas las palabras
+en el texto (40-60) > solo similitud (0-30). Dentro de cada nivel sube lo que
+está más cerca (consulta que cubre más del código, palabras que empiezan
+palabra) y desempata el código principal.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain, islice
+
+from backend.utils.formatters import normalizar_codigo, normalizar_codigo_sin_prefijo
+
+UMBRAL_SIMILITUD = 0.3
+
+PUNTAJE_CODIGO_EXACTO = 100
+PUNTAJE_CODIGO_PREFIJO = 80
+PUNTAJE_CODIGO_SUBCADENA = 60
+PUNTAJE_TEXTO = 40
+PUNTAJE_SIMILITUD = 30
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9A-Z]+')
+
+
+def normalizar_texto(valor):
+    """'Buje  ñ-Ácido/9304' -> 'BUJE N ACIDO 9304'."""
+    if not valor:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(valor).upper())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def compactar(valor):
+    """Código sin separadores: 'FR-93 04' -> 'FR9304'."""
+    return normalizar_texto(valor).replace(' ', '')
+
+
+def variantes_codigo(codigo):
+    """Formas compactas con las que se puede buscar un código (con y sin prefijo)."""
+    if not codigo:
+        return set()
+    variantes = {
+        compactar(codigo),
+        compactar(normalizar_codigo_sin_prefijo(codigo)),
+        compactar(normalizar_codigo(codigo)),
+    }
+    variantes.discard('')
+    return variantes
+
+
+def _trigramas_palabra(palabra):
+    rellena = f"  {palabra} "
+    return {rellena[i:i + 3] for i in range(len(rellena) - 2)}
+
+
+def _trigramas_internos(palabra):
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Índice inmutable sobre `documentos`: iterable de (registro, codigos, textos).
+    `codigos` (código de sistema, id, OEM...) se indexan exactos, por prefijo
+    y por trigramas; `textos` (descripción) por palabras. buscar() devuelve
+    posiciones en `registros`.
+    """
+
+    def __init__(self, documentos, version=0):
+        self.version = version
+        self.registros = []
+        self._codigos = []  # por documento: tupla de códigos compactos
+        self._codigos_unidos = []  # por documento: códigos compactos unidos con \x00
+        self._textos = []  # por documento: palabras normalizadas unidas con espacio
+        self._orden = []  # por documento: primer código, para desempatar
+        self._postings = {}
+        self._por_codigo = {}  # código compacto -> posiciones (coincidencia exacta O(1))
+        codigos_ordenados = []  # (código compacto, posición) para búsqueda por prefijo
+
+        for registro, codigos, textos in documentos:
+            posicion = len(self.registros)
+            compactos = set()
+            for codigo in codigos:
+                compactos |= variantes_codigo(codigo)
+            texto = ' '.join(t for t in map(normalizar_texto, chain(codigos, textos)) if t)
+
+            self.registros.append(registro)
+            self._codigos.append(tuple(sorted(compactos)))
+            self._codigos_unidos.append('\x00'.join(sorted(compactos)))
+            self._textos.append(texto)
+            self._orden.append(compactar(next(iter(codigos), '')))
+
+            trigramas = set()
+            for palabra in set(texto.split()) | compactos:
+                trigramas |= _trigramas_palabra(palabra)
+            for trigrama in trigramas:
+                self._postings.setdefault(trigrama, []).append(posicion)
+            for codigo in compactos:
+                self._por_codigo.setdefault(codigo, []).append(posicion)
+                codigos_ordenados.append((codigo, posicion))
+
+        codigos_ordenados.sort()
+        self._prefijos = codigos_ordenados
+
+    def __len__(self):
+        return len(self.registros)
+
+    def _candidatos_subcadena(self, palabras):
+        """
+        Superconjunto de los documentos que contienen todas `palabras` como
+        subcadena: los que tienen todos sus trigramas internos. Si ninguna
+        palabra llega a 3 caracteres no se puede acotar por índice y se
+        devuelven todas las posiciones.
+        """
+        internos = set()
+        for palabra in palabras:
+            internos |= _trigramas_internos(palabra)
+        if not internos:
+            return range(len(self.registros))
+        listas = sorted((self._postings.get(t, ()) for t in internos), key=len)
+        if not listas[0]:
+            return set()
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            candidatos.intersection_update(lista)
+            if not candidatos:
+                break
+        return candidatos
+
+    def _con_prefijo(self, prefijo):
+        """(código, posición) de los códigos que empiezan por `prefijo`."""
+        inicio = bisect_left(self._prefijos, (prefijo,))
+        for codigo, posicion in islice(self._prefijos, inicio, None):
+            if not codigo.startswith(prefijo):
+                break
+            yield codigo, posicion
+
+    def _similitudes(self, palabras, codigos_consulta):
+        """posición -> fracción de los trigramas (rellenos) de la consulta que tiene."""
+        trigramas = set()
+        for palabra in set(palabras) | codigos_consulta:
+            trigramas |= _trigramas_palabra(palabra)
+        conteo = Counter()
+        for trigrama in trigramas:
+            lista = self._postings.get(trigrama)
+            if lista:
+                conteo.update(lista)
+        total = len(trigramas)
+        return {i: n / total for i, n in conteo.items()}
+
+    def buscar(self, termino, limite=30):
+        """
+        Lista de (posicion, puntaje) de mayor a menor puntaje, hasta `limite`.
+        Los niveles se evalúan de mayor a menor y no se calcula uno si los
+        anteriores ya llenaron el límite: sus rangos de puntaje no se
+        solapan, así que el resultado es el mismo que evaluarlos todos.
+        """
+        texto = normalizar_texto(termino)
+        if not texto or not self.registros:
+            return []
+        palabras = texto.split()
+        codigos_consulta = variantes_codigo(termino)
+        mejores = {}  # posición -> puntaje (el primero que la alcanza es el más alto)
+
+        def _nivel(puntajes):
+            for i, puntaje in puntajes:
+                if i not in mejores or puntaje > mejores[i]:
+                    mejores[i] = puntaje
+
+        # 1. Código exacto (con o sin prefijo de división).
+        _nivel(
+            (i, float(PUNTAJE_CODIGO_EXACTO))
+            for c in codigos_consulta for i in self._por_codigo.get(c, ())
+        )
+
+        # 2. Prefijo de código: más alto cuanto más del código cubre la consulta.
+        if len(mejores) < limite:
+            _nivel(
+                (i, PUNTAJE_CODIGO_PREFIJO + 20 * len(c) / len(codigo))
+                for c in codigos_consulta for codigo, i in self._con_prefijo(c)
+                if i not in mejores
+            )
+
+        # 3. Subcadena de un código.
+        if len(mejores) < limite:
+            for c in codigos_consulta:
+                _nivel(
+                    (i, PUNTAJE_CODIGO_SUBCADENA + 20 * max(
+                        len(c) / len(codigo) for codigo in self._codigos[i] if c in codigo
+                    ))
+                    for i in self._candidatos_subcadena([c])
+                    if i not in mejores and c in self._codigos_unidos[i]
+                )
+
+        # 4. Todas las palabras en el texto; suben las que empiezan palabra.
+        if len(mejores) < limite:
+            _nivel(
+                (i, PUNTAJE_TEXTO + 20 * sum(
+                    f" {p}" in f" {self._textos[i]}" for p in palabras
+                ) / len(palabras))
+                for i in self._candidatos_subcadena(palabras)
+                if i not in mejores and all(p in self._textos[i] for p in palabras)
+            )
+
+        # 5. Solo similitud (errores de tipeo).
+        if len(mejores) < limite:
+            _nivel(
+                (i, PUNTAJE_SIMILITUD * similitud)
+                for i, similitud in self._similitudes(palabras, codigos_consulta).items()
+                if similitud >= UMBRAL_SIMILITUD and i not in mejores
+            )
+
+        # Desempate por el código principal, como el ORDER BY anterior.
+        resultados = sorted(mejores.items(), key=lambda r: (-r[1], self._orden[r[0]]))
+        return [(i, round(puntaje, 3)) for i, puntaje in resultados[:limite]]
@@ -201,7 +201,7 @@ class PDFGenerator:
                 ["MÁQUINA:", turno.get('maquina', ''), "ORDEN PROD (OP):", str(turno.get('orden_produccion', '')).upper()],
                 ["ENTRADA:", f"{turno.get('entrada_manual', 0)} kg", "SALIDA:", f"{turno.get('salida_manual', 0)} kg"],
                 ["HORA INICIO:", turno.get('hora_inicio', ''), "HORA TERMINA:", turno.get('hora_termina', '')],
-                ["PESO VELA MÁQ:", f"{turno.get('peso_vela_maquina', 0)} kg", "OBSERVACIONES:", Paragraph(obs_text_turno, styles['Normal'])]
+                ["PESO VELA MÁQ:", f"{turno['peso_vela_maquina']} kg" if 'peso_vela_maquina' in turno else "N/D", "OBSERVACIONES:", Paragraph(obs_text_turno, styles['Normal'])]
             ]
             t_turno = Table(data_turno, colWidths=[1.5*inch, 2.0*inch, 1.5*inch, 2.5*inch])
             t_turno.setStyle(TableStyle([
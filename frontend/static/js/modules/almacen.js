@@ -7,7 +7,7 @@
 const AlmacenModule = {
     pedidosPendientes: [],
     pedidoActual: null,
-    tvInterval: null,
+    cursorPedidos: null, // Cursor del change-feed (ver sincronizarCambios)
     autoRefreshInterval: null,
     scrollInterval: null,
     scrollTimeout: null, // Timeout para el delay del scroll
@@ -229,19 +229,12 @@ const AlmacenModule = {
                     const anterioresCount = this.pedidosPendientes.length;
 
                     if (nuevosCount > anterioresCount) {
-                        try {
-                            if (window.ModuloUX && typeof window.ModuloUX.reproducirNotificacionPedido === 'function') {
-                                window.ModuloUX.reproducirNotificacionPedido();
-                            } else if (window.ModuloUX && window.ModuloUX.playSound) {
-                                window.ModuloUX.playSound('new_order');
-                            }
-                        } catch (e) {
-                            console.warn('Error reproduciendo sonido de nuevo pedido', e);
-                        }
+                        this.avisarNuevoPedido();
                     }
                 }
 
                 this.pedidosPendientes = data.data.pedidos;
+                this.cursorPedidos = data.data.cursor || null;
                 console.log('📦 [Almacen] Pedidos asignados, llamando renderizarTarjetas()...');
                 this.renderizarTarjetas();
                 console.log('✅ [Almacen] renderizarTarjetas() completado');
@@ -264,6 +257,99 @@ const AlmacenModule = {
         }
     },
 
+    /**
+     * Sonido de nuevo pedido (notificación auditiva global para planta)
+     */
+    avisarNuevoPedido: function () {
+        try {
+            if (window.ModuloUX && typeof window.ModuloUX.reproducirNotificacionPedido === 'function') {
+                window.ModuloUX.reproducirNotificacionPedido();
+            } else if (window.ModuloUX && window.ModuloUX.playSound) {
+                window.ModuloUX.playSound('new_order');
+            }
+        } catch (e) {
+            console.warn('Error reproduciendo sonido de nuevo pedido', e);
+        }
+    },
+
+    /**
+     * Refresco incremental vía change-feed (/api/pedidos/pendientes/cambios).
+     * Con el cursor de la última carga el servidor responde 304 si nada
+     * cambió (sin tocar la base) o solo los pedidos modificados, que se
+     * mezclan por id_pedido en this.pedidosPendientes. `espera` (segundos)
+     * convierte la llamada en long-poll: el servidor la retiene hasta que
+     * haya cambios. Devuelve 'sin_cambios', 'cambios' o 'error'.
+     */
+    sincronizarCambios: async function (espera = 0) {
+        if (!this.cursorPedidos) {
+            await this.cargarPedidos(false);
+            return this.cursorPedidos ? 'cambios' : 'error';
+        }
+        try {
+            const url = new URL('/api/pedidos/pendientes/cambios', window.location.origin);
+            url.searchParams.set('desde', this.cursorPedidos);
+            if (espera) url.searchParams.set('espera', espera);
+
+            const response = await fetch(url, { cache: 'no-store' });
+            if (response.status === 304) return 'sin_cambios';
+
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                console.error('❌ [Almacen] Error en change-feed de pedidos:', data.error);
+                return 'error';
+            }
+
+            const cambios = data.data;
+            const previos = new Set(this.pedidosPendientes.map(p => p.id_pedido));
+            if (cambios.completo) {
+                this.pedidosPendientes = cambios.pedidos;
+            } else {
+                const porId = new Map(this.pedidosPendientes.map(p => [p.id_pedido, p]));
+                (cambios.retirados || []).forEach(id => porId.delete(id));
+                cambios.pedidos.forEach(p => porId.set(p.id_pedido, p));
+                // Mismo orden que el listado completo (fecha, id_pedido)
+                this.pedidosPendientes = Array.from(porId.values()).sort((a, b) =>
+                    String(a.fecha).localeCompare(String(b.fecha)) ||
+                    String(a.id_pedido).localeCompare(String(b.id_pedido)));
+            }
+            this.cursorPedidos = cambios.cursor;
+
+            if (previos.size > 0 && cambios.pedidos.some(p => !previos.has(p.id_pedido))) {
+                this.avisarNuevoPedido();
+            }
+            console.log(`🔄 [Almacen] Change-feed: ${cambios.pedidos.length} pedidos actualizados, ${(cambios.retirados || []).length} retirados`);
+            this.renderizarTarjetas();
+            return 'cambios';
+        } catch (error) {
+            console.error('❌ [Almacen] Error de conexión en change-feed:', error);
+            return 'error';
+        }
+    },
+
+    /**
+     * Bucle de long-poll del Modo TV: reemplaza al refresco fijo de 30s. Si
+     * el servidor responde al instante (sin cupo de long-poll o error) se
+     * espera 15s antes de volver a preguntar.
+     */
+    iniciarBucleTV: async function () {
+        const ciclo = this._cicloTV = (this._cicloTV || 0) + 1;
+        const dormir = (ms) => new Promise(r => setTimeout(r, ms));
+
+        while (this.isTVMode && this._cicloTV === ciclo) {
+            // Solo refrescar si NO hay un modal abierto (para evitar interrumpir al usuario)
+            const modal = document.getElementById('modalAlistamiento');
+            if (modal && (modal.style.display === 'flex' || modal.style.display === 'block')) {
+                await dormir(5000);
+                continue;
+            }
+            const inicio = Date.now();
+            const resultado = await this.sincronizarCambios(25);
+            if (resultado !== 'cambios' && Date.now() - inicio < 5000) {
+                await dormir(15000);
+            }
+        }
+    },
+
     /**
      * Renderizar tarjetas de pedidos en el contenedor
      */
@@ -1178,17 +1264,11 @@ const AlmacenModule = {
                 document.body.appendChild(btnExit);
             }
 
-            // Iniciar intervalo de refresco automático (cada 30 segundos)
-            this.tvInterval = setInterval(() => {
-                // Solo refrescar si NO hay un modal abierto (para evitar interrumpir al usuario)
-                const modal = document.getElementById('modalAlistamiento');
-                if (modal && modal.style.display !== 'flex' && modal.style.display !== 'block') {
-                    console.log('📺 [Almacen] Refresco automático de Modo TV...');
-                    this.cargarPedidos(false);
-                }
-            }, 30000);
+            // Refresco automático por long-poll del change-feed: los cambios
+            // llegan al confirmarse en el servidor, sin recargar el listado.
+            this.iniciarBucleTV();
 
-            mostrarNotificacion('Modo TV Activado: Auto-refresco cada 30s', 'info');
+            mostrarNotificacion('Modo TV Activado: Auto-refresco en vivo', 'info');
 
             // Iniciar auto-scroll después de un delay de seguridad (10s) para asegurar carga visual
             setTimeout(() => {
@@ -1227,11 +1307,9 @@ const AlmacenModule = {
             // Limpiar botón de salida
             document.querySelector('.btn-exit-tv')?.remove();
 
-            // Detener el auto-refresco
-            if (this.tvInterval) {
-                clearInterval(this.tvInterval);
-                this.tvInterval = null;
-            }
+            // Detener el auto-refresco (el bucle de long-poll termina al ver
+            // cambiar el ciclo)
+            this._cicloTV = (this._cicloTV || 0) + 1;
 
             // Detener auto-scroll
             this.detenerAutoScroll();
@@ -1302,8 +1380,8 @@ const AlmacenModule = {
                 console.log('📜 [Almacen] Fin alcanzado, volviendo al inicio...');
                 this.scrollTimeout = setTimeout(() => {
                     tvContainer.scrollTo({ top: 0, behavior: 'smooth' });
-                    // Aprovechar el reset para recargar datos
-                    this.cargarPedidos(false);
+                    // Aprovechar el reset para traer cambios pendientes
+                    this.sincronizarCambios();
                     this.scrollTimeout = setTimeout(scrollToNext, pauseDuration);
                 }, pauseDuration);
                 return;
@@ -1466,7 +1544,7 @@ const AlmacenModule = {
 
             if (esPaginaAlmacen && !this.isTVMode && !modalAbierto) {
                 console.log('🔄 [Almacen] Auto-refresco de fondo...');
-                this.cargarPedidos(false);
+                this.sincronizarCambios();
             }
         }, 15000); // 15s poll
     },
@@ -356,6 +356,101 @@ window.ModuloAsistente = (function () {
         contenedor.appendChild(wrap);
     }
 
+    // ── Lectura del job del asistente ──
+    // /preguntar ya no responde con la respuesta: devuelve un job_id y el
+    // progreso (tools consultadas, texto a medida que llega, resultado final)
+    // se lee por SSE. fetch() en vez de EventSource porque hace falta mandar
+    // el header Authorization del token PWA. Si el servidor no tiene cupo de
+    // streaming (429) o el stream se corta, se sigue por polling desde el
+    // último evento recibido.
+    const POLL_INTERVAL_MS = 1500;
+
+    async function leerStreamJob(job, onEvento) {
+        let ultimo = 0;
+        try {
+            const res = await fetch(job.stream_url, {
+                credentials: 'include',
+                headers: construirAuthHeaders({ 'Accept': 'text/event-stream' })
+            });
+            if (res.ok && res.body) {
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let corte;
+                    while ((corte = buffer.indexOf('\n\n')) >= 0) {
+                        const bloque = buffer.slice(0, corte);
+                        buffer = buffer.slice(corte + 2);
+                        const campos = {};
+                        bloque.split('\n').forEach(linea => {
+                            if (!linea || linea.startsWith(':')) return;
+                            const sep = linea.indexOf(': ');
+                            if (sep > 0) campos[linea.slice(0, sep)] = linea.slice(sep + 2);
+                        });
+                        if (!campos.event) continue;
+                        ultimo = parseInt(campos.id, 10) || ultimo;
+                        if (onEvento(campos.event, JSON.parse(campos.data || '{}'))) {
+                            reader.cancel().catch(() => {});
+                            return;
+                        }
+                    }
+                }
+            }
+        } catch (e) {
+            console.warn('[ModuloAsistente] Stream interrumpido, continuando por polling:', e);
+        }
+
+        // Polling: sin cupo de streaming, stream cortado, o navegador sin ReadableStream.
+        while (true) {
+            const res = await fetch(`${job.eventos_url}?desde=${ultimo}`, {
+                credentials: 'include',
+                headers: construirAuthHeaders()
+            });
+            const data = await res.json().catch(() => ({}));
+            if (!res.ok || !data.success) {
+                onEvento('fin', { success: false, error: data.error || 'No fue posible procesar la pregunta.' });
+                return;
+            }
+            for (const ev of data.eventos) {
+                ultimo = ev.seq;
+                if (onEvento(ev.tipo, ev.datos)) return;
+            }
+            if (data.terminado) return;
+            await new Promise(r => setTimeout(r, POLL_INTERVAL_MS));
+        }
+    }
+
+    function renderizarRespuestaFinal(bubble, data) {
+        bubble.innerHTML = `<i class="fas fa-robot me-1"></i> ${formatearMarkdownLigero(data.respuesta)}`;
+
+        if (data.datos && Object.keys(data.datos).length) {
+            if (data.tipo_grafica === 'bar' || data.tipo_grafica === 'line') {
+                // El backend ya identifica el campo correcto a graficar (ver
+                // asistente_tools.py: jsonify ordena las claves alfabéticamente,
+                // así que adivinar "el primer campo numérico" del lado del cliente
+                // es poco confiable). El heurístico genérico queda solo de respaldo
+                // para tools futuras sin extractor explícito.
+                const serie = (data.serie_grafica && data.serie_grafica.labels && data.serie_grafica.labels.length)
+                    ? data.serie_grafica
+                    : extraerSerieGrafica(data.datos);
+                if (serie && serie.labels && serie.labels.length) {
+                    renderizarGrafica(bubble, data.tipo_grafica, serie);
+                } else {
+                    renderizarTabla(bubble, data.datos);
+                }
+            } else if (data.tipo_grafica === 'table') {
+                renderizarTabla(bubble, data.datos);
+            }
+        }
+
+        if (data.enlace_sugerido) {
+            renderizarEnlace(bubble, data.enlace_sugerido);
+        }
+    }
+
     async function enviarPregunta() {
         if (enviando) return;
         const input = document.getElementById('asistente-input');
@@ -371,7 +466,9 @@ window.ModuloAsistente = (function () {
         const btn = document.getElementById('asistente-btn-enviar');
         if (btn) btn.disabled = true;
 
-        const pensando = agregarMensaje('<i class="fas fa-spinner fa-spin me-1"></i> Consultando datos...', 'cargando');
+        let pensando = agregarMensaje('<i class="fas fa-spinner fa-spin me-1"></i> Consultando datos...', 'cargando');
+        let bubble = null;
+        let textoParcial = '';
 
         try {
             const { desde, hasta } = obtenerFiltrosActivos();
@@ -381,44 +478,51 @@ window.ModuloAsistente = (function () {
                 headers: construirAuthHeaders(),
                 body: JSON.stringify({ pregunta, desde, hasta })
             });
-            const data = await res.json().catch(() => ({}));
-            pensando?.remove();
+            const job = await res.json().catch(() => ({}));
 
-            if (!res.ok || !data.success) {
-                agregarMensaje(`<i class="fas fa-exclamation-triangle me-1"></i> ${escapeHtml(data.error || 'No fue posible procesar la pregunta.')}`, 'error');
+            if (!res.ok || !job.success) {
+                pensando?.remove();
+                agregarMensaje(`<i class="fas fa-exclamation-triangle me-1"></i> ${escapeHtml(job.error || 'No fue posible procesar la pregunta.')}`, 'error');
                 return;
             }
 
-            const bubble = agregarMensaje(`<i class="fas fa-robot me-1"></i> ${formatearMarkdownLigero(data.respuesta)}`, 'asistente');
-
-            if (bubble && data.datos && Object.keys(data.datos).length) {
-                if (data.tipo_grafica === 'bar' || data.tipo_grafica === 'line') {
-                    // El backend ya identifica el campo correcto a graficar (ver
-                    // asistente_tools.py: jsonify ordena las claves alfabéticamente,
-                    // así que adivinar "el primer campo numérico" del lado del cliente
-                    // es poco confiable). El heurístico genérico queda solo de respaldo
-                    // para tools futuras sin extractor explícito.
-                    const serie = (data.serie_grafica && data.serie_grafica.labels && data.serie_grafica.labels.length)
-                        ? data.serie_grafica
-                        : extraerSerieGrafica(data.datos);
-                    if (serie && serie.labels && serie.labels.length) {
-                        renderizarGrafica(bubble, data.tipo_grafica, serie);
+            await leerStreamJob(job, (tipo, datos) => {
+                if (tipo === 'estado' && pensando) {
+                    pensando.innerHTML = `<i class="fas fa-spinner fa-spin me-1"></i> ${escapeHtml(datos.mensaje)}`;
+                } else if (tipo === 'tool' && pensando && datos.estado === 'inicio') {
+                    const titulo = TITULOS_TOOL[datos.nombre] || 'datos';
+                    pensando.innerHTML = `<i class="fas fa-spinner fa-spin me-1"></i> Consultando ${escapeHtml(titulo)}...`;
+                } else if (tipo === 'texto') {
+                    if (datos.reiniciar) {
+                        textoParcial = '';
+                    }
+                    textoParcial += datos.delta || '';
+                    if (textoParcial.trim()) {
+                        pensando?.remove();
+                        pensando = null;
+                        if (!bubble) bubble = agregarMensaje('', 'asistente');
+                        if (bubble) bubble.innerHTML = `<i class="fas fa-robot me-1"></i> ${formatearMarkdownLigero(textoParcial)}`;
+                    }
+                } else if (tipo === 'fin') {
+                    pensando?.remove();
+                    pensando = null;
+                    if (!datos.success) {
+                        bubble?.remove();
+                        agregarMensaje(`<i class="fas fa-exclamation-triangle me-1"></i> ${escapeHtml(datos.error || 'No fue posible procesar la pregunta.')}`, 'error');
                     } else {
-                        renderizarTabla(bubble, data.datos);
+                        if (!bubble) bubble = agregarMensaje('', 'asistente');
+                        if (bubble) renderizarRespuestaFinal(bubble, datos);
                     }
-                } else if (data.tipo_grafica === 'table') {
-                    renderizarTabla(bubble, data.datos);
+                    return true;
                 }
-            }
-
-            if (bubble && data.enlace_sugerido) {
-                renderizarEnlace(bubble, data.enlace_sugerido);
-            }
+                return false;
+            });
         } catch (e) {
             console.error('[ModuloAsistente] Error consultando el asistente:', e);
             pensando?.remove();
             agregarMensaje('<i class="fas fa-exclamation-triangle me-1"></i> Error de conexión con el asistente.', 'error');
         } finally {
+            pensando?.remove();
             input.disabled = false;
             if (btn) btn.disabled = false;
             enviando = false;
@@ -8,6 +8,15 @@
     // Variables de estado privadas al módulo
     let h_datos = [];
     let h_paginaActual = 1;
+    // Carga por páginas (keyset) de /api/historial-global: tamaño de página,
+    // token de la consulta vigente (una respuesta de una consulta anterior se
+    // descarta) y cursor de la página siguiente, que solo se pide cuando el
+    // usuario llega al final de lo cargado ("Cargar más" / Siguiente).
+    const H_LIMITE_PAGINA = 500;
+    let h_cargaId = 0;
+    let h_urlBase = '';
+    let h_siguienteCursor = null;
+    let h_cargandoMas = false;
     const getHRegistrosPorPagina = () => window.innerWidth < 992 ? 10 : 20;
 
     /**
@@ -114,7 +123,10 @@
             const operario = document.getElementById('filtroOperario')?.value || '';
             const codigo = document.getElementById('filtroCodigo')?.value || '';
 
-            let url = `/api/historial-global?tipo=${proceso}&desde=${desde}&hasta=${hasta}`;
+            ++h_cargaId;
+            h_siguienteCursor = null;
+            const urlBase = `/api/historial-global?tipo=${proceso}&desde=${desde}&hasta=${hasta}&limit=${H_LIMITE_PAGINA}`;
+            let url = urlBase;
             
             // Si el proceso es PULIDO, usamos el endpoint especializado con filtros dinámicos
             if (proceso === 'PULIDO') {
@@ -132,15 +144,9 @@
             console.log('📡 [Historial] Respuesta recibida:', res);
 
             if (res && res.success && Array.isArray(res.data)) {
-                let rawData = res.data;
-
-                // Filtrado estricto por división
-                const division = window.AppState.user?.division || 'FRIPARTS';
-                if (division === 'FRIPARTS') {
-                    h_datos = rawData.filter(r => r.Tipo !== 'METALS');
-                } else {
-                    h_datos = rawData.filter(r => r.Tipo === 'METALS');
-                }
+                h_datos = filtrarPorDivision(res.data);
+                h_urlBase = urlBase;
+                h_siguienteCursor = res.next_cursor || null;
 
                 h_paginaActual = 1;
 
@@ -159,7 +165,7 @@
                 }
 
                 const totalSpan = document.getElementById('total-registros-historial');
-                if (totalSpan) totalSpan.textContent = h_datos.length;
+                if (totalSpan) totalSpan.textContent = textoTotal();
             } else {
                 console.error('❌ La API no devolvió un Array válido:', res);
                 if (typeof mostrarNotificacion === 'function') {
@@ -174,6 +180,51 @@
         }
     }
 
+    /**
+     * Filtrado estricto por división
+     */
+    function filtrarPorDivision(rawData) {
+        const division = window.AppState.user?.division || 'FRIPARTS';
+        if (division === 'FRIPARTS') {
+            return rawData.filter(r => r.Tipo !== 'METALS');
+        }
+        return rawData.filter(r => r.Tipo === 'METALS');
+    }
+
+    function textoTotal() {
+        return h_siguienteCursor ? `${h_datos.length}+` : `${h_datos.length}`;
+    }
+
+    /**
+     * Pide UNA página más de /api/historial-global (next_cursor) y la anexa a
+     * h_datos. Devuelve false si no había más o la consulta cambió mientras
+     * tanto (cargaId).
+     */
+    async function cargarMas() {
+        if (!h_siguienteCursor || h_cargandoMas) return false;
+        const cargaId = h_cargaId;
+        h_cargandoMas = true;
+        try {
+            const res = await fetchData(`${h_urlBase}&after=${encodeURIComponent(h_siguienteCursor)}`);
+            if (cargaId !== h_cargaId) return false;
+            if (!res || !res.success || !Array.isArray(res.data)) {
+                console.error('❌ [Historial] Página siguiente inválida:', res);
+                return false;
+            }
+            h_datos = h_datos.concat(filtrarPorDivision(res.data));
+            h_siguienteCursor = res.next_cursor || null;
+
+            const totalSpan = document.getElementById('total-registros-historial');
+            if (totalSpan) totalSpan.textContent = textoTotal();
+            return true;
+        } catch (error) {
+            console.error('❌ Error cargando más registros del historial:', error);
+            return false;
+        } finally {
+            h_cargandoMas = false;
+        }
+    }
+
     /**
      * Renderizar la tabla con los datos actuales y paginación
      */
@@ -181,8 +232,14 @@
         const container = document.getElementById('historial-container');
         if (!container) return;
 
+        const botonCargarMas = h_siguienteCursor ? `
+                <button class="btn btn-sm btn-outline-primary" onclick="window.ModuloHistorial.cargarMas()">
+                    <i class="fas fa-plus"></i> Cargar más
+                </button>` : '';
+
         if (!h_datos || h_datos.length === 0) {
-            container.innerHTML = '<div class="text-center py-5 text-muted"><i class="fas fa-info-circle mb-2"></i> No se encontraron registros</div>';
+            container.innerHTML = '<div class="text-center py-5 text-muted"><i class="fas fa-info-circle mb-2"></i> No se encontraron registros'
+                + (botonCargarMas ? `<div class="mt-3">${botonCargarMas}</div>` : '') + '</div>';
             return;
         }
 
@@ -371,16 +428,18 @@
         }
 
         // Controles de Paginación
-        if (totalPaginas > 1) {
+        if (totalPaginas > 1 || h_siguienteCursor) {
             const h_registrosPorPagina = getHRegistrosPorPagina();
             const inicio_real = (h_paginaActual - 1) * h_registrosPorPagina + 1;
             const fin_real = Math.min(h_paginaActual * h_registrosPorPagina, h_datos.length);
+            const hayPaginaSiguiente = h_paginaActual < totalPaginas || !!h_siguienteCursor;
 
             html += `
                 <div class="pagination-container d-flex justify-content-between align-items-center p-3 bg-light border-top">
                     <div class="pagination-info text-muted small">
-                        Mostrando ${inicio_real} a ${fin_real} de ${h_datos.length} registros
+                        Mostrando ${inicio_real} a ${fin_real} de ${textoTotal()} registros
                     </div>
+                    ${h_paginaActual === totalPaginas ? botonCargarMas : ''}
                     <nav>
                         <ul class="pagination-buttons pagination pagination-sm mb-0" style="display: flex; gap: 5px; list-style: none; padding: 0;">
                             <li class="page-item ${h_paginaActual === 1 ? 'disabled' : ''}">
@@ -391,8 +450,8 @@
                             <li class="page-item disabled">
                                 <span class="page-link text-dark">Página ${h_paginaActual} de ${totalPaginas}</span>
                             </li>
-                            <li class="page-item ${h_paginaActual === totalPaginas ? 'disabled' : ''}">
-                                <button class="pagination-btn page-link" onclick="window.ModuloHistorial.cambiarPagina(${h_paginaActual + 1})" ${h_paginaActual === totalPaginas ? 'disabled' : ''}>
+                            <li class="page-item ${hayPaginaSiguiente ? '' : 'disabled'}">
+                                <button class="pagination-btn page-link" onclick="window.ModuloHistorial.cambiarPagina(${h_paginaActual + 1})" ${hayPaginaSiguiente ? '' : 'disabled'}>
                                     <span class="btn-text">Siguiente</span> <i class="fas fa-chevron-right"></i>
                                 </button>
                             </li>
@@ -406,10 +465,14 @@
     }
 
     /**
-     * Cambiar de página
+     * Cambiar de página. Pasar de la última página cargada pide la siguiente
+     * página al servidor (si la hay).
      */
-    function cambiarPagina(nuevaPagina) {
+    async function cambiarPagina(nuevaPagina) {
         const h_registrosPorPagina = getHRegistrosPorPagina();
+        if (nuevaPagina > Math.ceil(h_datos.length / h_registrosPorPagina) && h_siguienteCursor) {
+            await cargarMas();
+        }
         const totalPaginas = Math.ceil(h_datos.length / h_registrosPorPagina);
         if (nuevaPagina < 1 || nuevaPagina > totalPaginas) return;
         h_paginaActual = nuevaPagina;
@@ -1232,6 +1295,7 @@
         inicializar: initHistorial,
         filtrar: cargarHistorial,
         cambiarPagina: cambiarPagina,
+        cargarMas: async () => { if (await cargarMas()) renderizarTablaHistorial(); },
         editarRegistro: editarRegistro,
         guardarCambios: guardarCambios,
         cerrarModalEdicion: cerrarModalEdicion,
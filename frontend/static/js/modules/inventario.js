@@ -23,16 +23,20 @@ function obtenerHtmlImagen(p, esMovil = false) {
     const localImgLimpio = tieneCodigo ? `/static/img/productos/${codigoLimpio}.jpg` : PLACEHOLDER_SVG;
     const localImgPng = tieneCodigo ? `/static/img/productos/${codigoLimpio}.png` : PLACEHOLDER_SVG;
     const cloudImg = (p.imagen && typeof p.imagen === 'string' && p.imagen.trim() !== '') ? p.imagen : '';
+    // Variante reducida del proxy (miniatura en tabla, mediana en tarjeta móvil): evita
+    // bajar la foto original de varios MB para pintarla a 40px. El click abre el original.
+    const variantes = p.imagen_variantes || {};
+    const varianteImg = (esMovil ? variantes.mediana : variantes.miniatura) || '';
     
     // Si el backend ya validó una ruta, la usamos como punto de partida, si no, empezamos el radar
-    const srcInicial = cloudImg || (p.imagen_valida ? p.imagen_valida : (tieneCodigo ? localImgOriginal : PLACEHOLDER_SVG));
+    const srcInicial = varianteImg || cloudImg || (p.imagen_valida ? p.imagen_valida : (tieneCodigo ? localImgOriginal : PLACEHOLDER_SVG));
     
     // Estilos según vista
     const estilo = esMovil 
         ? 'width: 100%; height: 100%; object-fit: cover;' 
         : 'width: 40px; height: 40px; object-fit: cover; border-radius: 4px; cursor: pointer; background: white; border: 1px solid #eee;';
     
-    const extraAttr = esMovil ? 'class="card-img"' : 'onclick="window.open(this.src, \'_blank\')" title="Click para ampliar"';
+    const extraAttr = esMovil ? 'class="card-img"' : `onclick="window.open('${cloudImg}' || this.src, '_blank')" title="Click para ampliar"`;
 
     return `
         <img src="${srcInicial}" 
@@ -163,6 +167,7 @@ function procesarYRenderizarProductos(listaFinal) {
             stock_minimo: min,
             semaforo: semaforo,
             imagen: imagenSQL,
+            imagen_variantes: p.imagen_variantes || null,
             imagen_valida: imagenSQL || null
         };
     });
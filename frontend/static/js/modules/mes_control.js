@@ -28,7 +28,9 @@ window.ModuloMes = {
         }
 
         this.configurarEventos();
+        this.tableroActivo = true;
         await this.cargarDatos();
+        this.suscribirTablero();
         this.initAutocomplete();
 
         // Inicializar fecha de programación (visual)
@@ -108,6 +110,86 @@ window.ModuloMes = {
         }
     },
 
+    /**
+     * Mantiene las tarjetas al día por push (/api/mes/stream, SSE): el
+     * servidor manda el tablero completo al conectar y después solo las
+     * máquinas que cambiaron. Si no hay cupo de streaming (429) o se cae la
+     * conexión, reintenta cada 30s revalidando /api/mes/dashboard (ETag).
+     * Solo mientras el módulo está abierto y la pestaña visible: cada stream
+     * retiene un hilo del servidor (cupo compartido con el asistente y el
+     * long-poll de pedidos).
+     */
+    suscribirTablero: function () {
+        if (typeof EventSource === 'undefined' || this.streamTablero) return;
+        if (!this.tableroActivo || document.hidden) return;
+        this.vigilarVisibilidad();
+
+        const fuente = new EventSource('/api/mes/stream');
+        this.streamTablero = fuente;
+
+        fuente.addEventListener('tablero', (ev) => {
+            const data = JSON.parse(ev.data);
+            this.dashboardData = data.maquinas || [];
+            this.renderDashboardMaquinas(this.dashboardData);
+        });
+
+        fuente.addEventListener('maquinas', (ev) => {
+            const cambios = JSON.parse(ev.data).maquinas || [];
+            const porNombre = new Map(cambios.map(m => [m.nombre, m]));
+            this.dashboardData = (this.dashboardData || []).map(m => porNombre.get(m.nombre) || m);
+            this.renderDashboardMaquinas(this.dashboardData);
+        });
+
+        fuente.onerror = () => {
+            // CONNECTING: el navegador reconecta solo (con Last-Event-ID).
+            if (fuente.readyState !== EventSource.CLOSED) return;
+            this.streamTablero = null;
+            clearTimeout(this.reintentoTablero);
+            this.reintentoTablero = setTimeout(async () => {
+                this.reintentoTablero = null;
+                if (!this.tableroActivo || document.hidden) return;
+                await this.cargarDashboard();
+                this.suscribirTablero();
+            }, 30000);
+        };
+    },
+
+    /**
+     * Cierra el stream del tablero (y un reintento pendiente) para liberar
+     * su cupo en el servidor.
+     */
+    cerrarTablero: function () {
+        clearTimeout(this.reintentoTablero);
+        this.reintentoTablero = null;
+        if (this.streamTablero) {
+            this.streamTablero.close();
+            this.streamTablero = null;
+        }
+    },
+
+    /**
+     * Pestaña oculta: cierra el stream. Al volver a estar visible con el
+     * módulo abierto, revalida el tablero (ETag) y se vuelve a suscribir.
+     */
+    vigilarVisibilidad: function () {
+        if (this._visibilidadVinculada) return;
+        this._visibilidadVinculada = true;
+        document.addEventListener('visibilitychange', async () => {
+            if (document.hidden) {
+                this.cerrarTablero();
+            } else if (this.tableroActivo && !this.streamTablero) {
+                await this.cargarDashboard();
+                this.suscribirTablero();
+            }
+        });
+    },
+
+    desactivar: function () {
+        console.log('🔌 [MES] Cerrando stream del tablero...');
+        this.tableroActivo = false;
+        this.cerrarTablero();
+    },
+
     getColorEstadoMaquina: function (estado) {
         if (estado === 'EN_PROCESO') return { header: 'bg-primary text-white', badge: 'bg-white text-primary' };
         if (estado === 'PROGRAMADO') return { header: 'bg-warning text-dark', badge: 'bg-dark text-white' };
@@ -1870,25 +1870,50 @@ const ModuloPedidos = {
     // Estado de la pestaña actual para metales
     metalsTabActiva: 'proceso',
 
-    cargarHistorialMetals: async function () {
+    // Cursor de la siguiente página del historial (/api/pedidos/listar)
+    metalsSiguiente: null,
+    metalsBusqueda: '',
+
+    /**
+     * Primera página del historial de Metales, o la siguiente (cargarMas)
+     * con ?despues_de=<siguiente> sobre la misma búsqueda.
+     */
+    cargarHistorialMetals: async function (cargarMas = false) {
         const container = document.getElementById('metals-historial-container');
         if (!container) return;
 
-        const search = document.getElementById('busqueda-pedidos-metals')?.value || '';
+        if (!cargarMas) {
+            this.metalsBusqueda = document.getElementById('busqueda-pedidos-metals')?.value || '';
+            this.metalsSiguiente = null;
+        } else if (!this.metalsSiguiente) {
+            return;
+        }
 
         try {
-            container.innerHTML = `
-                <div class="text-center py-5 text-muted" style="grid-column: 1 / -1;">
-                    <i class="fas fa-spinner fa-spin fa-2x mb-3"></i>
-                    <p>Consultando pedidos de Metales...</p>
-                </div>
-            `;
+            let url = `/api/pedidos/listar?division=frimetals&limite=200&search=${encodeURIComponent(this.metalsBusqueda)}`;
+            if (cargarMas) {
+                url += `&despues_de=${encodeURIComponent(this.metalsSiguiente)}`;
+                const boton = document.getElementById('btn-metals-cargar-mas');
+                if (boton) {
+                    boton.disabled = true;
+                    boton.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Cargando...';
+                }
+            } else {
+                container.innerHTML = `
+                    <div class="text-center py-5 text-muted" style="grid-column: 1 / -1;">
+                        <i class="fas fa-spinner fa-spin fa-2x mb-3"></i>
+                        <p>Consultando pedidos de Metales...</p>
+                    </div>
+                `;
+            }
 
-            const res = await fetch(`/api/pedidos/listar?division=frimetals&search=${encodeURIComponent(search)}`);
+            const res = await fetch(url);
             const data = await res.json();
 
             if (data.success) {
-                this.pedidosMetalsCache = data.data.pedidos || [];
+                const nuevos = data.data.pedidos || [];
+                this.pedidosMetalsCache = cargarMas ? (this.pedidosMetalsCache || []).concat(nuevos) : nuevos;
+                this.metalsSiguiente = data.data.siguiente || null;
                 this.renderizarPedidosMetals(this.pedidosMetalsCache);
             } else {
                 throw new Error(data.error || 'Error desconocido');
@@ -1896,10 +1921,27 @@ const ModuloPedidos = {
 
         } catch (error) {
             console.error('❌ Error cargando historial metales:', error);
+            if (cargarMas) {
+                Swal.fire('Error', `No se pudieron cargar más pedidos: ${error.message}`, 'error');
+                this.renderizarPedidosMetals(this.pedidosMetalsCache || []);
+                return;
+            }
             container.innerHTML = `<div class="alert alert-danger" style="grid-column: 1 / -1;">Error al cargar datos: ${error.message}</div>`;
         }
     },
 
+    _botonCargarMasMetals: function () {
+        if (!this.metalsSiguiente) return '';
+        return `
+            <div class="text-center w-100 mt-2" style="grid-column: 1 / -1;">
+                <button id="btn-metals-cargar-mas" class="btn btn-outline-primary rounded-pill px-4 fw-bold"
+                        onclick="ModuloPedidos.cargarHistorialMetals(true)">
+                    <i class="fas fa-chevron-down me-2"></i>Cargar más pedidos
+                </button>
+            </div>
+        `;
+    },
+
     setMetalsTab: function(tabName) {
         this.metalsTabActiva = tabName;
         if (this.pedidosMetalsCache) {
@@ -1956,7 +1998,7 @@ const ModuloPedidos = {
                     <p class="fs-5">No se encontraron pedidos en esta categoría</p>
                 </div>
             `;
-            container.innerHTML = html;
+            container.innerHTML = html + this._botonCargarMasMetals();
             return;
         }
 
@@ -2059,7 +2101,7 @@ const ModuloPedidos = {
             });
         }
 
-        container.innerHTML = html;
+        container.innerHTML = html + this._botonCargarMasMetals();
     },
 
     abrirGestionProgreso: function (idPedido, progresoActual) {
@@ -23,7 +23,9 @@ bind = "0.0.0.0:" + os.environ.get("PORT", "10000")
 # memoria de un solo proceso Python en vez de duplicarla por worker.
 workers = 1
 worker_class = 'gthread'
-threads = 4
+# GUNICORN_THREADS también acota el cupo de SSE/long-poll
+# (backend/core/conexiones_largas.py: hilos - 2).
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
 
 # Increase timeout to allow for slow initial connections (e.g. Google Sheets)
 timeout = 120
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Fixtures compartidas por los tests de tests/."""
+import pytest
+from sqlalchemy import event
+
+from backend.core.sql_database import db
+
+
+@pytest.fixture
+def contar_consultas():
+    """
+    contar(funcion, *args, **kwargs) -> (resultado, consultas): llama a la
+    función y cuenta las sentencias que llegan al motor mientras corre.
+    Requiere app_context.
+    """
+    def contar(funcion, *args, **kwargs):
+        consultas = []
+        escuchar = lambda *a: consultas.append(1)
+        event.listen(db.engine, 'before_cursor_execute', escuchar)
+        try:
+            return funcion(*args, **kwargs), len(consultas)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', escuchar)
+    return contar
+
+
+class _ResolucionIdentidad(dict):
+    """Resuelve cada nombre a sí mismo sin consultar db_usuarios."""
+    def get(self, nombre, default=None):
+        return nombre
+
+
+@pytest.fixture
+def sin_db_usuarios(monkeypatch):
+    """
+    Perfil ESTANDAR para todos en nomina_service: la resolución nombre ->
+    username de ReglasAsistencia no consulta db_usuarios.
+    """
+    from backend.services import nomina_service
+    monkeypatch.setattr(nomina_service.ReglasAsistencia, '_usuarios_precargados', True)
+    monkeypatch.setattr(nomina_service, '_cache_nombres_usuarios', _ResolucionIdentidad())
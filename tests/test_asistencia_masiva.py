@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de nomina_service.guardar_asistencia_masiva (/api/asistencia/registrar_masivo):
+el lote se guarda con un SELECT de existentes y un único UPSERT sin importar
+su tamaño, reporta el resultado por fila y el propio UPDATE deja intactos los
+registros de una nómina ya PROCESADO.
+
+Corre contra la base de datos configurada en DATABASE_URL, limpiando los
+registros de colaboradores TEST-ASIS- que crea.
+"""
+from datetime import date
+
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import RegistroAsistencia
+from backend.services.nomina_service import guardar_asistencia_masiva
+
+
+def _limpiar():
+    RegistroAsistencia.query.filter(RegistroAsistencia.colaborador.like('TEST-ASIS-%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture
+def contexto(sin_db_usuarios):
+    # La resolución nombre -> username es por proceso y no depende del lote.
+    with app.app_context():
+        _limpiar()
+        db.session.add(RegistroAsistencia(
+            fecha=date(2026, 8, 17), colaborador='TEST-ASIS-SELLADO', ingreso_real='07:00', salida_real='17:00',
+            horas_ordinarias=9, horas_extras=0, estado='REGISTRADO', estado_pago='PROCESADO',
+        ))
+        db.session.add(RegistroAsistencia(
+            fecha=date(2026, 8, 17), colaborador='TEST-ASIS-ABIERTO', ingreso_real='07:00', salida_real='12:00',
+            horas_ordinarias=5, horas_extras=0, estado='REGISTRADO', estado_pago='PENDIENTE', motivo='CITA',
+        ))
+        db.session.commit()
+        yield
+        _limpiar()
+
+
+def test_resultado_por_fila_e_inmutabilidad(contexto):
+    resumen = guardar_asistencia_masiva([
+        {'colaborador': 'TEST-ASIS-NUEVO', 'fecha': '2026-08-17', 'ingreso_real': '07:00', 'salida_real': '17:00'},
+        {'colaborador': 'TEST-ASIS-ABIERTO', 'fecha': '2026-08-17', 'ingreso_real': '07:00', 'salida_real': '16:00'},
+        {'colaborador': 'TEST-ASIS-SELLADO', 'fecha': '2026-08-17', 'ingreso_real': '06:00', 'salida_real': '20:00'},
+        {'fecha': '2026-08-17'},
+        {'colaborador': 'TEST-ASIS-NUEVO', 'fecha': '2026-08-17', 'ingreso_real': '08:00', 'salida_real': '17:00'},
+    ], 'jefe prueba')
+    db.session.commit()
+
+    assert [r['resultado'] for r in resumen['resultados']] == [
+        'reemplazado', 'actualizado', 'bloqueado', 'omitido', 'creado',
+    ]
+    assert (resumen['creados'], resumen['actualizados'], resumen['bloqueados']) == (1, 1, 1)
+
+    filas = {r.colaborador: r for r in RegistroAsistencia.query.filter(
+        RegistroAsistencia.colaborador.like('TEST-ASIS-%'))}
+    assert len(filas) == 3
+    assert resumen['resultados'][4]['id'] == filas['TEST-ASIS-NUEVO'].id
+    assert filas['TEST-ASIS-NUEVO'].ingreso_real == '08:00'
+    assert filas['TEST-ASIS-ABIERTO'].salida_real == '16:00'
+    assert filas['TEST-ASIS-ABIERTO'].motivo == 'CITA'
+    assert filas['TEST-ASIS-ABIERTO'].registrado_por == 'jefe prueba'
+    assert filas['TEST-ASIS-SELLADO'].ingreso_real == '07:00'
+
+
+def test_consultas_constantes_en_el_tamano_del_lote(contexto, contar_consultas):
+    def lote(n, dia):
+        return [
+            {'colaborador': f'TEST-ASIS-{i}', 'fecha': f'2026-08-{dia}', 'ingreso_real': '07:00', 'salida_real': '17:00'}
+            for i in range(n)
+        ]
+
+    chico, consultas_chico = contar_consultas(guardar_asistencia_masiva, lote(2, 18), 'jefe prueba')
+    grande, consultas_grande = contar_consultas(guardar_asistencia_masiva, lote(120, 19), 'jefe prueba')
+    db.session.commit()
+
+    assert consultas_chico == consultas_grande == 2
+    assert grande['creados'] == 120
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del Asistente como job en segundo plano con streaming
+(backend/services/asistente_jobs.py y backend/routes/asistente_routes.py),
+usando el modelo local (ASISTENTE_MODELO=local) en vez de Gemini: la
+pregunta responde 202 con un job_id, el stream SSE entrega progreso de tools
+y texto por fragmentos, y el evento 'fin' trae el mismo dict que antes
+devolvía /preguntar.
+"""
+import json
+
+import pytest
+
+from backend.app import app
+from backend.core import conexiones_largas
+from backend.services import asistente_service, asistente_tools
+from backend.utils.cache_manager import get_cache
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(asistente_service, 'MODELO', 'local')
+    monkeypatch.setattr(asistente_service, '_rate_state', {})
+    monkeypatch.setitem(asistente_tools.TOOLS, 'prueba_stream', {
+        'description': 'tool de prueba', 'parameters': {'type': 'object', 'properties': {'desde': {'type': 'string'}}},
+        'allowed_roles': asistente_tools.ROL_TODOS,
+        'handler': lambda params, ctx: {'unidades': 10, 'desde': params.get('desde')},
+        'tipo_grafica': 'table', 'cache_ttl': 60, 'tablas': ('db_prueba_asistente',),
+    })
+    get_cache('asistente_tool:prueba_stream', maxsize=64, ttl=60).clear()
+    with app.test_client() as c:
+        with c.session_transaction() as s:
+            s['user'] = 'gerente prueba'
+            s['role'] = 'GERENCIA'
+        yield c
+
+
+def _leer_sse(cuerpo):
+    eventos = []
+    for bloque in cuerpo.split('\n\n'):
+        campos = dict(linea.split(': ', 1) for linea in bloque.splitlines() if not linea.startswith(':'))
+        if 'event' in campos:
+            eventos.append((int(campos['id']), campos['event'], json.loads(campos['data'])))
+    return eventos
+
+
+def test_pregunta_por_stream(cliente):
+    r = cliente.post('/api/dashboard/asistente/preguntar', json={'pregunta': 'Prueba stream desde 2026-01-01'})
+    assert r.status_code == 202
+    job_id = r.get_json()['job_id']
+
+    with cliente.get(f'/api/dashboard/asistente/jobs/{job_id}/stream') as r:
+        assert r.mimetype == 'text/event-stream'
+        eventos = _leer_sse(r.get_data(as_text=True))
+
+    tipos = [tipo for _, tipo, _ in eventos]
+    assert tipos[0] == 'estado' and tipos[-1] == 'fin'
+    assert ('tool', {'nombre': 'prueba_stream', 'estado': 'fin'}) in [(t, d) for _, t, d in eventos]
+    assert [s for s, _, _ in eventos] == list(range(1, len(eventos) + 1))
+
+    textos = [d['delta'] for _, t, d in eventos if t == 'texto' and not d.get('reiniciar')]
+    fin = eventos[-1][2]
+    assert len(textos) > 1  # llegó por fragmentos, no de una sola vez
+    assert fin['success'] is True
+    assert fin['respuesta'] == ''.join(textos).strip()
+    assert fin['tool_usado'] == ['prueba_stream']
+    assert fin['datos']['prueba_stream'] == {'unidades': 10, 'desde': '2026-01-01'}
+
+
+def test_polling_retoma_desde_cursor(cliente):
+    job_id = cliente.post('/api/dashboard/asistente/preguntar', json={'pregunta': 'hola'}).get_json()['job_id']
+    with cliente.get(f'/api/dashboard/asistente/jobs/{job_id}/stream') as r:
+        r.get_data()  # el stream se cierra cuando el job termina
+
+    todo = cliente.get(f'/api/dashboard/asistente/jobs/{job_id}').get_json()
+    assert todo['terminado'] is True
+    assert todo['eventos'][-1]['tipo'] == 'fin'
+    assert todo['eventos'][-1]['datos']['tool_usado'] == []
+
+    resto = cliente.get(f"/api/dashboard/asistente/jobs/{job_id}?desde={todo['siguiente'] - 1}").get_json()
+    assert [e['seq'] for e in resto['eventos']] == [todo['siguiente']]
+
+
+def test_stream_sin_cupo_compartido(cliente):
+    job_id = cliente.post('/api/dashboard/asistente/preguntar', json={'pregunta': 'hola'}).get_json()['job_id']
+    # El resto del cupo de conexiones largas lo ocupan otros streams/long-polls.
+    otros = 0
+    while otros < conexiones_largas.MAX_CONEXIONES_LARGAS - 1 and conexiones_largas.tomar():
+        otros += 1
+    try:
+        with cliente.get(f'/api/dashboard/asistente/jobs/{job_id}/stream') as abierto:
+            r = cliente.get(f'/api/dashboard/asistente/jobs/{job_id}/stream')
+            assert r.status_code == 429 and r.get_json()['usar_polling'] is True
+            abierto.get_data()
+        with cliente.get(f'/api/dashboard/asistente/jobs/{job_id}/stream') as r:
+            assert r.status_code == 200
+    finally:
+        for _ in range(otros):
+            conexiones_largas.liberar()
+
+
+def test_job_de_otro_usuario_no_es_visible(cliente):
+    job_id = cliente.post('/api/dashboard/asistente/preguntar', json={'pregunta': 'hola'}).get_json()['job_id']
+    with cliente.session_transaction() as s:
+        s['user'] = 'otro gerente'
+    assert cliente.get(f'/api/dashboard/asistente/jobs/{job_id}').status_code == 404
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la ejecución de tools del Asistente (backend/services/asistente_tools.py
+y asistente_service._ejecutar_tools_iter): varias tools de un mismo turno corren en
+paralelo y en su propio app_context, y el resultado de cada tool se cachea por
+(args normalizados, tenant, alcance de rol) hasta que cambia una de sus tablas.
+"""
+import threading
+import time
+
+import pytest
+
+from backend.app import app
+from backend.services import asistente_service, asistente_tools
+from backend.utils.cache_manager import get_cache, publish_table_change
+
+CTX = {'user': 'gerente', 'user_id': 1, 'role': 'ADMINISTRADOR', 'tenant': 'friparts'}
+
+
+@pytest.fixture
+def tool_contada(monkeypatch):
+    llamadas = []
+
+    def handler(params, ctx):
+        llamadas.append(dict(params))
+        return {'total': len(llamadas)}
+
+    monkeypatch.setitem(asistente_tools.TOOLS, 'prueba_cache', {
+        'description': 'tool de prueba', 'parameters': {'type': 'object', 'properties': {}},
+        'allowed_roles': asistente_tools.ROL_TODOS, 'handler': handler,
+        'tipo_grafica': None, 'cache_ttl': 60, 'tablas': ('db_prueba_asistente',),
+    })
+    get_cache('asistente_tool:prueba_cache', maxsize=64, ttl=60).clear()
+    return llamadas
+
+
+def test_cache_por_args_normalizados(tool_contada):
+    datos, *_ = asistente_tools.ejecutar_tool('prueba_cache', {'desde': '2026-01-01', 'hasta': ''}, CTX)
+    otra, *_ = asistente_tools.ejecutar_tool('prueba_cache', {'desde': ' 2026-01-01 '}, CTX)
+    assert datos == otra == {'total': 1}
+    assert len(tool_contada) == 1
+
+    asistente_tools.ejecutar_tool('prueba_cache', {'desde': '2026-02-01'}, CTX)
+    asistente_tools.ejecutar_tool('prueba_cache', {'desde': '2026-01-01'}, {**CTX, 'tenant': 'frimetals'})
+    asistente_tools.ejecutar_tool('prueba_cache', {'desde': '2026-01-01'}, {**CTX, 'role': 'COMERCIAL'})
+    assert len(tool_contada) == 4
+
+
+def test_cambio_de_tabla_invalida(tool_contada):
+    asistente_tools.ejecutar_tool('prueba_cache', {}, CTX)
+    publish_table_change('db_otra_tabla')
+    asistente_tools.ejecutar_tool('prueba_cache', {}, CTX)
+    assert len(tool_contada) == 1
+
+    publish_table_change('db_prueba_asistente', tenant='friparts')
+    datos, *_ = asistente_tools.ejecutar_tool('prueba_cache', {}, CTX)
+    assert datos == {'total': 2}
+
+
+def test_tools_del_turno_corren_en_paralelo(monkeypatch):
+    hilos = set()
+
+    def lenta(nombre, params, ctx):
+        from flask import current_app
+        assert current_app.name == app.name  # cada hilo con su app_context
+        hilos.add(threading.get_ident())
+        time.sleep(0.3)
+        if nombre == 'falla':
+            raise ValueError('dato invalido')
+        return {'tool': nombre}, None, None, None
+
+    monkeypatch.setattr(asistente_service, 'ejecutar_tool', lenta)
+    inicio = time.perf_counter()
+    salida = sorted(asistente_service._ejecutar_tools_iter(app, [('a', {}), ('falla', {}), ('c', {})], CTX))
+    duracion = time.perf_counter() - inicio
+
+    assert duracion < 0.8
+    assert len(hilos) == 3
+    assert [(i, n, r[0] if r else None, e) for i, n, r, e in salida] == [
+        (0, 'a', {'tool': 'a'}, None), (1, 'falla', None, 'dato invalido'), (2, 'c', {'tool': 'c'}, None),
+    ]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del índice compilado de la ficha maestra (bom_service.IndiceBom) y del
+BOM + stock en lote (EnsambleService.obtener_boms_con_stock): la cascada de
+intentos resuelve igual que las consultas de antes, un cambio de
+FichaMaestra confirmado por ORM recompila el índice y el lote trae el stock
+de todos los componentes en una sola consulta.
+
+Corre contra la base de datos configurada en DATABASE_URL. La primera
+palabra de producto/subproducto es el código que interpreta el servicio
+(FR-, CAR, CB, MP-), así que la marca TEST-BOM- va en la descripción: la
+limpieza borra solo las fichas de los productos TEST-BOM- exactos y los
+productos cuya descripción empieza por TEST-BOM-.
+"""
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import FichaMaestra, Producto
+from backend.services import bom_service
+from backend.services.bom_service import calcular_descuentos_ensamble
+from backend.services.ensamble_service import BomNoDisponibleException, EnsambleService
+
+
+KIT = 'FR-77901 TEST-BOM-KIT'
+COMPUESTO = 'CAR77931-77932 TEST-BOM-CARCASA'
+SUBRECETA = 'CB77941 TEST-BOM-SUB'
+
+
+def _limpiar():
+    FichaMaestra.query.filter(FichaMaestra.producto.in_([KIT, COMPUESTO, SUBRECETA])).delete(synchronize_session=False)
+    Producto.query.filter(Producto.descripcion.like('TEST-BOM-%')).delete(synchronize_session=False)
+    db.session.commit()
+    bom_service.invalidar_indice_bom()
+
+
+@pytest.fixture
+def ficha():
+    with app.app_context():
+        _limpiar()
+        db.session.add_all([
+            FichaMaestra(producto=KIT, subproducto='77911 TEST-BOM-BUJE', cantidad=2),
+            FichaMaestra(producto=KIT, subproducto='CAR77921-77922 TEST-BOM-CARCASA', cantidad=1),
+            FichaMaestra(producto=KIT, subproducto='MP-PEGANTE TEST-BOM-PEGANTE', cantidad=0.5),
+            FichaMaestra(producto=KIT, subproducto='77901 TEST-BOM-KIT', cantidad=1),
+            FichaMaestra(producto=KIT, subproducto='77912 TEST-BOM-CERO', cantidad=0),
+            FichaMaestra(producto=COMPUESTO, subproducto='77911 TEST-BOM-BUJE', cantidad=4),
+            FichaMaestra(producto=SUBRECETA, subproducto='77911 TEST-BOM-BUJE', cantidad=1),
+            Producto(codigo_sistema='77911', id_codigo='FR-77911', descripcion='TEST-BOM-Buje', p_terminado=10),
+            Producto(codigo_sistema='CAR77921', id_codigo='CAR77921', descripcion='TEST-BOM-Carcasa', p_terminado=3),
+        ])
+        db.session.commit()
+        yield
+        _limpiar()
+
+
+def test_cascada_por_prefijo_y_por_sub_parte(ficha):
+    kit = calcular_descuentos_ensamble('77901', 3)
+    assert kit['success'] and kit['kit'] == '77901'
+    assert [(c['codigo_ficha'], c['codigo_inventario'], c['cantidad_total_descontar']) for c in kit['componentes']] == [
+        ('77911 TEST-BOM-BUJE', '77911', 6.0),
+        ('CAR77921-77922 TEST-BOM-CARCASA', 'CAR77921', 3.0),
+        ('MP-PEGANTE TEST-BOM-PEGANTE', 'PEGANTE', 1.5),
+    ]
+
+    compuesto = calcular_descuentos_ensamble('77932', 1)
+    assert [c['codigo_inventario'] for c in compuesto['componentes']] == ['77911']
+
+    assert 'sub-recetas' in calcular_descuentos_ensamble('CB77941', 1)['error']
+    assert 'no encontrada' in calcular_descuentos_ensamble('77999', 1)['error']
+
+
+def test_cambio_de_ficha_por_orm_recompila_el_indice(ficha):
+    indice = bom_service.obtener_indice_bom()
+    assert bom_service.obtener_indice_bom() is indice
+
+    db.session.add(FichaMaestra(producto=KIT, subproducto='77913 TEST-BOM-RESORTE', cantidad=1))
+    db.session.commit()
+
+    assert bom_service.obtener_indice_bom() is not indice
+    assert '77913' in [c['codigo_inventario'] for c in calcular_descuentos_ensamble('FR-77901', 1)['componentes']]
+
+
+def test_boms_con_stock_en_lote_con_una_consulta(ficha, contar_consultas):
+    bom_service.obtener_indice_bom()
+    (boms, errores), consultas = contar_consultas(
+        EnsambleService.obtener_boms_con_stock, ['77901', '77932', 'CB77941'])
+    assert consultas == 1
+
+    assert boms['77901']['componentes'] == [
+        {'componente': '77911 TEST-BOM-BUJE', 'codigo_inventario': '77911', 'stock_almacen': 10.0,
+         'cantidad_por_unidad': 2.0, 'alcanza_para': 5},
+        {'componente': 'CAR77921-77922 TEST-BOM-CARCASA', 'codigo_inventario': 'CAR77921', 'stock_almacen': 3.0,
+         'cantidad_por_unidad': 1.0, 'alcanza_para': 3},
+    ]
+    assert boms['77932']['componentes'][0]['alcanza_para'] == 2
+    assert list(errores) == ['CB77941']
+
+    with pytest.raises(BomNoDisponibleException):
+        EnsambleService.obtener_bom_con_stock('CB77941')
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la serialización CSV de backend/core/bulk_copy.py: lo que viaja por
+COPY debe distinguir NULL de texto vacío y escapar comillas/comas/saltos.
+"""
+import csv
+from datetime import date
+
+from backend.core.bulk_copy import _buffer_csv, _NULL_CSV
+
+
+def test_buffer_csv_distingue_null_de_texto_vacio():
+    columnas = ('documento', 'nombre', 'iva', 'fecha')
+    filas = [
+        {'documento': 'FV-1', 'nombre': 'Taller "El Buje", S.A.S', 'iva': None, 'fecha': date(2026, 5, 1)},
+        ('FV-2', '', 19.0, None),
+    ]
+    buffer, total = _buffer_csv(columnas, filas)
+    lineas = buffer.getvalue().splitlines()
+
+    assert total == 2
+    assert lineas[0] == '"FV-1","Taller ""El Buje"", S.A.S",\\N,"2026-05-01"'
+    assert lineas[1] == '"FV-2","","19.0",\\N'
+    # Un lector CSV estándar recupera los valores originales.
+    assert next(csv.reader([lineas[0]]))[1] == 'Taller "El Buje", S.A.S'
+    assert next(csv.reader([lineas[1]]))[3] == _NULL_CSV
+
+
+def test_buffer_csv_texto_literal_null_va_entre_comillas():
+    buffer, _ = _buffer_csv(('nota',), [{'nota': _NULL_CSV}])
+    assert buffer.getvalue() == '"\\N"\n'
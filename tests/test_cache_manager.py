@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la invalidación por tags de backend/utils/cache_manager.py: un evento
+"tabla cambiada" debe desalojar solo las entradas que dependen de esa tabla
+(y de ese tenant, si se indica), no el namespace completo.
+"""
+from backend.utils import cache_manager
+from backend.utils.cache_manager import (
+    NamespaceTTLCache, get_cache, publish_table_change, subscribe_table_changes, tenant_tag,
+)
+
+
+def test_invalidate_tags_solo_desaloja_entradas_dependientes():
+    cache = NamespaceTTLCache(maxsize=10, ttl=60)
+    cache.set('stats_enero', 1, tags={'db_inyeccion', 'db_pulido'})
+    cache.set('jefatura', 2, tags={'db_ventas'})
+
+    assert cache.invalidate_tags({'db_pulido'}) == 1
+    assert cache.get('stats_enero') is None
+    assert cache.get('jefatura') == 2
+
+    stats = cache.stats()
+    assert stats['evictions']['tag'] == 1
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_invalidate_tags_respeta_tenant():
+    cache = NamespaceTTLCache(maxsize=10, ttl=60)
+    cache.set('fp', 1, tags={'db_productos', tenant_tag('friparts')})
+    cache.set('fm', 2, tags={'db_productos', tenant_tag('frimetals')})
+    cache.set('compartida', 3, tags={'db_productos'})
+
+    assert cache.invalidate_tags({'db_productos'}, tenant='frimetals') == 2
+    assert cache.get('fp') == 1
+    assert cache.get('fm') is None
+    assert cache.get('compartida') is None
+
+
+def test_desalojo_por_capacidad_limpia_indice_de_tags():
+    cache = NamespaceTTLCache(maxsize=1, ttl=60)
+    cache.set('a', 1, tags={'db_ventas'})
+    cache.set('b', 2, tags={'db_ventas'})
+
+    assert cache.stats()['evictions']['capacity'] == 1
+    assert cache.invalidate_tags({'db_ventas'}) == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_publish_table_change_recorre_namespaces_y_suscriptores():
+    cache = get_cache('test_publish', maxsize=10, ttl=60)
+    cache.clear()
+    cache.set('k', 'v', tags={'db_ensambles'})
+    recibidos = []
+
+    def _suscriptor(tablas, tenant):
+        recibidos.append((tablas, tenant))
+
+    subscribe_table_changes(_suscriptor)
+    try:
+        assert publish_table_change('db_ensambles') >= 1
+        assert cache.get('k') is None
+        assert recibidos == [(frozenset({'db_ensambles'}), None)]
+    finally:
+        cache_manager._suscriptores.remove(_suscriptor)
+
+
+def test_cached_route_con_version_recalcula_al_cambiar_la_version():
+    from flask import Flask
+    from backend.utils.cache_manager import cached_route
+
+    app = Flask(__name__)
+    get_cache('test_version', maxsize=10, ttl=60).clear()
+    version = {'actual': 1}
+    llamadas = []
+
+    @cached_route(namespace='test_version', ttl=60, version=lambda: version['actual'])
+    def _ruta():
+        llamadas.append(version['actual'])
+        return {'version': version['actual']}
+
+    with app.test_request_context('/api/admin/dashboard'):
+        assert _ruta() == {'version': 1}
+        assert _ruta() == {'version': 1}
+        version['actual'] = 2
+        assert _ruta() == {'version': 2}
+    assert llamadas == [1, 2]
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del snapshot en memoria del catálogo (backend/services/catalogo_service.py):
+un cambio de stock hecho por ORM debe llegar al snapshot de forma incremental
+(version + 1, solo la fila tocada), un rollback no debe dejar rastro,
+invalidar() debe forzar la reconstrucción completa, publicar db_productos
+tras una escritura ORM no debe, y un lector no debe esperar a otro hilo que
+está releyendo la BD.
+
+Corre contra la base de datos real (mismo patrón que el resto de tests/),
+limpiando los productos TEST-CAT- que crea.
+"""
+import unittest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import Producto
+from backend.services import catalogo_service
+from backend.services.catalogo_service import CatalogoService
+from backend.utils.cache_manager import publish_table_change
+
+
+class TestCatalogoSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        self._limpiar()
+        db.session.add(Producto(
+            codigo_sistema='TEST-CAT-001', id_codigo='FR-TEST-CAT-001',
+            descripcion='Buje de prueba catálogo', p_terminado=10, comprometido=4,
+        ))
+        db.session.commit()
+        CatalogoService.invalidar()
+
+    def tearDown(self):
+        self._limpiar()
+        CatalogoService.invalidar()
+        self.ctx.pop()
+
+    def _limpiar(self):
+        Producto.query.filter(Producto.codigo_sistema.like('TEST-CAT-%')).delete(synchronize_session=False)
+        db.session.commit()
+
+    def test_cambio_orm_se_aplica_incrementalmente(self):
+        snap = CatalogoService.obtener()
+        registro = snap.buscar_codigo('TEST-CAT-001')
+        self.assertEqual(registro.stock_disponible, 6.0)
+
+        producto = Producto.query.filter_by(codigo_sistema='TEST-CAT-001').first()
+        producto.p_terminado = 25
+        db.session.commit()
+
+        nuevo = CatalogoService.obtener()
+        self.assertEqual(nuevo.version, snap.version + 1)
+        self.assertEqual(nuevo.construido_en, snap.construido_en)  # no hubo reconstrucción
+        self.assertEqual(nuevo.buscar_codigo('TEST-CAT-001').stock_disponible, 21.0)
+        # El snapshot anterior es inmutable: quien lo tenga sigue viendo el valor viejo.
+        self.assertEqual(snap.buscar_codigo('TEST-CAT-001').stock_disponible, 6.0)
+        self.assertNotEqual(nuevo.etag, snap.etag)
+
+    def test_rollback_no_marca_pendientes(self):
+        snap = CatalogoService.obtener()
+        producto = Producto.query.filter_by(codigo_sistema='TEST-CAT-001').first()
+        producto.p_terminado = 99
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertIs(CatalogoService.obtener(), snap)
+
+    def test_buscar_por_codigo_sin_prefijo(self):
+        snap = CatalogoService.obtener()
+        self.assertIs(snap.buscar_codigo('fr-test-cat-001'), snap.buscar_codigo('TEST-CAT-001'))
+
+    def test_invalidar_reconstruye_y_ve_sql_crudo(self):
+        snap = CatalogoService.obtener()
+        db.session.execute(
+            db.text("UPDATE db_productos SET comprometido = 0 WHERE codigo_sistema = 'TEST-CAT-001'")
+        )
+        db.session.commit()
+        self.assertIs(CatalogoService.obtener(), snap)  # SQL crudo: el listener no lo ve
+
+        CatalogoService.invalidar()
+        nuevo = CatalogoService.obtener()
+        self.assertEqual(nuevo.version, snap.version + 1)
+        self.assertEqual(nuevo.buscar_codigo('TEST-CAT-001').stock_disponible, 10.0)
+
+    def test_publicar_db_productos_no_reconstruye(self):
+        # Escritor ORM que además publica la tabla (StockService, pulido):
+        # el snapshot se actualiza solo con la fila tocada.
+        snap = CatalogoService.obtener()
+        producto = Producto.query.filter_by(codigo_sistema='TEST-CAT-001').first()
+        producto.p_terminado = 40
+        db.session.commit()
+        publish_table_change('db_productos')
+
+        nuevo = CatalogoService.obtener()
+        self.assertEqual(nuevo.construido_en, snap.construido_en)
+        self.assertEqual(nuevo.buscar_codigo('TEST-CAT-001').stock_disponible, 36.0)
+
+    def test_sql_crudo_marcado_se_aplica_incrementalmente(self):
+        snap = CatalogoService.obtener()
+        db.session.execute(
+            db.text("UPDATE db_productos SET p_terminado = 40 WHERE codigo_sistema = 'TEST-CAT-001'")
+        )
+        db.session.commit()
+        CatalogoService.marcar_modificados(codigos=['TEST-CAT-001'])
+
+        nuevo = CatalogoService.obtener()
+        self.assertEqual(nuevo.construido_en, snap.construido_en)
+        self.assertEqual(nuevo.buscar_codigo('TEST-CAT-001').stock_disponible, 36.0)
+
+    def test_etag_distingue_procesos(self):
+        # version reinicia en 1 tras un reinicio: el ETag lleva la época del proceso.
+        snap = CatalogoService.obtener()
+        self.assertEqual(snap.etag, f"catalogo-{catalogo_service._EPOCA}-{snap.version}")
+
+    def test_lector_no_espera_relectura_en_curso(self):
+        snap = CatalogoService.obtener()
+        CatalogoService.marcar_modificados(codigos=['TEST-CAT-001'])
+        with catalogo_service._refresco_lock:  # otro hilo releyendo
+            self.assertIs(CatalogoService.obtener(), snap)
+        self.assertEqual(CatalogoService.obtener().version, snap.version + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del Excel YTD de analítica comercial
+(ComercialHistoricoService.generar_excel_ytd): el libro se escribe en modo
+write_only directo al destino, con las mismas hojas de antes, y los dos
+reshapes (zona x año, cliente x mes) se arman desde las filas ya agregadas
+sin pandas. _query_ytd se reemplaza por filas fijas: su SQL corre sobre el
+cubo de PostgreSQL.
+"""
+from decimal import Decimal
+
+import pytest
+from openpyxl import load_workbook
+
+from backend.services.comercial_service import ComercialHistoricoService
+
+
+@pytest.fixture
+def filas_ytd(monkeypatch):
+    anual = [
+        {'anio': 2025, 'total_ventas': Decimal('300.00'), 'total_unidades': Decimal('30'), 'total_transacciones': 3},
+        {'anio': 2026, 'total_ventas': Decimal('500.00'), 'total_unidades': Decimal('50'), 'total_transacciones': 5},
+    ]
+    zona = [
+        {'anio': 2025, 'zona': 'BOGOTA', 'total_ventas': Decimal('100.00'), 'total_unidades': 10, 'total_transacciones': 1},
+        {'anio': 2026, 'zona': 'BOGOTA', 'total_ventas': Decimal('400.00'), 'total_unidades': 40, 'total_transacciones': 4},
+        {'anio': 2025, 'zona': 'CALI', 'total_ventas': Decimal('200.00'), 'total_unidades': 20, 'total_transacciones': 2},
+    ]
+    mensual_zona = [
+        {'anio': 2025, 'mes': 1, 'zona': 'BOGOTA', 'total_ventas': Decimal('100.00'), 'total_unidades': 10},
+        {'anio': 2025, 'mes': 2, 'zona': 'CALI', 'total_ventas': Decimal('200.00'), 'total_unidades': 20},
+        {'anio': 2026, 'mes': 1, 'zona': 'BOGOTA', 'total_ventas': Decimal('400.00'), 'total_unidades': 40},
+    ]
+    top = [{'cliente': 'ACME', 'total_ventas': Decimal('600.00'), 'total_unidades': 60, 'total_transacciones': 6}]
+    mensual_cliente = [
+        {'anio': 2025, 'mes': 1, 'cliente': 'ACME', 'total_ventas': Decimal('100.00')},
+        {'anio': 2026, 'mes': 1, 'cliente': 'ACME', 'total_ventas': Decimal('400.00')},
+        {'anio': 2025, 'mes': 2, 'cliente': 'ZETA', 'total_ventas': Decimal('200.00')},
+    ]
+    llamadas = []
+
+    def query_ytd(**kwargs):
+        llamadas.append(kwargs)
+        return anual, zona, mensual_zona, top, iter(mensual_cliente), True
+
+    monkeypatch.setattr(ComercialHistoricoService, '_query_ytd', staticmethod(query_ytd))
+    return llamadas
+
+
+def _valores(ws):
+    return [list(fila) for fila in ws.iter_rows(values_only=True)]
+
+
+def test_libro_con_las_seis_hojas(filas_ytd, tmp_path):
+    destino = tmp_path / 'ytd.xlsx'
+    nombre = ComercialHistoricoService.generar_excel_ytd(
+        user_id=0, username='gerente', user_role='GERENCIA', start_year=2025, end_year=2026,
+        destino=str(destino), vendedor_filtro='Juan Perez', fecha_corte='2026-07-15'
+    )
+    assert nombre == 'Comercial_YTD_2025-2026_Juan_Perez_2026-07-15.xlsx'
+    assert filas_ytd[0]['corte_dt'].isoformat() == '2026-07-15'
+
+    wb = load_workbook(destino)
+    assert wb.sheetnames == [
+        'YTD Anual', 'YTD por Zona', 'Desglose Mensual Zona', 'Top Clientes',
+        'YoY Zona (Pivot)', 'Ventas Mensuales Cliente',
+    ]
+    anual = wb['YTD Anual']
+    assert _valores(anual)[0] == ['anio', 'total_ventas', 'total_unidades', 'total_transacciones']
+    assert anual['B2'].number_format == '"$" #,##0'
+    assert anual['C2'].number_format == '#,##0'
+    assert anual.freeze_panes == 'A2'
+
+    assert _valores(wb['YoY Zona (Pivot)']) == [
+        ['zona', 2025, 2026],
+        ['BOGOTA', 100, 400],
+        ['CALI', 200, 0],
+    ]
+
+
+def test_comparativo_cliente_por_mes_con_totales(filas_ytd, tmp_path):
+    destino = tmp_path / 'ytd.xlsx'
+    ComercialHistoricoService.generar_excel_ytd(
+        user_id=0, username='gerente', user_role='GERENCIA', start_year=2025, end_year=2026, destino=str(destino)
+    )
+    ws = load_workbook(destino)['Ventas Mensuales Cliente']
+    assert _valores(ws) == [
+        ['cliente', 'Enero 2025', 'Febrero 2025', 'Enero 2026', 'Total'],
+        ['ACME', 100, 0, 400, 500],
+        ['ZETA', 0, 200, 0, 200],
+        ['TOTAL VENTAS', 100, 200, 400, 700],
+    ]
+    assert ws['E2'].font.bold and not ws['D2'].font.bold
+    assert ws['B4'].font.bold
+    assert ws.freeze_panes == 'B2'
@@ -100,6 +100,19 @@ class TestEstadoSincronizaciones(unittest.TestCase):
 
         self.assertAlmostEqual(data['clientes']['antiguedad_horas'], 30, delta=0.1)
 
+    def test_watermark_comercial_requiere_token(self):
+        resp = self.client.get('/api/wo/watermark_comercial')
+        self.assertEqual(resp.status_code, 401)
+
+    def test_watermark_comercial_refleja_la_ultima_sync_exitosa(self):
+        headers = {'X-API-Key': os.environ['WO_SYNC_API_KEY']}
+        resp = self.client.get('/api/wo/watermark_comercial', headers=headers)
+        self.assertIsNone(resp.get_json()['watermark'])
+
+        _sellar_ultima_sync_exitosa(SYNC_EXITOSA_COMERCIAL_KEY)
+        resp = self.client.get('/api/wo/watermark_comercial', headers=headers)
+        self.assertEqual(resp.get_json()['watermark'], db.session.get(AppConfig, SYNC_EXITOSA_COMERCIAL_KEY).valor)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del modo paginado (keyset) de /api/historial-global: el cursor debe ser
+reversible, el filtro ?tipo= debe decidir qué ramas entran al UNION ALL, el
+cursor debe reducirse a un rango (fecha, id) por rama y los PNC sin fecha
+confiable deben mapearse igual que en el listado completo.
+"""
+from datetime import datetime
+
+import pytest
+
+from backend.routes import historial_routes as hr
+
+
+def test_cursor_historial_ida_y_vuelta():
+    fila = {'fecha_orden': datetime(2026, 3, 14, 9, 30), 'hoja': 'db_pnc_pulido', 'id': 42}
+    cursor = hr._codificar_cursor_historial(fila)
+
+    assert hr._decodificar_cursor_historial(cursor) == (datetime(2026, 3, 14, 9, 30), 'db_pnc_pulido', 42)
+    with pytest.raises(ValueError):
+        hr._decodificar_cursor_historial('no-es-un-cursor')
+
+
+def test_filtro_tipo_decide_ramas_del_union():
+    assert hr._hojas_historial('PNC') == ['db_pnc_inyeccion', 'db_pnc_pulido', 'db_pnc_ensamble']
+    assert hr._hojas_historial('FACTURACION') == ['db_ventas']
+    assert hr._hojas_historial('DESCONOCIDO') == []
+    assert set(hr._hojas_historial('')) == set(hr._RAMAS_HISTORIAL)
+
+
+def test_pnc_ambiguo_oculta_fecha_y_orden():
+    fila = {
+        'hoja': 'db_pnc_inyeccion', 'id': 7, 'fecha': datetime(2026, 1, 2),
+        'id_lote': 'INY-890801A3', 'producto': '9843', 'cantidad': 3,
+        'orden': 'OP-1', 'maquina': '4', 'criterio': 'Rebaba', 'notas': None,
+        'ambiguo': True,
+    }
+    mov = hr._mov_pnc(fila)
+
+    assert mov['Fecha'] == 'ID AMBIGUO'
+    assert mov['Orden'] == 'INY-890801A3'
+    assert mov['maquina'] == 'N/A'
+    assert mov['Responsable'] == 'INYECCION'
+
+    mov = hr._mov_pnc(dict(fila, ambiguo=False))
+    assert mov['Fecha'] == '02/01/2026'
+    assert mov['Orden'] == 'OP-1'
+    assert mov['maquina'] == 'Máquina No. 4'
+
+
+def test_keyset_por_rama_sobre_columnas_reales():
+    cursor = (datetime(2026, 3, 14, 9, 30), 'db_pulido', 42)
+
+    # Misma hoja del cursor: tupla (fecha, id) + cota simple para el índice.
+    sql, params = hr._filtro_keyset('db_pulido', 'db_pulido.fecha', 'db_pulido.id', False, cursor, 0)
+    assert '(db_pulido.fecha, db_pulido.id) < (:kf_0, :kid_0)' in sql
+    assert params == {'kf_0': datetime(2026, 3, 14, 9, 30), 'kid_0': 42}
+
+    # Hoja menor (desempata después): entra todo el instante del cursor.
+    sql, params = hr._filtro_keyset('db_inyeccion', 'db_inyeccion.fecha_inicia', 'db_inyeccion.id', False, cursor, 1)
+    assert sql == 'AND db_inyeccion.fecha_inicia <= :kf_1'
+
+    # Hoja mayor con columna Date: medianoche del 14 < 09:30, el día entra.
+    sql, params = hr._filtro_keyset('db_ventas', 'db_ventas.fecha', 'db_ventas.id', True, cursor, 2)
+    assert sql == 'AND db_ventas.fecha <= :kf_2'
+    assert str(params['kf_2']) == '2026-03-14'
+    _, params = hr._filtro_keyset('db_ventas', 'db_ventas.fecha', 'db_ventas.id', True,
+                                  (datetime(2026, 3, 14), 'db_pulido', 1), 2)
+    assert str(params['kf_2']) == '2026-03-13'
+
+
+def test_pnc_sin_fecha_solo_cuando_el_cursor_llega():
+    assert hr._rama_pagina_sin_fecha('db_pnc_pulido', (datetime(2026, 3, 14), 'db_pulido', 1), 0)[1] == {}
+    _, params = hr._rama_pagina_sin_fecha('db_pnc_pulido', (datetime(1900, 1, 1), 'db_pnc_pulido', 9), 0)
+    assert params == {'kid_0': 9}
+    assert hr._rama_pagina_sin_fecha('db_pnc_inyeccion', (datetime(1900, 1, 1), 'db_pnc_pulido', 9), 0)[1] == {}
+    assert hr._rama_pagina_sin_fecha('db_pnc_pulido', (datetime(1900, 1, 1), 'db_pnc_inyeccion', 9), 0) is None
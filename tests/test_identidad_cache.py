@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché de identidad de AuthService (resolver_identidad /
+invalidar_identidad): la correspondencia username <-> nombre completo se
+resuelve una vez por identidad, sirve igual para ambas llaves y se desaloja
+de forma explícita al cambiar la cuenta.
+
+Corre contra la base de datos configurada en DATABASE_URL; crea un usuario
+TEST-IDENTIDAD y lo borra al terminar.
+"""
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import Usuario
+from backend.services import auth_service
+from backend.services.auth_service import AuthService
+
+USERNAME = 'test-identidad'
+
+
+@pytest.fixture
+def usuario():
+    with app.app_context():
+        auth_service._cache_identidades().clear()
+        Usuario.query.filter_by(username=USERNAME).delete()
+        u = Usuario(username=USERNAME, password_hash='x', nombre_completo='Operaria Prueba', rol='alistamiento')
+        db.session.add(u)
+        db.session.commit()
+        yield u
+        Usuario.query.filter_by(username=USERNAME).delete()
+        db.session.commit()
+        auth_service._cache_identidades().clear()
+
+
+def test_resuelve_por_username_y_por_nombre(usuario):
+    esperado = {'username': 'TEST-IDENTIDAD', 'nombre_completo': 'OPERARIA PRUEBA', 'rol': 'ALISTAMIENTO'}
+    assert AuthService.resolver_identidad(' Test-Identidad ') == esperado
+    assert AuthService.resolver_identidad('operaria prueba') == esperado
+    assert AuthService.resolver_identidad('') is None
+
+
+def test_cacheada_hasta_invalidar(usuario):
+    AuthService.resolver_identidad(USERNAME)
+    AuthService.resolver_identidad('Operaria Prueba')
+
+    usuario.nombre_completo = 'Operaria Renombrada'
+    db.session.commit()
+    assert AuthService.resolver_identidad(USERNAME)['nombre_completo'] == 'OPERARIA PRUEBA'
+
+    AuthService.invalidar_identidad(USERNAME)
+    assert AuthService.resolver_identidad(USERNAME)['nombre_completo'] == 'OPERARIA RENOMBRADA'
+    # La llave por nombre completo también era de este usuario: se desalojó.
+    assert AuthService.resolver_identidad('Operaria Prueba')['nombre_completo'] == ''
+
+
+def test_desconocido_se_reresuelve_al_dar_de_alta_cuentas(usuario):
+    assert AuthService.resolver_identidad('nueva-operaria') == {
+        'username': 'NUEVA-OPERARIA', 'nombre_completo': '', 'rol': ''
+    }
+    usuario.username = 'nueva-operaria'
+    db.session.commit()
+    AuthService.invalidar_identidad()
+    assert AuthService.resolver_identidad('nueva-operaria')['rol'] == 'ALISTAMIENTO'
+    usuario.username = USERNAME
+    db.session.commit()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché en disco del proxy de imágenes de Drive
+(backend/utils/imagen_cache.py): presupuesto de bytes con LRU, dedupe de
+descargas concurrentes, fallos con TTL corto y persistencia entre reinicios.
+"""
+import threading
+import time
+
+from backend.utils.imagen_cache import DiskImageCache
+
+
+def test_desalojo_lru_respeta_presupuesto_de_bytes(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=10)
+    cache.set('a', b'12345', 'image/jpeg')
+    cache.set('b', b'67890', 'image/jpeg')
+    assert cache.get('a') is not None  # 'a' pasa a ser la más reciente
+    cache.set('c', b'abcde', 'image/png')
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['bytes'] == 10
+    assert cache.stats()['desalojos'] == 1
+
+
+def test_mismo_contenido_comparte_blob_y_etag(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=100)
+    a = cache.set('a', b'igual', 'image/jpeg')
+    b = cache.set('b', b'igual', 'image/jpeg')
+    assert a.etag == b.etag and a.ruta == b.ruta
+    assert cache.stats()['bytes'] == 5
+
+
+def test_misses_concurrentes_descargan_una_sola_vez(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=1000)
+    llamadas = []
+    inicio = threading.Event()
+
+    def cargar():
+        llamadas.append(1)
+        inicio.wait(1)
+        return b'foto', 'image/jpeg'
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(cache.obtener('x', cargar))) for _ in range(20)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.05)
+    inicio.set()
+    for h in hilos:
+        h.join()
+
+    assert len(llamadas) == 1
+    assert len({r.etag for r in resultados}) == 1
+
+
+def test_fallo_se_cachea_solo_durante_ttl(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=1000, ttl_fallo=0.05)
+    llamadas = []
+
+    def cargar():
+        llamadas.append(1)
+        return (None, None) if len(llamadas) == 1 else (b'ok', 'image/jpeg')
+
+    assert cache.obtener('x', cargar) is None
+    assert cache.obtener('x', cargar) is None
+    assert len(llamadas) == 1
+    time.sleep(0.06)
+    assert cache.obtener('x', cargar) is not None
+    assert len(llamadas) == 2
+
+
+def test_indice_se_reconstruye_desde_disco(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=1000)
+    etag = cache.set('a', b'persistente', 'image/webp').etag
+
+    otra = DiskImageCache(str(tmp_path), max_bytes=1000)
+    entrada = otra.get('a')
+    assert entrada.etag == etag and entrada.content_type == 'image/webp'
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de las variantes redimensionadas del proxy de imágenes
+(backend/utils/imagen_variantes.py).
+"""
+import io
+
+from PIL import Image
+
+from backend.utils.imagen_variantes import (
+    elegir_formato, generar_variante, normalizar_ancho, urls_variantes,
+)
+
+
+def _png(ancho, alto, modo='RGBA'):
+    salida = io.BytesIO()
+    Image.new(modo, (ancho, alto), (200, 10, 10, 0) if modo == 'RGBA' else (200, 10, 10)).save(salida, 'PNG')
+    return salida.getvalue()
+
+
+def test_normalizar_ancho_redondea_al_escalon_permitido():
+    assert normalizar_ancho('150') == 160
+    assert normalizar_ancho('160') == 160
+    assert normalizar_ancho('5000') == 1280
+    assert normalizar_ancho('abc') is None
+    assert normalizar_ancho(None) is None
+    assert normalizar_ancho('0') is None
+
+
+def test_elegir_formato_por_parametro_o_accept():
+    assert elegir_formato('jpg', 'image/webp') == 'jpeg'
+    assert elegir_formato(None, 'image/avif,image/webp,*/*') == 'webp'
+    assert elegir_formato(None, '*/*') == 'jpeg'
+
+
+def test_generar_variante_reduce_sin_ampliar():
+    contenido, content_type = generar_variante(_png(1600, 1200, 'RGB'), 160, 'webp')
+    assert content_type == 'image/webp'
+    with Image.open(io.BytesIO(contenido)) as img:
+        assert img.size == (160, 120)
+
+    contenido, _ = generar_variante(_png(100, 50, 'RGB'), 640, 'webp')
+    with Image.open(io.BytesIO(contenido)) as img:
+        assert img.size == (100, 50)
+
+
+def test_generar_variante_jpeg_aplana_transparencia():
+    contenido, content_type = generar_variante(_png(400, 400), 160, 'jpeg')
+    assert content_type == 'image/jpeg'
+    with Image.open(io.BytesIO(contenido)) as img:
+        assert img.mode == 'RGB'
+        assert img.getpixel((80, 80))[0] > 240  # fondo blanco, no negro
+
+
+def test_urls_variantes_solo_para_el_proxy():
+    assert urls_variantes('/imagenes/proxy/abc123xyz') == {
+        'miniatura': '/imagenes/proxy/abc123xyz?w=160',
+        'mediana': '/imagenes/proxy/abc123xyz?w=640',
+    }
+    assert urls_variantes('/static/img/productos/FR-1.jpg') == {}
+    assert urls_variantes('') == {}
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del índice de trigramas de backend/utils/indice_busqueda.py: el
+ranking debe poner primero el código exacto (con o sin prefijo FR-), luego
+los prefijos, luego descripción/OEM, y tolerar un error de tipeo.
+"""
+from backend.utils.indice_busqueda import IndiceTrigramas, normalizar_texto
+
+
+def _indice():
+    return IndiceTrigramas([
+        ('a', ['FR-9304', 'FR-9304'], ['Buje tijera delantero']),
+        ('b', ['FR-93041', 'FR-93041'], ['Buje tijera trasero']),
+        ('c', ['CAR-1205', '1205'], ['Soporte motor 9304']),
+        ('d', ['FR-7011', '7011', '90311-12ABC'], ['Retenedor cigüeñal']),
+    ])
+
+
+def _registros(indice, termino):
+    return [indice.registros[i] for i, _ in indice.buscar(termino)]
+
+
+def test_normalizar_texto_quita_tildes_y_separadores():
+    assert normalizar_texto('Retén  cigüeñal/FR-9304') == 'RETEN CIGUENAL FR 9304'
+
+
+def test_codigo_exacto_con_y_sin_prefijo_va_primero():
+    indice = _indice()
+    assert _registros(indice, '9304')[:3] == ['a', 'b', 'c']
+    assert _registros(indice, 'fr-9304')[0] == 'a'
+    assert _registros(indice, 'FR 9304')[0] == 'a'
+    assert _registros(indice, '1205')[0] == 'c'
+
+
+def test_descripcion_y_oem():
+    indice = _indice()
+    assert _registros(indice, 'buje trasero')[0] == 'b'
+    assert _registros(indice, 'ciguenal') == ['d']
+    assert _registros(indice, '9031112abc') == ['d']
+
+
+def test_tolera_error_de_tipeo():
+    indice = _indice()
+    assert 'a' in _registros(indice, 'tijeras')
+    assert _registros(indice, 'retenedr')[0] == 'd'
+
+
+def test_consulta_corta_y_vacia():
+    indice = _indice()
+    assert set(_registros(indice, '70')) == {'d'}
+    assert indice.buscar('  ') == []
+    assert _registros(indice, 'zzzz') == []
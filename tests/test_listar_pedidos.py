@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de VentasRepository.listar_pedidos (/api/pedidos/listar): una sola
+consulta por página para FriParts y FriMetals, con la fecha de creación
+original de FriMetals tomada de db_pedidos, el último despacho por pedido y
+paginación keyset sobre id_pedido.
+
+Corre contra la base de datos configurada en DATABASE_URL, limpiando los
+pedidos TEST-LST- que crea.
+"""
+from datetime import date, datetime
+
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import DespachoPedido, MetalsPedido, Pedido
+from backend.repositories.ventas_repository import VentasRepository
+
+
+def _limpiar():
+    for modelo in (Pedido, MetalsPedido, DespachoPedido):
+        modelo.query.filter(modelo.id_pedido.like('TEST-LST-%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture
+def pedidos():
+    with app.app_context():
+        _limpiar()
+        db.session.add_all([
+            Pedido(id_pedido='TEST-LST-1', fecha=date(2026, 3, 1), hora='08:00 AM', cliente='ACME',
+                   id_codigo='FR-9304', cantidad=2, precio_unitario=100, total=200, estado='PENDIENTE'),
+            Pedido(id_pedido='TEST-LST-1', fecha=date(2026, 3, 1), hora='08:00 AM', cliente='ACME',
+                   id_codigo='FR-9305', cantidad=1, precio_unitario=50, total=50, estado='PENDIENTE'),
+            Pedido(id_pedido='TEST-LST-2', fecha=date(2026, 3, 5), hora='09:30 AM', cliente='ZETA',
+                   id_codigo='FR-9306', cantidad=4, precio_unitario=10, total=40, estado='DESPACHADO'),
+            Pedido(id_pedido='TEST-LST-3', fecha=date(2026, 2, 10), hora='10:00 AM', cliente='METALES SA',
+                   id_codigo='M-1', cantidad=1, precio_unitario=1, total=1, estado='PENDIENTE'),
+            MetalsPedido(id_pedido='TEST-LST-3', fecha='2026-04-20', hora='11:00', cliente='METALES SA',
+                         id_codigo='M-1', cantidad=3, precio_unitario=7, total=21, progreso=50),
+            MetalsPedido(id_pedido='TEST-LST-3', fecha='2026-04-20', hora='11:00', cliente='METALES SA',
+                         id_codigo='M-2', cantidad=1, precio_unitario=9, total=9, progreso=50),
+            DespachoPedido(id_pedido='TEST-LST-2', id_codigo='FR-9306', cantidad_enviada=2,
+                           fecha=datetime(2026, 3, 6, 14, 0)),
+            DespachoPedido(id_pedido='TEST-LST-2', id_codigo='FR-9306', cantidad_enviada=2,
+                           fecha=datetime(2026, 3, 8, 16, 45)),
+        ])
+        db.session.commit()
+        yield
+        _limpiar()
+
+
+def test_friparts_agrupa_y_toma_el_ultimo_despacho(pedidos):
+    lista, siguiente = VentasRepository.listar_pedidos(busqueda='TEST-LST-')
+    por_id = {p['id_pedido']: p for p in lista}
+    assert [p['id_pedido'] for p in lista] == ['TEST-LST-3', 'TEST-LST-2', 'TEST-LST-1']
+    assert siguiente is None
+
+    uno = por_id['TEST-LST-1']
+    assert (uno['items_count'], uno['total']) == (2, 250.0)
+    assert uno['fecha_creacion'] == '2026-03-01 08:00 AM'
+    assert uno['fecha_despacho'] == uno['fecha_creacion']
+    assert [p['id_codigo'] for p in uno['productos']] == ['FR-9304', 'FR-9305']
+    assert por_id['TEST-LST-2']['fecha_despacho'] == '2026-03-08 16:45:00'
+
+
+def test_frimetals_fecha_original_en_una_sola_consulta(pedidos, contar_consultas):
+    (lista, _), consultas = contar_consultas(
+        VentasRepository.listar_pedidos, division='frimetals', busqueda='TEST-LST-')
+    assert consultas == 1
+
+    [metal] = lista
+    assert metal['fecha_creacion'] == '2026-02-10'
+    assert metal['fecha'] == '2026-04-20'
+    assert metal['fecha_despacho'] == '2026-04-20 11:00'
+    assert (metal['items_count'], metal['total'], metal['progreso']) == (2, 30.0, 50)
+    assert metal['productos'][1] == {
+        'id_codigo': 'M-2', 'descripcion': None, 'cantidad': 1.0, 'precio_unitario': 9.0, 'total': 9.0
+    }
+
+
+def test_paginacion_keyset(pedidos):
+    pagina, siguiente = VentasRepository.listar_pedidos(busqueda='TEST-LST-', limite=2)
+    assert [p['id_pedido'] for p in pagina] == ['TEST-LST-3', 'TEST-LST-2']
+    assert siguiente == 'TEST-LST-2'
+
+    resto, fin = VentasRepository.listar_pedidos(busqueda='TEST-LST-', despues_de=siguiente, limite=2)
+    assert [p['id_pedido'] for p in resto] == ['TEST-LST-1']
+    assert fin is None
+
+
+def test_busqueda_sin_limite_conserva_el_tope_previo(pedidos, monkeypatch):
+    from backend.repositories import ventas_repository
+    monkeypatch.setattr(ventas_repository, 'LISTADO_PEDIDOS_LIMITE', 1)
+    monkeypatch.setattr(ventas_repository, 'LISTADO_PEDIDOS_LIMITE_MAX', 1)
+
+    monkeypatch.setattr(ventas_repository, 'LISTADO_PEDIDOS_BUSQUEDA_LIMITE', 2)
+
+    # Sin búsqueda: página normal. Con búsqueda y sin limite: el tope de búsqueda.
+    assert len(VentasRepository.listar_pedidos()[0]) == 1
+    lista, siguiente = VentasRepository.listar_pedidos(busqueda='TEST-LST-')
+    assert [p['id_pedido'] for p in lista] == ['TEST-LST-3', 'TEST-LST-2'] and siguiente == 'TEST-LST-2'
+    assert len(VentasRepository.listar_pedidos(busqueda='TEST-LST-', limite=300)[0]) == 2
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del tablero de máquinas del MES en memoria
+(backend/services/mes_estado.py, /api/mes/dashboard y /api/mes/stream): un
+commit que toca programación o producción relee solo esa(s) máquina(s) con
+dos consultas sin importar el tamaño de planta, el resultado coincide con
+una reconstrucción completa desde SQL, un rollback no deja rastro, un
+cambio de catálogo pide el tablero completo, el dashboard responde 304 si
+la pantalla ya tiene la revisión y sin cupo de conexiones largas el stream
+responde 429.
+
+Corre contra la base de datos configurada en DATABASE_URL, limpiando las
+máquinas y registros TEST-MES- que crea.
+"""
+import json
+from datetime import date, datetime
+
+import pytest
+
+from backend.app import app
+from backend.core import conexiones_largas
+from backend.core.sql_database import db
+from backend.models.sql_models import Maquina, ProduccionInyeccion, ProgramacionInyeccion
+from backend.routes import programacion_routes
+from backend.services import mes_estado
+from backend.services.programacion_service import ProgramacionService
+
+
+def _limpiar():
+    ProgramacionInyeccion.query.filter(ProgramacionInyeccion.maquina.like('TEST-MES-%')).delete(synchronize_session=False)
+    ProduccionInyeccion.query.filter(ProduccionInyeccion.maquina.like('TEST-MES-%')).delete(synchronize_session=False)
+    Maquina.query.filter(Maquina.nombre.like('TEST-MES-%')).delete(synchronize_session=False)
+    db.session.commit()
+    mes_estado.reconstruir()
+
+
+@pytest.fixture
+def contexto():
+    with app.app_context():
+        _limpiar()
+        db.session.add_all([Maquina(nombre='TEST-MES-1', activa=True), Maquina(nombre='TEST-MES-2', activa=True)])
+        db.session.commit()
+        mes_estado.reconstruir()
+        yield
+        _limpiar()
+
+
+def _programar(maquina, codigo, molde=7, cavidades=2):
+    prog = ProgramacionInyeccion(fecha=date(2026, 10, 18), codigo_sistema=codigo, maquina=maquina, molde=molde,
+                                 cavidades=cavidades, cantidad=100, estado='PROGRAMADO')
+    db.session.add(prog)
+    db.session.commit()
+    return prog
+
+
+def _por_nombre(maquinas):
+    return {m['nombre']: m for m in maquinas}
+
+
+def test_commit_relee_solo_la_maquina_tocada(contexto, contar_consultas):
+    cursor, _ = mes_estado.tablero()
+    _programar('TEST-MES-1', 'FR-9304')
+    _programar('TEST-MES-1', 'FR-9305')
+
+    assert contar_consultas(ProgramacionService.clear_mes_cache)[1] == 2
+    assert contar_consultas(ProgramacionService.obtener_dashboard_mes)[1] == 0
+
+    cambios, nuevo = mes_estado.cambios_desde(cursor)
+    assert [m['nombre'] for m in cambios] == ['TEST-MES-1']
+    assert cambios[0]['estado'] == 'PROGRAMADO'
+    assert [c['codigo_sistema'] for c in cambios[0]['cola']] == ['FR-9304', 'FR-9305']
+    assert mes_estado.cambios_desde(nuevo) == ([], nuevo)
+
+    status = ProgramacionService.obtener_status_maquina('test-mes-1')
+    assert (status['estado'], status['producto'], status['cavidades']) == ('PROGRAMADO', 'FR-9304, FR-9305', 4)
+
+    db.session.add(ProduccionInyeccion(id_inyeccion='TEST-MES-INY', id_codigo='FR-9304', maquina='TEST-MES-1',
+                                       estado='EN_PROCESO', molde=7, cavidades=2,
+                                       fecha_inicia=datetime(2026, 10, 18, 6, 30)))
+    db.session.commit()
+    tablero = _por_nombre(ProgramacionService.obtener_dashboard_mes())
+    assert tablero['TEST-MES-1']['estado'] == 'EN_PROCESO'
+    assert tablero['TEST-MES-1']['trabajo_activo']['hora_inicio'] == '06:30'
+    assert ProgramacionService.obtener_status_maquina('TEST-MES-1')['inicio'] == '06:30'
+
+    # Igual a reconstruir todo desde SQL.
+    incremental = ProgramacionService.obtener_dashboard_mes()
+    mes_estado.reconstruir()
+    assert [{k: v for k, v in m.items() if k != 'revision'} for m in incremental] == \
+        [{k: v for k, v in m.items() if k != 'revision'} for m in ProgramacionService.obtener_dashboard_mes()]
+
+
+def test_mover_de_maquina_y_rollback(contexto):
+    prog = _programar('TEST-MES-1', 'FR-9304')
+    cursor, _ = mes_estado.tablero()
+
+    prog.maquina = 'TEST-MES-2'
+    db.session.flush()
+    db.session.rollback()
+    assert mes_estado.cambios_desde(cursor)[0] == []
+
+    prog = ProgramacionInyeccion.query.get(prog.id)
+    prog.maquina = 'TEST-MES-2'
+    db.session.commit()
+    cambios, _ = mes_estado.cambios_desde(cursor)
+    tablero = _por_nombre(cambios)
+    assert set(tablero) == {'TEST-MES-1', 'TEST-MES-2'}
+    assert tablero['TEST-MES-1']['estado'] == 'LIBRE'
+    assert tablero['TEST-MES-2']['cola'][0]['codigo_sistema'] == 'FR-9304'
+
+    # Query.update no pasa por el flush del ORM: solo llega si se marca.
+    ProgramacionInyeccion.query.filter_by(id=prog.id).update({'estado': 'FINALIZADO'}, synchronize_session=False)
+    mes_estado.marcar_maquinas(db.session, 'TEST-MES-2')
+    db.session.commit()
+    assert _por_nombre(ProgramacionService.obtener_dashboard_mes())['TEST-MES-2']['estado'] == 'LIBRE'
+
+
+def test_cambio_de_catalogo_pide_tablero_completo(contexto):
+    cursor, _ = mes_estado.tablero()
+    Maquina.query.filter_by(nombre='TEST-MES-2').one().activa = False
+    db.session.commit()
+
+    cambios, nuevo = mes_estado.cambios_desde(cursor)
+    assert cambios is None
+    assert 'TEST-MES-2' not in _por_nombre(mes_estado.tablero()[1])
+    assert mes_estado.cambios_desde('otraepoca.3')[0] is None
+    assert mes_estado.cambios_desde(nuevo) == ([], nuevo)
+
+
+def _cliente():
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s['user'] = 'jefe prueba'
+        s['role'] = 'JEFE INYECCION'
+    return cliente
+
+
+def test_dashboard_etag_y_stream(contexto, monkeypatch):
+    cliente = _cliente()
+    r = cliente.get('/api/mes/dashboard')
+    assert r.status_code == 200
+    cursor = r.get_json()['cursor']
+    assert 'TEST-MES-1' in _por_nombre(r.get_json()['maquinas'])
+    assert cliente.get('/api/mes/dashboard', headers={'If-None-Match': r.headers['ETag']}).status_code == 304
+
+    _programar('TEST-MES-2', 'FR-9306')
+    assert cliente.get('/api/mes/dashboard', headers={'If-None-Match': r.headers['ETag']}).status_code == 200
+
+    monkeypatch.setattr(programacion_routes, 'STREAM_MAX_SEGUNDOS', 0.2)
+    monkeypatch.setattr(programacion_routes, 'STREAM_PING_SEGUNDOS', 0.05)
+    with cliente.get('/api/mes/stream', headers={'Last-Event-ID': cursor}) as r:
+        assert r.mimetype == 'text/event-stream'
+        bloques = [b for b in r.get_data(as_text=True).split('\n\n') if b.startswith('id: ')]
+
+    campos = dict(linea.split(': ', 1) for linea in bloques[0].splitlines())
+    assert campos['event'] == 'maquinas'
+    assert [m['nombre'] for m in json.loads(campos['data'])['maquinas']] == ['TEST-MES-2']
+
+    with cliente.get('/api/mes/stream') as r:
+        primero = r.get_data(as_text=True).split('\n\n')[0]
+    assert 'event: tablero' in primero
+
+
+def test_stream_sin_cupo_compartido_cae_a_polling(contexto):
+    # El cupo de conexiones largas es uno solo para SSE y long-poll y deja
+    # libres al menos dos hilos de gunicorn.
+    assert conexiones_largas.MAX_CONEXIONES_LARGAS <= conexiones_largas.HILOS_SERVIDOR - 2
+    tomados = 0
+    while conexiones_largas.tomar():
+        tomados += 1
+    try:
+        assert tomados == conexiones_largas.MAX_CONEXIONES_LARGAS
+        r = _cliente().get('/api/mes/stream')
+        assert r.status_code == 429
+        assert r.get_json()['usar_polling'] is True
+    finally:
+        for _ in range(tomados):
+            conexiones_largas.liberar()
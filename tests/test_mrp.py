@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del planificador MRP de ensamble (backend/services/mrp_service.py):
+los programas abiertos y los pedidos pendientes explotan por la ficha en
+varios niveles, se netean contra p_terminado, por_pulir y el WIP de los
+lotes de inyección abiertos, y un movimiento de StockService confirmado
+re-netea solo el código tocado y lo que cuelga de él.
+
+Corre contra la base de datos configurada en DATABASE_URL. Todo lo que
+crea lleva la marca TEST-MRP- y la limpieza borra solo eso: pedidos,
+despachos y lotes por id, programas por op_numero, productos por
+descripción y las fichas de los productos TEST-MRP- exactos. En las fichas
+la marca va en la descripción porque la primera palabra es el código que
+interpreta el servicio (FR-, CB).
+"""
+from datetime import date
+
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import (
+    DespachoPedido, FichaMaestra, Pedido, Producto, ProgramacionEnsamble, TrazabilidadLote,
+)
+from backend.services import bom_service, mrp_service
+from backend.services.mrp_service import MrpService
+from backend.services.stock_service import StockService
+
+KIT = 'FR-77801 TEST-MRP-KIT'
+SUBENSAMBLE = 'CB77821 TEST-MRP-SUB'
+
+
+def _limpiar():
+    FichaMaestra.query.filter(FichaMaestra.producto.in_([KIT, SUBENSAMBLE])).delete(synchronize_session=False)
+    Producto.query.filter(Producto.descripcion.like('TEST-MRP-%')).delete(synchronize_session=False)
+    ProgramacionEnsamble.query.filter(ProgramacionEnsamble.op_numero.like('TEST-MRP-%')).delete(synchronize_session=False)
+    Pedido.query.filter(Pedido.id_pedido.like('TEST-MRP-%')).delete(synchronize_session=False)
+    DespachoPedido.query.filter(DespachoPedido.id_pedido.like('TEST-MRP-%')).delete(synchronize_session=False)
+    TrazabilidadLote.query.filter(TrazabilidadLote.id_lote.like('TEST-MRP-%')).delete(synchronize_session=False)
+    db.session.commit()
+    bom_service.invalidar_indice_bom()
+    MrpService.invalidar()
+
+
+@pytest.fixture
+def planta():
+    with app.app_context():
+        _limpiar()
+        db.session.add_all([
+            FichaMaestra(producto=KIT, subproducto='77811 TEST-MRP-BUJE', cantidad=2),
+            FichaMaestra(producto=KIT, subproducto=SUBENSAMBLE, cantidad=1),
+            FichaMaestra(producto=SUBENSAMBLE, subproducto='77831 TEST-MRP-RESORTE', cantidad=3),
+            Producto(codigo_sistema='77811', id_codigo='FR-77811', descripcion='TEST-MRP-Buje', p_terminado=4, por_pulir=2),
+            Producto(codigo_sistema='CB77821', id_codigo='CB77821', descripcion='TEST-MRP-Sub', p_terminado=0),
+            Producto(codigo_sistema='77831', id_codigo='FR-77831', descripcion='TEST-MRP-Resorte', p_terminado=5),
+            ProgramacionEnsamble(id_codigo='FR-77801', op_numero='TEST-MRP-OP', cantidad_objetivo=10, cantidad_realizada=0,
+                                 fecha_programada=date(2026, 11, 2), estado='PENDIENTE'),
+            # Pedido del kit posterior al programa: lo cubre la recepción programada.
+            Pedido(id_pedido='TEST-MRP-1', fecha=date(2026, 11, 5), id_codigo='FR-77801',
+                   cantidad=12, estado='PENDIENTE'),
+            DespachoPedido(id_pedido='TEST-MRP-1', id_codigo='FR-77801', cantidad_enviada=2),
+            TrazabilidadLote(id_lote='TEST-MRP-LOTE', id_codigo='FR-77831', estado_actual='EN_PULIDO', por_pulir=5),
+        ])
+        db.session.commit()
+        yield
+        _limpiar()
+
+
+def test_explosion_multinivel_con_wip(planta):
+    filas = MrpService.obtener_plan().filas
+
+    buje = filas['77811']
+    assert (buje['requerido'], buje['en_mano'], buje['por_pulir'], buje['faltante']) == (20.0, 4.0, 2.0, 14.0)
+    assert buje['fecha_faltante'] == '2026-11-02'
+
+    sub = filas['CB77821']
+    assert sub['se_ensambla'] and sub['faltante'] == 10.0
+
+    resorte = filas['77831']
+    assert resorte['nivel'] == 2
+    assert (resorte['requerido'], resorte['wip_inyeccion'], resorte['faltante']) == (30.0, 5.0, 20.0)
+
+    kit = filas['77801']
+    assert (kit['requerido'], kit['programado'], kit['faltante']) == (10.0, 10.0, 0.0)
+
+    resumen = MrpService.resumen()
+    codigos = [f['codigo'] for f in resumen['componentes']]
+    assert {'77811', 'CB77821', '77831'} <= set(codigos)
+    assert '77801' not in codigos
+
+
+def test_movimiento_de_stock_renetea_solo_lo_afectado(planta, monkeypatch):
+    plan = MrpService.obtener_plan()
+
+    neteados = []
+    netear = mrp_service._netear
+    monkeypatch.setattr(mrp_service, '_netear', lambda p, c, s: (neteados.append(c), netear(p, c, s)))
+
+    StockService.registrar_entrada('77811', 14, 'P. TERMINADO')
+    db.session.commit()
+
+    assert MrpService.obtener_plan() is plan
+    assert neteados == ['77811']
+    assert plan.filas['77811']['faltante'] == 0.0
+    assert plan.filas['77831']['faltante'] == 20.0
+
+
+def test_cambio_de_demanda_reconstruye_el_plan(planta):
+    plan = MrpService.obtener_plan()
+
+    prog = ProgramacionEnsamble.query.filter_by(op_numero='TEST-MRP-OP').first()
+    prog.cantidad_realizada = 5
+    db.session.commit()
+
+    # El programa ya no cubre el pedido: el kit queda corto el 5/11 y ese
+    # faltante explota de nuevo por la ficha en la fecha del pedido.
+    nuevo = MrpService.obtener_plan()
+    assert nuevo is not plan
+    kit = nuevo.filas['77801']
+    assert (kit['programado'], kit['faltante'], kit['fecha_faltante']) == (5.0, 5.0, '2026-11-05')
+    assert [(d['fecha'], d['cantidad']) for d in nuevo.filas['77811']['demandas']] == [
+        ('2026-11-02', 10.0), ('2026-11-05', 10.0),
+    ]
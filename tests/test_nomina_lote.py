@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del cálculo de nómina en lote (ReglasAsistencia.calcular_lote) y del
+recálculo set-based del periodo abierto (nomina_service.recalcular_periodo).
+
+La equivalencia con el cálculo escalar se verifica como propiedad sobre
+miles de registros generados con semilla fija (horas en todos los formatos
+que llegan de planta, vacíos, AUSENTE, basura, salidas invertidas, fines de
+semana y ambos perfiles). El recálculo corre contra la base de datos
+configurada en DATABASE_URL, limpiando los registros TEST-LOTE- que crea.
+"""
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.nomina_models import RegistroAsistencia as RegistroAsistenciaDTO
+from backend.models.sql_models import RegistroAsistencia
+from backend.services.nomina_service import ReglasAsistencia, recalcular_periodo
+
+pytestmark = pytest.mark.usefixtures('sin_db_usuarios')
+
+COLABORADORES = ['operario_generico', 'paola nimisica', 'Paola Nimisica ', '', None]
+
+
+def _hora_aleatoria(rng):
+    hh, mm = rng.randrange(24), rng.randrange(60)
+    formato = rng.randrange(10)
+    if formato < 4:
+        return f"{hh:02d}:{mm:02d}"
+    if formato == 4:
+        return f"{hh:02d}:{mm:02d}:{rng.randrange(60):02d}"
+    if formato == 5:
+        h12 = hh % 12 or 12
+        return f"{h12}:{mm:02d}:00 {'p. m.' if hh >= 12 else 'a. m.'}"
+    if formato == 6:
+        return f"{hh % 12 or 12}:{mm:02d} {'PM' if hh >= 12 else 'AM'}"
+    return rng.choice(['', None, 'AUSENTE', 'ausente', '99:99', 'sin marcar', '7h', '25:10'])
+
+
+def _registros_aleatorios(n, semilla):
+    rng = random.Random(semilla)
+    base = date(2026, 1, 1)
+    registros = []
+    for _ in range(n):
+        fecha = base + timedelta(days=rng.randrange(365))
+        fecha = rng.choice([fecha, fecha, fecha.isoformat(), '2026-13-45'])
+        registros.append({
+            'fecha': fecha,
+            'ingreso_real': _hora_aleatoria(rng),
+            'salida_real': _hora_aleatoria(rng),
+            'colaborador': rng.choice(COLABORADORES),
+        })
+    return registros
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_lote_identico_al_calculo_escalar(semilla):
+    registros = _registros_aleatorios(2000, semilla)
+    lote = ReglasAsistencia.calcular_lote(pd.DataFrame(registros))
+
+    for i, reg in enumerate(registros):
+        esperado = ReglasAsistencia.calcular_jornada_y_extras(RegistroAsistenciaDTO(**reg))
+        obtenido = {
+            'horas_ordinarias': lote['horas_ordinarias'].iloc[i],
+            'horas_extras': lote['horas_extras'].iloc[i],
+        }
+        assert obtenido == esperado, reg
+
+
+def test_lote_vacio():
+    vacio = ReglasAsistencia.calcular_lote(pd.DataFrame(columns=['fecha', 'ingreso_real', 'salida_real', 'colaborador']))
+    assert list(vacio['horas_ordinarias']) == []
+
+
+def _limpiar():
+    RegistroAsistencia.query.filter(RegistroAsistencia.colaborador.like('TEST-LOTE-%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture
+def periodo():
+    with app.app_context():
+        _limpiar()
+        lunes = date(2026, 8, 17)
+        db.session.add_all([
+            RegistroAsistencia(fecha=lunes + timedelta(days=d), colaborador=f'TEST-LOTE-{i}',
+                               ingreso_real='06:00', salida_real='18:00', horas_ordinarias=0, horas_extras=0,
+                               estado_pago='PENDIENTE')
+            for i in range(30) for d in range(5)
+        ] + [
+            RegistroAsistencia(fecha=lunes, colaborador='TEST-LOTE-SELLADO', ingreso_real='06:00',
+                               salida_real='18:00', horas_ordinarias=0, horas_extras=0, estado_pago='PROCESADO'),
+        ])
+        db.session.commit()
+        yield lunes
+        _limpiar()
+
+
+def test_recalcular_periodo_set_based(periodo, contar_consultas):
+    lunes = periodo
+    simulado = recalcular_periodo('all', lunes, lunes + timedelta(days=4), aplicar=False)
+    assert simulado['actualizados'] == 150
+    assert RegistroAsistencia.query.filter_by(colaborador='TEST-LOTE-0', fecha=lunes).one().horas_ordinarias == 0
+
+    resumen, consultas = contar_consultas(recalcular_periodo, 'all', lunes, lunes + timedelta(days=4))
+    db.session.commit()
+
+    assert resumen['actualizados'] == 150
+    assert consultas == 2  # SELECT del periodo + un UPDATE
+
+    lun = RegistroAsistencia.query.filter_by(colaborador='TEST-LOTE-0', fecha=lunes).one()
+    vie = RegistroAsistencia.query.filter_by(colaborador='TEST-LOTE-0', fecha=lunes + timedelta(days=4)).one()
+    assert (float(lun.horas_ordinarias), float(lun.horas_extras)) == (9.0, 2.0)
+    assert (float(vie.horas_ordinarias), float(vie.horas_extras)) == (6.33, 5.67)
+    sellado = RegistroAsistencia.query.filter_by(colaborador='TEST-LOTE-SELLADO').one()
+    assert float(sellado.horas_ordinarias) == 0
+
+    assert recalcular_periodo('all', lunes, lunes + timedelta(days=4))['actualizados'] == 0
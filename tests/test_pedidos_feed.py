@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del change-feed de pedidos pendientes (backend/services/pedidos_feed.py
+y /api/pedidos/pendientes/cambios): un commit que toca db_pedidos (por ORM o
+marcado a mano) sube la revisión con solo ese id_pedido, un rollback no deja
+rastro, un cursor ajeno pide recarga completa y, sin cambios, el endpoint
+responde 304 sin consultar la base. El listado con cambios usa el SQL de
+PostgreSQL de VentasRepository y no se cubre aquí.
+
+Corre contra la base de datos configurada en DATABASE_URL, limpiando los
+pedidos TEST-FEED- que crea.
+"""
+import threading
+
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import Pedido
+from backend.services import pedidos_feed
+
+
+@pytest.fixture
+def contexto():
+    with app.app_context():
+        Pedido.query.filter(Pedido.id_pedido.like('TEST-FEED-%')).delete(synchronize_session=False)
+        db.session.commit()
+        yield
+        Pedido.query.filter(Pedido.id_pedido.like('TEST-FEED-%')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _nuevo_pedido(id_pedido):
+    db.session.add(Pedido(id_pedido=id_pedido, id_codigo='FR-9304', cantidad=5, estado='PENDIENTE'))
+    db.session.commit()
+
+
+def test_commit_orm_publica_solo_el_pedido_tocado(contexto):
+    cursor = pedidos_feed.cursor_actual()
+    _nuevo_pedido('TEST-FEED-1')
+
+    ids, nuevo_cursor = pedidos_feed.cambios_desde(cursor)
+    assert ids == {'TEST-FEED-1'}
+    assert nuevo_cursor != cursor
+    assert pedidos_feed.cambios_desde(nuevo_cursor) == (set(), nuevo_cursor)
+
+
+def test_rollback_y_marcado_manual(contexto):
+    _nuevo_pedido('TEST-FEED-2')
+    cursor = pedidos_feed.cursor_actual()
+
+    Pedido.query.filter_by(id_pedido='TEST-FEED-2').first().estado = 'EN ALISTAMIENTO'
+    db.session.flush()
+    db.session.rollback()
+    assert pedidos_feed.cambios_desde(cursor)[0] == set()
+
+    # Query.update no pasa por el flush del ORM: solo llega si se marca.
+    Pedido.query.filter_by(id_pedido='TEST-FEED-2').update({'delegado_a': 'OPERARIA'})
+    pedidos_feed.marcar_pedidos(db.session, 'TEST-FEED-2')
+    db.session.commit()
+    assert pedidos_feed.cambios_desde(cursor)[0] == {'TEST-FEED-2'}
+
+
+def test_cursor_ajeno_pide_recarga_completa():
+    ids, cursor = pedidos_feed.cambios_desde('otraepoca.3')
+    assert ids is None
+    assert cursor == pedidos_feed.cursor_actual()
+    assert pedidos_feed.cambios_desde('')[0] is None
+
+
+def test_long_poll_despierta_al_publicar():
+    cursor = pedidos_feed.cursor_actual()
+    threading.Timer(0.1, pedidos_feed.publicar, args=({'TEST-FEED-LP'},)).start()
+    ids, _ = pedidos_feed.cambios_desde(cursor, espera=5)
+    assert ids == {'TEST-FEED-LP'}
+
+
+def test_endpoint_sin_cambios_responde_304():
+    with app.test_client() as c:
+        with c.session_transaction() as s:
+            s['user'] = 'jefe prueba'
+            s['role'] = 'JEFE ALMACEN'
+        r = c.get('/api/pedidos/pendientes/cambios', query_string={'desde': pedidos_feed.cursor_actual()})
+        assert r.status_code == 304
+        assert r.get_data() == b''
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la cola de PDFs de lote de Inyección
+(backend/services/reporte_lote_service.py): el render corre fuera del hilo
+que encola, el contenido sale de las filas de db_inyeccion, el resultado
+queda en la caché en disco bajo id + hash de ese contenido, el mismo lote no
+se vuelve a renderizar (tampoco al pedirlo tras perder el estado en memoria)
+y un lote cambiado sí, también cuando el cambio llega por validar_lote y el
+PDF anterior ya estaba LISTO.
+
+Corre contra la base de datos configurada en DATABASE_URL, limpiando los
+lotes TEST-PDF- que crea. Cada test usa su propio pool y estado de la cola:
+los lotes que encolan otros tests (test_registrar_lote) no corren mientras
+tanto.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from backend.app import app
+from backend.core.sql_database import db
+from backend.models.sql_models import PncInyeccion, ProduccionInyeccion
+from backend.services import reporte_lote_service as rls
+from backend.services.reporte_lote_service import ReportesLoteService
+from backend.utils.imagen_cache import DiskImageCache
+
+
+def _limpiar():
+    PncInyeccion.query.filter(PncInyeccion.id_inyeccion.like('TEST-PDF-%')).delete(synchronize_session=False)
+    ProduccionInyeccion.query.filter(ProduccionInyeccion.id_inyeccion.like('TEST-PDF-%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def cola_aislada(tmp_path, monkeypatch):
+    # Deja terminar lo que otros tests dejaron en el pool compartido antes de
+    # reemplazarlo por uno propio con estado vacío; al final queda None y el
+    # siguiente uso crea un pool nuevo.
+    if rls._executor is not None:
+        rls._executor.shutdown(wait=True)
+        rls._executor = None
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-lote-test')
+    monkeypatch.setattr(rls, '_executor', executor)
+    monkeypatch.setattr(rls, '_cache', DiskImageCache(str(tmp_path), max_bytes=5 * 1024 * 1024))
+    monkeypatch.setattr(rls, '_estados', rls.OrderedDict())
+    monkeypatch.setattr(rls, '_eventos', {})
+    monkeypatch.setattr(rls, '_en_cola', 0)
+    with app.app_context():
+        _limpiar()
+        yield
+        executor.shutdown(wait=True)
+        _limpiar()
+
+
+def _lote(id_inyeccion, cantidad_real=390):
+    db.session.add(ProduccionInyeccion(
+        id_inyeccion=id_inyeccion, id_codigo='FR-9304', responsable='TEST PDF', maquina='Maquina 1',
+        orden_produccion='OP-123', fecha_inicia=datetime(2026, 3, 3), hora_inicio='06:00', hora_termina='14:00',
+        entrada=10, salida=2, cavidades=4, cant_contador=100, cantidad_real=cantidad_real, pnc_total=10,
+        peso_bujes=0.01,
+    ))
+    db.session.commit()
+
+
+def _renders(monkeypatch):
+    from backend.utils.report_service import PDFGenerator
+    original = PDFGenerator.generar_reporte_inyeccion_lote
+    llamadas = []
+
+    def contar(turno, items, filepath):
+        llamadas.append((turno, items))
+        return original(turno, items, filepath)
+
+    monkeypatch.setattr(PDFGenerator, 'generar_reporte_inyeccion_lote', staticmethod(contar))
+    return llamadas
+
+
+def test_encola_y_deja_el_pdf_en_disco(monkeypatch):
+    llamadas = _renders(monkeypatch)
+    _lote('TEST-PDF-1')
+    estado = ReportesLoteService.encolar('TEST-PDF-1')
+    assert estado['estado'] in (rls.PENDIENTE, rls.GENERANDO)
+    assert estado['archivo'] == '2026-03-03_OP-123_Maquina-1.pdf'
+    assert 'llave' not in estado
+
+    assert ReportesLoteService.esperar('TEST-PDF-1', timeout=30)['estado'] == rls.LISTO
+    entrada, estado = ReportesLoteService.obtener_pdf('TEST-PDF-1')
+    with open(entrada.ruta, 'rb') as f:
+        assert f.read(4) == b'%PDF'
+    assert len(llamadas) == 1
+    assert ReportesLoteService.encolar('TEST-PDF-NO-EXISTE') is None
+
+
+def test_mismo_lote_no_se_renderiza_dos_veces(monkeypatch):
+    llamadas = _renders(monkeypatch)
+    _lote('TEST-PDF-2')
+    ReportesLoteService.encolar('TEST-PDF-2')
+    ReportesLoteService.esperar('TEST-PDF-2', timeout=30)
+    assert ReportesLoteService.encolar('TEST-PDF-2')['estado'] == rls.LISTO
+
+    # Sin el estado en memoria (reinicio del proceso) la descarga rearma el
+    # mismo contenido desde la BD y encuentra el PDF ya guardado.
+    rls._estados.clear()
+    entrada, estado = ReportesLoteService.obtener_pdf('TEST-PDF-2')
+    assert entrada is not None and estado['estado'] == rls.LISTO
+    assert len(llamadas) == 1
+
+    ProduccionInyeccion.query.filter_by(id_inyeccion='TEST-PDF-2').update({'cantidad_real': 380})
+    db.session.commit()
+    ReportesLoteService.encolar('TEST-PDF-2')
+    assert ReportesLoteService.esperar('TEST-PDF-2', timeout=30)['estado'] == rls.LISTO
+    assert len(llamadas) == 2
+    assert llamadas[1][1][0]['cantidad_real'] == 380
+
+
+def test_error_de_render_queda_en_estado(monkeypatch):
+    from backend.utils.report_service import PDFGenerator
+    monkeypatch.setattr(PDFGenerator, 'generar_reporte_inyeccion_lote', staticmethod(lambda *a: False))
+    _lote('TEST-PDF-3')
+    ReportesLoteService.encolar('TEST-PDF-3')
+    estado = ReportesLoteService.esperar('TEST-PDF-3', timeout=30)
+    assert estado['estado'] == rls.ERROR
+    assert estado['error']
+
+
+def test_lote_validado_sirve_pdf_nuevo(monkeypatch):
+    # 'PRUEBA' en el id: validar_lote no toca BOM ni inventario.
+    from backend.services.inyeccion_service import InyeccionService
+    llamadas = _renders(monkeypatch)
+    _lote('TEST-PDF-PRUEBA-4')
+    ReportesLoteService.encolar('TEST-PDF-PRUEBA-4')
+    assert ReportesLoteService.esperar('TEST-PDF-PRUEBA-4', timeout=30)['estado'] == rls.LISTO
+    antes, _ = ReportesLoteService.obtener_pdf('TEST-PDF-PRUEBA-4')
+    assert len(llamadas) == 1
+
+    resultado = InyeccionService.validar_lote(
+        'TEST-PDF-PRUEBA-4', {'items': [{'codigo': '9304', 'pnc_inyeccion': 25}]}, 'VALIDADOR TEST PDF')
+    assert resultado.get('success'), resultado
+
+    # Con el PDF anterior en LISTO, la descarga relee el lote y encola otro.
+    entrada, estado = ReportesLoteService.obtener_pdf('TEST-PDF-PRUEBA-4')
+    assert entrada is None and estado['estado'] in (rls.PENDIENTE, rls.GENERANDO)
+    assert ReportesLoteService.esperar('TEST-PDF-PRUEBA-4', timeout=30)['estado'] == rls.LISTO
+    despues, _ = ReportesLoteService.obtener_pdf('TEST-PDF-PRUEBA-4')
+    assert len(llamadas) == 2
+    assert llamadas[1][1][0]['pnc'] == 25
+    assert despues.ruta != antes.ruta
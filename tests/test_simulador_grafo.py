@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del grafo de recursos en memoria de backend/services/simulador_service.py:
+la enumeración de candidatos debe salir del grafo (sin consultas por
+referencia) con las mismas reglas que antes — portamoldes alternativos,
+máquinas libres, macho más cercano dentro de tolerancia y ciclo histórico
+sumando la referencia con y sin prefijo 'FR-'. El grafo se puede invalidar
+a pedido desde /api/simulador/grafo/invalidar.
+"""
+from backend.app import app
+from backend.services import simulador_service as ss
+from backend.services.simulador_service import GrafoRecursos, SimuladorService
+
+
+def _grafo():
+    return GrafoRecursos(
+        moldes=[('9629', 'M-9629', 4, 'CAVIDAD_FIJA'), ('7011', 'M-7011', 2, 'CAVIDAD_FIJA')],
+        molde_portamolde=[('M-9629', 'M'), ('M-9629', 'N'), ('M-9629', 'N'), ('M-7011', 'B')],
+        maquina_portamolde=[('Maquina 1', 'M'), ('Maquina 2', 'M'), ('Maquina 2', 'N'), ('Maquina 3', 'B')],
+        machos=[('MA-10', 10.0, 2), ('MA-12', 12.5, 1), ('MA-SIN', None, 5)],
+    )
+
+
+def test_macho_mas_cercano_dentro_de_tolerancia():
+    grafo = _grafo()
+    assert grafo.macho_compatible(10.4)['codigo_macho'] == 'MA-10'
+    assert grafo.macho_compatible(12.0)['codigo_macho'] == 'MA-12'
+    assert grafo.macho_compatible(20) is None
+    assert grafo.macho_compatible(None) is None
+
+
+def test_tiempo_ciclo_suma_con_y_sin_prefijo():
+    ciclos = {'9629': (30.0, 2), 'FR-9629': (18.0, 1), 'FR-FR-9629': (999.0, 1)}
+    assert SimuladorService._tiempo_ciclo_historico('9629', ciclos) == {
+        'segundos_por_unidad_promedio': 16.0, 'corridas_historicas': 3,
+    }
+    assert SimuladorService._tiempo_ciclo_historico('7011', ciclos) is None
+
+
+def test_candidatos_se_enumeran_en_memoria(monkeypatch):
+    grafo = _grafo()
+    monkeypatch.setattr(SimuladorService, '_obtener_grafo', staticmethod(lambda: grafo))
+    monkeypatch.setattr(SimuladorService, '_ciclos_historicos', staticmethod(lambda: {'FR-9629': (40.0, 4)}))
+    monkeypatch.setattr(SimuladorService, '_brechas_reales', staticmethod(lambda limite: [
+        {'codigo_referencia': '9629', 'descripcion': 'Buje', 'faltante': 100.0,
+         'pared': 3.0, 'diametro_interno': 10.2, 'via_producto_final': False},
+        {'codigo_referencia': '7011', 'descripcion': 'Retén', 'faltante': 50.0,
+         'pared': None, 'diametro_interno': None, 'via_producto_final': False},
+    ]))
+    # Máquina 1 y portamolde B ocupados; MA-10 tiene 2 unidades y 1 en uso.
+    monkeypatch.setattr(SimuladorService, '_recursos_ocupados', staticmethod(
+        lambda: ({'Maquina 1'}, {'B'}, {'MA-10': 1})
+    ))
+    monkeypatch.setattr(ss.db.session, 'execute', lambda *a, **k: (_ for _ in ()).throw(
+        AssertionError('obtener_candidatos no debe consultar la BD por referencia')
+    ))
+
+    candidatos = SimuladorService.obtener_candidatos(limite=10)
+
+    assert [(c['portamolde_sugerido'], c['maquina_sugerida']) for c in candidatos] == [
+        ('M', 'Maquina 2'), ('N', 'Maquina 2'),
+    ]
+    assert candidatos[0]['portamoldes_alternativos'] == ['M', 'N']
+    assert candidatos[0]['macho_requerido'] == 'MA-10'
+    assert candidatos[0]['macho_disponible'] is True
+    assert candidatos[0]['tiempo_ciclo_seg_promedio'] == 10.0
+
+
+def test_endpoint_invalida_el_grafo(monkeypatch):
+    monkeypatch.setattr(ss, '_grafo', _grafo())
+    monkeypatch.setattr(ss, '_ciclos', {'FR-9629': (40.0, 4)})
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s['user'] = 'jefe prueba'
+        s['role'] = 'JEFE INYECCION'
+
+    assert cliente.post('/api/simulador/grafo/invalidar').status_code == 200
+    assert ss._grafo is None and ss._ciclos is None
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del planificador por lotes (backend/services/simulador_planificador.py):
+el plan debe respetar que molde y portamolde estén en una sola máquina a la
+vez, producir parcial lo que no cabe en el horizonte, y la búsqueda local
+nunca debe dejar un plan peor que el greedy inicial.
+"""
+from backend.services.simulador_planificador import _Opcion, evaluar, optimizar
+
+PESOS = {'peso_faltante': 1.0, 'peso_cambio': 200.0, 'peso_ocio': 10.0}
+
+
+def _trabajo(ref, faltante, opciones):
+    return {'codigo_referencia': ref, 'faltante': faltante, 'opciones': opciones}
+
+
+def _solapan(a, b):
+    return a[2] < b[4] and b[2] < a[4]
+
+
+def test_molde_compartido_no_corre_en_dos_maquinas_a_la_vez():
+    # 100 u a 36 s/u = 1 h de producción + 1 h de cambio.
+    trabajos = [
+        _trabajo('A', 100, [_Opcion('M1', 2, 'P', 'Maq 1', None, 0.01), _Opcion('M1', 2, 'Q', 'Maq 2', None, 0.01)]),
+        _trabajo('B', 100, [_Opcion('M1', 2, 'Q', 'Maq 2', None, 0.01)]),
+    ]
+    _, desglose, tareas = evaluar([0, 1], {0: 0, 1: 0}, trabajos, ['Maq 1', 'Maq 2'], 10, 1.0, {}, PESOS)
+
+    assert desglose['unidades_sin_cubrir'] == 0
+    assert not _solapan(tareas[0], tareas[1])
+
+
+def test_produce_parcial_lo_que_no_cabe_en_el_horizonte():
+    trabajos = [_trabajo('A', 1000, [_Opcion('M1', 1, 'P', 'Maq 1', None, 0.01)])]
+    _, desglose, tareas = evaluar([0], {0: 0}, trabajos, ['Maq 1'], 5, 1.0, {}, PESOS)
+
+    assert tareas[0][5] == 400
+    assert desglose == {'unidades_sin_cubrir': 600, 'cambios_molde': 1, 'horas_ocio': 0}
+
+
+def test_cambios_de_molde_se_cuentan_aunque_no_duren():
+    trabajos = [
+        _trabajo('A', 100, [_Opcion('M1', 1, 'P', 'Maq 1', None, 0.01)]),
+        _trabajo('B', 100, [_Opcion('M1', 1, 'P', 'Maq 1', None, 0.01)]),
+        _trabajo('C', 100, [_Opcion('M2', 1, 'Q', 'Maq 1', None, 0.01)]),
+    ]
+    _, desglose, _ = evaluar([0, 1, 2], {0: 0, 1: 0, 2: 0}, trabajos, ['Maq 1'], 10, 0.0, {}, PESOS)
+    assert desglose['cambios_molde'] == 2
+
+
+def test_macho_limita_trabajos_simultaneos():
+    trabajos = [
+        _trabajo('A', 100, [_Opcion('M1', 1, 'P', 'Maq 1', 'MA-10', 0.01)]),
+        _trabajo('B', 100, [_Opcion('M2', 1, 'Q', 'Maq 2', 'MA-10', 0.01)]),
+    ]
+    _, _, tareas = evaluar([0, 1], {0: 0, 1: 0}, trabajos, ['Maq 1', 'Maq 2'], 10, 0.5, {'MA-10': 1}, PESOS)
+    assert not _solapan(tareas[0], tareas[1])
+
+    _, _, tareas = evaluar([0, 1], {0: 0, 1: 0}, trabajos, ['Maq 1', 'Maq 2'], 10, 0.5, {'MA-10': 2}, PESOS)
+    assert _solapan(tareas[0], tareas[1])
+
+
+def test_busqueda_local_no_empeora_y_es_determinista():
+    maquinas = ['Maq 1', 'Maq 2', 'Maq 3']
+    trabajos = []
+    for i in range(12):
+        molde = f'M{i % 4}'
+        opciones = [
+            _Opcion(molde, 2, f'P{i % 4}{k}', maquinas[(i + k) % 3], None, 0.002 * (1 + k))
+            for k in range(2)
+        ]
+        trabajos.append(_trabajo(f'R{i}', 500 + 137 * i, opciones))
+
+    greedy = optimizar(trabajos, maquinas, 24, {}, pesos=PESOS, max_iteraciones=0)
+    mejorado = optimizar(trabajos, maquinas, 24, {}, pesos=PESOS, max_iteraciones=300, tiempo_max_seg=5)
+
+    assert mejorado[0] <= greedy[0]
+    assert mejorado[:3] == optimizar(trabajos, maquinas, 24, {}, pesos=PESOS, max_iteraciones=300, tiempo_max_seg=5)[:3]